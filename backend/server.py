@@ -108,9 +108,10 @@ async def lifespan(app: FastAPI):
 
     # Encoder — try local first, fallback to HF API
     encoder = None
+    local_encoder = None
     try:
         from towow.hdc.encoder import EmbeddingEncoder
-        encoder = EmbeddingEncoder()
+        encoder = local_encoder = EmbeddingEncoder()
         logger.info("Encoder: local EmbeddingEncoder (backend=%s)", encoder._backend)
     except Exception as e:
         logger.info("Encoder: local not available (%s), trying HF API...", e)
@@ -122,6 +123,19 @@ async def lifespan(app: FastAPI):
         except Exception as e2:
             logger.warning("Encoder: no encoder available (%s)", e2)
 
+    # Micro-batch concurrent single-text encodes (local model only; API encoder is remote)
+    app.state.encode_batchers = []
+    if local_encoder is not None and config.encode_batch_max_size > 1:
+        from towow.infra.encode_batcher import BatchingEncoder, MicroBatcher
+        v1_batcher = MicroBatcher(
+            lambda texts: local_encoder.model.encode(texts, normalize_embeddings=True),
+            max_batch_size=config.encode_batch_max_size,
+            max_wait_ms=config.encode_batch_wait_ms,
+        )
+        app.state.encode_batchers.append(v1_batcher)
+        encoder = BatchingEncoder(v1_batcher)
+        logger.info("Encoder: micro-batching enabled (max_batch=%d)", config.encode_batch_max_size)
+
     app.state.encoder = encoder
 
     # V1 Resonance
@@ -194,10 +208,68 @@ async def lifespan(app: FastAPI):
     # ── 2b. V2 Intent Field subsystem ────────────────────────
     from towow.field import MemoryField, BgeM3Encoder, SimHashProjector, EncodingPipeline
     field_encoder = BgeM3Encoder()
-    field_projector = SimHashProjector(input_dim=field_encoder.dim)
-    field_pipeline = EncodingPipeline(field_encoder, field_projector)
-    field = MemoryField(field_pipeline)
+    if config.field_projector == "hadamard":
+        from towow.field import HadamardProjector
+        field_projector = HadamardProjector(input_dim=field_encoder.dim)
+    else:
+        field_projector = SimHashProjector(input_dim=field_encoder.dim)
+    field_cache = None
+    if config.field_query_cache_entries > 0:
+        from towow.field.cache import EmbeddingCache
+        field_cache = EmbeddingCache(
+            max_entries=config.field_query_cache_entries,
+            max_bytes=config.field_query_cache_mb * 1024 * 1024,
+        )
+    field_pipeline = EncodingPipeline(field_encoder, field_projector, cache=field_cache)
+    field_kwargs = {
+        "scan_threads": config.field_scan_threads,
+        "ttl": config.field_ttl_seconds or None,
+        "ttl_by_type": config.field_ttl_by_type or None,
+        "compact_below": config.field_compact_below,
+    }
+    if config.field_index != "brute":
+        field_kwargs.update(index=config.field_index, ef_search=config.field_ef_search)
+    if config.field_cascade_bits > 0:
+        field_kwargs.update(
+            cascade_bits=config.field_cascade_bits,
+            cascade_multiplier=config.field_cascade_multiplier,
+        )
+    if config.encode_batch_max_size > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        from towow.infra.encode_batcher import MicroBatcher
+        # One encode thread shared by the batcher and the field keeps model forwards serial
+        field_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="field-encode")
+        field_batcher = MicroBatcher(
+            field_pipeline.encode_texts,
+            max_batch_size=config.encode_batch_max_size,
+            max_wait_ms=config.encode_batch_wait_ms,
+            executor=field_executor,
+        )
+        app.state.encode_batchers.append(field_batcher)
+        field_kwargs.update(encode_executor=field_executor, encode_batcher=field_batcher)
+    if config.field_shared_memory:
+        from towow.field import SharedMemoryField
+        # Every worker attaches the same segment; it outlives worker restarts
+        field = SharedMemoryField(
+            field_pipeline,
+            config.field_shared_memory,
+            capacity=config.field_shared_capacity,
+            arena_bytes=config.field_shared_arena_mb * 1024 * 1024,
+            **field_kwargs,
+        )
+    elif config.field_shards > 1:
+        from towow.field import ShardedField
+        field = ShardedField(field_pipeline, n_shards=config.field_shards, **field_kwargs)
+    elif config.field_data_dir:
+        from towow.field import PersistentField
+        field = PersistentField(field_pipeline, config.field_data_dir, **field_kwargs)
+    else:
+        field = MemoryField(field_pipeline, **field_kwargs)
     app.state.field = field
+    app.state.match_cache = None
+    if config.field_match_cache_entries > 0:
+        from towow.field.cache import MatchResultCache
+        app.state.match_cache = MatchResultCache(max_entries=config.field_match_cache_entries)
     logger.info("V2 Intent Field initialized (encoder=%s, dim=%d)", type(field_encoder).__name__, field_encoder.dim)
 
     # MultiPerspectiveGenerator (needs LLM client)
@@ -233,6 +305,15 @@ async def lifespan(app: FastAPI):
     if getattr(app.state, "store_oauth2_client", None):
         await app.state.store_oauth2_client.close()
 
+    # V2 Intent Field (PersistentField checkpoints on close)
+    field = getattr(app.state, "field", None)
+    if hasattr(field, "close"):
+        await field.close()
+
+    # Encoder micro-batchers
+    for batcher in getattr(app.state, "encode_batchers", []):
+        await batcher.close()
+
     # Session store
     await close_session_store()
     logger.info("Towow unified backend shutdown")
@@ -0,0 +1,131 @@
+"""Tests for MicroBatcher and BatchingEncoder."""
+
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from towow.core.errors import EncodingError
+from towow.infra.encode_batcher import BatchingEncoder, MicroBatcher
+
+
+class RecordingBatchFn:
+    """batch_fn that records batch sizes and returns len(text) per text."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[str]] = []
+        self._fail = fail
+
+    def __call__(self, texts: list[str]) -> list[np.ndarray]:
+        self.batches.append(list(texts))
+        if self._fail:
+            raise RuntimeError("model exploded")
+        return [np.array([float(len(t)), 1.0], dtype=np.float32) for t in texts]
+
+
+class TestMicroBatcher:
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_requests(self):
+        fn = RecordingBatchFn()
+        batcher = MicroBatcher(fn, max_batch_size=32, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit("x" * i) for i in range(1, 11)))
+
+        assert [r[0] for r in results] == [float(i) for i in range(1, 11)]
+        assert len(fn.batches) < 10
+        assert sum(len(b) for b in fn.batches) == 10
+        await batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_respects_max_batch_size(self):
+        fn = RecordingBatchFn()
+        batcher = MicroBatcher(fn, max_batch_size=4, max_wait_ms=20)
+        await asyncio.gather(*(batcher.submit(f"t{i}") for i in range(10)))
+
+        assert max(len(b) for b in fn.batches) <= 4
+        assert sum(len(b) for b in fn.batches) == 10
+        await batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_every_caller(self):
+        batcher = MicroBatcher(RecordingBatchFn(fail=True), max_wait_ms=10)
+        results = await asyncio.gather(
+            *(batcher.submit(f"t{i}") for i in range(3)), return_exceptions=True
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # The worker survives a failed batch
+        batcher._batch_fn = RecordingBatchFn()
+        assert (await batcher.submit("ok"))[0] == 2.0
+        await batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_short_result_fails_every_caller(self):
+        batcher = MicroBatcher(lambda texts: [[0.0]] * (len(texts) - 1), max_wait_ms=20)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(f"t{i}") for i in range(3)), return_exceptions=True),
+            timeout=5,
+        )
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert batcher.stats()["requests"] == 0
+        await batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_stats(self):
+        batcher = MicroBatcher(RecordingBatchFn(), max_wait_ms=10)
+        assert batcher.stats()["requests"] == 0
+        await asyncio.gather(*(batcher.submit(f"t{i}") for i in range(5)))
+
+        stats = batcher.stats()
+        assert stats["requests"] == 5
+        assert 1 <= stats["batches"] <= 5
+        assert stats["mean_batch_size"] == round(5 / stats["batches"], 2)
+        assert stats["latency_p99_ms"] >= stats["latency_p50_ms"] > 0
+        await batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_run_batch_skips_queue(self):
+        fn = RecordingBatchFn()
+        batcher = MicroBatcher(fn)
+        results = await batcher.run_batch(["a", "bb"])
+
+        assert [r[0] for r in results] == [1.0, 2.0]
+        assert fn.batches == [["a", "bb"]]
+        assert batcher.stats()["requests"] == 0
+        await batcher.close()
+
+    def test_rejects_invalid_batch_size(self):
+        with pytest.raises(ValueError):
+            MicroBatcher(RecordingBatchFn(), max_batch_size=0)
+
+
+class TestBatchingEncoder:
+    @pytest.mark.asyncio
+    async def test_encode_and_batch_encode(self):
+        encoder = BatchingEncoder(MicroBatcher(RecordingBatchFn()))
+        vec = await encoder.encode("abc")
+        vecs = await encoder.batch_encode(["a", "bb"])
+
+        assert vec.dtype == np.float32
+        assert vec[0] == 3.0
+        assert [v[0] for v in vecs] == [1.0, 2.0]
+        await encoder.batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_empty_text_raises(self):
+        encoder = BatchingEncoder(MicroBatcher(RecordingBatchFn()))
+        with pytest.raises(EncodingError):
+            await encoder.encode("  ")
+        with pytest.raises(EncodingError):
+            await encoder.batch_encode(["ok", ""])
+        assert await encoder.batch_encode([]) == []
+        await encoder.batcher.close()
+
+    @pytest.mark.asyncio
+    async def test_model_failure_wrapped(self):
+        encoder = BatchingEncoder(MicroBatcher(RecordingBatchFn(fail=True)))
+        with pytest.raises(EncodingError):
+            await encoder.encode("abc")
+        await encoder.batcher.close()
@@ -0,0 +1,150 @@
+"""
+Tests for EmbeddingCache, the EncodingPipeline query cache and MatchResultCache.
+"""
+
+import numpy as np
+import pytest
+
+from towow.field.cache import EmbeddingCache, MatchResultCache
+from towow.field.types import MatchFilter
+from towow.field.pipeline import EncodingPipeline
+from towow.field.projector import MrlBqlProjector, SimHashProjector
+
+from .test_pipeline import StubEncoder
+
+
+class CountingEncoder(StubEncoder):
+    def __init__(self, dim: int = 64) -> None:
+        super().__init__(dim)
+        self.calls = 0
+
+    def encode(self, text: str) -> np.ndarray:
+        self.calls += 1
+        return super().encode(text)
+
+
+def _entry(n: int = 8) -> tuple[np.ndarray, np.ndarray]:
+    return np.zeros(n, dtype=np.uint8), np.zeros(n, dtype=np.float32)
+
+
+class TestEmbeddingCache:
+
+    def test_lru_eviction_by_entries(self):
+        cache = EmbeddingCache(max_entries=2)
+        cache.put("a", *_entry())
+        cache.put("b", *_entry())
+        assert cache.get("a") is not None  # a becomes most recent
+        cache.put("c", *_entry())
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        cache = EmbeddingCache(max_entries=100, max_bytes=100)  # 40 bytes per entry
+        for key in "abc":
+            cache.put(key, *_entry())
+        assert len(cache) == 2
+        assert cache.stats()["bytes"] == 80
+        assert cache.get("a") is None
+
+    def test_oversized_entry_not_cached(self):
+        cache = EmbeddingCache(max_bytes=10)
+        cache.put("a", *_entry())
+        assert len(cache) == 0
+
+    def test_stats_counters(self):
+        cache = EmbeddingCache()
+        cache.get("missing")
+        cache.put("a", *_entry())
+        cache.get("a")
+        cache.get("a")
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 0)
+        assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+    def test_cached_arrays_are_read_only_copies(self):
+        cache = EmbeddingCache()
+        binary, dense = _entry()
+        cache.put("a", binary, dense)
+        binary[0] = 7
+        cached_binary, _ = cache.get("a")
+        assert cached_binary[0] == 0
+        with pytest.raises(ValueError):
+            cached_binary[0] = 1
+
+    def test_invalid_limits(self):
+        with pytest.raises(ValueError):
+            EmbeddingCache(max_entries=0)
+
+
+class TestPipelineCache:
+
+    def test_repeat_query_skips_encoder(self):
+        encoder = CountingEncoder()
+        pipeline = EncodingPipeline(encoder, MrlBqlProjector(input_dim=64), cache=EmbeddingCache())
+        a = pipeline.encode_text("find a rust mentor")
+        b = pipeline.encode_text("  find a rust mentor\n")
+        np.testing.assert_array_equal(a, b)
+        assert encoder.calls == 1
+        assert pipeline.cache.stats()["hits"] == 1
+
+    def test_cached_and_uncached_results_agree(self):
+        long_text = "。".join(f"第{i}句内容比较长一些用来触发切分" for i in range(40))
+        projector = SimHashProjector(input_dim=64, D=512, seed=3)
+        cached = EncodingPipeline(StubEncoder(64), projector, cache=EmbeddingCache())
+        plain = EncodingPipeline(StubEncoder(64), projector)
+        for text in ("short", long_text):
+            for _ in range(2):
+                cb, cd = cached.encode_with_dense(text)
+                pb, pd = plain.encode_with_dense(text)
+                np.testing.assert_array_equal(cb, pb)
+                np.testing.assert_array_equal(cd, pd)
+
+    def test_shared_cache_separates_projectors(self):
+        cache = EmbeddingCache()
+        encoder = StubEncoder(64)
+        p1 = EncodingPipeline(encoder, SimHashProjector(input_dim=64, D=256, seed=1), cache=cache)
+        p2 = EncodingPipeline(encoder, SimHashProjector(input_dim=64, D=256, seed=2), cache=cache)
+        a = p1.encode_text("same text")
+        b = p2.encode_text("same text")
+        assert not np.array_equal(a, b)
+        assert len(cache) == 2
+
+
+class TestMatchResultCache:
+
+    def test_entry_served_only_for_its_generation(self):
+        cache = MatchResultCache()
+        key = MatchResultCache.make_key("match", "rust mentor", 10)
+        assert cache.get(key, 1) is None
+        cache.put(key, 1, ["result"], 12.5)
+        assert cache.get(key, 1) == (["result"], 12.5)
+
+        assert cache.get(key, 2) is None  # field changed: stale entry dropped
+        assert len(cache) == 0
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["stale"]) == (1, 2, 1)
+        assert stats["saved_ms"] == 12.5
+
+    def test_key_normalises_text_and_separates_params(self):
+        key = MatchResultCache.make_key
+        assert key("match", "  rust mentor\n", 10) == key("match", "rust mentor", 10)
+        assert key("match", "rust mentor", 10) != key("match_owners", "rust mentor", 10)
+        assert key("match", "rust mentor", 10) != key("match", "rust mentor", 5)
+        # 1 == True, but the metadata filters select different rows
+        assert key("match", "x", MatchFilter(metadata={"a": 1})) != key(
+            "match", "x", MatchFilter(metadata={"a": True})
+        )
+
+    def test_lru_eviction(self):
+        cache = MatchResultCache(max_entries=2)
+        for name in "abc":
+            cache.put(name, 0, name, 1.0)
+        assert cache.get("a", 0) is None
+        assert cache.get("c", 0) == ("c", 1.0)
+
+    def test_invalid_limits(self):
+        with pytest.raises(ValueError):
+            MatchResultCache(max_entries=0)
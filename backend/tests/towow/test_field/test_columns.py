@@ -0,0 +1,79 @@
+"""
+Tests for BlobColumn — row-aligned variable-length byte column.
+
+Every sequence of operations is mirrored on a plain Python list, which
+is the reference for what each row must read back.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from towow.field import columns
+from towow.field.columns import BlobColumn
+
+
+def _assert_matches(column: BlobColumn, reference: list[bytes]) -> None:
+    assert len(column) == len(reference)
+    assert [column.get(row) for row in range(len(reference))] == reference
+
+
+def test_append_get_and_resize():
+    column = BlobColumn(4)
+    blobs = [b"alpha", b"", "多字节".encode(), b"z" * 100]
+    column.append_many(blobs[:2])
+    column.append_many(blobs[2:])
+    _assert_matches(column, blobs)
+
+    column.resize(16)
+    column.append_many([b"after resize"])
+    _assert_matches(column, blobs + [b"after resize"])
+
+
+def test_set_and_swap_remove_follow_row_moves():
+    column = BlobColumn(8)
+    reference = [f"row {i}".encode() for i in range(6)]
+    column.append_many(reference)
+
+    column.set(2, b"rewritten")
+    reference[2] = b"rewritten"
+    for row in (1, 4, 3):  # middle, middle, then the last row itself
+        column.swap_remove(row)
+        reference[row] = reference[-1]
+        reference.pop()
+    _assert_matches(column, reference)
+
+
+def test_compaction_keeps_rows_and_reclaims_space(monkeypatch):
+    monkeypatch.setattr(columns, "_MIN_COMPACT_BYTES", 64)
+    monkeypatch.setattr(columns, "_COMPACT_ROWS", 3)  # several gather blocks
+    rng = np.random.RandomState(0)
+    column = BlobColumn(64)
+    reference: list[bytes] = []
+    for step in range(400):
+        if len(reference) < 40 and rng.rand() < 0.6:
+            blob = bytes(rng.randint(0, 256, size=rng.randint(0, 30), dtype=np.uint8))
+            column.append_many([blob])
+            reference.append(blob)
+        elif reference and rng.rand() < 0.5:
+            row = rng.randint(len(reference))
+            column.swap_remove(row)
+            reference[row] = reference[-1]
+            reference.pop()
+        elif reference:
+            row = rng.randint(len(reference))
+            blob = f"set {step}".encode()
+            column.set(row, blob)
+            reference[row] = blob
+        _assert_matches(column, reference)
+    live = sum(map(len, reference))
+    assert len(column._data) <= 2 * live + 64 + 30
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_compact_small_columns(n):
+    column = BlobColumn(2)
+    column.append_many([b"only"][:n])
+    column.compact()
+    _assert_matches(column, [b"only"][:n])
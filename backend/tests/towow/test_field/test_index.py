@@ -0,0 +1,178 @@
+"""
+Tests for MihIndex — multi-index hashing over packed binary codes — and
+HnswIndex — the approximate HNSW graph over Hamming distance.
+
+Exactness (MIH) and recall (HNSW) are checked against a brute-force Hamming scan.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from towow.field import index as index_module
+from towow.field.index import HnswIndex, MihIndex
+from towow.field.projector import hamming_distance
+
+
+def _flip(code: np.ndarray, n_bits: int, rng: np.random.RandomState) -> np.ndarray:
+    bits = np.unpackbits(code)
+    pos = rng.choice(bits.size, size=n_bits, replace=False)
+    bits[pos] ^= 1
+    return np.packbits(bits)
+
+
+def _build(n: int = 300, packed_dim: int = 64, seed: int = 0):
+    rng = np.random.RandomState(seed)
+    base = rng.randint(0, 256, size=packed_dim, dtype=np.uint8)
+    codes = {}
+    for i in range(n):
+        # half near the base code, half random
+        if i % 2 == 0:
+            codes[f"id{i}"] = _flip(base, rng.randint(0, 20), rng)
+        else:
+            codes[f"id{i}"] = rng.randint(0, 256, size=packed_dim, dtype=np.uint8)
+    index = MihIndex(packed_dim)
+    for key, code in codes.items():
+        index.add(key, code)
+    return index, codes, base
+
+
+def _verifier(codes, query):
+    def verify(keys):
+        return hamming_distance(query, np.array([codes[k] for k in keys]))
+    return verify
+
+
+class TestMihIndex:
+
+    def test_n_tables(self):
+        assert MihIndex(64).n_tables == 16
+        assert MihIndex(10, substring_bytes=4).n_tables == 3
+
+    def test_exact_topk_matches_brute_force(self):
+        index, codes, base = _build()
+        keys = list(codes)
+        brute = hamming_distance(base, np.array([codes[k] for k in keys]))
+        for k in (1, 5, 20):
+            hit = index.search(base, k, _verifier(codes, base))
+            assert hit is not None
+            _, dists = hit
+            np.testing.assert_array_equal(dists, np.sort(brute)[:k])
+
+    def test_returns_none_when_not_certified(self):
+        """Random query far from everything cannot be certified at small radius."""
+        index, codes, _ = _build()
+        query = np.random.RandomState(99).randint(0, 256, size=64, dtype=np.uint8)
+        assert index.search(query, 5, _verifier(codes, query)) is None
+
+    def test_small_index_complete(self):
+        """When every key has been probed the result is exact regardless of bound."""
+        index = MihIndex(4, substring_bytes=4, max_radius=2)
+        a = np.array([0, 0, 0, 0], dtype=np.uint8)
+        b = np.array([0, 0, 0, 3], dtype=np.uint8)
+        codes = {"a": a, "b": b}
+        index.add("a", a)
+        index.add("b", b)
+        keys, dists = index.search(a, 5, _verifier(codes, a))
+        assert keys == ["a", "b"]
+        assert dists.tolist() == [0, 2]
+
+    def test_remove(self):
+        index, codes, base = _build(n=50)
+        assert len(index) == 50
+        for key in list(codes)[:10]:
+            index.remove(key, codes.pop(key))
+        assert len(index) == 40
+        index.remove("missing", base)  # silent
+        assert len(index) == 40
+        hit = index.search(base, 3, _verifier(codes, base))
+        if hit is not None:
+            assert not set(hit[0]) & {f"id{i}" for i in range(10)}
+
+    def test_k_zero(self):
+        index, codes, base = _build(n=10)
+        keys, dists = index.search(base, 0, _verifier(codes, base))
+        assert keys == [] and dists.size == 0
+
+
+def _clustered(n: int, packed_dim: int = 32, n_centres: int = 12, seed: int = 0):
+    """Codes a few bits away from one of n_centres random centres."""
+    rng = np.random.RandomState(seed)
+    centres = rng.randint(0, 256, size=(n_centres, packed_dim), dtype=np.uint8)
+    return {
+        f"id{i}": _flip(centres[i % n_centres], rng.randint(0, 30), rng) for i in range(n)
+    }
+
+
+def _hnsw(codes: dict, **kwargs) -> HnswIndex:
+    index = HnswIndex(next(iter(codes.values())).size, m=8, ef_construction=64, **kwargs)
+    for key, code in codes.items():
+        index.add(key, code)
+    return index
+
+
+def _recall(index: HnswIndex, codes: dict, queries, k: int, ef: int = 0) -> float:
+    keys = list(codes)
+    matrix = np.array([codes[key] for key in keys])
+    hits = 0
+    for query in queries:
+        found, dists = index.search(query, k, ef)
+        assert dists.tolist() == sorted(dists.tolist())
+        np.testing.assert_array_equal(dists, hamming_distance(query, np.array([codes[key] for key in found])))
+        hits += int((dists <= np.sort(hamming_distance(query, matrix))[k - 1]).sum())
+    return hits / (k * len(queries))
+
+
+class TestHnswIndex:
+
+    def test_recall_against_brute_force(self, monkeypatch):
+        monkeypatch.setattr(index_module, "_INITIAL_NODES", 16)  # exercise node array growth
+        codes = _clustered(400)
+        index = _hnsw(codes)
+        assert len(index) == 400
+        queries = [codes[f"id{i}"] for i in range(0, 400, 20)]
+        assert _recall(index, codes, queries, k=10, ef=100) >= 0.95
+        top_keys, top_dists = index.search(codes["id7"], 1)
+        assert top_dists.tolist() == [0]
+
+    def test_tombstones_never_returned(self):
+        codes = _clustered(200)
+        index = _hnsw(codes)
+        removed = {f"id{i}" for i in range(0, 200, 2)}
+        for key in removed:
+            index.remove(key)
+        index.remove("missing")  # silent
+        assert (len(index), index.tombstones) == (100, 100)
+        for i in range(0, 200, 10):
+            keys, _ = index.search(codes[f"id{i}"], 5, ef=50)
+            assert not set(keys) & removed
+        assert index.search(codes["id0"], 101, ef=300) is None  # fewer live nodes than k
+
+    def test_rebuilt_purges_tombstones(self):
+        codes = _clustered(200)
+        index = _hnsw(codes, ef_search=40)
+        for i in range(150):
+            index.remove(f"id{i}")
+        live = {key: codes[key] for key in list(codes)[150:]}
+        fresh = index.rebuilt(list(live), np.array(list(live.values())))
+        assert (len(fresh), fresh.tombstones, fresh.ef_search) == (50, 0, 40)
+        assert _recall(fresh, live, list(live.values())[:10], k=5) >= 0.95
+
+    def test_readd_after_remove_and_k_zero(self):
+        codes = _clustered(30)
+        index = _hnsw(codes)
+        moved = np.bitwise_not(codes["id3"])
+        index.remove("id3")
+        index.add("id3", moved)
+        keys, dists = index.search(moved, 1)
+        assert (keys, dists.tolist()) == (["id3"], [0])
+        keys, dists = index.search(moved, 0)
+        assert keys == [] and dists.size == 0
+        assert HnswIndex(8).search(moved[:8], 1) is None  # empty graph
+
+    def test_args_validated(self):
+        with pytest.raises(ValueError, match="m must"):
+            HnswIndex(8, m=1)
+        with pytest.raises(ValueError, match="ef_search"):
+            HnswIndex(8, ef_search=0)
@@ -10,12 +10,22 @@ AttributeError (unlike MagicMock which silently accepts anything).
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pytest
 
+from towow.field.cache import EmbeddingCache
 from towow.field.field import MemoryField
+from towow.field.index import HnswIndex
+from towow.field.pipeline import EncodingPipeline
+from towow.field.projector import MrlBqlProjector
+from towow.field.types import MatchFilter
+from towow.infra.encode_batcher import MicroBatcher
 
 
 # ── Test Pipeline (production-grade, no MagicMock) ────────
@@ -25,7 +35,9 @@ class HashPipeline:
 
     Satisfies the same interface as EncodingPipeline:
       - encode_text(str) → uint8[packed_dim]
+      - encode_texts(list[str]) → list[uint8[packed_dim]]
       - batch_similarity(query, candidates) → float[N]
+      - batch_similarity_many(queries, candidates) → float[Q, N]
       - packed_dim → int
 
     Uses SHA-256 hash to generate reproducible binary vectors —
@@ -46,12 +58,17 @@ class HashPipeline:
     def packed_dim(self) -> int:
         return self._packed_dim
 
-    def encode_text(self, text: str) -> np.ndarray:
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
         """text → deterministic uint8[packed_dim] via SHA-256 seeded RNG."""
         h = hashlib.sha256(text.encode()).digest()
         rng = np.random.RandomState(int.from_bytes(h[:4], "big"))
         return rng.randint(0, 256, size=self._packed_dim, dtype=np.uint8)
 
+    def encode_texts(
+        self, texts: list[str], cache_results: bool = True
+    ) -> list[np.ndarray]:
+        return [self.encode_text(t) for t in texts]
+
     def batch_similarity(
         self, query: np.ndarray, candidates: np.ndarray
     ) -> np.ndarray:
@@ -63,6 +80,35 @@ class HashPipeline:
         total_bits = candidates.shape[1] * 8
         return 1.0 - diff / total_bits
 
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        return np.stack([self.batch_similarity(q, candidates) for q in queries])
+
+
+class DenseStubEncoder:
+    """Deterministic Encoder (SHA-256 seeded) for tests needing a real EncodingPipeline."""
+
+    def __init__(self, dim: int = 64) -> None:
+        self._dim = dim
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def encode(self, text: str) -> np.ndarray:
+        h = hashlib.sha256(text.encode()).digest()
+        rng = np.random.RandomState(int.from_bytes(h[:4], "big"))
+        vec = rng.randn(self._dim).astype(np.float32)
+        return vec / np.linalg.norm(vec)
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        return np.array([self.encode(t) for t in texts], dtype=np.float32)
+
+
+def _dense_pipeline(dim: int = 64) -> EncodingPipeline:
+    return EncodingPipeline(DenseStubEncoder(dim), MrlBqlProjector(input_dim=dim))
+
 
 # ── Deposit Tests ─────────────────────────────────────────
 
@@ -152,6 +198,194 @@ async def test_deposit_with_metadata():
     assert results[0].metadata["scene"] == "hackathon"
 
 
+@pytest.mark.asyncio
+async def test_columnar_storage_round_trips_intents():
+    field = MemoryField(HashPipeline(packed_dim=32))
+    metadata = {"scene": "h_1", "tags": ["a", "b"], "nested": {"x": 1.5}, "flag": None}
+    iid = await field.deposit("多语言 text", "alice", metadata)
+    await field.deposit("plain", "bob")
+
+    intent = field._intent(iid)
+    assert (intent.owner, intent.text, intent.metadata) == ("alice", "多语言 text", metadata)
+    results = {r.intent_id: r for r in await field.match("plain", k=2)}
+    assert results[iid].metadata == metadata
+    assert results[iid].text == "多语言 text"
+    assert field._intent("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_unserializable_metadata_rejected_before_writing():
+    field = MemoryField(HashPipeline(packed_dim=32))
+    await field.deposit("kept", "alice")
+    with pytest.raises(TypeError):
+        await field.deposit_many([("new", "alice", None), ("bad", "alice", {"x": object()})])
+    assert await field.count() == 1
+    # the failed batch left no dedup entry behind
+    iid = await field.deposit("new", "alice")
+    assert await field.count() == 2
+    assert (await field.match("new", k=1))[0].intent_id == iid
+
+
+@pytest.mark.asyncio
+async def test_owner_counts_follow_removals():
+    field = MemoryField(HashPipeline(packed_dim=32))
+    ids = await field.deposit_many([(f"t{i}", f"owner_{i % 3}", None) for i in range(9)])
+    assert await field.count_owners() == 3
+    for iid in ids[0:9:3]:
+        await field.remove(iid)
+    assert await field.count_owners() == 2
+    assert await field.remove_owner("owner_0") == 0
+    assert await field.remove_owner("owner_1") == 3
+    assert await field.count_owners() == 1
+    await field.deposit("back", "owner_0")
+    assert await field.count_owners() == 2
+
+
+# ── Batch Deposit Tests ───────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_deposit_many_matches_single_deposits():
+    batch = MemoryField(HashPipeline())
+    single = MemoryField(HashPipeline())
+    items = [(f"text {i}", f"owner_{i % 3}", {"i": i}) for i in range(25)]
+
+    ids = await batch.deposit_many(items)
+    for text, owner, meta in items:
+        await single.deposit(text, owner, meta)
+
+    assert len(ids) == 25 and len(set(ids)) == 25
+    assert await batch.count() == 25
+    assert await batch.count_owners() == 3
+    a = await batch.match("text 4", k=5)
+    b = await single.match("text 4", k=5)
+    assert [(r.text, r.score, r.metadata) for r in a] == [
+        (r.text, r.score, r.metadata) for r in b
+    ]
+
+
+@pytest.mark.asyncio
+async def test_deposit_many_dedups_within_batch_and_field():
+    field = MemoryField(HashPipeline())
+    existing = await field.deposit("already here", "alice")
+
+    ids = await field.deposit_many([
+        ("already here", "alice", None),
+        ("new text", "bob", None),
+        ("new text", "bob", None),
+        ("new text", "carol", None),
+    ])
+    assert ids[0] == existing
+    assert ids[1] == ids[2]
+    assert ids[1] != ids[3]
+    assert await field.count() == 3
+
+
+@pytest.mark.asyncio
+async def test_deposit_many_validates_before_writing():
+    field = MemoryField(HashPipeline())
+    with pytest.raises(ValueError, match="empty"):
+        await field.deposit_many([("ok", "alice", None), ("  ", "bob", None)])
+    assert await field.count() == 0
+    assert await field.deposit_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_deposit_many_grows_buffer():
+    field = MemoryField(HashPipeline(packed_dim=8))
+    ids = await field.deposit_many([(f"t{i}", "o", None) for i in range(3000)])
+    assert await field.count() == 3000
+    results = await field.match("t2999", k=1)
+    assert results[0].intent_id == ids[-1]
+
+
+# ── Encoding Concurrency Tests ────────────────────────────
+
+class SlowHashPipeline(HashPipeline):
+    """HashPipeline whose encode blocks the calling thread, like a model forward pass."""
+
+    def __init__(self, delay: float = 0.2) -> None:
+        super().__init__(packed_dim=64)
+        self._delay = delay
+        self.encode_threads: set[str] = set()
+        self.started = threading.Event()
+        self.max_concurrent = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        self.encode_threads.add(threading.current_thread().name)
+        with self._lock:
+            self._running += 1
+            self.max_concurrent = max(self.max_concurrent, self._running)
+        self.started.set()
+        try:
+            time.sleep(self._delay)
+        finally:
+            with self._lock:
+                self._running -= 1
+        return super().encode_text(text)
+
+
+@pytest.mark.asyncio
+async def test_encoding_does_not_block_event_loop():
+    pipeline = SlowHashPipeline(delay=0.3)
+    field = MemoryField(pipeline)
+    await field.deposit("seed", "alice")
+
+    pipeline.started.clear()
+    deposit_task = asyncio.create_task(field.deposit("slow text", "bob"))
+    await asyncio.to_thread(pipeline.started.wait)  # the deposit is now encoding
+    assert await field.count() == 1  # lock is not held during encoding
+    await deposit_task
+    assert await field.count() == 2
+    assert threading.current_thread().name not in pipeline.encode_threads
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deposits_overlap_with_wider_executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    pipeline = SlowHashPipeline(delay=0.2)
+    field = MemoryField(pipeline, encode_executor=executor)
+    await asyncio.gather(*(field.deposit(f"t{i}", f"o{i}") for i in range(4)))
+    assert pipeline.max_concurrent > 1  # a single-thread executor would never overlap
+    assert await field.count() == 4
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_same_text_deposits_dedup():
+    executor = ThreadPoolExecutor(max_workers=2)
+    field = MemoryField(SlowHashPipeline(delay=0.05), encode_executor=executor)
+    ids = await asyncio.gather(*(field.deposit("same", "alice") for _ in range(3)))
+    assert len(set(ids)) == 1
+    assert await field.count() == 1
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_deposit_through_micro_batcher():
+    pipeline = HashPipeline()
+    calls: list[int] = []
+
+    def encode_texts(texts):
+        calls.append(len(texts))
+        return pipeline.encode_texts(texts)
+
+    batcher = MicroBatcher(encode_texts, max_batch_size=16, max_wait_ms=20)
+    field = MemoryField(pipeline, encode_batcher=batcher)
+    await asyncio.gather(*(field.deposit(f"text {i}", f"o{i}") for i in range(8)))
+
+    assert await field.count() == 8
+    assert sum(calls) == 8
+    assert len(calls) < 8
+    results = await field.match("text 3", k=1)
+    assert results[0].owner == "o3"
+    assert field.stats()["encode_batching"]["requests"] == 9  # match query batched too
+    await field.close()
+    await batcher.close()
+
+
 # ── Match Tests ───────────────────────────────────────────
 
 @pytest.mark.asyncio
@@ -266,6 +500,160 @@ async def test_match_owners_empty_field():
     assert results == []
 
 
+class PrefixHashPipeline(HashPipeline):
+    """HashPipeline that only encodes the text before '#', so "x#1" == "x"."""
+
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        return super().encode_text(text.split("#", 1)[0])
+
+
+def _reference_owner_scores(field, query, max_intents, aggregate):
+    """Plain-Python owner aggregation over every intent, for comparison."""
+    q = field._pipeline.encode_text(query)
+    by_owner: dict[str, list[float]] = {}
+    for iid, row in field._pos_index.items():
+        score = float(field._pipeline.batch_similarity(q, field._vectors[row])[0])
+        by_owner.setdefault(field._intent(iid).owner, []).append(score)
+    out = {}
+    for owner, scores in by_owner.items():
+        top = sorted(scores, reverse=True)[:max_intents]
+        if aggregate == "max":
+            out[owner] = top[0]
+        elif aggregate == "mean":
+            out[owner] = sum(top) / len(top)
+        else:
+            w = np.exp((np.array(top) - top[0]) / 0.05)
+            out[owner] = float((w * top).sum() / w.sum())
+    return out
+
+
+@pytest.mark.asyncio
+async def test_match_owners_exactly_k_when_one_owner_dominates():
+    field = MemoryField(PrefixHashPipeline(packed_dim=64))
+    for i in range(30):
+        await field.deposit(f"python#{i}", "alice")
+    for i in range(5):
+        await field.deposit(f"other {i}", f"owner_{i}")
+
+    results = await field.match_owners("python", k=4, max_intents=3)
+    assert len(results) == 4
+    assert results[0].owner == "alice"
+    assert results[0].score == 1.0
+    assert len(results[0].intents) == 3
+    assert len({r.owner for r in results}) == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("aggregate", ["max", "mean", "softmax"])
+async def test_match_owners_matches_reference(aggregate):
+    field = MemoryField(HashPipeline(packed_dim=32), scan_tile_bytes=32 * 7)
+    for i in range(120):
+        await field.deposit(f"intent {i}", f"owner_{i % 17}")
+    for i in range(0, 120, 9):
+        await field.remove(field._id_index[i % await field.count()])
+
+    results = await field.match_owners("intent 5", k=6, max_intents=3, aggregate=aggregate)
+    expected = _reference_owner_scores(field, "intent 5", 3, aggregate)
+    ranked = sorted(expected.values(), reverse=True)[:6]
+
+    assert len(results) == 6
+    assert [r.score for r in results] == pytest.approx(ranked)
+    for r in results:
+        assert r.score == pytest.approx(expected[r.owner])
+        assert all(i.owner == r.owner for i in r.intents)
+        scores = [i.score for i in r.intents]
+        assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_match_owners_unknown_aggregate_raises():
+    field = MemoryField(HashPipeline())
+    await field.deposit("x", "alice")
+    with pytest.raises(ValueError, match="aggregate"):
+        await field.match_owners("x", aggregate="median")
+    with pytest.raises(ValueError, match="owner_aggregate"):
+        MemoryField(HashPipeline(), owner_aggregate="median")
+
+
+@pytest.mark.asyncio
+async def test_stats_reports_query_cache():
+    pipeline = EncodingPipeline(
+        DenseStubEncoder(64), MrlBqlProjector(input_dim=64), cache=EmbeddingCache()
+    )
+    field = MemoryField(pipeline)
+    await field.deposit("rust mentor", "alice")
+    await field.match("rust mentor", k=1)
+    await field.match("rust mentor", k=1)
+
+    stats = field.stats()["query_cache"]
+    assert stats["hits"] == 1  # the second match reuses the first match's encoding
+    assert stats["misses"] == 2
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_deposits_read_but_do_not_fill_query_cache():
+    cache = EmbeddingCache()
+    pipeline = EncodingPipeline(DenseStubEncoder(64), MrlBqlProjector(input_dim=64), cache=cache)
+    field = MemoryField(pipeline)
+    await field.deposit("rust mentor", "alice")
+    await field.deposit_many([("go mentor", "bob", None), ("zig mentor", "carol", None)])
+    await field.upsert("custom", "ml mentor", owner="dave")
+    assert cache.stats()["entries"] == 0
+
+    await field.match("go mentor", k=1)
+    assert cache.stats()["entries"] == 1
+    await field.deposit_many([("go mentor", "erin", None)])
+    assert cache.stats()["hits"] == 1  # the write path still reuses a cached query
+    assert cache.stats()["entries"] == 1
+    await field.close()
+
+
+# ── Multi-query Tests ─────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_match_many_equals_individual_matches():
+    field = MemoryField(HashPipeline(packed_dim=64), scan_tile_bytes=64 * 9)
+    for i in range(80):
+        await field.deposit(f"intent {i}", f"owner_{i % 11}")
+    texts = ["intent 3", "", "intent 42", "something new"]
+
+    batched = await field.match_many(texts, k=5)
+    assert len(batched) == 4
+    assert batched[1] == []
+    for text, results in zip(texts, batched):
+        single = await field.match(text, k=5)
+        assert [r.score for r in results] == [r.score for r in single]
+    assert batched[0][0].text == "intent 3"
+
+
+@pytest.mark.asyncio
+async def test_match_owners_many_equals_individual_matches():
+    field = MemoryField(HashPipeline(packed_dim=64), scan_tile_bytes=64 * 9)
+    for i in range(80):
+        await field.deposit(f"intent {i}", f"owner_{i % 11}")
+    texts = ["intent 3", "intent 42", "   "]
+
+    batched = await field.match_owners_many(texts, k=4, aggregate="mean")
+    assert batched[2] == []
+    for text, results in zip(texts[:2], batched):
+        single = await field.match_owners(text, k=4, aggregate="mean")
+        assert [(r.owner, r.score) for r in results] == [(r.owner, r.score) for r in single]
+
+
+@pytest.mark.asyncio
+async def test_match_many_encodes_once():
+    pipeline = HashPipeline(packed_dim=64)
+    field = MemoryField(pipeline)
+    await field.deposit("seed", "alice")
+    calls = []
+    original = pipeline.encode_texts
+    pipeline.encode_texts = lambda texts: calls.append(len(texts)) or original(texts)
+
+    await field.match_owners_many(["a", "b", "c", "d"], k=1)
+    assert calls == [4]
+
+
 # ── Remove Tests ──────────────────────────────────────────
 
 @pytest.mark.asyncio
@@ -335,6 +723,104 @@ async def test_deposit_after_remove_allows_reuse():
     assert iid1 != iid2  # new intent, new id
 
 
+@pytest.mark.asyncio
+async def test_dedup_key_ignores_surrounding_whitespace():
+    """deposit and deposit_many key on the stripped text, and hits survive swap-removes."""
+    field = MemoryField(HashPipeline())
+    others = [await field.deposit(f"filler {i}", "alice") for i in range(3)]
+    iid = await field.deposit("  hello world ", "alice")
+    await field.remove(others[0])  # swaps the target into another row
+
+    assert await field.deposit("hello world", "alice") == iid
+    assert await field.deposit_many([(" hello world", "alice", None)]) == [iid]
+    assert await field.count() == 3
+
+
+# ── Upsert Tests ──────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_upsert_overwrites_row_in_place():
+    field = MemoryField(HashPipeline())
+    ids = [await field.deposit(f"text {i}", f"owner_{i % 2}") for i in range(5)]
+    row = field._pos_index[ids[2]]
+    created_at = field._intent(ids[2]).created_at
+
+    assert await field.upsert(ids[2], " rewritten ") == ids[2]
+    assert await field.count() == 5
+    assert field._pos_index[ids[2]] == row
+    assert field._id_index == ids
+    intent = field._intent(ids[2])
+    assert (intent.owner, intent.text, intent.created_at) == ("owner_0", "rewritten", created_at)
+
+    top = (await field.match("rewritten", k=1))[0]
+    assert (top.intent_id, top.score) == (ids[2], pytest.approx(1.0))
+    assert ids[2] not in {r.intent_id for r in await field.match("text 2", k=5) if r.score == 1.0}
+    # the dedup map follows the new text
+    assert await field.deposit("rewritten", "owner_0") == ids[2]
+    assert await field.deposit("text 2", "owner_0") not in ids
+
+
+@pytest.mark.asyncio
+async def test_upsert_inserts_unknown_id_and_rejects_conflicts():
+    field = MemoryField(HashPipeline())
+    taken = await field.deposit("taken", "alice")
+
+    assert await field.upsert("custom-id", "fresh", owner="alice", metadata={"a": 1}) == "custom-id"
+    assert field._intent("custom-id").metadata == {"a": 1}
+    assert await field.deposit("fresh", "alice") == "custom-id"
+
+    with pytest.raises(KeyError):
+        await field.upsert("missing", "text")
+    with pytest.raises(ValueError, match="already has intent"):
+        await field.upsert("custom-id", "taken")
+    with pytest.raises(ValueError, match="already has intent"):
+        await field.upsert("other-id", "taken", owner="alice")
+    with pytest.raises(ValueError, match="cannot move"):
+        await field.upsert(taken, "taken", owner="bob")
+    with pytest.raises(ValueError, match="empty"):
+        await field.upsert(taken, "  ")
+    assert await field.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_reindexes_metadata_and_ttl():
+    field = MemoryField(HashPipeline(), maintenance_interval=0)
+    ids = [await field.deposit(f"text {i}", "alice", {"tier": 1}) for i in range(4)]
+
+    await field.upsert(ids[1], "text 1", metadata={"tier": 2, "ttl": 5})
+    tier2 = await field.match("text 1", k=10, filters=MatchFilter(metadata={"tier": 2}))
+    assert [r.intent_id for r in tier2] == [ids[1]]
+    tier1 = await field.match("text 1", k=10, filters=MatchFilter(metadata={"tier": 1}))
+    assert ids[1] not in {r.intent_id for r in tier1}
+    assert field._expires == {ids[1]: field._intent(ids[1]).created_at + 5}
+
+    await field.upsert(ids[1], "text one", metadata={})
+    assert field._expires == {}
+    assert await field.expire(now=time.time() + 100) == 0
+
+
+@pytest.mark.asyncio
+async def test_upsert_keeps_mih_and_dense_copy_in_sync():
+    pipeline = HashPipeline(packed_dim=64)
+    mih = MemoryField(pipeline, index="mih")
+    brute = MemoryField(pipeline)
+    for field in (mih, brute):
+        ids = [await field.deposit(f"intent {i}", f"owner_{i}") for i in range(40)]
+        for i in range(0, 40, 3):
+            await field.upsert(ids[i], f"updated {i}")
+    for query in ("updated 9", "intent 10", "intent 9"):
+        a = await mih.match(query, k=5)
+        b = await brute.match(query, k=5)
+        assert [r.score for r in a] == [r.score for r in b]
+
+    dense = MemoryField(_dense_pipeline(), dense_dtype="float16")
+    ids = [await dense.deposit(f"profile {i}", f"owner_{i}") for i in range(10)]
+    await dense.upsert(ids[4], "a new profile")
+    top = (await dense.match("a new profile", k=1, rerank=10))[0]
+    assert top.intent_id == ids[4]
+    assert top.score == pytest.approx(1.0, abs=1e-2)
+
+
 # ── Buffer Growth Test ────────────────────────────────────
 
 @pytest.mark.asyncio
@@ -351,6 +837,705 @@ async def test_buffer_grows_beyond_initial_capacity():
     assert len(results) == 5
 
 
+# ── Blocked Scan Tests ────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_blocked_scan_matches_full_scan():
+    """Tiny tiles (many blocks) must give the same top-k as one big tile."""
+    pipeline = HashPipeline(packed_dim=64)
+    tiled = MemoryField(pipeline, scan_tile_bytes=64 * 3)  # 3 rows per tile
+    full = MemoryField(pipeline)
+    for i in range(40):
+        await tiled.deposit(f"intent {i}", f"owner_{i % 7}")
+        await full.deposit(f"intent {i}", f"owner_{i % 7}")
+
+    for k in (1, 5, 40, 100):
+        a = await tiled.match("intent 3", k=k)
+        b = await full.match("intent 3", k=k)
+        assert len(a) == min(k, 40)
+        assert [r.score for r in a] == [r.score for r in b]
+    top = await tiled.match("intent 3", k=1)
+    assert top[0].text == "intent 3"
+
+
+# ── Parallel Scan Tests ───────────────────────────────────
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scan_threads", [1, 3])
+async def test_parallel_scan_matches_inline_scan(scan_threads):
+    """Row ranges scanned off-loop in a thread pool merge to the inline result."""
+    pipeline = HashPipeline(packed_dim=64)
+    parallel = MemoryField(pipeline, scan_tile_bytes=64 * 4, scan_threads=scan_threads)
+    inline = MemoryField(pipeline, scan_tile_bytes=64 * 4)
+    items = [(f"intent {i}", f"owner_{i % 9}", None) for i in range(101)]
+    await parallel.deposit_many(items)
+    await inline.deposit_many(items)
+
+    for k in (1, 7, 101):
+        a = await parallel.match("intent 5", k=k)
+        b = await inline.match("intent 5", k=k)
+        assert [r.score for r in a] == [r.score for r in b]
+    many_a = await parallel.match_many(["intent 1", "intent 50"], k=6)
+    many_b = await inline.match_many(["intent 1", "intent 50"], k=6)
+    assert [[r.score for r in rs] for rs in many_a] == [[r.score for r in rs] for rs in many_b]
+    for aggregate in ("max", "mean"):
+        a = await parallel.match_owners("intent 5", k=4, aggregate=aggregate)
+        b = await inline.match_owners("intent 5", k=4, aggregate=aggregate)
+        assert [(m.owner, m.score) for m in a] == [(m.owner, m.score) for m in b]
+    owners_a = await parallel.match_owners_many(["intent 2", "intent 3"], k=3)
+    owners_b = await inline.match_owners_many(["intent 2", "intent 3"], k=3)
+    assert [[m.owner for m in ms] for ms in owners_a] == [[m.owner for m in ms] for ms in owners_b]
+    await parallel.close()
+
+
+def test_row_ranges_cover_field():
+    field = MemoryField(HashPipeline(packed_dim=64), scan_threads=4)
+    assert field._row_ranges(10, tile_rows=8) == [(0, 5), (5, 10)]
+    ranges = field._row_ranges(1001, tile_rows=3)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1001
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    with pytest.raises(ValueError, match="scan_threads"):
+        MemoryField(HashPipeline(), scan_threads=-1)
+
+
+class GatedPipeline(HashPipeline):
+    """Scans block until `release` is set, so a test can hold one in flight."""
+
+    def __init__(self) -> None:
+        super().__init__(packed_dim=64)
+        self.scanning = threading.Event()
+        self.release = threading.Event()
+
+    def batch_similarity(self, query, candidates):
+        self.scanning.set()
+        assert self.release.wait(5)
+        return super().batch_similarity(query, candidates)
+
+
+@pytest.mark.asyncio
+async def test_off_loop_scan_keeps_loop_free_and_does_not_block_removal():
+    pipeline = GatedPipeline()
+    field = MemoryField(pipeline, scan_threads=1)
+    pipeline.release.set()
+    ids = await field.deposit_many([(f"intent {i}", "alice", None) for i in range(5)])
+    pipeline.release.clear()
+    pipeline.scanning.clear()
+
+    match_task = asyncio.create_task(field.match("intent 1", k=5))
+    while not pipeline.scanning.is_set():
+        await asyncio.sleep(0.001)  # loop keeps running while the scan is blocked
+    await asyncio.wait_for(field.remove(ids[1]), 1)  # writer does not wait for readers
+    assert await field.count() == 4
+
+    pipeline.release.set()
+    results = await match_task
+    # the scan overlapped a swap-remove, so it is discarded and rerun
+    assert {r.intent_id for r in results} == set(ids) - {ids[1]}
+    assert field.stats()["reads"]["read_retries"] == 1
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_read_retries_then_falls_back_to_shared_lock():
+    field = MemoryField(HashPipeline(packed_dim=32), scan_threads=1)
+    await field.deposit("text", "alice")
+    calls = []
+
+    def torn_once():
+        calls.append(1)
+        if len(calls) == 1:
+            field._generation += 2  # a swap-remove completed mid-read
+        return len(calls)
+
+    assert await field._read(torn_once) == 2
+
+    def always_torn():
+        field._generation += 2
+        return "locked"
+
+    assert await field._read(always_torn) == "locked"
+    reads = field.stats()["reads"]
+    assert reads["read_retries"] == 1 + 3
+    assert reads["locked_fallbacks"] == 1
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_read_error_during_concurrent_append_is_retried():
+    field = MemoryField(HashPipeline(packed_dim=32), scan_threads=1)
+    await field.deposit("text", "alice")
+    calls = []
+
+    def racing_append():
+        calls.append(1)
+        if len(calls) == 1:
+            field._appends += 1
+            raise IndexError("row not yet published")
+        return "ok"
+
+    assert await field._read(racing_append) == "ok"
+
+    def broken():
+        raise ValueError("genuine error")
+
+    with pytest.raises(ValueError, match="genuine"):
+        await field._read(broken)
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_compaction_waits_for_in_flight_reads():
+    pipeline = GatedPipeline()
+    field = MemoryField(pipeline, scan_threads=1, maintenance_interval=0)
+    pipeline.release.set()
+    ids = await field.deposit_many([(f"intent {i}", "alice", None) for i in range(1100)])
+    for iid in ids[100:]:
+        await field.remove(iid)
+    pipeline.release.clear()
+    pipeline.scanning.clear()
+
+    match_task = asyncio.create_task(field.match("intent 1", k=1))
+    while not pipeline.scanning.is_set():
+        await asyncio.sleep(0.001)
+    compact_task = asyncio.create_task(field.compact())
+    await asyncio.sleep(0.02)
+    assert not compact_task.done()  # shrinking waits for the lock-free scan
+    late_match = asyncio.create_task(field.match("intent 2", k=1))
+    await asyncio.sleep(0.02)
+
+    pipeline.release.set()
+    assert await compact_task
+    assert (await match_task)[0].text == "intent 1"
+    assert (await late_match)[0].text == "intent 2"
+    assert field.stats()["reads"]["locked_fallbacks"] == 1  # late reader queued on the lock
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_see_consistent_rows_during_writes():
+    pipeline = HashPipeline(packed_dim=64)
+    field = MemoryField(pipeline, scan_threads=2, scan_tile_bytes=64 * 16)
+    ids = await field.deposit_many(
+        [(f"skill {i}", f"owner_{i % 5}", {"i": i}) for i in range(300)]
+    )
+
+    async def write():
+        for step in range(150):
+            await field.remove(ids[step])
+            await field.upsert(ids[150 + step], f"skill rewritten {step}")
+            await field.deposit(f"skill new {step}", "owner_new", {"i": -step})
+            await asyncio.sleep(0)
+
+    async def read(query):
+        found = []
+        for _ in range(40):
+            found.extend(await field.match(query, k=10))
+            for owner in await field.match_owners(query, k=3):
+                found.extend(owner.intents)
+        return found
+
+    results = await asyncio.gather(write(), *(read(f"skill {q}") for q in range(4)))
+    query_vecs = {f"skill {q}": pipeline.encode_text(f"skill {q}") for q in range(4)}
+    for q, found in enumerate(results[1:]):
+        assert found
+        for r in found:
+            # a torn row would pair one row's text with another row's score or id
+            expected = pipeline.batch_similarity(
+                query_vecs[f"skill {q}"], pipeline.encode_text(r.text)
+            )[0]
+            assert r.score == pytest.approx(expected)
+            if r.owner == "owner_new":
+                assert r.text == f"skill new {-r.metadata['i']}"
+            elif "rewritten" not in r.text:
+                assert r.text == f"skill {r.metadata['i']}"
+                assert r.intent_id == ids[r.metadata["i"]]
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_generation_changes_with_every_visible_write():
+    field = MemoryField(HashPipeline(packed_dim=32), maintenance_interval=0)
+    seen = [field.generation]
+
+    def changed() -> bool:
+        seen.append(field.generation)
+        return seen[-1] > seen[-2]
+
+    ids = await field.deposit_many([(f"t{i}", "alice", None) for i in range(1100)])
+    assert changed()
+    await field.deposit("t1", "alice")  # dedup hit
+    assert not changed()
+    await field.upsert(ids[0], "rewritten")
+    assert changed()
+    assert await field.remove_owner("alice") == 1100
+    assert changed()
+    assert await field.compact()  # same content, smaller buffer
+    assert not changed()
+
+
+# ── MIH Index Tests ───────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_mih_index_matches_brute_force():
+    pipeline = HashPipeline(packed_dim=64)
+    mih = MemoryField(pipeline, index="mih")
+    brute = MemoryField(pipeline)
+    ids = []
+    for i in range(60):
+        ids.append(await mih.deposit(f"intent {i}", f"owner_{i}"))
+        await brute.deposit(f"intent {i}", f"owner_{i}")
+    for iid in ids[:10]:
+        await mih.remove(iid)
+    for i in range(10):
+        await brute.remove((await brute.match(f"intent {i}", k=1))[0].intent_id)
+
+    for query in ("intent 12", "intent 40", "unrelated"):
+        a = await mih.match(query, k=5)
+        b = await brute.match(query, k=5)
+        assert [r.score for r in a] == [r.score for r in b]
+    top = await mih.match("intent 12", k=3)
+    assert top[0].text == "intent 12"
+
+
+# ── HNSW Index Tests ──────────────────────────────────────
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scan_threads", [0, 2])
+async def test_hnsw_index_follows_writes(scan_threads):
+    field = MemoryField(
+        HashPipeline(packed_dim=32), index="hnsw", ef_search=32,
+        scan_threads=scan_threads, maintenance_interval=0,
+    )
+    ids = await field.deposit_many([(f"intent {i}", f"owner_{i % 7}", None) for i in range(120)])
+    for iid in ids[0:30:3]:
+        await field.remove(iid)
+    await field.upsert(ids[40], "rewritten")
+    await field.remove_owner("owner_6")
+    assert len(field._index) == await field.count()
+
+    for query, iid in (("intent 50", ids[50]), ("rewritten", ids[40])):
+        top = await field.match(query, k=3, ef_search=100)
+        assert top[0].intent_id == iid
+        assert top[0].score == 1.0
+    assert ids[3] not in {r.intent_id for r in await field.match("intent 3", k=5)}
+    stats = field.stats()["index"]
+    assert stats["kind"] == "hnsw"
+    assert stats["tombstones"] == stats["nodes"] - stats["live"] > 0
+    await field.close()
+
+
+@pytest.mark.asyncio
+async def test_hnsw_rebuild_replays_writes_made_while_building(monkeypatch):
+    monkeypatch.setattr("towow.field.field._INDEX_REBUILD_MIN", 8)
+    field = MemoryField(HashPipeline(packed_dim=32), index="hnsw", maintenance_interval=0)
+    ids = await field.deposit_many([(f"intent {i}", "owner", None) for i in range(100)])
+    assert not await field.rebuild_index()  # no tombstones yet
+    for iid in ids[:40]:
+        await field.remove(iid)
+
+    build = HnswIndex.rebuilt
+
+    def slow_rebuilt(self, keys, codes):
+        time.sleep(0.2)
+        return build(self, keys, codes)
+
+    monkeypatch.setattr(HnswIndex, "rebuilt", slow_rebuilt)
+    task = asyncio.create_task(field.rebuild_index())
+    await asyncio.sleep(0.05)
+    assert field.stats()["index"]["rebuilding"]
+    late = await field.deposit("late arrival", "owner")
+    await field.remove(ids[50])
+    assert await task
+
+    index = field._index
+    assert (len(index), index.tombstones) == (60, 1)
+    assert field.stats()["index"]["rebuilds"] == 1
+    assert (await field.match("late arrival", k=1))[0].intent_id == late
+    assert ids[50] not in {r.intent_id for r in await field.match("intent 50", k=5)}
+
+
+@pytest.mark.asyncio
+async def test_hnsw_rebuilt_by_maintenance(monkeypatch):
+    monkeypatch.setattr("towow.field.field._INDEX_REBUILD_MIN", 8)
+    field = MemoryField(HashPipeline(packed_dim=32), index="hnsw", maintenance_interval=0.01)
+    ids = await field.deposit_many([(f"intent {i}", "owner", None) for i in range(60)])
+    for iid in ids[:20]:
+        await field.remove(iid)
+    for _ in range(200):
+        if field.stats()["index"]["rebuilds"]:
+            break
+        await asyncio.sleep(0.01)
+    assert field._index.tombstones == 0
+    assert len(field._index) == 40
+    await field.close()
+
+
+def test_hnsw_ef_search_validated():
+    with pytest.raises(ValueError, match="ef_search"):
+        MemoryField(HashPipeline(), index="hnsw", ef_search=0)
+
+
+# ── MRL Cascade Tests ─────────────────────────────────────
+
+def _assert_prefix_in_sync(field: MemoryField) -> None:
+    n = field._active_count
+    np.testing.assert_array_equal(
+        field._prefix_buf[:n], field._vector_buf[:n, : field._cascade_bytes]
+    )
+
+
+@pytest.mark.asyncio
+async def test_cascade_verifies_prefix_candidates_on_full_code():
+    pipeline = HashPipeline(packed_dim=64)
+    cascade = MemoryField(pipeline, cascade_bits=128, cascade_multiplier=4, scan_tile_bytes=64 * 8)
+    exact = MemoryField(pipeline)
+    items = [(f"intent {i}", f"owner_{i % 9}", None) for i in range(400)]
+    await cascade.deposit_many(items)
+    await exact.deposit_many(items)
+
+    for query in ("intent 7", "intent 300"):
+        got = await cascade.match(query, k=5)
+        assert got[0].text == query  # prefix distance 0 always survives the coarse pass
+        query_vec = pipeline.encode_text(query)
+        for r in got:  # scores come from the full 512-bit code
+            assert r.score == pipeline.batch_similarity(query_vec, pipeline.encode_text(r.text))[0]
+        assert [r.score for r in got] == sorted((r.score for r in got), reverse=True)
+    assert cascade.stats()["cascade"]["prefix_bits"] == 128
+
+    # candidates covering the whole field fall back to the exact scan
+    wide = await cascade.match("intent 7", k=100)
+    assert [r.score for r in wide] == [r.score for r in await exact.match("intent 7", k=100)]
+    many = await cascade.match_many(["intent 7", "", "intent 300"], k=5)
+    assert many[1] == []
+    assert many[2] == await cascade.match("intent 300", k=5)
+
+
+@pytest.mark.asyncio
+async def test_cascade_prefix_follows_writes_and_resizes():
+    field = MemoryField(
+        HashPipeline(packed_dim=32), cascade_bits=64, maintenance_interval=0
+    )
+    ids = await field.deposit_many([(f"t{i}", f"o{i % 50}", None) for i in range(3000)])
+    _assert_prefix_in_sync(field)
+    await field.upsert(ids[49], "rewritten")
+    for owner in range(45):
+        await field.remove_owner(f"o{owner}")
+    assert await field.compact()
+    _assert_prefix_in_sync(field)
+    assert (await field.match("rewritten", k=1))[0].intent_id == ids[49]
+    top = await field.match(f"t{2999}", k=1, filters=MatchFilter(owner_prefixes=("o4",)))
+    assert top[0].text == "t2999"
+
+
+def test_cascade_args_validated():
+    with pytest.raises(ValueError, match="cascade_bits"):
+        MemoryField(HashPipeline(packed_dim=16), cascade_bits=12)
+    with pytest.raises(ValueError, match="cascade_bits"):
+        MemoryField(HashPipeline(packed_dim=16), cascade_bits=128)
+    with pytest.raises(ValueError, match="cascade_multiplier"):
+        MemoryField(HashPipeline(packed_dim=16), cascade_bits=64, cascade_multiplier=0)
+
+
+def test_unknown_index_raises():
+    with pytest.raises(ValueError, match="Unknown index"):
+        MemoryField(HashPipeline(), index="faiss")
+
+
+# ── Filtered Match Tests ──────────────────────────────────
+
+SCENES = ("h_", "s_", "r_", "m_")
+
+
+async def _scene_field(**kwargs) -> MemoryField:
+    """80 intents over 16 owners in four scenes, then some swap-removes."""
+    field = MemoryField(HashPipeline(packed_dim=32), scan_tile_bytes=32 * 5, **kwargs)
+    await field.deposit_many([
+        (f"intent {i}", f"{SCENES[i % 4]}user{i % 16}", {"tier": i % 3, "remote": i % 2 == 0})
+        for i in range(80)
+    ])
+    for i in (3, 17, 40, 41, 79):
+        await field.remove((await field.match(f"intent {i}", k=1))[0].intent_id)
+    return field
+
+
+def _reference_filtered(field, query, k, predicate):
+    """Brute-force top-k scores over the intents that satisfy predicate."""
+    q = field._pipeline.encode_text(query)
+    scores = [
+        float(field._pipeline.batch_similarity(q, field._vectors[row])[0])
+        for iid, row in field._pos_index.items()
+        if predicate(field._intent(iid))
+    ]
+    return sorted(scores, reverse=True)[:k]
+
+
+FILTER_CASES = [
+    (MatchFilter(owner_prefixes=("h_",)), lambda i: i.owner.startswith("h_")),
+    (MatchFilter(owner_prefixes=("r_", "m_")), lambda i: i.owner[:2] in ("r_", "m_")),
+    (MatchFilter(exclude_owners=("h_user0", "s_user1")), lambda i: i.owner not in ("h_user0", "s_user1")),
+    (MatchFilter(metadata={"tier": 1}), lambda i: i.metadata["tier"] == 1),
+    (
+        MatchFilter(owner_prefixes=("s_",), exclude_owners=("s_user5",), metadata={"tier": 2, "remote": False}),
+        lambda i: i.owner.startswith("s_") and i.owner != "s_user5"
+        and i.metadata == {"tier": 2, "remote": False},
+    ),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scan_threads", [0, 3])
+@pytest.mark.parametrize("case", range(len(FILTER_CASES)))
+async def test_filtered_match_equals_reference(case, scan_threads):
+    filters, predicate = FILTER_CASES[case]
+    field = await _scene_field(scan_threads=scan_threads)
+    try:
+        for query in ("intent 9", "intent 60", "unrelated"):
+            results = await field.match(query, k=7, filters=filters)
+            assert all(predicate(field._intent(r.intent_id)) for r in results)
+            assert [r.score for r in results] == _reference_filtered(field, query, 7, predicate)
+    finally:
+        await field.close()
+
+
+@pytest.mark.asyncio
+async def test_filtered_match_owners_only_aggregates_selected_rows():
+    field = await _scene_field()
+    filters = MatchFilter(owner_prefixes=("h_",), metadata={"remote": True})
+    results = await field.match_owners("intent 8", k=10, max_intents=5, filters=filters)
+    assert results
+    assert all(m.owner.startswith("h_") for m in results)
+    assert all(i.metadata["remote"] is True for m in results for i in m.intents)
+
+    many = await field.match_owners_many(["intent 8", "", "intent 9"], k=10, max_intents=5, filters=filters)
+    assert [m.owner for m in many[0]] == [m.owner for m in results]
+    assert many[1] == []
+    singles = await field.match_many(["intent 8", "intent 9"], k=4, filters=filters)
+    assert singles[0] == await field.match("intent 8", k=4, filters=filters)
+
+
+@pytest.mark.asyncio
+async def test_filter_selecting_nothing_returns_empty():
+    field = await _scene_field()
+    assert await field.match("intent 1", filters=MatchFilter(metadata={"tier": 9})) == []
+    assert await field.match("intent 1", filters=MatchFilter(owner_prefixes=("x_",))) == []
+    assert await field.match_owners("intent 1", filters=MatchFilter(metadata={"missing": 1})) == []
+    # bool and int values index separately
+    assert await field.match("intent 1", filters=MatchFilter(metadata={"remote": 1})) == []
+
+
+@pytest.mark.asyncio
+async def test_metadata_index_follows_swap_removes():
+    field = await _scene_field()
+    for key, rows in field._meta_index.items():
+        name, _, value = key
+        for row in rows:
+            assert field._intent(field._id_index[row]).metadata[name] == value
+    indexed = sum(len(rows) for rows in field._meta_index.values())
+    assert indexed == 2 * await field.count()
+
+    await field.remove_owner("m_user3")
+    assert sum(len(rows) for rows in field._meta_index.values()) == 2 * await field.count()
+
+
+@pytest.mark.asyncio
+async def test_metadata_index_normalises_non_str_keys():
+    field = MemoryField(HashPipeline(packed_dim=32))
+    iid = await field.deposit("first", "alice", {1: "x"})
+    other = await field.deposit("second", "bob", {1: "x"})
+    results = await field.match("first", filters=MatchFilter(metadata={"1": "x"}))
+    assert {r.intent_id for r in results} == {iid, other}
+
+    await field.upsert(other, "second", metadata={1: "y"})
+    await field.remove(iid)
+    assert await field.match("first", filters=MatchFilter(metadata={"1": "x"})) == []
+    assert [r.intent_id for r in await field.match("second", filters=MatchFilter(metadata={"1": "y"}))] == [other]
+    assert set(field._meta_index) == {("1", False, "y")}
+
+
+@pytest.mark.asyncio
+async def test_owner_prefix_table_extends_with_new_owners():
+    field = await _scene_field()
+    filters = MatchFilter(owner_prefixes=("h_",))
+    await field.match("intent 1", filters=filters)
+    await field.deposit("late arrival", "h_newcomer")
+    results = await field.match("late arrival", k=1, filters=filters)
+    assert results[0].owner == "h_newcomer"
+
+
+@pytest.mark.asyncio
+async def test_filtered_match_with_mih_and_rerank():
+    filters = MatchFilter(owner_prefixes=("m_",))
+    mih = await _scene_field(index="mih")
+    results = await mih.match("intent 5", k=4, filters=filters)
+    assert [r.score for r in results] == _reference_filtered(
+        mih, "intent 5", 4, lambda i: i.owner.startswith("m_")
+    )
+
+    field = MemoryField(_dense_pipeline(), dense_dtype="float16")
+    for i in range(20):
+        await field.deposit(f"profile {i}", f"{SCENES[i % 4]}{i}")
+    reranked = await field.match("profile 4", k=3, rerank=20, filters=MatchFilter(owner_prefixes=("h_",)))
+    assert reranked[0].text == "profile 4"
+    assert all(r.owner.startswith("h_") for r in reranked)
+    owners = await field.match_owners("profile 4", k=3, rerank=20, filters=MatchFilter(exclude_owners=("h_4",)))
+    assert "h_4" not in {m.owner for m in owners}
+
+
+def test_match_filter_normalises_and_validates():
+    a = MatchFilter(owner_prefixes=["s_", "h_", "s_"], metadata={"b": 1, "a": "x"})
+    assert a.owner_prefixes == ("h_", "s_")
+    assert a.metadata == (("a", "x"), ("b", 1))
+    assert a == MatchFilter(owner_prefixes=("h_", "s_"), metadata=(("b", 1), ("a", "x")))
+    assert hash(a)
+    assert not MatchFilter()
+    with pytest.raises(ValueError, match="scalar"):
+        MatchFilter(metadata={"tags": ["a"]})
+
+
+# ── Expiry and Compaction Tests ───────────────────────────
+
+@pytest.mark.asyncio
+async def test_ttl_resolution_order():
+    field = MemoryField(
+        HashPipeline(packed_dim=32), ttl=100, ttl_by_type={"demand": 10}, maintenance_interval=0
+    )
+    ids = await field.deposit_many([
+        ("profile", "alice", None),
+        ("demand", "alice", {"type": "demand"}),
+        ("override", "alice", {"type": "demand", "ttl": 1000}),
+    ])
+    created = {iid: field._intent(iid).created_at for iid in ids}
+    assert [field._expires[iid] - created[iid] for iid in ids] == [100, 10, 1000]
+
+    unlimited = MemoryField(HashPipeline(packed_dim=32), maintenance_interval=0)
+    await unlimited.deposit("forever", "bob")
+    await unlimited.deposit("short", "bob", {"ttl": 5})
+    assert list(unlimited._expires.values()) == [pytest.approx(time.time() + 5, abs=1)]
+
+
+@pytest.mark.asyncio
+async def test_expire_evicts_in_batches(monkeypatch):
+    monkeypatch.setattr("towow.field.field._EXPIRE_BATCH", 7)
+    field = MemoryField(HashPipeline(packed_dim=32), maintenance_interval=0)
+    items = [
+        (f"intent {i}", f"owner_{i % 5}", {"ttl": 10 if i % 3 else 1000, "i": i})
+        for i in range(60)
+    ]
+    await field.deposit_many(items)
+    t0 = float(field._created_col[: field._active_count].max())
+    await field.remove((await field.match("intent 1", k=1))[0].intent_id)
+
+    assert await field.expire(now=t0 + 5) == 0
+    assert await field.expire(now=t0 + 20) == 39
+    assert await field.count() == 20
+    assert all(field._intent_at(row).metadata["i"] % 3 == 0 for row in range(field._active_count))
+    assert sorted(field._pos_index.values()) == list(range(20))
+    assert {r.metadata["i"] for r in await field.match("intent 4", k=60)} == set(range(0, 60, 3))
+    # row-aligned secondary indexes survived the swap-removes
+    assert await field.match("intent 4", filters=MatchFilter(metadata={"i": 4})) == []
+    assert len(await field.match("intent 3", filters=MatchFilter(metadata={"i": 3}))) == 1
+    # an expired (owner, text) can be deposited again
+    assert await field.deposit("intent 4", "owner_4") not in field._expires
+    assert field.stats()["maintenance"]["expired"] == 39
+
+
+@pytest.mark.asyncio
+async def test_background_maintenance_expires_intents():
+    field = MemoryField(HashPipeline(packed_dim=32), ttl=0.05, maintenance_interval=0.02)
+    await field.deposit_many([(f"t{i}", "alice", None) for i in range(5)])
+    await field.deposit("keeper", "bob", {"ttl": 60})
+    assert field._maintenance is not None
+    for _ in range(50):
+        if await field.count() == 1:
+            break
+        await asyncio.sleep(0.02)
+    assert [r.text for r in await field.match("keeper", k=5)] == ["keeper"]
+    await field.close()
+    assert field._maintenance is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dense", [False, True])
+async def test_compact_shrinks_sparse_buffer(dense):
+    pipeline = _dense_pipeline(dim=16) if dense else HashPipeline(packed_dim=16)
+    field = MemoryField(pipeline, dense_dtype="float16" if dense else None, maintenance_interval=0)
+    await field.deposit_many([(f"text {i}", f"o{i % 40}", None) for i in range(5000)])
+    assert field._capacity == 8192
+    assert not await field.compact()
+
+    for owner in range(35):
+        await field.remove_owner(f"o{owner}")
+    assert await field.count() == 625
+    before = await field.match("text 39", k=5, rerank=50 if dense else 0)
+    assert await field.compact()
+    assert field._capacity == 2048
+    assert field._vector_buf.shape[0] == field._owner_col.shape[0] == 2048
+    if dense:
+        assert field._dense_buf.shape[0] == 2048
+    assert await field.match("text 39", k=5, rerank=50 if dense else 0) == before
+    await field.deposit("after compaction", "o1")
+    assert (await field.match("after compaction", k=1))[0].owner == "o1"
+
+
+def test_ttl_and_compaction_args_validated():
+    with pytest.raises(ValueError, match="ttl"):
+        MemoryField(HashPipeline(), ttl=0)
+    with pytest.raises(ValueError, match="ttl"):
+        MemoryField(HashPipeline(), ttl_by_type={"demand": -1})
+    with pytest.raises(ValueError, match="compact_below"):
+        MemoryField(HashPipeline(), compact_below=0.5)
+
+
+# ── Two-stage Rerank Tests ────────────────────────────────
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dense_dtype", ["float16", "int8"])
+async def test_rerank_orders_by_cosine(dense_dtype):
+    pipeline = _dense_pipeline()
+    field = MemoryField(pipeline, dense_dtype=dense_dtype)
+    texts = [f"profile {i}" for i in range(30)]
+    for i, t in enumerate(texts):
+        await field.deposit(t, f"owner_{i}")
+
+    results = await field.match("profile 7", k=5, rerank=30)
+    assert results[0].text == "profile 7"
+    assert results[0].score == pytest.approx(1.0, abs=1e-2)
+    scores = [r.score for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+    # rerank over every row equals exact cosine ranking
+    encoder = DenseStubEncoder()
+    q = encoder.encode("profile 7")
+    exact = sorted(texts, key=lambda t: -float(encoder.encode(t) @ q))[:5]
+    assert [r.text for r in results] == exact
+
+
+@pytest.mark.asyncio
+async def test_rerank_survives_remove_and_growth():
+    field = MemoryField(_dense_pipeline(), dense_dtype="float16")
+    n = 1030  # beyond the initial 1024-row capacity
+    ids = [await field.deposit(f"text {i}", f"o{i}") for i in range(n)]
+    await field.remove(ids[0])
+
+    results = await field.match("text 1029", k=3, rerank=50)
+    assert results[0].text == "text 1029"
+    assert ids[0] not in {r.intent_id for r in results}
+
+
+@pytest.mark.asyncio
+async def test_rerank_ignored_without_dense_copy():
+    field = MemoryField(HashPipeline())
+    await field.deposit("alpha", "a")
+    results = await field.match("alpha", k=1, rerank=10)
+    assert results[0].text == "alpha"
+
+
+def test_unknown_dense_dtype_raises():
+    with pytest.raises(ValueError, match="dense_dtype"):
+        MemoryField(_dense_pipeline(), dense_dtype="float64")
+
+
 # ── Protocol Conformance ──────────────────────────────────
 
 def test_memory_field_satisfies_protocol():
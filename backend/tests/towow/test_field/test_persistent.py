@@ -0,0 +1,387 @@
+"""
+Tests for PersistentField — mmap vectors + sidecar + WAL.
+
+Reopening a directory must restore the exact field state without
+re-encoding (the counting pipeline below verifies encode is not called).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from towow.field.persistent import PersistentField
+from towow.field.types import MatchFilter
+
+
+class CountingPipeline:
+    """HashPipeline variant that counts encode_text calls."""
+
+    def __init__(self, packed_dim: int = 16) -> None:
+        self._packed_dim = packed_dim
+        self.encode_calls = 0
+
+    @property
+    def packed_dim(self) -> int:
+        return self._packed_dim
+
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        self.encode_calls += 1
+        h = hashlib.sha256(text.encode()).digest()
+        rng = np.random.RandomState(int.from_bytes(h[:4], "big"))
+        return rng.randint(0, 256, size=self._packed_dim, dtype=np.uint8)
+
+    def encode_texts(
+        self, texts: list[str], cache_results: bool = True
+    ) -> list[np.ndarray]:
+        return [self.encode_text(t) for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        if candidates.ndim == 1:
+            candidates = candidates.reshape(1, -1)
+        bits = np.unpackbits(np.bitwise_xor(query, candidates), axis=1)
+        return 1.0 - bits.sum(axis=1) / (candidates.shape[1] * 8)
+
+
+def _snapshot(field):
+    """(intent_id, owner, text) per row plus the matching vectors."""
+    rows = [
+        (iid, field._intent(iid).owner, field._intent(iid).text)
+        for iid in field._id_index
+    ]
+    return rows, np.array(field._vectors)
+
+
+async def _settled(field):
+    """Wait for an automatic checkpoint still writing its sidecar."""
+    if field._checkpoint_pending is not None:
+        await asyncio.wrap_future(field._checkpoint_pending)
+
+
+@pytest.mark.asyncio
+async def test_reopen_restores_without_reencoding(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path)
+    for i in range(20):
+        await field.deposit(f"intent {i}", f"owner_{i % 4}", metadata={"i": i})
+    before = _snapshot(field)
+
+    pipeline = CountingPipeline()
+    reopened = PersistentField(pipeline, tmp_path)
+    assert pipeline.encode_calls == 0
+    after = _snapshot(reopened)
+    assert before[0] == after[0]
+    np.testing.assert_array_equal(before[1], after[1])
+    assert await reopened.count() == 20
+    assert await reopened.count_owners() == 4
+
+    results = await reopened.match("intent 5", k=1)
+    assert results[0].text == "intent 5"
+    assert results[0].metadata == {"i": 5}
+
+
+@pytest.mark.asyncio
+async def test_removals_replayed_from_wal(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path)
+    ids = [await field.deposit(f"t{i}", f"o{i}") for i in range(10)]
+    await field.remove(ids[2])
+    await field.remove_owner("o7")
+    await field.deposit("after removal", "o99")
+    before = _snapshot(field)
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    after = _snapshot(reopened)
+    assert before[0] == after[0]
+    np.testing.assert_array_equal(before[1], after[1])
+    # dedup state restored: same (owner, text) returns the existing id
+    existing = (await reopened.match("after removal", k=1))[0].intent_id
+    assert await reopened.deposit("after removal", "o99") == existing
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_truncates_wal(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path)
+    for i in range(5):
+        await field.deposit(f"t{i}", "o")
+    await field.checkpoint()
+    assert (tmp_path / "wal.log").stat().st_size == 0
+    sidecar = json.loads((tmp_path / "intents.json").read_text())
+    assert sidecar["count"] == 5
+    assert sidecar["owner_table"] == ["o"]
+
+    await field.deposit("t5", "o")
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert await reopened.count() == 6
+
+
+@pytest.mark.asyncio
+async def test_auto_checkpoint(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, checkpoint_every=3)
+    for i in range(7):
+        await field.deposit(f"t{i}", "o")
+    await _settled(field)
+    wal_lines = (tmp_path / "wal.log").read_text().splitlines()
+    assert len(wal_lines) == 1
+    assert not list(tmp_path.glob("wal.log.*"))
+    # a removal that triggers the checkpoint must be in the snapshot
+    await field.remove((await field.match("t0", k=1))[0].intent_id)
+    await field.remove((await field.match("t1", k=1))[0].intent_id)
+    await _settled(field)
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert await reopened.count() == 5
+
+
+@pytest.mark.asyncio
+async def test_rotated_wal_replayed_when_sidecar_write_lost(tmp_path):
+    """Crash after the WAL rotation but before the checkpoint thread wrote the sidecar."""
+    field = PersistentField(CountingPipeline(), tmp_path)
+    ids = [await field.deposit(f"t{i}", "o") for i in range(3)]
+    async with field._lock:
+        field._begin_checkpoint_locked()  # snapshot taken, sidecar never written
+    await field.remove(ids[0])
+    await field.deposit("t3", "o")
+    assert (tmp_path / "wal.log.0").exists()
+    before = _snapshot(field)
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert _snapshot(reopened)[0] == before[0]
+    await reopened.checkpoint()
+    assert not list(tmp_path.glob("wal.log.*"))
+    assert json.loads((tmp_path / "intents.json").read_text())["count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_auto_checkpoint_writes_sidecar_off_the_event_loop(tmp_path, monkeypatch):
+    field = PersistentField(CountingPipeline(), tmp_path, checkpoint_every=4)
+    writers = []
+    write = field._write_checkpoint
+
+    def record_thread(*args):
+        writers.append(threading.current_thread())
+        write(*args)
+
+    monkeypatch.setattr(field, "_write_checkpoint", record_thread)
+    await field.deposit_many([(f"t{i}", "o", None) for i in range(4)])
+    assert field._checkpoint_pending is not None
+    await field.deposit("during write", "o")
+    await _settled(field)
+    assert writers and threading.main_thread() not in writers
+    assert json.loads((tmp_path / "intents.json").read_text())["count"] == 4
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert await reopened.count() == 5
+
+
+@pytest.mark.asyncio
+async def test_deposit_many_persists(tmp_path):
+    field = PersistentField(CountingPipeline(packed_dim=8), tmp_path)
+    ids = await field.deposit_many([(f"t{i}", f"o{i % 5}", {"i": i}) for i in range(1500)])
+    before = _snapshot(field)
+
+    reopened = PersistentField(CountingPipeline(packed_dim=8), tmp_path)
+    after = _snapshot(reopened)
+    assert before[0] == after[0]
+    np.testing.assert_array_equal(before[1], after[1])
+    assert (await reopened.match("t1499", k=1))[0].intent_id == ids[-1]
+
+
+@pytest.mark.asyncio
+async def test_torn_wal_tail_is_dropped(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path)
+    await field.deposit("kept", "o")
+    with open(tmp_path / "wal.log", "a") as f:
+        f.write('{"op": "add", "row": 1, "id": "x", "ow')
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert await reopened.count() == 1
+    # the torn record was truncated away; new writes append cleanly
+    await reopened.deposit("next", "o")
+    again = PersistentField(CountingPipeline(), tmp_path)
+    assert await again.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_crash_during_swap_remove_is_repaired(tmp_path):
+    """WAL del written but the row swap never happened (crash in between)."""
+    field = PersistentField(CountingPipeline(), tmp_path)
+    ids = [await field.deposit(f"t{i}", f"o{i}") for i in range(4)]
+    expected_last = np.array(field._vector_buf[3])
+    field._log_many([{"op": "del", "id": ids[1]}])  # simulate: logged, not applied
+    field._vector_buf.flush()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert await reopened.count() == 3
+    assert reopened._id_index[1] == ids[3]
+    np.testing.assert_array_equal(reopened._vectors[1], expected_last)
+    results = await reopened.match("t3", k=1)
+    assert results[0].intent_id == ids[3]
+    assert results[0].score == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_cascade_prefix_rebuilt_on_reopen(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, cascade_bits=32, cascade_multiplier=2)
+    ids = await field.deposit_many([(f"t{i}", f"o{i % 3}", None) for i in range(40)])
+    await field.checkpoint()
+    await field.remove(ids[0])  # WAL-only swap-remove
+    await field.upsert(ids[7], "rewritten")
+
+    reopened = PersistentField(CountingPipeline(), tmp_path, cascade_bits=32, cascade_multiplier=2)
+    n = reopened._active_count
+    np.testing.assert_array_equal(reopened._prefix_buf[:n], reopened._vector_buf[:n, :4])
+    assert (await reopened.match("rewritten", k=1))[0].intent_id == ids[7]
+    assert (await reopened.match("t39", k=1))[0].intent_id == ids[39]
+
+
+@pytest.mark.asyncio
+async def test_upserts_replayed_from_wal(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, checkpoint_every=6)
+    ids = [await field.deposit(f"t{i}", f"o{i}", {"v": 0}) for i in range(4)]
+    await field.upsert(ids[1], "t1 rewritten", metadata={"v": 1})
+    await field.upsert(ids[3], "t3 rewritten")
+    await field.remove(ids[0])
+    before = _snapshot(field)
+    await _settled(field)
+
+    pipeline = CountingPipeline()
+    reopened = PersistentField(pipeline, tmp_path)
+    after = _snapshot(reopened)
+    assert before[0] == after[0]
+    np.testing.assert_array_equal(before[1], after[1])
+    assert reopened._intent(ids[1]).metadata == {"v": 1}
+    assert reopened._intent(ids[3]).metadata == {"v": 0}
+    assert await reopened.deposit("t1 rewritten", "o1") == ids[1]
+    assert pipeline.encode_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_crash_during_upsert_is_repaired(tmp_path):
+    """WAL upd written but the row overwrite never happened (crash in between)."""
+    field = PersistentField(CountingPipeline(), tmp_path)
+    ids = [await field.deposit(f"t{i}", f"o{i}") for i in range(3)]
+    old_vector = np.array(field._vector_buf[1])
+    await field.upsert(ids[1], "t1 rewritten")
+    new_vector = np.array(field._vector_buf[1])
+    field._vector_buf[1] = old_vector  # simulate: logged, not applied
+    field._vector_buf.flush()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    np.testing.assert_array_equal(reopened._vectors[1], new_vector)
+    top = (await reopened.match("t1 rewritten", k=1))[0]
+    assert (top.intent_id, top.score) == (ids[1], pytest.approx(1.0))
+
+
+@pytest.mark.asyncio
+async def test_grows_mmap_in_place(tmp_path):
+    field = PersistentField(CountingPipeline(packed_dim=8), tmp_path)
+    n = 1100  # beyond the initial 1024-row capacity
+    for i in range(n):
+        await field.deposit(f"t{i}", "o")
+    assert (tmp_path / "vectors.u8").stat().st_size >= 2048 * 8
+    await field.close()
+
+    reopened = PersistentField(CountingPipeline(packed_dim=8), tmp_path)
+    assert await reopened.count() == n
+    assert (await reopened.match("t1099", k=1))[0].text == "t1099"
+
+
+@pytest.mark.asyncio
+async def test_owner_column_restored(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, checkpoint_every=7)
+    for i in range(20):
+        await field.deposit(f"intent {i}", f"owner_{i % 4}")
+    await field.remove_owner("owner_1")
+    expected = await field.match_owners("intent 3", k=3)
+    await field.close()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    results = await reopened.match_owners("intent 3", k=3)
+    assert [(r.owner, r.score) for r in results] == [(r.owner, r.score) for r in expected]
+    assert "owner_1" not in {r.owner for r in results}
+
+
+@pytest.mark.asyncio
+async def test_metadata_index_restored(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, checkpoint_every=9)
+    ids = [
+        await field.deposit(f"intent {i}", f"owner_{i % 4}", metadata={"tier": i % 3})
+        for i in range(20)
+    ]
+    await field.remove(ids[1])
+    await field.remove_owner("owner_2")
+    filters = MatchFilter(metadata={"tier": 1})
+    expected = await field.match("intent 7", k=20, filters=filters)
+    await field.close()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    results = await reopened.match("intent 7", k=20, filters=filters)
+    assert [(r.intent_id, r.score) for r in results] == [(r.intent_id, r.score) for r in expected]
+    assert all(r.metadata == {"tier": 1} for r in results)
+    assert ids[1] not in {r.intent_id for r in results}
+
+
+@pytest.mark.asyncio
+async def test_compaction_truncates_files_and_survives_reopen(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, maintenance_interval=0)
+    await field.deposit_many([(f"t{i}", f"o{i % 10}", None) for i in range(3000)])
+    for owner in range(9):
+        await field.remove_owner(f"o{owner}")
+    assert await field.compact()
+    assert field._capacity == 1024
+    assert (tmp_path / "vectors.u8").stat().st_size == 1024 * 16
+    before = _snapshot(field)
+    await field.deposit("after compaction", "o9")
+    await field.close()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert reopened._capacity == 1024
+    assert _snapshot(reopened)[0][:300] == before[0]
+    assert (await reopened.match("after compaction", k=1))[0].text == "after compaction"
+
+
+@pytest.mark.asyncio
+async def test_expiry_restored_and_logged(tmp_path):
+    field = PersistentField(CountingPipeline(), tmp_path, ttl=50, maintenance_interval=0)
+    await field.deposit("short lived", "alice")
+    await field.deposit("kept", "alice", {"ttl": 10_000})
+    await field.close()
+
+    reopened = PersistentField(CountingPipeline(), tmp_path, ttl=50, maintenance_interval=0)
+    assert len(reopened._expires) == 2
+    assert await reopened.expire(now=time.time() + 100) == 1
+    again = PersistentField(CountingPipeline(), tmp_path)
+    assert [again._intent_at(row).text for row in range(again._active_count)] == ["kept"]
+
+
+def test_packed_dim_mismatch_raises(tmp_path):
+    PersistentField(CountingPipeline(packed_dim=16), tmp_path)._checkpoint_locked()
+    with pytest.raises(ValueError, match="packed_dim"):
+        PersistentField(CountingPipeline(packed_dim=32), tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_fsync_syncs_vector_rows_before_wal(tmp_path, monkeypatch):
+    field = PersistentField(CountingPipeline(), tmp_path, fsync=True)
+    calls = []
+    sync_rows, log_many = field._sync_rows, field._log_many
+
+    def record_sync(lo, hi):
+        calls.append(("sync", lo, hi))
+        sync_rows(lo, hi)
+
+    def record_wal(records):
+        calls.append(("wal", len(records)))
+        log_many(records)
+
+    monkeypatch.setattr(field, "_sync_rows", record_sync)
+    monkeypatch.setattr(field, "_log_many", record_wal)
+    ids = await field.deposit_many([(f"t{i}", "o", None) for i in range(3)])
+    await field.remove(ids[0])
+    assert calls == [("sync", 0, 3), ("wal", 3), ("wal", 1), ("sync", 0, 1)]
+
+    reopened = PersistentField(CountingPipeline(), tmp_path)
+    assert (await reopened.match("t2", k=1))[0].score == pytest.approx(1.0)
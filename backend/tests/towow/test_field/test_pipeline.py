@@ -7,6 +7,7 @@ Uses a stub Encoder and the real SimHashProjector (no model loading).
 import numpy as np
 import pytest
 
+from towow.field.cache import EmbeddingCache
 from towow.field.pipeline import EncodingPipeline
 from towow.field.projector import SimHashProjector
 
@@ -92,6 +93,30 @@ class TestEncodingPipeline:
         scores = self.pipeline.batch_similarity(query, candidates)
         assert scores.shape == (5,)
 
+    def test_batch_similarity_many_without_projector_support(self):
+        class SingleQueryProjector:
+            """Third-party projector predating batch_similarity_many."""
+
+            def __init__(self, inner):
+                self._inner = inner
+                self.project = inner.project
+                self.batch_project = inner.batch_project
+                self.similarity = inner.similarity
+                self.batch_similarity = inner.batch_similarity
+                self.D = inner.D
+
+            @property
+            def packed_dim(self):
+                return self._inner.packed_dim
+
+        pipeline = EncodingPipeline(self.encoder, SingleQueryProjector(self.projector))
+        queries = np.array([pipeline.encode_text(f"query {i}") for i in range(3)])
+        candidates = np.array([pipeline.encode_text(f"doc {i}") for i in range(5)])
+        np.testing.assert_allclose(
+            pipeline.batch_similarity_many(queries, candidates),
+            self.pipeline.batch_similarity_many(queries, candidates),
+        )
+
     def test_packed_dim(self):
         assert self.pipeline.packed_dim == 1250
 
@@ -104,8 +129,98 @@ class TestEncodingPipeline:
         assert vec.dtype == np.uint8
         assert vec.shape == (1250,)
 
+    def test_encode_with_dense_single_chunk(self):
+        binary, dense = self.pipeline.encode_with_dense("hello world")
+        np.testing.assert_array_equal(binary, self.pipeline.encode_text("hello world"))
+        np.testing.assert_allclose(dense, self.encoder.encode("hello world"))
+
+    def test_encode_with_dense_long_text_normalized(self):
+        long_text = ". ".join(f"Sentence number {i} with some content" for i in range(20))
+        binary, dense = self.pipeline.encode_with_dense(long_text)
+        np.testing.assert_array_equal(binary, self.pipeline.encode_text(long_text))
+        assert dense.shape == (768,)
+        assert np.linalg.norm(dense) == pytest.approx(1.0, abs=1e-5)
+
+    def test_dense_dim(self):
+        assert self.pipeline.dense_dim == 768
+
     def test_long_text_deterministic(self):
         long_text = ". ".join(f"Part {i}" for i in range(30))
         a = self.pipeline.encode_text(long_text)
         b = self.pipeline.encode_text(long_text)
         np.testing.assert_array_equal(a, b)
+
+
+class BatchCountingEncoder(StubEncoder):
+    """StubEncoder that records every encode / encode_batch call."""
+
+    def __init__(self, dim: int = 768) -> None:
+        super().__init__(dim)
+        self.single_calls = 0
+        self.batches: list[list[str]] = []
+
+    def encode(self, text: str) -> np.ndarray:
+        self.single_calls += 1
+        return super().encode(text)
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        return np.array([StubEncoder.encode(self, t) for t in texts], dtype=np.float32)
+
+
+class TestFlattenedBatchEncoding:
+
+    def setup_method(self):
+        self.encoder = BatchCountingEncoder(dim=64)
+        self.projector = SimHashProjector(input_dim=64, D=512, seed=7)
+        self.pipeline = EncodingPipeline(self.encoder, self.projector)
+        long_a = ". ".join(f"Sentence number {i} with some content" for i in range(20))
+        long_b = "。".join(f"第{i}句比较长的中文内容用于切分测试" for i in range(30))
+        self.texts = ["short one", long_a, "another short", long_b, "short one"]
+
+    def test_matches_per_text_encoding(self):
+        binaries, denses = self.pipeline.encode_texts_with_dense(self.texts)
+        reference = EncodingPipeline(StubEncoder(64), self.projector)
+        for text, binary, dense in zip(self.texts, binaries, denses):
+            ref_binary, ref_dense = reference.encode_with_dense(text)
+            np.testing.assert_array_equal(binary, ref_binary)
+            np.testing.assert_allclose(dense, ref_dense, atol=1e-6)
+
+    def test_single_length_sorted_encode_batch(self):
+        self.pipeline.encode_texts(self.texts)
+        assert self.encoder.single_calls == 0
+        assert len(self.encoder.batches) == 1
+        lengths = [len(c) for c in self.encoder.batches[0]]
+        assert lengths == sorted(lengths, reverse=True)
+        # duplicate "short one" is encoded once
+        assert self.encoder.batches[0].count("short one") == 1
+
+    def test_empty_text_raises(self):
+        with pytest.raises(ValueError, match="empty"):
+            self.pipeline.encode_texts(["fine", "  "])
+
+    def test_empty_batch(self):
+        assert self.pipeline.encode_texts([]) == []
+        assert self.encoder.batches == []
+
+    def test_cache_hits_skip_the_batch(self):
+        cache = EmbeddingCache()
+        pipeline = EncodingPipeline(self.encoder, self.projector, cache=cache)
+        first = pipeline.encode_texts(["a", "b"])
+        second = pipeline.encode_texts(["b", "c", "a"])
+
+        assert self.encoder.batches == [["a", "b"], ["c"]]
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[2], first[0])
+        assert cache.stats()["hits"] == 2
+
+    def test_cache_results_false_reads_but_does_not_fill(self):
+        cache = EmbeddingCache()
+        pipeline = EncodingPipeline(self.encoder, self.projector, cache=cache)
+        pipeline.encode_texts(["a"])
+        pipeline.encode_texts(["a", "b"], cache_results=False)
+        pipeline.encode_with_dense("c", cache_results=False)
+
+        assert self.encoder.batches == [["a"], ["b"]]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["entries"] == 1
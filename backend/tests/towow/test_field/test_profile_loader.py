@@ -14,6 +14,7 @@ from towow.field.profile_loader import (
     load_all_profiles,
     load_profiles_from_json,
     profile_to_text,
+    scene_prefix,
 )
 
 # Project root (Towow/) for locating real agent data files
@@ -151,3 +152,14 @@ class TestLoadAllProfiles:
         # With explicit dirs, keys should NOT have scene prefix
         for key in profiles:
             assert not key.startswith("h_")
+
+
+class TestScenePrefix:
+
+    @pytest.mark.parametrize("scene", ["S2_skill_exchange", "s_", "s"])
+    def test_accepts_dir_name_or_prefix(self, scene):
+        assert scene_prefix(scene) == "s_"
+
+    def test_unknown_scene_raises(self):
+        with pytest.raises(ValueError, match="Unknown scene"):
+            scene_prefix("S9_nothing")
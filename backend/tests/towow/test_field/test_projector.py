@@ -7,7 +7,13 @@ Pure numpy, no model loading.
 import numpy as np
 import pytest
 
-from towow.field.projector import SimHashProjector, bundle_binary
+from towow.field.projector import (
+    HadamardProjector,
+    SimHashProjector,
+    bundle_binary,
+    hamming_distance,
+    hamming_distance_many,
+)
 
 
 class TestSimHashProjector:
@@ -104,6 +110,66 @@ class TestSimHashProjector:
         assert not np.array_equal(a, b)
 
 
+class TestHadamardProjector:
+
+    def setup_method(self):
+        self.proj = HadamardProjector(input_dim=768, D=10_000, seed=42)
+
+    def test_satisfies_protocol(self):
+        from towow.field.protocols import Projector
+        assert isinstance(self.proj, Projector)
+
+    def test_project_output_shape(self):
+        packed = self.proj.project(np.random.randn(768).astype(np.float32))
+        assert packed.dtype == np.uint8
+        assert packed.shape == (1250,)
+        assert self.proj.packed_dim == 1250
+
+    def test_batch_project_matches_single(self):
+        dense = np.random.RandomState(0).randn(300, 768).astype(np.float32)  # > one batch
+        packed = self.proj.batch_project(dense)
+        assert packed.shape == (300, 1250)
+        for i in (0, 255, 256, 299):
+            np.testing.assert_array_equal(packed[i], self.proj.project(dense[i]))
+
+    def test_transform_is_signed_hadamard(self):
+        proj = HadamardProjector(input_dim=16, D=32, seed=1, rounds=1)
+        x = np.random.RandomState(2).randn(4, 16).astype(np.float32)
+        h = np.array([[1.0]])
+        while h.shape[0] < 16:
+            h = np.block([[h, h], [h, -h]])
+        expected = np.concatenate(
+            [(x * proj._signs[0, b]) @ h for b in range(proj._n_blocks)], axis=1
+        )
+        np.testing.assert_allclose(proj._transform(x), expected, rtol=1e-4, atol=1e-4)
+
+    @pytest.mark.parametrize("theta", [0.3, 1.0, 2.0])
+    def test_similarity_tracks_angle(self, theta):
+        """P[bit equal] = 1 - θ/π, like random hyperplanes."""
+        rng = np.random.RandomState(3)
+        a = rng.randn(768)
+        b = rng.randn(768)
+        b -= a * (a @ b) / (a @ a)
+        a /= np.linalg.norm(a)
+        b /= np.linalg.norm(b)
+        c = np.cos(theta) * a + np.sin(theta) * b
+        sim = self.proj.similarity(self.proj.project(a), self.proj.project(c))
+        assert sim == pytest.approx(1 - theta / np.pi, abs=0.03)
+
+    def test_seed_and_small_dims(self):
+        dense = np.random.RandomState(4).randn(10).astype(np.float32)
+        a = HadamardProjector(input_dim=10, D=100, seed=1).project(dense)
+        b = HadamardProjector(input_dim=10, D=100, seed=2).project(dense)
+        assert a.shape == (13,)
+        assert not np.array_equal(a, b)
+
+    def test_batch_similarity_many(self):
+        codes = self.proj.batch_project(np.random.RandomState(5).randn(6, 768))
+        many = self.proj.batch_similarity_many(codes[:2], codes)
+        np.testing.assert_allclose(many[1], self.proj.batch_similarity(codes[1], codes))
+        assert many[0, 0] == 1.0
+
+
 class TestBundleBinary:
 
     def test_single_vector_returns_copy(self):
@@ -146,3 +212,77 @@ class TestBundleBinary:
         # Not guaranteed different for 8 bits, but very likely
         # Just check it doesn't crash
         assert result_c.dtype == np.uint8
+
+    @staticmethod
+    def _legacy_bundle(vectors, D, seed):
+        """Original per-vector implementation, kept as the output reference."""
+        n = len(vectors)
+        unpacked = np.array([np.unpackbits(v)[:D] for v in vectors], dtype=np.int32)
+        counts = unpacked.sum(axis=0)
+        result_bits = np.zeros(D, dtype=np.uint8)
+        result_bits[counts > n / 2.0] = 1
+        ties = counts == n / 2.0
+        if ties.any():
+            rng = np.random.RandomState(seed)
+            result_bits[ties] = rng.randint(0, 2, size=ties.sum()).astype(np.uint8)
+        return np.packbits(result_bits)
+
+    @pytest.mark.parametrize("n", [2, 3, 4, 7, 16])
+    @pytest.mark.parametrize("D,packed", [(10_000, 1250), (512, 64), (20, 3)])
+    def test_matches_legacy_output(self, n, D, packed):
+        rng = np.random.RandomState(n * 31 + D)
+        vectors = rng.randint(0, 256, size=(n, packed), dtype=np.uint8)
+        expected = self._legacy_bundle(list(vectors), D, seed=123)
+        np.testing.assert_array_equal(bundle_binary(vectors, D=D, seed=123), expected)
+        np.testing.assert_array_equal(bundle_binary(list(vectors), D=D, seed=123), expected)
+
+
+class TestHammingDistance:
+
+    @staticmethod
+    def _reference(query, candidates):
+        lut = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+        return lut[np.bitwise_xor(query, candidates)].sum(axis=1)
+
+    @pytest.mark.parametrize("packed_dim", [3, 16, 64, 1250, 1256])
+    def test_matches_lut_reference(self, packed_dim):
+        rng = np.random.RandomState(0)
+        query = rng.randint(0, 256, size=packed_dim, dtype=np.uint8)
+        candidates = rng.randint(0, 256, size=(17, packed_dim), dtype=np.uint8)
+        np.testing.assert_array_equal(
+            hamming_distance(query, candidates), self._reference(query, candidates)
+        )
+
+    def test_row_slice_of_larger_matrix(self):
+        """Tiles are row slices of the field buffer — must work on views."""
+        rng = np.random.RandomState(1)
+        buf = rng.randint(0, 256, size=(40, 1250), dtype=np.uint8)
+        query = buf[0]
+        tile = buf[10:20]
+        np.testing.assert_array_equal(
+            hamming_distance(query, tile), self._reference(query, tile)
+        )
+
+    def test_column_prefix_and_strided_views(self):
+        """Cascade prefixes are column slices — the uint64 fast path must not misread them."""
+        rng = np.random.RandomState(3)
+        buf = rng.randint(0, 256, size=(30, 64), dtype=np.uint8)
+        queries = buf[:3, :16]
+        for view in (buf[:, :16], buf[::2, :16], buf[:, 1:17]):
+            np.testing.assert_array_equal(
+                hamming_distance(queries[0], view), self._reference(queries[0], view)
+            )
+            expected = np.stack([self._reference(q, view) for q in queries])
+            np.testing.assert_array_equal(hamming_distance_many(queries, view), expected)
+
+    @pytest.mark.parametrize("packed_dim", [3, 16, 64, 1250])
+    def test_many_matches_single(self, packed_dim):
+        rng = np.random.RandomState(2)
+        queries = rng.randint(0, 256, size=(4, packed_dim), dtype=np.uint8)
+        candidates = rng.randint(0, 256, size=(9, packed_dim), dtype=np.uint8)
+        expected = np.stack([self._reference(q, candidates) for q in queries])
+        np.testing.assert_array_equal(hamming_distance_many(queries, candidates), expected)
+
+    def test_1d_candidate(self):
+        v = np.array([0xFF, 0x0F], dtype=np.uint8)
+        assert hamming_distance(v, np.zeros(2, dtype=np.uint8)).tolist() == [12]
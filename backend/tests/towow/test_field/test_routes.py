@@ -0,0 +1,213 @@
+"""
+Tests for the V2 Intent Field HTTP routes (/field/api/*).
+
+Uses a real MemoryField over the deterministic HashPipeline test double.
+"""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from towow.field.cache import MatchResultCache
+from towow.field.field import MemoryField
+from towow.field.multi_perspective import MultiPerspectiveResult
+from towow.field.routes import field_router
+
+from .test_memory_field import HashPipeline
+
+
+def _create_test_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(field_router)
+    app.state.field = MemoryField(HashPipeline(packed_dim=64))
+    return app
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(_create_test_app())
+
+
+def _ndjson(rows: list[dict]) -> bytes:
+    return "\n".join(json.dumps(r) for r in rows).encode()
+
+
+class TestDepositBulk:
+
+    def test_ingests_ndjson(self, client):
+        rows = [{"text": f"intent {i}", "owner": f"o{i % 4}"} for i in range(10)]
+        resp = client.post("/field/api/deposit-bulk?batch_size=3", content=_ndjson(rows))
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["received"] == 10
+        assert body["deposited"] == 10
+        assert body["rejected"] == 0
+        assert body["total_intents"] == 10
+
+        match = client.post("/field/api/match", json={"text": "intent 7", "k": 1})
+        assert match.json()["results"][0]["text"] == "intent 7"
+
+    def test_streamed_body_split_mid_line(self, client):
+        payload = _ndjson([{"text": f"t{i}", "owner": "o"} for i in range(5)])
+
+        def chunks():
+            for i in range(0, len(payload), 7):
+                yield payload[i:i + 7]
+
+        resp = client.post("/field/api/deposit-bulk", content=chunks())
+        assert resp.json()["deposited"] == 5
+
+    def test_reports_bad_lines(self, client):
+        payload = b"\n".join([
+            json.dumps({"text": "good", "owner": "a"}).encode(),
+            b"not json",
+            json.dumps({"text": "", "owner": "a"}).encode(),
+            b"",
+            json.dumps({"text": "   ", "owner": "a"}).encode(),
+            json.dumps({"text": "also good", "owner": "b"}).encode(),
+        ])
+        resp = client.post("/field/api/deposit-bulk?batch_size=1", content=payload)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["received"] == 5
+        assert body["deposited"] == 2
+        assert body["rejected"] == 3
+        assert body["total_intents"] == 2
+        assert [e.split(":")[0] for e in body["errors"]] == ["line 2", "line 3", "line 5"]
+
+    def test_rejects_oversized_line(self, client, monkeypatch):
+        monkeypatch.setattr("towow.field.routes._BULK_MAX_LINE_BYTES", 10)
+        resp = client.post("/field/api/deposit-bulk", content=b"x" * 50)
+        assert resp.status_code == 413
+
+
+def test_match_rerank_field_is_optional(client):
+    client.post("/field/api/deposit", json={"text": "alpha", "owner": "a"})
+    resp = client.post("/field/api/match", json={"text": "alpha", "k": 1})
+    assert resp.status_code == 200
+    assert resp.json()["results"][0]["owner"] == "a"
+
+
+def test_match_ef_search_reaches_hnsw_index():
+    app = _create_test_app()
+    app.state.field = MemoryField(HashPipeline(packed_dim=64), index="hnsw")
+    client = TestClient(app)
+    for i in range(30):
+        client.post("/field/api/deposit", json={"text": f"skill {i}", "owner": f"o{i}"})
+
+    body = {"text": "skill 12", "k": 3, "ef_search": 128}
+    assert client.post("/field/api/match", json=body).json()["results"][0]["text"] == "skill 12"
+    assert client.post("/field/api/match-owners", json=body).status_code == 200
+    assert client.post("/field/api/match", json={**body, "ef_search": -1}).status_code == 422
+    index = client.get("/field/api/stats").json()["diagnostics"]["index"]
+    assert (index["kind"], index["live"]) == ("hnsw", 30)
+
+
+def test_match_filters(client):
+    for owner, text, meta in [
+        ("h_alice", "rust engineer", {"city": "sh"}),
+        ("s_bob", "rust engineer too", {"city": "bj"}),
+        ("h_carol", "rust engineering lead", {"city": "bj"}),
+    ]:
+        client.post("/field/api/deposit", json={"text": text, "owner": owner, "metadata": meta})
+
+    body = {"text": "rust engineer", "k": 10, "scenes": ["S1_hackathon"], "exclude_owners": ["h_alice"]}
+    results = client.post("/field/api/match", json=body).json()["results"]
+    assert [r["owner"] for r in results] == ["h_carol"]
+
+    owners = client.post(
+        "/field/api/match-owners", json={"text": "rust", "k": 10, "metadata": {"city": "bj"}}
+    ).json()["results"]
+    assert {o["owner"] for o in owners} == {"s_bob", "h_carol"}
+
+    assert client.post("/field/api/match", json={"text": "x", "scenes": ["nope"]}).status_code == 422
+    bad_meta = {"text": "x", "metadata": {"tags": ["a"]}}
+    assert client.post("/field/api/match", json=bad_meta).status_code == 422
+
+
+def test_match_cache_serves_repeats_until_field_changes():
+    app = _create_test_app()
+    app.state.match_cache = MatchResultCache()
+    client = TestClient(app)
+    client.post("/field/api/deposit", json={"text": "rust engineer", "owner": "a"})
+
+    body = {"text": "rust engineer", "k": 5}
+    first = client.post("/field/api/match", json=body).json()
+    assert first["diagnostics"]["match_cache"]["hit"] is False
+    again = client.post("/field/api/match", json={**body, "text": " rust engineer "}).json()
+    assert again["diagnostics"]["match_cache"]["hit"] is True
+    assert again["diagnostics"]["match_cache"]["hit_rate"] == 0.5
+    assert again["results"] == first["results"]
+    # different k / endpoint are separate entries
+    assert not client.post("/field/api/match", json={**body, "k": 1}).json()[
+        "diagnostics"]["match_cache"]["hit"]
+    owners = client.post("/field/api/match-owners", json=body).json()
+    assert owners["diagnostics"]["match_cache"]["hit"] is False
+
+    client.post("/field/api/deposit", json={"text": "rust engineer lead", "owner": "b"})
+    fresh = client.post("/field/api/match", json=body).json()
+    assert fresh["diagnostics"]["match_cache"]["hit"] is False  # generation moved on
+    assert len(fresh["results"]) == 2
+
+    stats = client.get("/field/api/stats").json()["diagnostics"]["match_cache"]
+    assert (stats["hits"], stats["stale"]) == (1, 1)
+
+
+def test_match_without_cache_has_no_cache_diagnostics(client):
+    client.post("/field/api/deposit", json={"text": "alpha", "owner": "a"})
+    assert client.post("/field/api/match", json={"text": "alpha"}).json()["diagnostics"] == {}
+
+
+class StubPerspectives:
+    async def generate(self, demand_text: str) -> MultiPerspectiveResult:
+        return MultiPerspectiveResult(
+            original=demand_text, resonance="intent 1", complement="intent 2", interference="intent 3",
+        )
+
+
+class TestMatchPerspectives:
+
+    def test_sections_and_original(self):
+        app = _create_test_app()
+        app.state.mpg = StubPerspectives()
+        client = TestClient(app)
+        rows = [{"text": f"intent {i}", "owner": f"o{i}"} for i in range(6)]
+        client.post("/field/api/deposit-bulk", content=_ndjson(rows))
+
+        resp = client.post("/field/api/match-perspectives", json={"text": "intent 5", "k": 2})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [s["perspective"] for s in body["perspectives"]] == [
+            "resonance", "complement", "interference",
+        ]
+        assert [s["results"][0]["owner"] for s in body["perspectives"]] == ["o1", "o2", "o3"]
+        assert all(len(s["results"]) == 2 for s in body["perspectives"])
+        assert body["original_results"][0]["owner"] == "o5"
+
+    def test_field_without_match_owners_many(self):
+        class PlainField:
+            """IntentField without the MemoryField-only match_owners_many."""
+
+            def __init__(self, field):
+                self._field = field
+
+            def __getattr__(self, name):
+                if name == "match_owners_many":
+                    raise AttributeError(name)
+                return getattr(self._field, name)
+
+        app = _create_test_app()
+        app.state.mpg = StubPerspectives()
+        rows = [{"text": f"intent {i}", "owner": f"o{i}"} for i in range(6)]
+        TestClient(app).post("/field/api/deposit-bulk", content=_ndjson(rows))
+        app.state.field = PlainField(app.state.field)
+
+        resp = TestClient(app).post("/field/api/match-perspectives", json={"text": "intent 5", "k": 2})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [s["results"][0]["owner"] for s in body["perspectives"]] == ["o1", "o2", "o3"]
+        assert body["original_results"][0]["owner"] == "o5"
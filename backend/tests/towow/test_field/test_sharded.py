@@ -0,0 +1,307 @@
+"""
+Tests for ShardedField — owner-partitioned shards in real worker processes.
+
+The reference for every query is a single MemoryField fed the same deposits:
+scatter-gather results must carry identical scores (ties may order differently
+across shards) and identical owner aggregation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from towow.field.field import MemoryField
+from towow.field.protocols import IntentField
+from towow.field.sharded import ShardedField, _shard_of
+from towow.field.types import MatchFilter
+
+
+class HashPipeline:
+    """Deterministic SHA-256 pipeline; similarity is 1 - hamming / (packed_dim·8)."""
+
+    def __init__(self, packed_dim: int = 32) -> None:
+        self._packed_dim = packed_dim
+        self.encoded: list[str] = []
+
+    @property
+    def packed_dim(self) -> int:
+        return self._packed_dim
+
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        self.encoded.append(text)
+        h = hashlib.sha256(text.encode()).digest()
+        rng = np.random.RandomState(int.from_bytes(h[:4], "big"))
+        return rng.randint(0, 256, size=self._packed_dim, dtype=np.uint8)
+
+    def encode_texts(
+        self, texts: list[str], cache_results: bool = True
+    ) -> list[np.ndarray]:
+        return [self.encode_text(t) for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        if candidates.ndim == 1:
+            candidates = candidates.reshape(1, -1)
+        bits = np.unpackbits(np.bitwise_xor(query, candidates), axis=1)
+        return 1.0 - bits.sum(axis=1) / (candidates.shape[1] * 8)
+
+    def batch_similarity_many(self, queries, candidates):
+        return np.stack([self.batch_similarity(q, candidates) for q in queries])
+
+
+ITEMS = [(f"skill {i}", f"owner_{i % 11}", {"i": i}) for i in range(120)]
+
+
+@pytest_asyncio.fixture
+async def fields():
+    sharded = ShardedField(HashPipeline(), n_shards=3, mp_context="fork")
+    reference = MemoryField(HashPipeline())
+    await sharded.deposit_many(ITEMS)
+    await reference.deposit_many(ITEMS)
+    yield sharded, reference
+    await sharded.close()
+
+
+def _top_scores(results):
+    return [r.score for r in results]
+
+
+@pytest.mark.asyncio
+async def test_satisfies_protocol(fields):
+    sharded, _ = fields
+    assert isinstance(sharded, IntentField)
+
+
+@pytest.mark.asyncio
+async def test_owners_are_partitioned(fields):
+    sharded, _ = fields
+    sizes = await sharded._broadcast("sizes")
+    assert sum(owners for _, owners in sizes) == 11
+    assert all(rows > 0 for rows, _ in sizes)
+    assert await sharded.count() == 120
+    assert await sharded.count_owners() == 11
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["skill 7", "skill 99", "something else"])
+async def test_match_equals_single_field(fields, query):
+    sharded, reference = fields
+    got = await sharded.match(query, k=15)
+    want = await reference.match(query, k=15)
+    assert _top_scores(got) == _top_scores(want)
+    cutoff = want[-1].score
+    assert {(r.owner, r.text) for r in got if r.score > cutoff} == {
+        (r.owner, r.text) for r in want if r.score > cutoff
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("aggregate", ["max", "mean", "softmax"])
+async def test_match_owners_exact(fields, aggregate):
+    sharded, reference = fields
+    got = await sharded.match_owners("skill 12", k=5, max_intents=2, aggregate=aggregate)
+    want = await reference.match_owners("skill 12", k=5, max_intents=2, aggregate=aggregate)
+    assert [m.score for m in got] == pytest.approx([m.score for m in want])
+    cutoff = want[-1].score
+    assert {
+        m.owner: sorted(i.text for i in m.intents) for m in got if m.score > cutoff
+    } == {
+        m.owner: sorted(i.text for i in m.intents) for m in want if m.score > cutoff
+    }
+
+
+@pytest.mark.asyncio
+async def test_filters_forwarded_to_shards(fields):
+    sharded, reference = fields
+    filters = MatchFilter(exclude_owners=("owner_4",), metadata={"i": 37})
+    assert await sharded.match("skill 37", k=5, filters=filters) == []
+
+    filters = MatchFilter(owner_prefixes=("owner_1",), exclude_owners=("owner_10",))
+    got = await sharded.match("skill 21", k=8, filters=filters)
+    want = await reference.match("skill 21", k=8, filters=filters)
+    assert _top_scores(got) == _top_scores(want)
+    assert {r.owner for r in got} == {"owner_1"}
+    owners = await sharded.match_owners("skill 21", k=5, filters=filters)
+    assert [m.owner for m in owners] == ["owner_1"]
+    many = await sharded.match_owners_many(["skill 21"], k=5, filters=filters)
+    assert many[0] == owners
+
+
+@pytest.mark.asyncio
+async def test_many_variants_align_with_texts(fields):
+    sharded, _ = fields
+    many = await sharded.match_many(["skill 1", "", "skill 2"], k=3)
+    assert many[1] == []
+    assert many[0] == await sharded.match("skill 1", k=3)
+    owners = await sharded.match_owners_many(["  ", "skill 3"], k=2)
+    assert owners[0] == []
+    assert owners[1] == await sharded.match_owners("skill 3", k=2)
+
+
+@pytest.mark.asyncio
+async def test_deposit_dedups_without_reencoding(fields):
+    sharded, _ = fields
+    existing = await sharded.match("skill 5", k=1)
+    before = len(sharded._pipeline.encoded)
+    assert await sharded.deposit(" skill 5 ", "owner_5") == existing[0].intent_id
+    assert len(sharded._pipeline.encoded) == before
+    assert await sharded.count() == 120
+
+
+@pytest.mark.asyncio
+async def test_remove_and_remove_owner(fields):
+    sharded, _ = fields
+    target = (await sharded.match("skill 40", k=1))[0]
+    await sharded.remove(target.intent_id)
+    assert await sharded.count() == 119
+    assert target.intent_id not in {r.intent_id for r in await sharded.match("skill 40", k=5)}
+
+    owner_rows = sum(1 for _, owner, _ in ITEMS if owner == "owner_3")
+    assert await sharded.remove_owner("owner_3") == owner_rows
+    assert await sharded.count_owners() == 10
+    assert all(m.owner != "owner_3" for m in await sharded.match_owners("skill 3", k=11))
+
+
+@pytest.mark.asyncio
+async def test_upsert_routes_to_owning_shard(fields):
+    sharded, reference = fields
+    for field in fields:
+        target = (await field.match("skill 40", k=1))[0].intent_id
+        assert await field.upsert(target, "rewritten skill") == target
+        await field.upsert("new-id", "brand new", owner="owner_2")
+    got = await sharded.match("rewritten skill", k=5)
+    want = await reference.match("rewritten skill", k=5)
+    assert _top_scores(got) == _top_scores(want)
+    assert got[0].text == "rewritten skill"
+    assert (await sharded.match("brand new", k=1))[0].intent_id == "new-id"
+    assert await sharded.count() == 121
+
+    with pytest.raises(KeyError):
+        await sharded.upsert("missing", "text")
+    # conflicts detected inside the shard come back to the caller
+    with pytest.raises(ValueError, match="already has intent"):
+        await sharded.upsert("new-id", "skill 2", owner="owner_2")
+
+
+@pytest.mark.asyncio
+async def test_generation_advances_on_content_changes(fields):
+    for field in fields:
+        first = (await field.match("skill 3", k=1))[0]
+        generation = field.generation
+        await field.deposit(first.text, first.owner)  # dedup hit
+        await field.remove("missing")
+        assert await field.remove_owner("nobody") == 0
+        assert field.generation == generation
+
+        new_id = await field.deposit("fresh skill", "owner_1")
+        assert field.generation > generation
+        generation = field.generation
+        await field.remove(new_id)
+        assert field.generation > generation
+
+
+@pytest.mark.asyncio
+async def test_cascade_runs_inside_shards():
+    sharded = ShardedField(
+        HashPipeline(), n_shards=2, mp_context="fork", cascade_bits=128, cascade_multiplier=2
+    )
+    try:
+        await sharded.deposit_many(ITEMS)
+        for query in ("skill 3", "skill 77"):
+            got = await sharded.match(query, k=3)
+            assert got[0].text == query
+            assert got[0].score == pytest.approx(1.0)
+            assert (await sharded.match_many([query], k=3))[0] == got
+    finally:
+        await sharded.close()
+
+
+@pytest.mark.asyncio
+async def test_hnsw_index_inside_shards(monkeypatch):
+    monkeypatch.setattr("towow.field.field._INDEX_REBUILD_MIN", 8)  # forked shards inherit it
+    with pytest.raises(ValueError, match="Unknown index"):
+        ShardedField(HashPipeline(), n_shards=2, index="faiss")
+    sharded = ShardedField(
+        HashPipeline(packed_dim=64), n_shards=2, mp_context="fork",
+        index="hnsw", ef_search=16, maintenance_interval=0,
+    )
+    try:
+        ids = await sharded.deposit_many(ITEMS)
+        for query in ("skill 3", "skill 77"):
+            got = await sharded.match(query, k=3, ef_search=64)
+            assert got[0].text == query
+            assert got[0].score == pytest.approx(1.0)
+        for iid in ids[:60]:
+            await sharded.remove(iid)
+        assert await sharded.rebuild_index()
+        assert not await sharded.rebuild_index()
+        assert (await sharded.match("skill 90", k=1))[0].intent_id == ids[90]
+    finally:
+        await sharded.close()
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate(fields):
+    sharded, _ = fields
+    with pytest.raises(ValueError, match="aggregate"):
+        await sharded.match_owners("skill 1", aggregate="median")
+    with pytest.raises(ValueError, match="empty"):
+        await sharded.deposit("  ", "owner_1")
+    # exceptions raised inside a shard process come back to the caller
+    with pytest.raises(AttributeError):
+        await sharded._call(0, "no_such_op")
+    assert await sharded.count() == 120
+
+
+@pytest.mark.asyncio
+async def test_expiry_and_compaction_run_inside_shards():
+    field = ShardedField(
+        HashPipeline(), n_shards=2, mp_context="fork", ttl_by_type={"demand": 30},
+        maintenance_interval=0,
+    )
+    try:
+        await field.deposit_many(
+            [(f"need {i}", f"owner_{i % 7}", {"type": "demand"}) for i in range(40)]
+            + [(f"profile {i}", f"owner_{i % 7}", None) for i in range(10)]
+        )
+        assert await field.expire(now=time.time() + 10) == 0
+        assert await field.expire(now=time.time() + 60) == 40
+        assert await field.count() == 10
+        assert all(r.text.startswith("profile") for r in await field.match("need 3", k=20))
+        assert not await field.compact()
+    finally:
+        await field.close()
+
+
+def test_shard_of_is_stable():
+    assert _shard_of("alice", 4) == _shard_of("alice", 4)
+    assert {_shard_of(f"o{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_spawned_shards_roundtrip():
+    """Default spawn context: each shard re-imports towow.field (sentence_transformers)."""
+    field = ShardedField(HashPipeline(), n_shards=2)
+    try:
+        iid = await field.deposit("hello world", "alice")
+        assert (await field.match("hello world", k=1))[0].intent_id == iid
+    finally:
+        await field.close()
+
+
+@pytest.mark.asyncio
+async def test_maintenance_only_runs_while_shards_have_work():
+    field = ShardedField(HashPipeline(), n_shards=2, mp_context="fork", maintenance_interval=0.01)
+    try:
+        await field.deposit_many([(f"t{i}", f"owner_{i}", None) for i in range(5)])
+        assert field._maintenance is None
+        await field.remove_owner("owner_0")
+        assert field._maintenance is not None
+        await asyncio.wait_for(field._maintenance, timeout=5)
+    finally:
+        await field.close()
@@ -0,0 +1,374 @@
+"""
+Tests for SharedMemoryField — one shared-memory segment, many attached fields.
+
+Two SharedMemoryField instances attached to the same segment behave like two
+uvicorn workers (separate lock-file descriptors conflict under flock even
+within one process); one test also writes from a real child process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing as mp
+import uuid
+
+import numpy as np
+import pytest
+
+from towow.field.field import MemoryField
+from towow.field.shared import _H_SEQ, SharedMemoryField
+from towow.field.types import MatchFilter
+
+
+class HashPipeline:
+    """Deterministic SHA-256 pipeline (module level so child processes can build it)."""
+
+    def __init__(self, packed_dim: int = 32) -> None:
+        self._packed_dim = packed_dim
+
+    @property
+    def packed_dim(self) -> int:
+        return self._packed_dim
+
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        h = hashlib.sha256(text.encode()).digest()
+        rng = np.random.RandomState(int.from_bytes(h[:4], "big"))
+        return rng.randint(0, 256, size=self._packed_dim, dtype=np.uint8)
+
+    def encode_texts(
+        self, texts: list[str], cache_results: bool = True
+    ) -> list[np.ndarray]:
+        return [self.encode_text(t) for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        if candidates.ndim == 1:
+            candidates = candidates.reshape(1, -1)
+        bits = np.unpackbits(np.bitwise_xor(query, candidates), axis=1)
+        return 1.0 - bits.sum(axis=1) / (candidates.shape[1] * 8)
+
+    def batch_similarity_many(self, queries, candidates):
+        return np.stack([self.batch_similarity(q, candidates) for q in queries])
+
+
+@pytest.fixture
+def segment(tmp_path):
+    """(name, lock_path) of a fresh segment; unlinked after the test."""
+    name = f"towow-test-{uuid.uuid4().hex[:12]}"
+    lock_path = tmp_path / "field.lock"
+    opened: list[SharedMemoryField] = []
+
+    def attach(**kwargs) -> SharedMemoryField:
+        kwargs.setdefault("capacity", 256)
+        kwargs.setdefault("arena_bytes", 64 * 1024)
+        field = SharedMemoryField(HashPipeline(), name, lock_path=lock_path, **kwargs)
+        opened.append(field)
+        return field
+
+    yield attach, name, lock_path
+    if opened:
+        opened[0].unlink()
+    for field in opened:
+        if field._header is not None:
+            asyncio.run(field.close())
+
+
+@pytest.mark.asyncio
+async def test_writes_visible_to_other_attachments(segment):
+    attach, _, _ = segment
+    writer, reader = attach(), attach()
+    assert writer._created and not reader._created
+
+    iid = await writer.deposit("distributed systems engineer", "alice", {"scene": "h_1"})
+    await writer.deposit("product designer", "bob")
+
+    assert await reader.count() == 2
+    assert await reader.count_owners() == 2
+    results = await reader.match("distributed systems engineer", k=1)
+    assert results[0].intent_id == iid
+    assert results[0].owner == "alice"
+    assert results[0].metadata == {"scene": "h_1"}
+    assert results[0].score == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_dedup_across_attachments(segment):
+    attach, _, _ = segment
+    a, b = attach(), attach()
+    first = await a.deposit("same text", "alice")
+    assert await b.deposit("  same text ", "alice") == first
+    ids = await b.deposit_many(
+        [("same text", "alice", None), ("new text", "alice", None), ("new text", "alice", None)]
+    )
+    assert ids[0] == first
+    assert ids[1] == ids[2] != first
+    assert await a.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_remove_and_remove_owner(segment):
+    attach, _, _ = segment
+    a, b = attach(), attach()
+    ids = await a.deposit_many([(f"text {i}", f"owner_{i % 3}", None) for i in range(9)])
+
+    await b.remove(ids[4])
+    assert await a.count() == 8
+    assert ids[4] not in {r.intent_id for r in await a.match("text 4", k=9)}
+
+    assert await b.remove_owner("owner_0") == 3
+    assert await a.count() == 5
+    assert await a.count_owners() == 2
+    remaining = {r.intent_id for r in await a.match("text 1", k=10)}
+    assert remaining == {ids[i] for i in (1, 2, 5, 7, 8)}
+    await a.remove("missing")
+    assert await a.remove_owner("nobody") == 0
+
+
+@pytest.mark.asyncio
+async def test_matches_memory_field(segment):
+    attach, _, _ = segment
+    shared = attach()
+    reference = MemoryField(HashPipeline())
+    items = [(f"skill {i}", f"owner_{i % 7}", {"i": i}) for i in range(60)]
+    await shared.deposit_many(items)
+    await reference.deposit_many(items)
+    await shared.remove_owner("owner_3")
+    await reference.remove_owner("owner_3")
+
+    for query in ("skill 5", "skill 42"):
+        got = await shared.match(query, k=10)
+        want = await reference.match(query, k=10)
+        # Row order differs after swap-removes, so only ties may resolve differently
+        assert [r.score for r in got] == [r.score for r in want]
+        assert {(r.owner, r.text) for r in got if r.score > got[-1].score} == {
+            (r.owner, r.text) for r in want if r.score > want[-1].score
+        }
+        got_owners = await shared.match_owners(query, k=4, aggregate="mean")
+        want_owners = await reference.match_owners(query, k=4, aggregate="mean")
+        assert [m.score for m in got_owners] == [m.score for m in want_owners]
+    many = await shared.match_owners_many(["skill 1", "", "skill 2"], k=3)
+    assert many[1] == []
+    assert [m.owner for m in many[0]] == [m.owner for m in await shared.match_owners("skill 1", k=3)]
+
+
+@pytest.mark.asyncio
+async def test_owner_filters_on_shared_owner_column(segment):
+    attach, _, _ = segment
+    writer, reader = attach(), attach()
+    await writer.deposit_many(
+        [(f"skill {i}", f"{'hs'[i % 2]}_user{i % 5}", None) for i in range(20)]
+    )
+    filters = MatchFilter(owner_prefixes=("h_",), exclude_owners=("h_user0",))
+    results = await reader.match("skill 4", k=20, filters=filters)
+    assert results
+    assert all(r.owner.startswith("h_") and r.owner != "h_user0" for r in results)
+    owners = await reader.match_owners("skill 4", k=5, filters=filters)
+    assert {m.owner for m in owners} == {r.owner for r in results}
+    with pytest.raises(ValueError, match="metadata"):
+        await reader.match("skill 4", filters=MatchFilter(metadata={"i": 1}))
+
+
+@pytest.mark.asyncio
+async def test_compact_keeps_fixed_size_segment(segment):
+    attach, _, _ = segment
+    a, b = attach(capacity=4096), attach(capacity=4096)
+    await a.deposit_many([(f"text {i}", "alice", None) for i in range(5)])
+    assert not await a.compact()
+    await a.deposit("from a", "alice")
+    await b.deposit("from b", "bob")
+    assert (await b.match("from a", k=1))[0].text == "from a"
+    assert (await a.match("from b", k=1))[0].text == "from b"
+
+
+@pytest.mark.asyncio
+async def test_read_retries_when_writer_swaps_concurrently(segment):
+    attach, _, _ = segment
+    field = attach()
+    await field.deposit("text", "alice")
+    calls = []
+
+    def scan():
+        calls.append(1)
+        if len(calls) == 1:
+            # Simulate a swap-remove completing in another process mid-scan
+            field._header[_H_SEQ] += 2
+        return len(calls)
+
+    assert await field._read(scan) == 2
+    assert field.stats()["shared_memory"]["read_retries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_waits_for_writer_without_blocking_loop(segment):
+    attach, _, _ = segment
+    field = attach(scan_threads=2)
+    await field.deposit("text", "alice")
+    field._header[_H_SEQ] += 1  # writer mid-swap
+
+    async def writer_finishes():
+        await asyncio.sleep(0.01)
+        field._header[_H_SEQ] += 1
+
+    finisher = asyncio.create_task(writer_finishes())
+    results = await field.match("text", k=1)
+    await finisher
+    assert [r.text for r in results] == ["text"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_rejects_ids_longer_than_id_column(segment):
+    attach, _, _ = segment
+    field = attach()
+    with pytest.raises(ValueError, match="exceeds"):
+        await field.upsert("x" * 40, "text", "alice")
+    assert await field.count() == 0
+    await field.upsert("x" * 36, "text", "alice")
+    await field.remove("x" * 36)
+    assert await field.count() == 0
+
+
+@pytest.mark.asyncio
+async def test_generation_tracks_writes_from_any_attachment(segment):
+    attach, _, _ = segment
+    writer, reader = attach(), attach()
+    ids = await writer.deposit_many([(f"text {i}", "alice", None) for i in range(3)])
+    generation = reader.generation
+    assert generation == writer.generation
+
+    await writer.deposit("text 1", "alice")  # dedup hit
+    assert reader.generation == generation
+    await writer.deposit("text 3", "alice")
+    assert reader.generation > generation
+    # removing rows lowers the count but the seq half still moves the generation up
+    generation = reader.generation
+    assert await writer.remove_owner("alice") == 4
+    assert reader.generation > generation
+    generation = reader.generation
+    await writer.upsert(ids[0], "back again", owner="bob")
+    assert reader.generation > generation
+
+
+@pytest.mark.asyncio
+async def test_arena_compacts_removed_records(segment):
+    attach, _, _ = segment
+    field = attach(arena_bytes=4096)
+    keep = await field.deposit("kept intent", "alice", {"note": "x" * 100})
+    for round_ in range(20):
+        ids = await field.deposit_many(
+            [(f"churn {round_} {i} " + "y" * 100, "bob", None) for i in range(5)]
+        )
+        for iid in ids:
+            await field.remove(iid)
+    stats = field.stats()["shared_memory"]
+    assert stats["arena_used"] < 4096
+    result = (await field.match("kept intent", k=1))[0]
+    assert result.intent_id == keep
+    assert result.metadata == {"note": "x" * 100}
+
+
+@pytest.mark.asyncio
+async def test_arena_compaction_gathers_in_row_chunks(segment, monkeypatch):
+    monkeypatch.setattr("towow.field.shared._COMPACT_ROWS", 3)
+    attach, _, _ = segment
+    writer, reader = attach(arena_bytes=8192), attach()
+    kept = {}
+    for round_ in range(20):
+        ids = await writer.deposit_many(
+            [(f"churn {round_} {i} " + "y" * 100, f"owner{i % 4}", {"i": i}) for i in range(6)]
+        )
+        kept[ids[round_ % 6]] = (f"churn {round_} {round_ % 6} " + "y" * 100, round_ % 6)
+        for iid in ids:
+            if iid not in kept:
+                await writer.remove(iid)
+    assert writer.stats()["shared_memory"]["arena_used"] < 8192
+    assert await reader.count() == len(kept)
+    for iid, (text, i) in kept.items():
+        top = (await reader.match(text, k=1))[0]
+        assert (top.intent_id, top.owner, top.metadata) == (iid, f"owner{i % 4}", {"i": i})
+
+
+@pytest.mark.asyncio
+async def test_upsert_rewrites_row_for_every_attachment(segment):
+    attach, _, _ = segment
+    writer, reader = attach(arena_bytes=4096), attach()
+    ids = await writer.deposit_many([(f"text {i}", "alice", {"i": i}) for i in range(4)])
+
+    for round_ in range(30):  # forces arena compactions between rewrites
+        await writer.upsert(ids[2], f"rewritten {round_} " + "z" * 100)
+    assert await reader.count() == 4
+    top = (await reader.match("rewritten 29 " + "z" * 100, k=1))[0]
+    assert (top.intent_id, top.owner, top.metadata) == (ids[2], "alice", {"i": 2})
+    assert top.score == pytest.approx(1.0)
+    assert await reader.deposit("rewritten 29 " + "z" * 100, "alice") == ids[2]
+
+    await reader.upsert("custom-id", "from reader", owner="bob")
+    assert (await writer.match("from reader", k=1))[0].intent_id == "custom-id"
+    with pytest.raises(ValueError, match="already has"):
+        await writer.upsert(ids[0], "text 1")
+    with pytest.raises(KeyError):
+        await writer.upsert("missing", "text")
+
+
+@pytest.mark.asyncio
+async def test_full_segment_raises(segment):
+    attach, _, _ = segment
+    field = attach(capacity=4)
+    await field.deposit_many([(f"t{i}", "alice", None) for i in range(4)])
+    with pytest.raises(RuntimeError, match="full"):
+        await field.deposit("one more", "alice")
+    assert await field.count() == 4
+
+
+def test_attach_with_incompatible_pipeline_raises(segment):
+    attach, name, lock_path = segment
+    attach()
+    with pytest.raises(ValueError, match="does not match"):
+        SharedMemoryField(HashPipeline(packed_dim=64), name, lock_path=lock_path)
+
+
+def test_index_mih_rejected(segment):
+    attach, _, _ = segment
+    with pytest.raises(ValueError, match="brute"):
+        attach(index="mih")
+
+
+def test_ttl_rejected(segment):
+    attach, _, _ = segment
+    with pytest.raises(ValueError, match="ttl"):
+        attach(ttl=60)
+
+
+def test_cascade_rejected(segment):
+    attach, _, _ = segment
+    with pytest.raises(ValueError, match="cascade"):
+        attach(cascade_bits=64)
+
+
+def _child_deposit(name: str, lock_path: str, texts: list[str]) -> None:
+    async def run() -> None:
+        field = SharedMemoryField(HashPipeline(), name, lock_path=lock_path)
+        await field.deposit_many([(t, "child", None) for t in texts])
+        await field.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.asyncio
+async def test_child_process_writes_are_visible(segment):
+    attach, name, lock_path = segment
+    parent = attach()
+    await parent.deposit("from parent", "parent")
+
+    ctx = mp.get_context("fork")
+    texts = [f"from child {i}" for i in range(10)]
+    proc = ctx.Process(target=_child_deposit, args=(name, str(lock_path), texts))
+    proc.start()
+    proc.join(timeout=30)
+    assert proc.exitcode == 0
+
+    assert await parent.count() == 11
+    hit = (await parent.match("from child 3", k=1))[0]
+    assert (hit.owner, hit.text) == ("child", "from child 3")
+    # the child's exit must not have unlinked the segment
+    late = attach()
+    assert await late.count() == 11
@@ -4,17 +4,31 @@ V2 Intent Field module.
 Core exports:
   - IntentField: Protocol (deposit, match, match_owners)
   - MemoryField: In-memory implementation
+  - PersistentField: MemoryField backed by mmap vectors + WAL
+  - SharedMemoryField: MemoryField in a shared-memory segment, one per host for all workers
+  - ShardedField: owner-partitioned shard processes with scatter-gather top-k
+  - MihIndex: Multi-index hashing index for short binary codes
+  - HnswIndex: Approximate HNSW graph index over Hamming distance, tombstone deletes
   - FieldResult, OwnerMatch, Intent: Data types
+  - MatchFilter: owner-prefix / excluded-owner / metadata predicates for match and match_owners
   - EncodingPipeline, MpnetEncoder, SimHashProjector: Encoding stack
+  - HadamardProjector: Structured (SORF) SimHash alternative, ~130 KB instead of 30 MB
+  - EmbeddingCache: Bounded LRU for query embeddings (EncodingPipeline cache)
+  - MatchResultCache: Bounded LRU for match results, versioned by field generation
   - profile_to_text, load_all_profiles: Profile loading utilities (preserved from V1)
 """
 
-from towow.field.types import FieldResult, Intent, OwnerMatch
+from towow.field.types import FieldResult, Intent, MatchFilter, OwnerMatch
 from towow.field.protocols import IntentField, Encoder, Projector
 from towow.field.field import MemoryField
+from towow.field.index import HnswIndex, MihIndex
+from towow.field.persistent import PersistentField
+from towow.field.shared import SharedMemoryField
+from towow.field.sharded import ShardedField
 from towow.field.encoder import MpnetEncoder, BgeM3Encoder
-from towow.field.projector import SimHashProjector, MrlBqlProjector
+from towow.field.projector import SimHashProjector, MrlBqlProjector, HadamardProjector
 from towow.field.pipeline import EncodingPipeline
+from towow.field.cache import EmbeddingCache, MatchResultCache
 from towow.field.profile_loader import load_profiles_from_json, profile_to_text, load_all_profiles
 from towow.field.multi_perspective import MultiPerspectiveGenerator, MultiPerspectiveResult
 
@@ -27,13 +41,22 @@ __all__ = [
     "Intent",
     "FieldResult",
     "OwnerMatch",
+    "MatchFilter",
     # Implementation
     "MemoryField",
+    "PersistentField",
+    "SharedMemoryField",
+    "ShardedField",
+    "MihIndex",
+    "HnswIndex",
     "MpnetEncoder",
     "BgeM3Encoder",
     "SimHashProjector",
     "MrlBqlProjector",
+    "HadamardProjector",
     "EncodingPipeline",
+    "EmbeddingCache",
+    "MatchResultCache",
     # Multi-perspective query
     "MultiPerspectiveGenerator",
     "MultiPerspectiveResult",
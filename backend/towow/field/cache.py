@@ -0,0 +1,184 @@
+"""
+查询缓存。
+
+EmbeddingCache — 查询编码缓存，规范化文本 → (binary, dense) 的有界 LRU。
+
+相同的需求文本、多视角改写和重复的 /field/api/match 查询不必每次都跑
+模型前向。EncodingPipeline 以 sha256(编码器/投影器身份 + 规范化文本)
+为键查询本缓存；同一个缓存可以被多个 pipeline 共享，身份前缀保证不同
+模型 / 投影的结果互不串用。
+
+容量按条数和字节数双重限制，超出时从最久未用的一端淘汰。
+编码在线程池中执行，所有操作都在一把 threading.Lock 内完成。
+
+MatchResultCache — 匹配结果缓存，(规范化文本, k, max_intents, rerank, filters)
+→ 结果列表。每条记录写入时场的 generation（任何可见变更后都会变化的写入
+代数）；读取时代数不一致即视为过期、丢弃并按未命中处理，写入场时不必整体
+清空。命中同时跳过编码和扫描，按该条目首次计算的耗时累计节省的毫秒数。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+_DEFAULT_MAX_ENTRIES = 4096
+_DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_DEFAULT_MAX_RESULTS = 1024
+
+
+class EmbeddingCache:
+    """线程安全的有界 LRU：key → (binary, dense)。缓存的数组只读。"""
+
+    def __init__(
+        self,
+        max_entries: int = _DEFAULT_MAX_ENTRIES,
+        max_bytes: int = _DEFAULT_MAX_BYTES,
+    ) -> None:
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be positive")
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        """namespace（编码器/投影器身份）+ 规范化文本 → 缓存键。"""
+        return hashlib.sha256(f"{namespace}\0{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[np.ndarray, np.ndarray] | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: str, binary: np.ndarray, dense: np.ndarray) -> None:
+        binary = np.array(binary, copy=True)
+        dense = np.array(dense, copy=True)
+        binary.flags.writeable = False
+        dense.flags.writeable = False
+        size = binary.nbytes + dense.nbytes
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0].nbytes + old[1].nbytes
+            self._entries[key] = (binary, dense)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                _, (b, d) = self._entries.popitem(last=False)
+                self._bytes -= b.nbytes + d.nbytes
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        """命中 / 未命中 / 淘汰计数与当前占用（/field/api/stats 展示）。"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self._max_entries,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class MatchResultCache:
+    """线程安全的有界 LRU：key → (generation, 结果, 计算耗时 ms)。缓存的结果只读。"""
+
+    def __init__(self, max_entries: int = _DEFAULT_MAX_RESULTS) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._saved_ms = 0.0
+
+    @staticmethod
+    def make_key(kind: str, text: str, *params: Any) -> str:
+        """
+        查询种类（"match" / "match_owners"）+ 规范化文本 + 其余参数 → 缓存键。
+
+        参数取 repr：MatchFilter 的 repr 区分 1 / 1.0 / True 这类相等但
+        过滤语义不同的元数据值。
+        """
+        text = unicodedata.normalize("NFC", text).strip()
+        return hashlib.sha256(repr((kind, text, params)).encode()).hexdigest()
+
+    def get(self, key: str, generation: Any) -> tuple[Any, float] | None:
+        """代数一致时返回 (结果, 当初的计算耗时 ms)，否则 None（过期条目顺带删除）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != generation:
+                del self._entries[key]
+                self._stale += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            self._saved_ms += entry[2]
+            return entry[1], entry[2]
+
+    def put(self, key: str, generation: Any, value: Any, cost_ms: float) -> None:
+        """generation 须为计算开始前读到的代数：计算期间有写入时，条目一写入即过期。"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (generation, value, cost_ms)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self._hits + self._misses
+        return round(self._hits / lookups, 4) if lookups else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        """命中 / 未命中 / 过期计数与累计节省的毫秒数（/field/api/stats 展示）。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "stale": self._stale,
+                "hit_rate": self.hit_rate,
+                "saved_ms": round(self._saved_ms, 2),
+            }
@@ -0,0 +1,117 @@
+"""
+BlobColumn — 与向量行对齐的变长字节列（MemoryField 的文本 / 元数据存储）。
+
+每行一段 bytes，全部存放在一块 bytearray 里，行只记 (offset, length)
+两个 numpy 整数列，不为每行保留 Python 对象。行操作与向量矩阵的
+swap 删除约定一致：
+- append_many: 追加到末尾（一次 join）
+- set: 原地改写一行，旧字节成为垃圾
+- swap_remove: 末行的 (offset, length) 搬到被删行，被删行的字节成为垃圾
+
+垃圾超过数据区一半时整体压缩（按行块 gather，临时内存有界），摊还 O(1)。
+调用方负责并发控制（MemoryField 在写锁内修改；读线程无锁读取，set / swap_remove
+/ 压缩发生在 seqlock 写区间内，撕裂的读由代计数校验作废）。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+# 垃圾低于该字节数时不压缩（小场反复压缩不划算）
+_MIN_COMPACT_BYTES = 1 << 20
+# 压缩时每次 gather 的行数（下标数组约 8 × 该块字节数）
+_COMPACT_ROWS = 65_536
+
+
+class BlobColumn:
+    """行对齐的变长字节列。"""
+
+    def __init__(self, capacity: int) -> None:
+        self._data = bytearray()
+        self._offsets = np.zeros(capacity, dtype=np.int64)
+        self._lengths = np.zeros(capacity, dtype=np.int32)
+        self._count = 0
+        self._garbage = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """数据区 + 偏移 / 长度列占用的字节数。"""
+        return len(self._data) + self._offsets.nbytes + self._lengths.nbytes
+
+    def get(self, row: int) -> bytes:
+        offset = int(self._offsets[row])
+        return bytes(self._data[offset : offset + int(self._lengths[row])])
+
+    def copy(self) -> BlobColumn:
+        """当前各行的独立副本（数据区与偏移 / 长度列都复制），供锁外读取。"""
+        n = self._count
+        clone = BlobColumn(n)
+        clone._data = bytearray(self._data)
+        clone._offsets[:] = self._offsets[:n]
+        clone._lengths[:] = self._lengths[:n]
+        clone._count = n
+        clone._garbage = self._garbage
+        return clone
+
+    def resize(self, capacity: int) -> None:
+        """偏移 / 长度列换成 capacity 行（capacity 不小于当前行数）。"""
+        n = self._count
+        offsets = np.zeros(capacity, dtype=np.int64)
+        lengths = np.zeros(capacity, dtype=np.int32)
+        offsets[:n] = self._offsets[:n]
+        lengths[:n] = self._lengths[:n]
+        self._offsets, self._lengths = offsets, lengths
+
+    def append_many(self, blobs: list[bytes]) -> None:
+        start = self._count
+        end = start + len(blobs)
+        lengths = np.fromiter(map(len, blobs), dtype=np.int64, count=len(blobs))
+        self._offsets[start:end] = len(self._data) + np.cumsum(lengths) - lengths
+        self._lengths[start:end] = lengths
+        self._data += b"".join(blobs)
+        self._count = end
+
+    def set(self, row: int, blob: bytes) -> None:
+        self._garbage += int(self._lengths[row])
+        self._offsets[row] = len(self._data)
+        self._lengths[row] = len(blob)
+        self._data += blob
+        self._maybe_compact()
+
+    def swap_remove(self, row: int) -> None:
+        self._garbage += int(self._lengths[row])
+        last = self._count - 1
+        if row != last:
+            self._offsets[row] = self._offsets[last]
+            self._lengths[row] = self._lengths[last]
+        self._count = last
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if self._garbage > max(_MIN_COMPACT_BYTES, len(self._data) // 2):
+            self.compact()
+
+    def compact(self) -> None:
+        """按行序把存活字节紧凑地搬到新数据区。"""
+        n = self._count
+        src = np.frombuffer(self._data, dtype=np.uint8)
+        lengths = self._lengths[:n].astype(np.int64)
+        new_offsets = np.cumsum(lengths) - lengths
+        packed = bytearray(int(lengths.sum()))
+        dst = np.frombuffer(packed, dtype=np.uint8)
+        for lo in range(0, n, _COMPACT_ROWS):
+            hi = min(n, lo + _COMPACT_ROWS)
+            size = lengths[lo:hi]
+            total = int(size.sum())
+            if total == 0:
+                continue
+            base = int(new_offsets[lo])
+            shift = np.repeat(self._offsets[lo:hi] - (new_offsets[lo:hi] - base), size)
+            dst[base : base + total] = src[shift + np.arange(total)]
+        del src, dst  # 释放缓冲区导出，之后 bytearray 才能再增长
+        self._data = packed
+        self._offsets[:n] = new_offsets
+        self._garbage = 0
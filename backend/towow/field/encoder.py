@@ -31,6 +31,7 @@ class MpnetEncoder:
 
     def __init__(self, model_name: str = _MPNET_MODEL) -> None:
         logger.info("Loading encoder model: %s", model_name)
+        self.model_name = model_name
         self._model = SentenceTransformer(model_name)
         self._dim = self._model.get_sentence_embedding_dimension()
         logger.info("Encoder ready: dim=%d", self._dim)
@@ -73,6 +74,7 @@ class BgeM3Encoder:
         logger.info(
             "Loading encoder model: %s (truncate_dim=%s)", model_name, truncate_dim
         )
+        self.model_name = model_name
         self._model = SentenceTransformer(model_name)
         self._full_dim = self._model.get_sentence_embedding_dimension()
         self._truncate_dim = truncate_dim
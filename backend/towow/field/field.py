@@ -4,50 +4,259 @@ MemoryField — V2 IntentField 的内存实现。
 持久内存场：Intent deposit 后持续存在，不随请求销毁。
 支持 Intent 级匹配（match）和 Owner 级聚合（match_owners）。
 
-存储结构：
-- _intents: dict[intent_id → Intent]
+存储结构（列式，与向量行对齐）：
 - _vectors: uint8[N, packed_dim] 紧凑矩阵（packed_dim 从 pipeline 获取）
 - _id_index: list[intent_id]（行号 → id 映射）
 - _pos_index: dict[intent_id → int]（id → 行号反向索引，O(1) 删除）
-- _owner_index: dict[owner → set[intent_id]]
-- _dedup: set[hash]（去重键）
+- _owner_col: int32[N]（owner 编码列，编码表 _owner_names）
+- _texts / _metas: BlobColumn（文本 / 元数据紧凑 JSON）
+- _meta_index: dict[(key, value) → set[行号]]（标量元数据倒排）
+- _dedup: dict[hash → intent_id]（去重键）
+
+索引、读写并发、级联、过期等设计见 docs/engineering/DEV_LOG_V2.md。
 """
 
 from __future__ import annotations
 
 import asyncio
+import functools
 import hashlib
+import heapq
+import json
 import logging
+import time
 import uuid
 from collections import defaultdict
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, TypeVar
 
 import numpy as np
 
+from towow.field.columns import BlobColumn
+from towow.field.index import HnswIndex, MihIndex
 from towow.field.pipeline import EncodingPipeline
-from towow.field.types import FieldResult, Intent, OwnerMatch
+from towow.field.projector import hamming_distance, hamming_distance_many
+from towow.field.types import FieldResult, Intent, MatchFilter, OwnerMatch
+
+if TYPE_CHECKING:
+    from towow.infra.encode_batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
 _INITIAL_CAPACITY = 1024
 
+# 每个扫描块的字节预算（约 L2/L3 级别）。SimHash 1250B → ~3.3k 行/块，
+# MRL+BQL 64B → 64k 行/块
+_SCAN_TILE_BYTES = 4 * 1024 * 1024
+
+# 无锁读（读线程）与写者冲突时的重试次数，之后改持共享锁读取
+_OPTIMISTIC_READS = 3
+
+# 可选检索后端
+_INDEX_KINDS = ("brute", "mih", "hnsw")
+
+# HNSW 墓碑超过存活节点的该比例（且不少于 _INDEX_REBUILD_MIN 个）时后台重建
+_INDEX_REBUILD_RATIO = 0.25
+_INDEX_REBUILD_MIN = 1024
+
+# 密集副本的存储精度。int8 按 127 线性量化（输入已归一化，分量 ∈ [-1, 1]）
+_DENSE_DTYPES = ("float16", "int8")
+_INT8_SCALE = 127.0
+
+# Owner 分数聚合：max = 最佳 Intent；mean / softmax = 前 max_intents 条的
+# 均值 / softmax 加权均值（温度越低越接近 max）
+_OWNER_AGGREGATES = ("max", "mean", "softmax")
+_SOFTMAX_TEMPERATURE = 0.05
+
+# owner 前缀表缓存上限（每个前缀一张 bool[owner 数] 表）
+_PREFIX_TABLE_LIMIT = 64
+
+# 过滤扫描：块内选中行覆盖的区间不超过行数的该倍数时整段打分再取出，
+# 比 gather 复制更快（如只排除个别 owner）；更稀疏时才 gather
+_SPAN_SCAN_RATIO = 1.25
+
+# 进入元数据倒排的值类型
+_INDEXED_SCALARS = (str, int, float, bool, type(None))
+
+# 过期：单条 Intent 的 TTL 元数据键、按类型取 TTL 的元数据键，
+# 以及每次持写锁最多淘汰的行数（批间让出事件循环）
+_TTL_KEY = "ttl"
+_TTL_TYPE_KEY = "type"
+_EXPIRE_BATCH = 4096
+
+
+def _dedup_key(owner: str, text: str) -> bytes:
+    """(owner, text) 去重键：sha256 前 16 字节（比 64 字符的 hex 串小一半以上）。"""
+    return hashlib.sha256(f"{owner}|{text}".encode()).digest()[:16]
+
+
+def _encode_metadata(metadata: dict) -> bytes:
+    """元数据 → 紧凑 JSON 字节；空元数据不占字节。"""
+    if not metadata:
+        return b""
+    return json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _decode_metadata(blob: bytes) -> dict:
+    """_encode_metadata 的逆。倒排按解码后的副本建（非 str 键已变为 str），与删除时读回的一致。"""
+    return json.loads(blob) if blob else {}
+
+
+def _meta_key(key: str, value: Any) -> tuple | None:
+    """元数据 (key, value) → 倒排键；非标量值不建索引（返回 None）。bool 与 1 / 0 区分。"""
+    if not isinstance(value, _INDEXED_SCALARS):
+        return None
+    return (key, isinstance(value, bool), value)
+
+
+class _ReadWriteLock:
+    """
+    asyncio 读写锁。`async with lock` 为写者独占（与 asyncio.Lock 用法相同），
+    `async with lock.shared()` 为读者共享。写者优先：有写者等待时新读者排队，
+    持续的查询不会饿死 deposit / remove。
+    """
+
+    def __init__(self) -> None:
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    async def __aenter__(self) -> None:
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    async def __aexit__(self, *exc: object) -> None:
+        async with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def shared(self) -> AsyncIterator[None]:
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: not self._writer and self._waiting_writers == 0
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
 
 class MemoryField:
     """内存持久场。满足 IntentField Protocol。"""
 
-    def __init__(self, pipeline: EncodingPipeline) -> None:
+    def __init__(
+        self,
+        pipeline: EncodingPipeline,
+        scan_tile_bytes: int = _SCAN_TILE_BYTES,
+        index: str = "brute",
+        dense_dtype: str | None = None,
+        encode_executor: Executor | None = None,
+        encode_batcher: MicroBatcher | None = None,
+        owner_aggregate: str = "max",
+        scan_threads: int = 0,
+        ttl: float | None = None,
+        ttl_by_type: dict[str, float] | None = None,
+        compact_below: float = 0.25,
+        maintenance_interval: float = 1.0,
+        cascade_bits: int = 0,
+        cascade_multiplier: int = 8,
+        ef_search: int = 64,
+    ) -> None:
+        if index not in _INDEX_KINDS:
+            raise ValueError(
+                f"Unknown index '{index}', expected one of {_INDEX_KINDS}"
+            )
+        if dense_dtype is not None and dense_dtype not in _DENSE_DTYPES:
+            raise ValueError(
+                f"Unknown dense_dtype '{dense_dtype}', expected one of {_DENSE_DTYPES}"
+            )
+        if owner_aggregate not in _OWNER_AGGREGATES:
+            raise ValueError(
+                f"Unknown owner_aggregate '{owner_aggregate}', "
+                f"expected one of {_OWNER_AGGREGATES}"
+            )
+        if scan_threads < 0:
+            raise ValueError("scan_threads must be >= 0")
+        ttls = [*([ttl] if ttl is not None else []), *(ttl_by_type or {}).values()]
+        if any(t <= 0 for t in ttls):
+            raise ValueError("ttl values must be > 0 seconds")
+        if not 0.0 <= compact_below < 0.5:
+            raise ValueError("compact_below must be in [0, 0.5)")
+        if cascade_bits % 8 or not 0 <= cascade_bits < pipeline.packed_dim * 8:
+            raise ValueError(
+                "cascade_bits must be a multiple of 8 shorter than the code "
+                f"({pipeline.packed_dim * 8} bits)"
+            )
+        if cascade_multiplier < 1:
+            raise ValueError("cascade_multiplier must be >= 1")
+        if ef_search < 1:
+            raise ValueError("ef_search must be >= 1")
+        self._owner_aggregate = owner_aggregate
         self._pipeline = pipeline
         self._packed_dim = pipeline.packed_dim
-        self._lock = asyncio.Lock()
+        self._lock = _ReadWriteLock()
+        # 扫描线程：0 = 在事件循环上同步扫描；N > 0 = 查询在读线程中执行，
+        # 矩阵按行区间切成至多 N 段在扫描线程池中并行打分
+        self._scan_threads = scan_threads
+        # seqlock：破坏性变更期间为奇数；_appends 在每次追加开始时加一，
+        # 用来判断读线程中的异常是否由并发写入引起
+        self._generation = 0
+        self._appends = 0
+        self._optimistic_readers = 0
+        self._drained: asyncio.Future | None = None
+        self._read_retries = 0
+        self._read_fallbacks = 0
+        self._read_executor: ThreadPoolExecutor | None = None
+        self._scan_pool: ThreadPoolExecutor | None = None
+        if scan_threads > 0:
+            self._read_executor = ThreadPoolExecutor(
+                max_workers=scan_threads, thread_name_prefix="field-read"
+            )
+        if scan_threads > 1:
+            self._scan_pool = ThreadPoolExecutor(
+                max_workers=scan_threads, thread_name_prefix="field-scan"
+            )
+        # 编码专用执行器（默认单线程：模型前向串行，但不阻塞事件循环）
+        self._owns_executor = encode_executor is None
+        self._encode_executor: Executor = encode_executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="field-encode"
+        )
+        self._encode_batcher = encode_batcher
+        self._tile_rows = max(1, scan_tile_bytes // max(1, self._packed_dim))
+        self._index: MihIndex | HnswIndex | None = None
+        if index == "mih":
+            self._index = MihIndex(self._packed_dim)
+        elif index == "hnsw":
+            self._index = HnswIndex(self._packed_dim, ef_search=ef_search)
+        # HNSW 后台重建期间的索引变更 (intent_id, 新码 | None = 删除)，换图前补放
+        self._index_log: list[tuple[str, np.ndarray | None]] | None = None
+        self._index_rebuilds = 0
 
         # 核心存储
-        self._intents: dict[str, Intent] = {}
         self._vectors: np.ndarray = np.empty(
             (0, self._packed_dim), dtype=np.uint8
         )
         self._id_index: list[str] = []
         self._pos_index: dict[str, int] = {}  # intent_id → row position
-        self._owner_index: defaultdict[str, set[str]] = defaultdict(set)
-        self._dedup: set[str] = set()
+        self._meta_index: defaultdict[tuple, set[int]] = defaultdict(set)
+        self._prefix_tables: dict[str, np.ndarray] = {}
+        self._dedup: dict[bytes, str] = {}  # dedup key → intent_id
 
         # 容量管理
         self._capacity = _INITIAL_CAPACITY
@@ -56,6 +265,48 @@ class MemoryField:
         )
         self._active_count = 0
 
+        # owner 编码列（与向量行对齐）。编码只增不回收：已离场 owner 的编码
+        # 不出现在列中，聚合时自然为空；_owner_live 为各编码的存活行数
+        self._owner_codes: dict[str, int] = {}
+        self._owner_names: list[str] = []
+        self._owner_col: np.ndarray = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._owner_live: list[int] = []
+        self._live_owners = 0
+
+        # 文本、元数据与创建时间列（与向量行对齐）
+        self._texts = BlobColumn(_INITIAL_CAPACITY)
+        self._metas = BlobColumn(_INITIAL_CAPACITY)
+        self._created_col: np.ndarray = np.zeros(_INITIAL_CAPACITY, dtype=np.float64)
+
+        # 可选：码前缀的连续副本（MRL 级联粗排用），0 字节表示不启用
+        self._cascade_bytes = cascade_bits // 8
+        self._cascade_multiplier = cascade_multiplier
+        self._prefix_buf: np.ndarray | None = None
+        if self._cascade_bytes:
+            self._prefix_buf = np.zeros(
+                (_INITIAL_CAPACITY, self._cascade_bytes), dtype=np.uint8
+            )
+
+        # 可选：密集向量副本（两阶段检索精排用）
+        self._dense_dtype = dense_dtype
+        self._dense_buf: np.ndarray | None = None
+        if dense_dtype is not None:
+            self._dense_buf = np.zeros(
+                (_INITIAL_CAPACITY, pipeline.dense_dim), dtype=dense_dtype
+            )
+
+        # 过期与缩容：_expires 是有 TTL 的存活 Intent 的到期时间，堆中与之
+        # 不一致的项（已删除）弹出时丢弃
+        self._ttl = ttl
+        self._ttl_by_type = dict(ttl_by_type or {})
+        self._compact_below = compact_below
+        self._maintenance_interval = maintenance_interval
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._expires: dict[str, float] = {}
+        self._maintenance: asyncio.Task | None = None
+        self._expired_total = 0
+        self._compactions = 0
+
     async def deposit(
         self, text: str, owner: str, metadata: dict | None = None
     ) -> str:
@@ -65,165 +316,1351 @@ class MemoryField:
         if not owner or not owner.strip():
             raise ValueError("Cannot deposit without owner")
 
-        # 去重
-        dedup_key = hashlib.sha256(f"{owner}|{text}".encode()).hexdigest()
+        # 去重（与 deposit_many 一致，按去掉首尾空白的文本取键）
+        text = text.strip()
+        dedup_key = _dedup_key(owner, text)
+        existing = self._dedup.get(dedup_key)
+        if existing is not None:
+            return existing
+
+        intent_id = str(uuid.uuid4())
+        intent = Intent(
+            id=intent_id,
+            owner=owner,
+            text=text,
+            metadata=metadata or {},
+        )
+
+        # 编码：锁外、事件循环外
+        binary_vec, dense_vec = await self._encode_one(intent.text)
+
+        async with self._lock:
+            # 编码期间并发 deposit 可能已写入同一 (owner, text)
+            existing = self._dedup.get(dedup_key)
+            if existing is not None:
+                return existing
+            self._append_locked(intent, binary_vec, dense_vec)
+            self._dedup[dedup_key] = intent_id
+        self._ensure_maintenance()
+
+        logger.debug(
+            "Deposited intent %s for owner %s (%d chars)",
+            intent_id[:8], owner, len(text),
+        )
+        return intent_id
+
+    async def upsert(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """
+        按 intent_id 改写 Intent 的文本（metadata 非 None 时一并替换）。
+
+        重新编码后原地覆盖该行的向量，行号不变，owner 与 created_at 保留。
+        intent_id 不在场内时以该 id 新建，此时必须给出 owner，否则 KeyError。
+        新文本与同 owner 的另一条 Intent 重复时 ValueError。返回 intent_id。
+        """
+        if not text or not text.strip():
+            raise ValueError("Cannot deposit empty text")
+        if owner is not None and not owner.strip():
+            raise ValueError("Cannot deposit without owner")
+        text = text.strip()
+        current = self._intent(intent_id)
+        if (
+            current is not None
+            and current.text == text
+            and metadata is None
+            and owner in (None, current.owner)
+        ):
+            return intent_id
+
+        binary_vec, dense_vec = await self._encode_one(text)
         async with self._lock:
-            if dedup_key in self._dedup:
-                # 找到已存在的 intent_id 并返回
-                for iid, intent in self._intents.items():
-                    if intent.owner == owner and intent.text == text:
-                        return iid
-                # dedup 集合和 intents 不一致，清理并继续
-                self._dedup.discard(dedup_key)
-
-            intent_id = str(uuid.uuid4())
-            intent = Intent(
-                id=intent_id,
+            self._upsert_locked(intent_id, text, owner, metadata, binary_vec, dense_vec)
+        self._ensure_maintenance()
+        return intent_id
+
+    def _upsert_locked(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None,
+        metadata: dict | None,
+        binary_vec: np.ndarray,
+        dense_vec: np.ndarray | None,
+    ) -> None:
+        """锁内复核（编码期间可能有并发写入）后新建或原地改写。调用方必须持有 self._lock。"""
+        current = self._intent(intent_id)
+        if current is None and owner is None:
+            raise KeyError(f"Unknown intent_id '{intent_id}'")
+        if current is not None and owner is not None and owner != current.owner:
+            raise ValueError(
+                f"Intent {intent_id} belongs to '{current.owner}', cannot move it to '{owner}'"
+            )
+        owner = current.owner if current is not None else owner
+        dedup_key = _dedup_key(owner, text)
+        holder = self._dedup.get(dedup_key)
+        if holder is not None and holder != intent_id:
+            raise ValueError(f"Owner '{owner}' already has intent {holder} with this text")
+
+        if current is None:
+            self._append_locked(
+                Intent(id=intent_id, owner=owner, text=text, metadata=metadata or {}),
+                binary_vec,
+                dense_vec,
+            )
+            self._dedup[dedup_key] = intent_id
+            return
+        updated = replace(
+            current, text=text, metadata=current.metadata if metadata is None else metadata
+        )
+        self._overwrite_locked(current, updated, binary_vec, dense_vec)
+
+    def _overwrite_locked(
+        self,
+        current: Intent,
+        updated: Intent,
+        binary_vec: np.ndarray,
+        dense_vec: np.ndarray | None = None,
+    ) -> None:
+        """原地改写一行：向量、文本 / 元数据列、去重键、MIH、元数据倒排与到期时间随之更新。
+        调用方必须持有 self._lock。"""
+        meta_blob = _encode_metadata(updated.metadata)
+        row = self._pos_index[current.id]
+        with self._destructive():
+            if self._index is not None:
+                self._index_remove(current.id, self._vector_buf[row])
+                self._index_add(current.id, binary_vec)
+            self._vector_buf[row] = binary_vec
+            if self._prefix_buf is not None:
+                self._prefix_buf[row] = binary_vec[: self._cascade_bytes]
+            if self._dense_buf is not None and dense_vec is not None:
+                self._dense_buf[row] = self._quantize_dense(dense_vec.reshape(1, -1))[0]
+            del self._dedup[_dedup_key(current.owner, current.text)]
+            self._dedup[_dedup_key(updated.owner, updated.text)] = updated.id
+            self._texts.set(row, updated.text.encode())
+            self._metas.set(row, meta_blob)
+            self._unindex_metadata(row, current.metadata)
+            self._index_metadata(row, _decode_metadata(meta_blob))
+        # metadata 可能改变 TTL；旧的堆项与 _expires 不一致，弹出时丢弃
+        self._expires.pop(updated.id, None)
+        self._schedule_expiry(updated)
+
+    async def _encode_one(self, text: str) -> tuple[np.ndarray, np.ndarray | None]:
+        """单条待写入文本 → (binary, 可选 dense)。锁外、事件循环外；结果不写回查询缓存。"""
+        if self._dense_buf is not None:
+            return await self._run_encode(
+                self._pipeline.encode_with_dense, text, cache_results=False
+            )
+        return await self._encode_text(text, cache_results=False), None
+
+    async def _run_encode(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在编码执行器中运行 pipeline 调用。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._encode_executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def _encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
+        """
+        单条文本编码：有 micro-batcher 时与并发请求合批，否则直接进执行器。
+
+        合批时是否写回缓存由 batcher 的 batch_fn 决定（cache_results 不生效）。
+        """
+        if self._encode_batcher is not None:
+            return await self._encode_batcher.submit(text)
+        return await self._run_encode(
+            self._pipeline.encode_text, text, cache_results=cache_results
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """运行时诊断（/field/api/stats 展示）。"""
+        stats: dict[str, Any] = {}
+        if self._encode_batcher is not None:
+            stats["encode_batching"] = self._encode_batcher.stats()
+        cache = getattr(self._pipeline, "cache", None)
+        if cache is not None:
+            stats["query_cache"] = cache.stats()
+        if self._prefix_buf is not None:
+            stats["cascade"] = {
+                "prefix_bits": self._cascade_bytes * 8,
+                "multiplier": self._cascade_multiplier,
+                "prefix_bytes": self._prefix_buf.nbytes,
+            }
+        if isinstance(self._index, HnswIndex):
+            stats["index"] = {
+                "kind": "hnsw",
+                **self._index.stats(),
+                "rebuilds": self._index_rebuilds,
+                "rebuilding": self._index_log is not None,
+            }
+        if self._read_executor is not None:
+            stats["reads"] = {
+                "generation": self._generation,
+                "read_retries": self._read_retries,
+                "locked_fallbacks": self._read_fallbacks,
+            }
+        if self._expires or self._expired_total or self._compactions:
+            stats["maintenance"] = {
+                "ttl_scheduled": len(self._expires),
+                "expired": self._expired_total,
+                "compactions": self._compactions,
+                "capacity": self._capacity,
+            }
+        return stats
+
+    async def close(self) -> None:
+        """停止后台维护任务，释放自建的编码线程池与扫描线程池。"""
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            try:
+                await self._maintenance
+            except asyncio.CancelledError:
+                pass
+            self._maintenance = None
+        if self._owns_executor:
+            self._encode_executor.shutdown(wait=False)
+        for pool in (self._read_executor, self._scan_pool):
+            if pool is not None:
+                pool.shutdown(wait=False)
+
+    async def deposit_many(
+        self, items: list[tuple[str, str, dict | None]]
+    ) -> list[str]:
+        """
+        批量 deposit。items 为 (text, owner, metadata)，返回与输入对齐的 intent_id。
+
+        先整体校验与去重（场内已有的和批内重复的都不再编码），
+        新文本一次走 pipeline.encode_texts，再在锁内一次切片写入向量矩阵。
+        """
+        for text, owner, _ in items:
+            if not text or not text.strip():
+                raise ValueError("Cannot deposit empty text")
+            if not owner or not owner.strip():
+                raise ValueError("Cannot deposit without owner")
+
+        keys = [_dedup_key(owner, text.strip()) for text, owner, _ in items]
+        pending: dict[str, Intent] = {}
+        for key, (text, owner, metadata) in zip(keys, items):
+            if key in self._dedup or key in pending:
+                continue
+            pending[key] = Intent(
+                id=str(uuid.uuid4()),
                 owner=owner,
                 text=text.strip(),
                 metadata=metadata or {},
             )
 
-            # 编码（在锁外做会更好，但简单起见先在锁内）
-            binary_vec = self._pipeline.encode_text(intent.text)
+        new_intents = list(pending.values())
+        binaries, denses = await self._run_encode(
+            self._encode_many, [i.text for i in new_intents]
+        )
+
+        pending_keys = list(pending)
+        async with self._lock:
+            # 锁外编码期间可能有并发 deposit 写入了同一键
+            fresh = [
+                n for n, key in enumerate(pending_keys) if key not in self._dedup
+            ]
+            if fresh:
+                self._append_many_locked(
+                    [new_intents[n] for n in fresh],
+                    binaries[fresh],
+                    denses[fresh] if denses is not None else None,
+                )
+                self._dedup.update((pending_keys[n], new_intents[n].id) for n in fresh)
+            ids = [self._dedup[key] for key in keys]
+        self._ensure_maintenance()
+
+        logger.debug("Deposited %d new intents (%d items)", len(fresh), len(items))
+        return ids
+
+    def _encode_many(
+        self, texts: list[str]
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """待写入的多段文本 → (uint8[N, packed_dim], 可选 dense[N, dim])，不写回查询缓存。"""
+        if not texts:
+            return np.empty((0, self._packed_dim), dtype=np.uint8), None
+        if self._dense_buf is not None:
+            return self._pipeline.encode_texts_with_dense(texts, cache_results=False)
+        return np.stack(self._pipeline.encode_texts(texts, cache_results=False)), None
+
+    def _append_locked(
+        self,
+        intent: Intent,
+        binary_vec: np.ndarray,
+        dense_vec: np.ndarray | None = None,
+    ) -> None:
+        """锁内追加单条已编码的 Intent。调用方必须持有 self._lock。"""
+        self._append_many_locked(
+            [intent],
+            binary_vec.reshape(1, -1),
+            dense_vec.reshape(1, -1) if dense_vec is not None else None,
+        )
+
+    def _append_many_locked(
+        self,
+        intents: list[Intent],
+        binary_vecs: np.ndarray,
+        dense_vecs: np.ndarray | None = None,
+    ) -> None:
+        """锁内把已编码的 Intent 追加到存储和所有索引，向量一次切片写入。调用方必须持有 self._lock。"""
+        # 先序列化元数据：不可 JSON 序列化时在任何修改之前失败
+        metas = [_encode_metadata(i.metadata) for i in intents]
+        self._appends += 1
+        start = self._active_count
+        end = start + len(intents)
+        while end > self._capacity:
+            self._grow_buffer()
 
-            # 存储
-            self._intents[intent_id] = intent
-            self._dedup.add(dedup_key)
-            self._owner_index[owner].add(intent_id)
+        # 向量矩阵追加
+        self._vector_buf[start:end] = binary_vecs
+        if self._prefix_buf is not None:
+            self._prefix_buf[start:end] = binary_vecs[:, : self._cascade_bytes]
+        if self._dense_buf is not None and dense_vecs is not None:
+            self._dense_buf[start:end] = self._quantize_dense(dense_vecs)
+        codes = [self._owner_code(i.owner) for i in intents]
+        self._owner_col[start:end] = codes
+        for code in codes:
+            self._retain_owner(code)
+        self._created_col[start:end] = [i.created_at for i in intents]
+        self._texts.append_many([i.text.encode() for i in intents])
+        self._metas.append_many(metas)
 
-            # 向量矩阵追加
-            if self._active_count >= self._capacity:
-                self._grow_buffer()
-            self._vector_buf[self._active_count] = binary_vec
+        for row, intent in enumerate(intents, start):
+            intent_id = intent.id
             self._id_index.append(intent_id)
-            self._pos_index[intent_id] = self._active_count
-            self._active_count += 1
-            # 更新活跃视图
-            self._vectors = self._vector_buf[: self._active_count]
+            self._pos_index[intent_id] = row
+            self._index_metadata(row, _decode_metadata(metas[row - start]))
+            self._schedule_expiry(intent)
+            if self._index is not None:
+                self._index_add(intent_id, binary_vecs[row - start])
+        self._active_count = end
+        # 更新活跃视图
+        self._vectors = self._vector_buf[: self._active_count]
 
-        logger.debug(
-            "Deposited intent %s for owner %s (%d chars)",
-            intent_id[:8], owner, len(text),
+    def _retain_owner(self, code: int) -> None:
+        if self._owner_live[code] == 0:
+            self._live_owners += 1
+        self._owner_live[code] += 1
+
+    def _release_owner(self, code: int) -> None:
+        self._owner_live[code] -= 1
+        if self._owner_live[code] == 0:
+            self._live_owners -= 1
+
+    def _metadata_at(self, row: int) -> dict:
+        return _decode_metadata(self._metas.get(row))
+
+    def _intent_at(self, row: int) -> Intent:
+        """按行从列式存储构造 Intent。"""
+        return Intent(
+            id=self._id_index[row],
+            owner=self._owner_names[self._owner_col[row]],
+            text=self._texts.get(row).decode(),
+            metadata=self._metadata_at(row),
+            created_at=float(self._created_col[row]),
         )
-        return intent_id
 
-    async def match(self, text: str, k: int = 10) -> list[FieldResult]:
-        """在场中找到与 text 最相关的 Intent。"""
+    def _intent(self, intent_id: str) -> Intent | None:
+        row = self._pos_index.get(intent_id)
+        return self._intent_at(row) if row is not None else None
+
+    def _index_metadata(self, row: int, metadata: dict) -> None:
+        """把行号加入其标量元数据的倒排。调用方必须持有 self._lock。"""
+        for key, value in metadata.items():
+            mk = _meta_key(key, value)
+            if mk is not None:
+                self._meta_index[mk].add(row)
+
+    def _unindex_metadata(self, row: int, metadata: dict) -> None:
+        """从倒排中去掉行号，空集合删除。调用方必须持有 self._lock。"""
+        for key, value in metadata.items():
+            mk = _meta_key(key, value)
+            rows = self._meta_index.get(mk) if mk is not None else None
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._meta_index[mk]
+
+    def _index_add(self, intent_id: str, code: np.ndarray) -> None:
+        """索引插入；HNSW 重建期间同时记入日志。调用方必须持有 self._lock。"""
+        self._index.add(intent_id, code)
+        if self._index_log is not None:
+            self._index_log.append((intent_id, np.array(code, dtype=np.uint8)))
+
+    def _index_remove(self, intent_id: str, code: np.ndarray) -> None:
+        """索引删除（HNSW 为打墓碑）；重建期间同时记入日志。调用方必须持有 self._lock。"""
+        self._index.remove(intent_id, code)
+        if self._index_log is not None:
+            self._index_log.append((intent_id, None))
+
+    def _ttl_of(self, intent: Intent) -> float | None:
+        """Intent 的有效期（秒）：metadata["ttl"] > ttl_by_type[metadata["type"]] > ttl。"""
+        ttl = intent.metadata.get(_TTL_KEY)
+        if isinstance(ttl, (int, float)) and not isinstance(ttl, bool) and ttl > 0:
+            return float(ttl)
+        kind = intent.metadata.get(_TTL_TYPE_KEY)
+        if isinstance(kind, str) and kind in self._ttl_by_type:
+            return self._ttl_by_type[kind]
+        return self._ttl
+
+    def _schedule_expiry(self, intent: Intent) -> None:
+        """有 TTL 的 Intent 登记到期时间。调用方必须持有 self._lock。"""
+        ttl = self._ttl_of(intent)
+        if ttl is None:
+            return
+        expires_at = intent.created_at + ttl
+        self._expires[intent.id] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, intent.id))
+
+    def _owner_code(self, owner: str) -> int:
+        """owner → 整数编码（首次出现时分配）。"""
+        code = self._owner_codes.get(owner)
+        if code is None:
+            code = len(self._owner_names)
+            self._owner_codes[owner] = code
+            self._owner_names.append(owner)
+            self._owner_live.append(0)
+        return code
+
+    def _quantize_dense(self, dense: np.ndarray) -> np.ndarray:
+        if self._dense_dtype == "int8":
+            return np.clip(np.rint(dense * _INT8_SCALE), -127, 127).astype(np.int8)
+        return dense.astype(np.float16)
+
+    async def match(
+        self,
+        text: str,
+        k: int = 10,
+        rerank: int = 0,
+        filters: MatchFilter | None = None,
+        ef_search: int = 0,
+    ) -> list[FieldResult]:
+        """
+        在场中找到与 text 最相关的 Intent。
+
+        rerank > 0 且场保存了密集副本时走两阶段检索：Hamming top-max(rerank, k)
+        候选按精确 cosine 重排，返回的 score 为 cosine。
+        filters 非空时只在满足谓词的行内检索。
+        ef_search > 0 时覆盖 HNSW 索引本次查询的候选表大小（其他索引忽略）。
+        """
         if not text or not text.strip():
             return []
         if self._active_count == 0:
             return []
 
-        query_vec = self._pipeline.encode_text(text.strip())
-        scores = self._pipeline.batch_similarity(query_vec, self._vectors)
+        if rerank > 0 and self._dense_buf is not None:
+            query_vec, query_dense = await self._run_encode(
+                self._pipeline.encode_with_dense, text.strip()
+            )
+
+            def read() -> list[FieldResult]:
+                subset = self._filter_rows(filters)
+                rows, _ = self._candidate_topk(
+                    query_vec, max(rerank, k), subset, ef_search
+                )
+                return self._build_results(*self._rerank_dense(query_dense, rows, k))
+
+            return await self._read(read)
+
+        query_vec = await self._encode_text(text.strip())
+        return await self._read(
+            lambda: self._build_results(
+                *self._candidate_topk(query_vec, k, self._filter_rows(filters), ef_search)
+            )
+        )
+
+    async def match_many(
+        self, texts: list[str], k: int = 10, filters: MatchFilter | None = None
+    ) -> list[list[FieldResult]]:
+        """多条查询一次编码、一次扫描。返回与 texts 对齐的 match 结果（空文本 → []）。"""
+        queries, valid = await self._encode_queries(texts)
+        results: list[list[FieldResult]] = [[] for _ in texts]
+        if queries is None:
+            return results
+
+        def read() -> list[list[FieldResult]]:
+            return [
+                self._build_results(rows, scores)
+                for rows, scores in self._candidate_topk_many(
+                    queries, k, self._filter_rows(filters)
+                )
+            ]
+
+        for q, found in zip(valid, await self._read(read)):
+            results[q] = found
+        return results
+
+    async def _encode_queries(
+        self, texts: list[str]
+    ) -> tuple[np.ndarray | None, list[int]]:
+        """非空查询一次 encode_texts → (uint8[Q, packed_dim], 在 texts 中的下标)。"""
+        valid = [i for i, t in enumerate(texts) if t and t.strip()]
+        if not valid or self._active_count == 0:
+            return None, valid
+        vecs = await self._run_encode(
+            self._pipeline.encode_texts, [texts[i].strip() for i in valid]
+        )
+        return np.stack(vecs), valid
+
+    async def _read(self, fn: Callable[[], _T]) -> _T:
+        """
+        读路径钩子：查询编码完成后，扫描与结果构建在 fn 内执行。
+
+        scan_threads = 0 时 fn 在事件循环上同步执行，不跨 await，天然看到一致
+        的存储。scan_threads > 0 时 fn 经 run_in_executor 在读线程中无锁执行
+        （_read_once 校验代计数），与破坏性变更冲突时重试，重试用尽或写者
+        正在等待读者退出（缩容）时改持 self._lock 的共享段执行。
+        共享内存场（SharedMemoryField）覆盖此方法，用段头的代计数校验。
+        """
+        self._ensure_maintenance()
+        if self._read_executor is None:
+            return fn()
+        loop = asyncio.get_running_loop()
+        if self._drained is None:
+            self._optimistic_readers += 1
+            try:
+                for _ in range(_OPTIMISTIC_READS):
+                    ok, result = await loop.run_in_executor(
+                        self._read_executor, self._read_once, fn
+                    )
+                    if ok:
+                        return result
+                    self._read_retries += 1
+                    if self._drained is not None:
+                        break
+            finally:
+                self._optimistic_readers -= 1
+                if self._optimistic_readers == 0 and self._drained is not None:
+                    if not self._drained.done():
+                        self._drained.set_result(None)
+        self._read_fallbacks += 1
+        async with self._lock.shared():
+            return await loop.run_in_executor(self._read_executor, fn)
+
+    def _read_once(self, fn: Callable[[], _T]) -> tuple[bool, _T | None]:
+        """
+        读线程中无锁执行 fn 一次 → (是否有效, 结果)。
+
+        写者的变更区间都是事件循环上的同步代码，读线程看到奇数代计数时写者
+        正在其中，直接作废（重试经事件循环调度，届时区间已结束）。fn 抛出
+        异常时，若期间有破坏性变更或追加，视为撕裂状态导致，作废重试。
+        """
+        generation = self._generation
+        if generation & 1:
+            return False, None
+        appends = self._appends
+        try:
+            result = fn()
+        except Exception:
+            if self._generation != generation or self._appends != appends:
+                return False, None
+            raise
+        return self._generation == generation, result
+
+    @contextmanager
+    def _destructive(self) -> Iterator[None]:
+        """seqlock 写区间（swap 删除、原地改写）：结束后正在进行的无锁读作废重试。"""
+        self._generation += 1
+        try:
+            yield
+        finally:
+            self._generation += 1
+
+    def _candidate_topk(
+        self,
+        query_vec: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        ef_search: int = 0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Hamming top-k：有索引先走索引，否则（或索引无法给出 k 条时）分块扫描。
+        rows 为过滤选中的行号时只扫描这些行（索引不支持过滤）。
+        """
+        if rows is None and self._index is not None and k < self._active_count:
+            hit = self._index_topk(query_vec, k, ef_search)
+            if hit is not None:
+                return hit
+        width = self._cascade_width(k, rows)
+        if width:
+            coarse, _ = self._scan_topk(query_vec, width, rows, prefix=True)
+            return self._verify_candidates(query_vec, coarse, k)
+        return self._scan_topk(query_vec, k, rows)
+
+    def _candidate_topk_many(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """多查询 Hamming top-k：启用级联时一次前缀粗排、逐条精排，否则一次分块扫描。"""
+        width = self._cascade_width(k, rows)
+        if not width:
+            return self._scan_topk_many(queries, k, rows)
+        coarse = self._scan_topk_many(queries, width, rows, prefix=True)
+        return [
+            self._verify_candidates(query_vec, cand, k)
+            for query_vec, (cand, _) in zip(queries, coarse)
+        ]
+
+    def _cascade_width(self, k: int, rows: np.ndarray | None) -> int:
+        """级联粗排的候选数；未启用或候选会覆盖全部待扫描行时返回 0（直接精确扫描）。"""
+        if self._prefix_buf is None:
+            return 0
+        width = k * self._cascade_multiplier
+        n = self._vectors.shape[0] if rows is None else rows.shape[0]
+        return width if width < n else 0
+
+    def _verify_candidates(
+        self, query_vec: np.ndarray, rows: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """粗排候选行用完整码重新打分，取 top-k (行号, 分数)，按分数降序。"""
+        # 粗排之后再取 _vectors：候选行号小于粗排时的行数，追加只会让视图变长
+        scores = self._pipeline.batch_similarity(query_vec, self._vectors[rows])
+        top = self._topk_order(scores, k)
+        return rows[top], scores[top]
+
+    def _scan_view(self, prefix: bool) -> tuple[np.ndarray, int]:
+        """待扫描的 (矩阵, tile 行数)：完整码 _vectors，或同行数的前缀副本（tile 按字节预算放大）。"""
+        vectors = self._vectors
+        if not prefix:
+            return vectors, self._tile_rows
+        tile_rows = self._tile_rows * self._packed_dim // self._cascade_bytes
+        return self._prefix_buf[: vectors.shape[0]], tile_rows
+
+    def _filter_rows(self, filters: MatchFilter | None) -> np.ndarray | None:
+        """过滤谓词 → 选中行号（int64 升序）。无过滤时返回 None（全场扫描）。"""
+        if not filters:
+            return None
+        # 以已发布的行数为界：倒排可能已含正在追加、尚未发布的行
+        n = self._vectors.shape[0]
+        rows = None
+        if filters.metadata:
+            rows = self._metadata_rows(filters.metadata)
+            rows = rows[rows < n]
+        allowed = self._owner_allowed(filters)
+        if allowed is not None:
+            if rows is None:
+                rows = np.flatnonzero(allowed[self._owner_col[:n]])
+            else:
+                rows = rows[allowed[self._owner_col[rows]]]
+        return rows.astype(np.int64, copy=False)
 
-        # top-k
-        actual_k = min(k, self._active_count)
-        if actual_k >= self._active_count:
-            top_indices = np.argsort(scores)[::-1]
+    def _metadata_rows(self, metadata: tuple[tuple[str, Any], ...]) -> np.ndarray:
+        """元数据等值条件 → 满足全部条件的行号。从最小的倒排集合开始求交。"""
+        postings: list[set[int]] = []
+        for key, value in metadata:
+            rows = self._meta_index.get(_meta_key(key, value))
+            if not rows:
+                return np.empty(0, dtype=np.int64)
+            postings.append(rows)
+        postings.sort(key=len)
+        selected = postings[0].intersection(*postings[1:])
+        return np.sort(np.fromiter(selected, dtype=np.int64, count=len(selected)))
+
+    def _owner_allowed(self, filters: MatchFilter) -> np.ndarray | None:
+        """owner 谓词 → bool[owner 编码] 查表；没有 owner 谓词时返回 None。"""
+        if not filters.owner_prefixes and not filters.exclude_owners:
+            return None
+        n_owners = len(self._owner_names)
+        if filters.owner_prefixes:
+            allowed = np.zeros(n_owners, dtype=bool)
+            for prefix in filters.owner_prefixes:
+                allowed |= self._prefix_table(prefix, n_owners)
+        else:
+            allowed = np.ones(n_owners, dtype=bool)
+        for owner in filters.exclude_owners:
+            code = self._owner_codes.get(owner)
+            if code is not None and code < n_owners:
+                allowed[code] = False
+        return allowed
+
+    def _prefix_table(self, prefix: str, n_owners: int) -> np.ndarray:
+        """
+        bool[owner 编码]：owner 是否以 prefix 开头。
+
+        owner 编码只增不回收，表按前缀缓存，新 owner 出现时只补齐新增部分。
+        并发读者可能重复补齐同一张表，结果相同，后写者覆盖即可；超过上限时整体
+        换成新字典（赋值是原子的，读线程不会遍历到变化中的字典）。
+        """
+        table = self._prefix_tables.get(prefix)
+        if table is None:
+            if len(self._prefix_tables) >= _PREFIX_TABLE_LIMIT:
+                self._prefix_tables = {}
+            table = np.zeros(0, dtype=bool)
+        if table.shape[0] < n_owners:
+            names = self._owner_names[table.shape[0] : n_owners]
+            tail = np.fromiter(
+                (name.startswith(prefix) for name in names), dtype=bool, count=len(names)
+            )
+            table = np.concatenate([table, tail])
+            self._prefix_tables[prefix] = table
+        return table[:n_owners]
+
+    def _rerank_dense(
+        self, query_dense: np.ndarray, rows: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """候选行按与 query 的精确 cosine 重排，取 top-k。"""
+        if rows.size == 0:
+            return rows, np.empty(0, dtype=np.float64)
+        cand = self._dense_buf[rows].astype(np.float32)
+        if self._dense_dtype == "int8":
+            cand /= _INT8_SCALE
+        norms = np.linalg.norm(cand, axis=1) * np.linalg.norm(query_dense)
+        norms[norms == 0] = 1.0
+        scores = (cand @ np.asarray(query_dense, dtype=np.float32)) / norms
+        order = np.argsort(scores, kind="stable")[::-1][:k]
+        return rows[order], scores[order].astype(np.float64)
+
+    def _index_topk(
+        self, query_vec: np.ndarray, k: int, ef_search: int = 0
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        经索引取 top-k 的 (行号, 分数)：MIH 为精确结果，HNSW 为近似结果。
+        索引无法给出 k 条时返回 None。
+        """
+        vectors = self._vectors
+        index = self._index
+        if isinstance(index, HnswIndex):
+            hit = index.search(query_vec, k, ef_search)
         else:
-            top_indices = np.argpartition(scores, -actual_k)[-actual_k:]
-            top_indices = top_indices[np.argsort(scores[top_indices])[::-1]]
 
+            def verify(keys: list[str]) -> np.ndarray:
+                rows = [self._pos_index[iid] for iid in keys]
+                return hamming_distance(query_vec, vectors[rows])
+
+            hit = index.search(query_vec, k, verify)
+        if hit is None:
+            return None
+        keys, _ = hit
+        rows = np.array([self._pos_index[iid] for iid in keys], dtype=np.int64)
+        scores = self._pipeline.batch_similarity(query_vec, vectors[rows])
+        order = np.argsort(scores, kind="stable")[::-1]
+        return rows[order], scores[order]
+
+    def _row_ranges(self, n: int, tile_rows: int) -> list[tuple[int, int]]:
+        """[0, n) 切成至多 scan_threads 段连续行区间，每段不少于一个 tile。"""
+        parts = max(1, min(self._scan_threads, -(-n // tile_rows)))
+        bounds = np.linspace(0, n, parts + 1).astype(np.int64)
+        return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def _map_ranges(
+        self, fn: Callable[[int, int], _T], n: int, tile_rows: int
+    ) -> list[_T]:
+        """fn(lo, hi) 在各行区间上并发执行（XOR / popcount 释放 GIL），按区间序返回。"""
+        ranges = self._row_ranges(n, tile_rows)
+        if len(ranges) == 1 or self._scan_pool is None:
+            return [fn(lo, hi) for lo, hi in ranges]
+        return list(self._scan_pool.map(lambda r: fn(*r), ranges))
+
+    @staticmethod
+    def _tile_scores(
+        score: Callable[[np.ndarray], np.ndarray],
+        vectors: np.ndarray,
+        rows: np.ndarray | None,
+        start: int,
+        end: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        第 start:end 个待扫描行的 (分数, 行号)，分数的最后一维与行号对齐。
+
+        rows 为 None 时对连续切片打分（不复制）。rows（升序）在块内足够稠密时
+        对覆盖区间整段打分再取出选中列，否则 gather 选中行后打分。
+        """
+        if rows is None:
+            return score(vectors[start:end]), np.arange(start, end, dtype=np.int64)
+        idx = rows[start:end]
+        lo, hi = int(idx[0]), int(idx[-1]) + 1
+        if hi - lo <= _SPAN_SCAN_RATIO * idx.shape[0]:
+            return score(vectors[lo:hi])[..., idx - lo], idx
+        return score(vectors[idx]), idx
+
+    def _scan_topk(
+        self,
+        query_vec: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        prefix: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        分块扫描 _vectors，返回 (行号, 分数)，按分数降序，最多 k 条。
+
+        每块只物化 tile 大小的 XOR/popcount 临时数组，块间维护滚动 top-k：
+        上一轮的 k 个候选与本块分数拼接后 argpartition，内存 O(tile + k)。
+        scan_threads > 1 时各行区间并行扫描，各自的 top-k 再合并一次。
+        rows 给出时只扫描这些行（过滤选中的行号，见 _tile_scores）。
+        prefix=True 时扫描码前缀副本（级联粗排），分数为负的前缀 Hamming 距离。
+        """
+        vectors, tile_rows = self._scan_view(prefix)
+        n = vectors.shape[0] if rows is None else rows.shape[0]
+        k = min(k, n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        if prefix:
+            query_prefix = query_vec[: self._cascade_bytes]
+
+            def score(tile: np.ndarray) -> np.ndarray:
+                return -hamming_distance(query_prefix, tile).astype(np.float64)
+
+        else:
+
+            def score(tile: np.ndarray) -> np.ndarray:
+                return self._pipeline.batch_similarity(query_vec, tile)
+
+        def scan(lo: int, hi: int) -> tuple[np.ndarray, np.ndarray]:
+            best_idx = np.empty(0, dtype=np.int64)
+            best_scores = np.empty(0, dtype=np.float64)
+            for start in range(lo, hi, tile_rows):
+                scores, tile_idx = self._tile_scores(
+                    score, vectors, rows, start, min(start + tile_rows, hi)
+                )
+                cand_idx = np.concatenate([best_idx, tile_idx])
+                cand_scores = np.concatenate([best_scores, scores])
+                if cand_scores.shape[0] > k:
+                    keep = np.argpartition(cand_scores, -k)[-k:]
+                    cand_idx = cand_idx[keep]
+                    cand_scores = cand_scores[keep]
+                best_idx, best_scores = cand_idx, cand_scores
+            return best_idx, best_scores
+
+        parts = self._map_ranges(scan, n, tile_rows)
+        best_idx = np.concatenate([idx for idx, _ in parts])
+        best_scores = np.concatenate([scores for _, scores in parts])
+        if best_scores.shape[0] > k:
+            keep = np.argpartition(best_scores, -k)[-k:]
+            best_idx, best_scores = best_idx[keep], best_scores[keep]
+        order = np.argsort(best_scores, kind="stable")[::-1]
+        return best_idx[order], best_scores[order]
+
+    def _scan_topk_many(
+        self,
+        queries: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        prefix: bool = False,
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """_scan_topk 的多查询版：每块一次算 Q×tile 分数，Q 条滚动 top-k 并行维护。"""
+        vectors, tile_rows = self._scan_view(prefix)
+        n = vectors.shape[0] if rows is None else rows.shape[0]
+        n_queries = queries.shape[0]
+        k = min(k, n)
+        if k <= 0:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+            return [empty] * n_queries
+
+        # Q×tile 的 XOR 临时数组保持在单查询 tile 的字节预算内
+        tile_rows = max(1, tile_rows // n_queries)
+
+        if prefix:
+            query_prefixes = np.ascontiguousarray(queries[:, : self._cascade_bytes])
+
+            def score(tile: np.ndarray) -> np.ndarray:
+                return -hamming_distance_many(query_prefixes, tile).astype(np.float64)
+
+        else:
+
+            def score(tile: np.ndarray) -> np.ndarray:
+                return self._pipeline.batch_similarity_many(queries, tile)
+
+        def scan(lo: int, hi: int) -> tuple[np.ndarray, np.ndarray]:
+            best_idx = np.empty((n_queries, 0), dtype=np.int64)
+            best_scores = np.empty((n_queries, 0), dtype=np.float64)
+            for start in range(lo, hi, tile_rows):
+                scores, tile_idx = self._tile_scores(
+                    score, vectors, rows, start, min(start + tile_rows, hi)
+                )
+                cand_idx = np.concatenate(
+                    [best_idx, np.broadcast_to(tile_idx, scores.shape)], axis=1
+                )
+                cand_scores = np.concatenate([best_scores, scores], axis=1)
+                if cand_scores.shape[1] > k:
+                    keep = np.argpartition(cand_scores, -k, axis=1)[:, -k:]
+                    cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+                    cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                best_idx, best_scores = cand_idx, cand_scores
+            return best_idx, best_scores
+
+        parts = self._map_ranges(scan, n, tile_rows)
+        best_idx = np.concatenate([idx for idx, _ in parts], axis=1)
+        best_scores = np.concatenate([scores for _, scores in parts], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+            best_idx = np.take_along_axis(best_idx, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        results = []
+        for idx, scores in zip(best_idx, best_scores):
+            order = np.argsort(scores, kind="stable")[::-1]
+            results.append((idx[order], scores[order]))
+        return results
+
+    def _scan_scores_many(
+        self, queries: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """分块计算 Q 条查询对全部行（或 rows 选中的行）的相似度，float64[Q, N]。"""
+        vectors = self._vectors
+        n = vectors.shape[0] if rows is None else rows.shape[0]
+        scores = np.empty((queries.shape[0], n), dtype=np.float64)
+        # Q×tile 的 XOR 临时数组保持在单查询 tile 的字节预算内
+        tile_rows = max(1, self._tile_rows // queries.shape[0])
+
+        def score(tile: np.ndarray) -> np.ndarray:
+            return self._pipeline.batch_similarity_many(queries, tile)
+
+        def fill(lo: int, hi: int) -> None:
+            for start in range(lo, hi, tile_rows):
+                end = min(start + tile_rows, hi)
+                scores[:, start:end], _ = self._tile_scores(score, vectors, rows, start, end)
+
+        self._map_ranges(fill, n, tile_rows)
+        return scores
+
+    def _scan_scores(
+        self, query_vec: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """分块计算 query 对全部行（或 rows 选中的行）的相似度，float64[N]（与行序 / rows 对齐）。"""
+        vectors = self._vectors
+        n = vectors.shape[0] if rows is None else rows.shape[0]
+        scores = np.empty(n, dtype=np.float64)
+
+        def score(tile: np.ndarray) -> np.ndarray:
+            return self._pipeline.batch_similarity(query_vec, tile)
+
+        def fill(lo: int, hi: int) -> None:
+            for start in range(lo, hi, self._tile_rows):
+                end = min(start + self._tile_rows, hi)
+                scores[start:end], _ = self._tile_scores(score, vectors, rows, start, end)
+
+        self._map_ranges(fill, n, self._tile_rows)
+        return scores
+
+    def _build_results(
+        self, indices: np.ndarray, scores: np.ndarray
+    ) -> list[FieldResult]:
+        """行号 + 分数 → FieldResult 列表。"""
         results: list[FieldResult] = []
-        for idx in top_indices:
-            iid = self._id_index[idx]
-            intent = self._intents[iid]
+        for idx, score in zip(indices, scores):
             results.append(
                 FieldResult(
-                    intent_id=iid,
-                    score=float(scores[idx]),
-                    owner=intent.owner,
-                    text=intent.text,
-                    metadata=intent.metadata,
+                    intent_id=self._id_index[idx],
+                    score=float(score),
+                    owner=self._owner_names[self._owner_col[idx]],
+                    text=self._texts.get(idx).decode(),
+                    metadata=self._metadata_at(idx),
                 )
             )
         return results
 
     async def match_owners(
-        self, text: str, k: int = 10, max_intents: int = 3
+        self,
+        text: str,
+        k: int = 10,
+        max_intents: int = 3,
+        rerank: int = 0,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
     ) -> list[OwnerMatch]:
-        """在场中找到与 text 最相关的 Owner。按 owner 聚合。"""
-        # 取足够多的 Intent 级结果用于聚合
-        raw_k = min(k * max_intents * 2, self._active_count)
-        if raw_k == 0:
+        """
+        在场中找到与 text 最相关的 Owner。按 owner 聚合，场内 owner 足够时精确返回 k 个。
+
+        aggregate 覆盖构造时的 owner_aggregate（"max" | "mean" | "softmax"）。
+        rerank > 0 且场保存了密集副本时，只在 Hamming top-max(rerank, k·max_intents)
+        候选内按 cosine 聚合（候选覆盖的 owner 可能少于 k）。
+        filters 非空时只聚合满足谓词的行。
+        """
+        aggregate = aggregate or self._owner_aggregate
+        if aggregate not in _OWNER_AGGREGATES:
+            raise ValueError(
+                f"Unknown aggregate '{aggregate}', expected one of {_OWNER_AGGREGATES}"
+            )
+        if not text or not text.strip() or self._active_count == 0 or k <= 0:
+            return []
+
+        max_intents = max(1, max_intents)
+        if rerank > 0 and self._dense_buf is not None:
+            query_vec, query_dense = await self._run_encode(
+                self._pipeline.encode_with_dense, text.strip()
+            )
+
+            def read() -> list[OwnerMatch]:
+                subset = self._filter_rows(filters)
+                rows, _ = self._candidate_topk(
+                    query_vec, max(rerank, k * max_intents), subset
+                )
+                rows, scores = self._rerank_dense(query_dense, rows, rows.size)
+                return self._aggregate_owners(rows, scores, k, max_intents, aggregate)
+
+        else:
+            query_vec = await self._encode_text(text.strip())
+
+            def read() -> list[OwnerMatch]:
+                rows = self._filter_rows(filters)
+                scores = self._scan_scores(query_vec, rows)
+                if rows is None:
+                    rows = np.arange(scores.shape[0], dtype=np.int64)
+                return self._aggregate_owners(rows, scores, k, max_intents, aggregate)
+
+        return await self._read(read)
+
+    async def match_owners_many(
+        self,
+        texts: list[str],
+        k: int = 10,
+        max_intents: int = 3,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[list[OwnerMatch]]:
+        """多条查询的 match_owners：一次编码、一次扫描。返回与 texts 对齐（空文本 → []）。"""
+        aggregate = aggregate or self._owner_aggregate
+        if aggregate not in _OWNER_AGGREGATES:
+            raise ValueError(
+                f"Unknown aggregate '{aggregate}', expected one of {_OWNER_AGGREGATES}"
+            )
+        results: list[list[OwnerMatch]] = [[] for _ in texts]
+        if k <= 0:
+            return results
+        queries, valid = await self._encode_queries(texts)
+        if queries is None:
+            return results
+
+        def read() -> list[list[OwnerMatch]]:
+            rows = self._filter_rows(filters)
+            scores = self._scan_scores_many(queries, rows)
+            if rows is None:
+                rows = np.arange(scores.shape[1], dtype=np.int64)
+            return [
+                self._aggregate_owners(rows, row_scores, k, max(1, max_intents), aggregate)
+                for row_scores in scores
+            ]
+
+        for q, found in zip(valid, await self._read(read)):
+            results[q] = found
+        return results
+
+    def _aggregate_owners(
+        self,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        k: int,
+        max_intents: int,
+        aggregate: str,
+    ) -> list[OwnerMatch]:
+        """
+        行级 (行号, 分数) → top-k OwnerMatch，全程向量化。
+
+        max：np.maximum.at 一次得到每个 owner 的最佳分数，先选出 k 个 owner，
+        只对它们的行排序取前 max_intents 条。
+        mean / softmax：按 (owner, 分数降序) 排序分组，截取每组前 max_intents
+        条后用 reduceat 聚合。
+        """
+        if rows.size == 0:
             return []
-        intent_results = await self.match(text, k=raw_k)
-
-        # 按 owner 归组
-        owner_groups: dict[str, list[FieldResult]] = defaultdict(list)
-        for r in intent_results:
-            owner_groups[r.owner].append(r)
-
-        # 聚合：top-1 max（初版策略，可切换）
-        owner_matches: list[OwnerMatch] = []
-        for owner, intents in owner_groups.items():
-            # intents 已按 score 降序（继承自 match 的排序）
-            top = intents[:max_intents]
-            owner_matches.append(
+        codes = self._owner_col[rows]
+        if aggregate == "max":
+            best = np.full(len(self._owner_names), -np.inf)
+            np.maximum.at(best, codes, scores)
+            present = np.flatnonzero(best > -np.inf)
+            chosen = present[self._topk_order(best[present], k)]
+            keep = np.isin(codes, chosen)
+            rows, scores, codes = rows[keep], scores[keep], codes[keep]
+
+        # 分组：owner 升序，组内分数降序（同分按行号，结果确定）
+        order = np.lexsort((rows, -scores, codes))
+        rows, scores, codes = rows[order], scores[order], codes[order]
+        n = codes.shape[0]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        rank = np.arange(n) - np.repeat(starts, sizes)
+        top = rank < max_intents
+        rows, scores, codes = rows[top], scores[top], codes[top]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        sizes = np.diff(np.r_[starts, codes.shape[0]])
+
+        if aggregate == "mean":
+            owner_scores = np.add.reduceat(scores, starts) / sizes
+        elif aggregate == "softmax":
+            group_max = np.repeat(scores[starts], sizes)
+            weights = np.exp((scores - group_max) / _SOFTMAX_TEMPERATURE)
+            owner_scores = (
+                np.add.reduceat(weights * scores, starts)
+                / np.add.reduceat(weights, starts)
+            )
+        else:
+            owner_scores = scores[starts]
+
+        matches: list[OwnerMatch] = []
+        for g in self._topk_order(owner_scores, k):
+            lo, hi = starts[g], starts[g] + sizes[g]
+            matches.append(
                 OwnerMatch(
-                    owner=owner,
-                    score=top[0].score,  # max score
-                    intents=tuple(top),
+                    owner=self._owner_names[codes[lo]],
+                    score=float(owner_scores[g]),
+                    intents=tuple(self._build_results(rows[lo:hi], scores[lo:hi])),
                 )
             )
+        return matches
 
-        # 按 owner score 降序排列，取 top-k
-        owner_matches.sort(key=lambda m: m.score, reverse=True)
-        return owner_matches[:k]
+    @staticmethod
+    def _topk_order(values: np.ndarray, k: int) -> np.ndarray:
+        """values 中最大的 k 个的下标，按值降序（同值按下标）。"""
+        if values.shape[0] > k:
+            cand = np.argpartition(values, -k)[-k:]
+        else:
+            cand = np.arange(values.shape[0])
+        return cand[np.lexsort((cand, -values[cand]))]
 
     async def remove(self, intent_id: str) -> None:
         """移除单个 Intent。不存在时静默。"""
         async with self._lock:
             self._remove_locked(intent_id)
+        self._ensure_maintenance()
 
     async def remove_owner(self, owner: str) -> int:
         """移除 owner 的所有 Intent。返回移除数量。锁内一次性完成。"""
         async with self._lock:
-            intent_ids = list(self._owner_index.get(owner, set()))
+            intent_ids = self._owner_ids(owner)
             for iid in intent_ids:
                 self._remove_locked(iid)
-            return len(intent_ids)
+        self._ensure_maintenance()
+        return len(intent_ids)
+
+    def _owner_ids(self, owner: str) -> list[str]:
+        """owner 的全部 intent_id：在 owner 编码列上向量化比较。"""
+        code = self._owner_codes.get(owner)
+        if code is None or not self._owner_live[code]:
+            return []
+        rows = np.flatnonzero(self._owner_col[: self._active_count] == code)
+        return [self._id_index[row] for row in rows]
 
     def _remove_locked(self, intent_id: str) -> None:
         """锁内移除单个 Intent。调用方必须持有 self._lock。"""
-        if intent_id not in self._intents:
-            return
-        intent = self._intents.pop(intent_id)
-        dedup_key = hashlib.sha256(
-            f"{intent.owner}|{intent.text}".encode()
-        ).hexdigest()
-        self._dedup.discard(dedup_key)
-        self._owner_index[intent.owner].discard(intent_id)
-        if not self._owner_index[intent.owner]:
-            del self._owner_index[intent.owner]
-
-        # 从向量矩阵移除（swap with last, O(1)）
-        idx = self._pos_index.pop(intent_id, None)
-        if idx is None:
+        if intent_id not in self._pos_index:
             return
+        with self._destructive():
+            self._swap_remove_locked(intent_id)
+
+    def _swap_remove_locked(self, intent_id: str) -> None:
+        """swap 删除一行（末行搬入空位）。调用方必须在 _destructive() 区间内。"""
+        idx = self._pos_index.pop(intent_id)
+        code = int(self._owner_col[idx])
+        self._expires.pop(intent_id, None)
+        self._dedup.pop(
+            _dedup_key(self._owner_names[code], self._texts.get(idx).decode()), None
+        )
+        self._release_owner(code)
+
+        # 从向量矩阵与各列移除（swap with last, O(1)）
+        if self._index is not None:
+            self._index_remove(intent_id, self._vector_buf[idx])
+        self._unindex_metadata(idx, self._metadata_at(idx))
         last = self._active_count - 1
         if idx != last:
             moved_id = self._id_index[last]
+            moved_meta = self._metadata_at(last)
+            self._unindex_metadata(last, moved_meta)
+            self._index_metadata(idx, moved_meta)
             self._vector_buf[idx] = self._vector_buf[last]
+            if self._prefix_buf is not None:
+                self._prefix_buf[idx] = self._prefix_buf[last]
+            if self._dense_buf is not None:
+                self._dense_buf[idx] = self._dense_buf[last]
+            self._owner_col[idx] = self._owner_col[last]
+            self._created_col[idx] = self._created_col[last]
             self._id_index[idx] = moved_id
             self._pos_index[moved_id] = idx
+        self._texts.swap_remove(idx)
+        self._metas.swap_remove(idx)
         self._id_index.pop()
         self._active_count -= 1
         self._vectors = self._vector_buf[: self._active_count]
 
+    @property
+    def generation(self) -> int:
+        """
+        写入代数：任何可见变更（追加、删除、改写、过期）后严格增大。
+
+        追加计数加一，swap 删除 / 原地改写的 seqlock 代计数加二，两者之和单调；
+        缩容不改变内容，不计入。匹配结果缓存（MatchResultCache）按它判断过期。
+        """
+        return self._generation + self._appends
+
     async def count(self) -> int:
         return self._active_count
 
     async def count_owners(self) -> int:
-        return len(self._owner_index)
+        return self._live_owners
+
+    # ── 过期、缩容与索引重建 ───────────────────────────────
+
+    async def expire(self, now: float | None = None) -> int:
+        """
+        淘汰到期（expires_at <= now，默认当前时间）的 Intent。返回淘汰数量。
+
+        每批持写锁至多 _EXPIRE_BATCH 行，批间释放锁，大量同时到期时查询不被长时间阻塞。
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            async with self._lock:
+                removed += self._expire_locked(now, _EXPIRE_BATCH)
+        return removed
+
+    def _expire_locked(self, now: float, limit: int) -> int:
+        """弹出至多 limit 个到期堆项，仍存活的 Intent 走 swap 删除。调用方必须持有 self._lock。"""
+        heap = self._expiry_heap
+        removed = 0
+        for _ in range(limit):
+            if not heap or heap[0][0] > now:
+                break
+            expires_at, intent_id = heapq.heappop(heap)
+            if self._expires.get(intent_id) == expires_at:
+                self._remove_locked(intent_id)
+                removed += 1
+        # 已删除 Intent 的残留堆项过多时按 _expires 重建
+        if len(heap) > 2 * len(self._expires) + _EXPIRE_BATCH:
+            self._expiry_heap = [(t, iid) for iid, t in self._expires.items()]
+            heapq.heapify(self._expiry_heap)
+        self._expired_total += removed
+        return removed
+
+    async def compact(self) -> bool:
+        """活跃行数低于容量的 compact_below 时缩容。返回是否缩容。"""
+        async with self._lock:
+            if not self._sparse():
+                return False
+            await self._drain_readers()
+            return self._compact_locked()
+
+    async def _drain_readers(self) -> None:
+        """等进行中的无锁读结束。期间新读者改走共享锁，排在本写者之后。"""
+        if not self._optimistic_readers:
+            return
+        self._drained = asyncio.get_running_loop().create_future()
+        try:
+            await self._drained
+        finally:
+            self._drained = None
+
+    def _compact_locked(self) -> bool:
+        """缩到不小于 2× 活跃行数的 2 的幂（不低于初始容量）。调用方必须持有 self._lock。"""
+        if not self._sparse():
+            return False
+        old_capacity = self._capacity
+        target = max(_INITIAL_CAPACITY, 1 << (2 * self._active_count - 1).bit_length())
+        self._resize_buffer(target)
+        self._compactions += 1
+        logger.info(
+            "Field buffer compacted %d → %d (%d rows)",
+            old_capacity, target, self._active_count,
+        )
+        return True
+
+    def _sparse(self) -> bool:
+        return (
+            self._capacity > _INITIAL_CAPACITY
+            and self._active_count < self._compact_below * self._capacity
+        )
+
+    async def rebuild_index(self) -> bool:
+        """
+        HNSW 墓碑过多时重建图。返回是否重建。
+
+        在写锁内快照当前各行的 (intent_id, 码)，锁外在线程中建新图，期间的
+        索引变更记入 _index_log；建好后在写锁内按序补放日志再换上新图。
+        换图不是破坏性变更：新旧图的存活 key 相同，进行中的读者用哪张都有效。
+        建图是 Python 代码，与事件循环争 GIL，重建期间查询延迟会上升。
+        """
+        if not self._stale_index():
+            return False
+        async with self._lock:
+            if not self._stale_index():
+                return False
+            index = self._index
+            keys = list(self._id_index)
+            codes = self._vectors.copy()
+            self._index_log = []
+        try:
+            loop = asyncio.get_running_loop()
+            fresh = await loop.run_in_executor(None, index.rebuilt, keys, codes)
+            async with self._lock:
+                for intent_id, code in self._index_log:
+                    if code is None:
+                        fresh.remove(intent_id)
+                    else:
+                        fresh.add(intent_id, code)
+                self._index = fresh
+        finally:
+            self._index_log = None
+        self._index_rebuilds += 1
+        logger.info(
+            "Field HNSW index rebuilt: %d nodes (%d tombstones purged)",
+            len(fresh), index.tombstones,
+        )
+        return True
+
+    def _stale_index(self) -> bool:
+        index = self._index
+        return (
+            isinstance(index, HnswIndex)
+            and self._index_log is None
+            and index.tombstones >= max(_INDEX_REBUILD_MIN, _INDEX_REBUILD_RATIO * len(index))
+        )
+
+    def _ensure_maintenance(self) -> None:
+        """有 TTL 登记、占用率过低或 HNSW 墓碑过多时惰性启动后台维护任务。须在事件循环内调用。"""
+        if self._maintenance_interval <= 0:
+            return
+        if self._maintenance is not None and not self._maintenance.done():
+            return
+        if self._expires or self._sparse() or self._stale_index():
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        """每 maintenance_interval 秒淘汰到期 Intent、按需缩容与重建索引；无事可做时退出。"""
+        while self._expires or self._sparse() or self._stale_index():
+            await asyncio.sleep(self._maintenance_interval)
+            try:
+                await self.expire()
+                await self.compact()
+                await self.rebuild_index()
+            except Exception:
+                logger.exception("Field maintenance round failed")
 
     def _grow_buffer(self) -> None:
         """向量矩阵容量翻倍。"""
-        new_capacity = self._capacity * 2
+        self._resize_buffer(self._capacity * 2)
+        logger.info("Field buffer grown to %d", self._capacity)
+
+    def _resize_buffer(self, new_capacity: int) -> None:
+        """向量矩阵、密集副本与各行对齐列换成 new_capacity 行的新缓冲区，复制活跃行。"""
         new_buf = np.zeros((new_capacity, self._packed_dim), dtype=np.uint8)
         new_buf[: self._active_count] = self._vector_buf[: self._active_count]
         self._vector_buf = new_buf
+        if self._dense_buf is not None:
+            new_dense = np.zeros(
+                (new_capacity, self._dense_buf.shape[1]), dtype=self._dense_buf.dtype
+            )
+            new_dense[: self._active_count] = self._dense_buf[: self._active_count]
+            self._dense_buf = new_dense
+        self._resize_columns(new_capacity)
         self._capacity = new_capacity
-        logger.info("Field buffer grown to %d", new_capacity)
+        self._vectors = self._vector_buf[: self._active_count]
+
+    def _resize_columns(self, new_capacity: int) -> None:
+        """owner / 创建时间列、码前缀副本与字节列的行数换成 new_capacity。"""
+        n = self._active_count
+        if self._prefix_buf is not None:
+            new_prefix = np.zeros((new_capacity, self._cascade_bytes), dtype=np.uint8)
+            new_prefix[:n] = self._prefix_buf[:n]
+            self._prefix_buf = new_prefix
+        new_col = np.zeros(new_capacity, dtype=np.int32)
+        new_col[:n] = self._owner_col[:n]
+        self._owner_col = new_col
+        new_created = np.zeros(new_capacity, dtype=np.float64)
+        new_created[:n] = self._created_col[:n]
+        self._created_col = new_created
+        self._texts.resize(new_capacity)
+        self._metas.resize(new_capacity)
@@ -0,0 +1,420 @@
+"""
+二进制码的子线性检索索引。
+
+MihIndex — Multi-Index Hashing（Norouzi et al., 2012）：
+把 packed 码切成 m 段子串，每段一张哈希表（子串 → key 集合）。
+查询时按半径 r = 0, 1, 2 ... 逐层探测每张表中与查询子串相差 ≤ r bit 的桶，
+候选用完整 Hamming 距离验证。
+
+鸽巢原理：若 d(q, x) ≤ m·(r+1) − 1，则至少有一段子串相差 ≤ r bit。
+所以探测完半径 r 后，距离不超过该界的条目全部已被找到——
+当界内候选 ≥ k 时结果就是精确 top-k。超过 max_radius 仍不足 k 条时
+返回 None，由调用方回退到暴力扫描（保持精确）。
+
+适用于短码（MrlBqlProjector 的 64 字节）。SimHash 1250 字节码分段过多，
+不建议使用。
+
+HnswIndex — Hierarchical Navigable Small World（Malkov & Yashunin, 2016）：
+在 Hamming 距离上建多层近邻图，查询从顶层入口贪心下降，在第 0 层以
+ef_search 大小的候选表做 best-first 搜索。近似检索：ef_search 越大召回越高、
+越慢，不保证精确 top-k。
+- 插入增量完成（每条一次 ef_construction 搜索 + 邻居裁剪）
+- 删除只打墓碑：节点留在图中继续参与导航，但不再出现在结果里；墓碑多了
+  搜索变慢、召回下降，由调用方按 tombstones 定期 rebuilt() 重建
+- 第 0 层邻接表是 int32[容量, 2M] 矩阵，上层节点很少（每层约 1/M），用字典
+
+节点的码自存一份（插入时拷贝），图上的距离计算不依赖调用方的存储。
+纯 Python + NumPy 实现，每次扩展一个节点做一次向量化距离计算：1 万条 64 字节
+聚类码上插入约 4 ms/条，ef_search=64 查询 p50 约 1.5 ms。建图成本随规模线性
+增长，千万级需按小时计。
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import random
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from itertools import combinations
+
+import numpy as np
+
+from towow.field.projector import hamming_distance, hamming_distance_many
+
+# 每段子串的字节数：64 字节码 → 16 段 × 32 bit
+_DEFAULT_SUBSTRING_BYTES = 4
+# 每段最多探测到的半径：C(32, 2) = 496 个掩码/段
+_DEFAULT_MAX_RADIUS = 2
+
+# HNSW：上层每节点 M 条边（第 0 层 2M 条）、插入时的候选表大小、默认查询候选表大小
+_DEFAULT_HNSW_M = 16
+_DEFAULT_EF_CONSTRUCTION = 100
+_DEFAULT_EF_SEARCH = 64
+_INITIAL_NODES = 1024
+
+
+def _flip_masks(width: int, radius: int) -> list[int]:
+    """width bit 内恰好 radius 个 1 的所有掩码。"""
+    masks = []
+    for bits in combinations(range(width), radius):
+        m = 0
+        for b in bits:
+            m |= 1 << b
+        masks.append(m)
+    return masks
+
+
+class MihIndex:
+    """Multi-Index Hashing 索引。key 由调用方定义（MemoryField 用 intent_id）。"""
+
+    def __init__(
+        self,
+        packed_dim: int,
+        substring_bytes: int = _DEFAULT_SUBSTRING_BYTES,
+        max_radius: int = _DEFAULT_MAX_RADIUS,
+    ) -> None:
+        if packed_dim <= 0:
+            raise ValueError("packed_dim must be positive")
+        self._packed_dim = packed_dim
+        self._max_radius = max_radius
+        # 子串边界（字节）：最后一段可能较短
+        self._bounds: list[tuple[int, int]] = [
+            (start, min(start + substring_bytes, packed_dim))
+            for start in range(0, packed_dim, substring_bytes)
+        ]
+        self._tables: list[defaultdict[int, set[str]]] = [
+            defaultdict(set) for _ in self._bounds
+        ]
+        # 按段宽缓存翻转掩码：width → [radius → masks]
+        self._masks: dict[int, list[list[int]]] = {}
+        for start, end in self._bounds:
+            width = (end - start) * 8
+            if width not in self._masks:
+                self._masks[width] = [
+                    _flip_masks(width, r) for r in range(max_radius + 1)
+                ]
+        self._size = 0
+
+    @property
+    def n_tables(self) -> int:
+        return len(self._tables)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _substrings(self, code: np.ndarray) -> list[int]:
+        raw = np.asarray(code, dtype=np.uint8).tobytes()
+        return [int.from_bytes(raw[s:e], "big") for s, e in self._bounds]
+
+    def add(self, key: str, code: np.ndarray) -> None:
+        """插入一条码。同一 key 重复插入由调用方避免。"""
+        for table, sub in zip(self._tables, self._substrings(code)):
+            table[sub].add(key)
+        self._size += 1
+
+    def remove(self, key: str, code: np.ndarray) -> None:
+        """删除一条码。code 必须是插入时的码。不存在时静默。"""
+        removed = False
+        for table, sub in zip(self._tables, self._substrings(code)):
+            bucket = table.get(sub)
+            if bucket is None or key not in bucket:
+                continue
+            bucket.discard(key)
+            removed = True
+            if not bucket:
+                del table[sub]
+        if removed:
+            self._size -= 1
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        verify: Callable[[list[str]], np.ndarray],
+    ) -> tuple[list[str], np.ndarray] | None:
+        """
+        精确 Hamming top-k。
+
+        verify(keys) 返回这些 key 到 query 的完整 Hamming 距离（int[len(keys)]）。
+        返回 (keys, distances)，按距离升序；探测到 max_radius 仍无法证明
+        top-k 完整时返回 None。
+        """
+        if k <= 0:
+            return [], np.empty(0, dtype=np.int64)
+        q_subs = self._substrings(query)
+        m = len(self._tables)
+        seen: set[str] = set()
+        keys: list[str] = []
+        dists: list[np.ndarray] = []
+
+        for r in range(self._max_radius + 1):
+            new_keys: list[str] = []
+            for table, q_sub, (s, e) in zip(self._tables, q_subs, self._bounds):
+                for mask in self._masks[(e - s) * 8][r]:
+                    bucket = table.get(q_sub ^ mask)
+                    if not bucket:
+                        continue
+                    for key in bucket:
+                        if key not in seen:
+                            seen.add(key)
+                            new_keys.append(key)
+            if new_keys:
+                keys.extend(new_keys)
+                dists.append(np.asarray(verify(new_keys), dtype=np.int64))
+
+            if not keys:
+                continue
+            all_dists = np.concatenate(dists)
+            bound = m * (r + 1) - 1
+            complete = len(keys) == self._size
+            if complete or int((all_dists <= bound).sum()) >= k:
+                order = np.argsort(all_dists, kind="stable")[:k]
+                return [keys[i] for i in order], all_dists[order]
+        return None
+
+
+class HnswIndex:
+    """HNSW 近似近邻图索引（Hamming 距离）。key 由调用方定义（MemoryField 用 intent_id）。"""
+
+    def __init__(
+        self,
+        packed_dim: int,
+        m: int = _DEFAULT_HNSW_M,
+        ef_construction: int = _DEFAULT_EF_CONSTRUCTION,
+        ef_search: int = _DEFAULT_EF_SEARCH,
+        seed: int = 0,
+    ) -> None:
+        if packed_dim <= 0:
+            raise ValueError("packed_dim must be positive")
+        if m < 2:
+            raise ValueError("m must be >= 2")
+        if ef_construction < 1 or ef_search < 1:
+            raise ValueError("ef_construction and ef_search must be >= 1")
+        self._packed_dim = packed_dim
+        self._m = m
+        self._m0 = 2 * m
+        self._ef_construction = ef_construction
+        self._ef_search = ef_search
+        self._seed = seed
+        self._level_mult = 1.0 / math.log(m)
+        self._rng = random.Random(seed)
+
+        # 节点号 = 插入序号，只增不回收（墓碑节点留在图中，重建时清除）
+        self._codes = np.zeros((_INITIAL_NODES, packed_dim), dtype=np.uint8)
+        self._links = np.full((_INITIAL_NODES, self._m0), -1, dtype=np.int32)
+        self._degree = np.zeros(_INITIAL_NODES, dtype=np.int32)
+        self._upper: list[dict[int, list[int]]] = []  # 第 l 层（l ≥ 1）在 _upper[l - 1]
+        self._keys: list[str | None] = []
+        self._nodes: dict[str, int] = {}
+        self._dead: set[int] = set()
+        self._entry = -1
+        self._top = -1
+
+    @property
+    def ef_search(self) -> int:
+        return self._ef_search
+
+    @property
+    def tombstones(self) -> int:
+        """已删除但仍留在图中的节点数。"""
+        return len(self._dead)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "nodes": len(self._keys),
+            "live": len(self._nodes),
+            "tombstones": len(self._dead),
+            "levels": self._top + 1,
+            "m": self._m,
+            "ef_construction": self._ef_construction,
+            "ef_search": self._ef_search,
+        }
+
+    def add(self, key: str, code: np.ndarray) -> None:
+        """插入一条码。同一 key 重复插入由调用方避免（先 remove）。"""
+        node = len(self._keys)
+        if node == self._codes.shape[0]:
+            self._grow()
+        code = np.asarray(code, dtype=np.uint8)
+        self._codes[node] = code
+        self._keys.append(key)
+        self._nodes[key] = node
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        while len(self._upper) < level:
+            self._upper.append({})
+        for layer in range(1, level + 1):
+            self._upper[layer - 1][node] = []
+
+        if self._entry >= 0:
+            ep = self._entry
+            entries = [(int(hamming_distance(code, self._codes[ep : ep + 1])[0]), ep)]
+            for layer in range(self._top, level, -1):
+                entries = self._search_layer(code, entries, 1, layer, live_only=False)
+            for layer in range(min(level, self._top), -1, -1):
+                found = self._search_layer(
+                    code, entries, self._ef_construction, layer, live_only=False
+                )
+                cap = self._m0 if layer == 0 else self._m
+                chosen = self._select(found, cap)
+                self._set_neighbors(node, layer, chosen)
+                for neighbor in chosen:
+                    self._connect(neighbor, node, layer, cap)
+                entries = found
+        if level > self._top:
+            self._entry, self._top = node, level
+
+    def remove(self, key: str, code: np.ndarray | None = None) -> None:
+        """删除一条码（打墓碑）。不存在时静默。code 不使用，与 MihIndex 接口一致。"""
+        node = self._nodes.pop(key, None)
+        if node is None:
+            return
+        self._keys[node] = None
+        self._dead.add(node)
+
+    def search(
+        self, query: np.ndarray, k: int, ef: int = 0
+    ) -> tuple[list[str], np.ndarray] | None:
+        """
+        近似 Hamming top-k。
+
+        ef 为第 0 层候选表大小（0 = 构造时的 ef_search，不小于 k）。返回 (keys,
+        distances)，按距离升序；可达的存活节点不足 k 个时返回 None。
+        """
+        if k <= 0:
+            return [], np.empty(0, dtype=np.int64)
+        ep, top = self._entry, self._top
+        if ep < 0:
+            return None
+        query = np.asarray(query, dtype=np.uint8)
+        entries = [(int(hamming_distance(query, self._codes[ep : ep + 1])[0]), ep)]
+        for layer in range(top, 0, -1):
+            entries = self._search_layer(query, entries, 1, layer, live_only=False)
+        found = self._search_layer(
+            query, entries, max(ef or self._ef_search, k), 0, live_only=True
+        )[:k]
+        if len(found) < k:
+            return None
+        keys = [self._keys[node] for _, node in found]
+        return keys, np.array([d for d, _ in found], dtype=np.int64)
+
+    def rebuilt(self, keys: Iterable[str], codes: np.ndarray) -> HnswIndex:
+        """同参数的新图，只含给定的 (key, code)。墓碑由此清除。"""
+        fresh = HnswIndex(
+            self._packed_dim, self._m, self._ef_construction, self._ef_search, self._seed
+        )
+        for key, code in zip(keys, codes):
+            fresh.add(key, code)
+        return fresh
+
+    def _neighbors(self, node: int, layer: int) -> list[int]:
+        if layer == 0:
+            return self._links[node, : self._degree[node]].tolist()
+        return self._upper[layer - 1].get(node, [])
+
+    def _search_layer(
+        self,
+        query: np.ndarray,
+        entries: list[tuple[int, int]],
+        ef: int,
+        layer: int,
+        live_only: bool,
+    ) -> list[tuple[int, int]]:
+        """
+        单层 best-first 搜索 → 至多 ef 个 (距离, 节点)，按距离升序。
+
+        live_only 时墓碑节点照常扩展（保持连通），但不进入结果。
+        """
+        codes, links, degree = self._codes, self._links, self._degree
+        dead = self._dead if live_only else ()
+        visited = {node for _, node in entries}
+        candidates = list(entries)
+        heapq.heapify(candidates)
+        results = [(-d, node) for d, node in entries if node not in dead]
+        heapq.heapify(results)
+        while candidates:
+            d, node = heapq.heappop(candidates)
+            if len(results) >= ef and d > -results[0][0]:
+                break
+            if layer == 0:
+                neighbors = links[node, : degree[node]].tolist()
+            else:
+                neighbors = self._upper[layer - 1].get(node, [])
+            fresh = [n for n in neighbors if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for n, dn in zip(fresh, hamming_distance(query, codes[fresh]).tolist()):
+                if len(results) < ef or dn < -results[0][0]:
+                    heapq.heappush(candidates, (dn, n))
+                    if n not in dead:
+                        heapq.heappush(results, (-dn, n))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return sorted((-nd, node) for nd, node in results)
+
+    def _select(self, found: list[tuple[int, int]], cap: int) -> list[int]:
+        """
+        邻居选择启发式：按距离从近到远，候选比已选邻居都更靠近基点时保留
+        （边朝不同方向展开）；不足 cap 条时用被跳过的最近候选补齐。
+        """
+        nodes = [node for _, node in found]
+        if len(nodes) <= cap:
+            return nodes
+        dists = np.array([d for d, _ in found])
+        pair = hamming_distance_many(self._codes[nodes], self._codes[nodes])
+        # blocked[i]：某个已选邻居比基点更靠近候选 i
+        blocked = np.zeros(len(nodes), dtype=bool)
+        chosen: list[int] = []
+        skipped: list[int] = []
+        for i in range(len(nodes)):
+            if blocked[i]:
+                skipped.append(i)
+                continue
+            chosen.append(i)
+            if len(chosen) == cap:
+                break
+            blocked |= pair[i] < dists
+        chosen += skipped[: cap - len(chosen)]
+        return [nodes[i] for i in chosen]
+
+    def _set_neighbors(self, node: int, layer: int, neighbors: list[int]) -> None:
+        if layer == 0:
+            self._links[node, : len(neighbors)] = neighbors
+            self._degree[node] = len(neighbors)
+        else:
+            self._upper[layer - 1][node] = neighbors
+
+    def _connect(self, node: int, new: int, layer: int, cap: int) -> None:
+        """
+        反向边 node → new；邻接表已满时去掉离 node 最远的一个。
+
+        反向边不再走选择启发式：插入成本约减半，聚类数据上召回没有可见差别。
+        """
+        neighbors = self._neighbors(node, layer)
+        if len(neighbors) < cap:
+            if layer == 0:
+                self._links[node, len(neighbors)] = new
+                self._degree[node] = len(neighbors) + 1
+            else:
+                self._upper[layer - 1][node] = neighbors + [new]
+            return
+        candidates = neighbors + [new]
+        dists = hamming_distance(self._codes[node], self._codes[candidates])
+        del candidates[int(np.argmax(dists))]
+        self._set_neighbors(node, layer, candidates)
+
+    def _grow(self) -> None:
+        """节点数组容量翻倍。换成新数组（不原地扩容），读线程持有的旧数组仍可读。"""
+        capacity = self._codes.shape[0] * 2
+        codes = np.zeros((capacity, self._packed_dim), dtype=np.uint8)
+        links = np.full((capacity, self._m0), -1, dtype=np.int32)
+        degree = np.zeros(capacity, dtype=np.int32)
+        n = len(self._keys)
+        codes[:n] = self._codes[:n]
+        links[:n] = self._links[:n]
+        degree[:n] = self._degree[:n]
+        self._codes, self._links, self._degree = codes, links, degree
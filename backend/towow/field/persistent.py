@@ -0,0 +1,507 @@
+"""
+PersistentField — 持久化的 MemoryField（mmap 向量矩阵 + sidecar + WAL）。
+
+重启不丢 Intent，也不需要经 EncodingPipeline 重新编码：
+冷启动 = mmap 向量文件 + 读取 sidecar + 回放 WAL 尾部。
+
+目录结构：
+- vectors.u8: uint8[capacity, packed_dim] 向量矩阵，np.memmap 原地增长
+- dense.bin:  可选密集副本（dense_dtype 非空时），同样 mmap
+- intents.json: sidecar 快照，按行序存储列式元数据（owner 去重成表）
+- wal.log: 追加式 JSON 行日志，记录快照之后的 add/del/upd
+- wal.log.<n>: checkpoint 时轮换出的 WAL 段，sidecar 写完后删除
+
+一致性约定：向量文件是向量内容的唯一真相（MAP_SHARED 写入在进程崩溃后仍在
+页缓存中；fsync=True 时每次写入涉及的向量行都 msync，新增行在 WAL fsync
+之前，断电后同样成立）；WAL 只记录"行 → intent"映射的变化。回放时只重放映射，
+不搬运向量——最终映射与向量文件的最终内容一致。唯一的窗口是最后一条 del：
+WAL 先落盘、swap 搬运可能未完成，因此回放结束后对最后一条 del 重做一次
+行拷贝（该操作之后再无写入，拷贝幂等）。upd（upsert 原地改写）同理：
+记录里带上新向量（base64），先落盘再覆盖该行；只有最后一条 upd 的覆盖
+可能未完成，回放结束后重写一次。
+
+checkpoint 在写锁内复制各行对齐列并把 wal.log 轮换为 wal.log.<n>，
+之后在 checkpoint 线程中刷新 mmap、原子替换 sidecar（记下 epoch = n + 1）
+并删除已并入的段，不阻塞事件循环。冷启动回放 sidecar epoch 之后的各段，
+再回放 wal.log。WAL 记录数达到 checkpoint_every 时自动 checkpoint。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import mmap
+import os
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from towow.field.field import (
+    _INITIAL_CAPACITY,
+    MemoryField,
+    _decode_metadata,
+    _dedup_key,
+    _encode_metadata,
+)
+from towow.field.pipeline import EncodingPipeline
+from towow.field.types import Intent
+
+logger = logging.getLogger(__name__)
+
+_VECTORS_FILE = "vectors.u8"
+_DENSE_FILE = "dense.bin"
+_SIDECAR_FILE = "intents.json"
+_WAL_FILE = "wal.log"
+_SIDECAR_VERSION = 1
+
+_DEFAULT_CHECKPOINT_EVERY = 10_000
+
+
+class PersistentField(MemoryField):
+    """磁盘持久场。满足 IntentField Protocol，行为与 MemoryField 一致。"""
+
+    def __init__(
+        self,
+        pipeline: EncodingPipeline,
+        path: str | Path,
+        fsync: bool = False,
+        checkpoint_every: int = _DEFAULT_CHECKPOINT_EVERY,
+        **kwargs,
+    ) -> None:
+        super().__init__(pipeline, **kwargs)
+        self._dir = Path(path)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._fsync = fsync
+        self._checkpoint_every = checkpoint_every
+        self._wal_records = 0
+        self._wal = None
+        # 当前 WAL 的段号；sidecar 的 epoch = 它覆盖到的第一个未并入段
+        self._wal_epoch = 0
+        # sidecar 序列化与 fsync 在单线程中按提交顺序执行
+        self._checkpoint_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="field-checkpoint"
+        )
+        self._checkpoint_pending: Future | None = None
+        self._open()
+
+    # ── 写路径钩子 ─────────────────────────────────────────
+
+    def _append_many_locked(
+        self,
+        intents: list[Intent],
+        binary_vecs: np.ndarray,
+        dense_vecs: np.ndarray | None = None,
+    ) -> None:
+        # 先写向量行，再写 WAL：崩溃在两者之间时这些 Intent 未被确认，丢弃即可
+        start = self._active_count
+        super()._append_many_locked(intents, binary_vecs, dense_vecs)
+        if self._fsync:
+            # add 记录不带向量：WAL fsync 之前先让这些行的向量落盘
+            self._sync_rows(start, start + len(intents))
+        self._log_many([
+            {
+                "op": "add",
+                "row": row,
+                "id": intent.id,
+                "owner": intent.owner,
+                "text": intent.text,
+                "metadata": intent.metadata,
+                "created_at": intent.created_at,
+            }
+            for row, intent in enumerate(intents, start)
+        ])
+        self._maybe_checkpoint()
+
+    def _remove_locked(self, intent_id: str) -> None:
+        if intent_id not in self._pos_index:
+            return
+        # 先写 WAL 再 swap：崩溃窗口由回放末尾的行拷贝修复
+        row = self._pos_index[intent_id]
+        self._log_many([{"op": "del", "id": intent_id}])
+        super()._remove_locked(intent_id)
+        if self._fsync:
+            # 回放只修复最后一条 del 的搬运，之前的搬运须在下一条记录前落盘
+            self._sync_rows(row, row + 1)
+        self._maybe_checkpoint()
+
+    def _overwrite_locked(
+        self,
+        current: Intent,
+        updated: Intent,
+        binary_vec: np.ndarray,
+        dense_vec: np.ndarray | None = None,
+    ) -> None:
+        # 先写 WAL（带新向量）再原地覆盖：崩溃窗口由回放末尾的重写修复
+        record = {
+            "op": "upd",
+            "id": updated.id,
+            "text": updated.text,
+            "metadata": updated.metadata,
+            "vector": base64.b64encode(binary_vec.tobytes()).decode(),
+        }
+        if self._dense_buf is not None and dense_vec is not None:
+            dense_row = self._quantize_dense(dense_vec.reshape(1, -1))[0]
+            record["dense"] = base64.b64encode(dense_row.tobytes()).decode()
+        row = self._pos_index[current.id]
+        self._log_many([record])
+        super()._overwrite_locked(current, updated, binary_vec, dense_vec)
+        if self._fsync:
+            self._sync_rows(row, row + 1)
+        self._maybe_checkpoint()
+
+    def _resize_buffer(self, new_capacity: int) -> None:
+        """
+        mmap 文件原地改变容量（ftruncate + 重新映射），不复制数据。
+
+        缩容（compact）前先 checkpoint：WAL 清空后，回放不会再引用被截掉的行
+        （尤其是末条 del 的行拷贝修复）；截短后再 checkpoint 一次记录新容量。
+        """
+        shrink = new_capacity < self._capacity
+        if shrink:
+            self._checkpoint_locked()
+        self._vector_buf.flush()
+        self._vector_buf = self._map(_VECTORS_FILE, new_capacity, self._packed_dim, np.uint8)
+        if self._dense_buf is not None:
+            self._dense_buf.flush()
+            self._dense_buf = self._map(
+                _DENSE_FILE, new_capacity, self._dense_buf.shape[1], self._dense_buf.dtype
+            )
+        self._resize_columns(new_capacity)
+        self._capacity = new_capacity
+        self._vectors = self._vector_buf[: self._active_count]
+        if shrink:
+            self._checkpoint_locked()
+
+    # ── 持久化操作 ─────────────────────────────────────────
+
+    async def checkpoint(self) -> None:
+        """刷新 mmap、写 sidecar 快照并轮换 WAL，等快照落盘后返回。"""
+        async with self._lock:
+            write = self._begin_checkpoint_locked()
+        await asyncio.wrap_future(self._checkpoint_executor.submit(write))
+
+    async def close(self) -> None:
+        """checkpoint 后关闭 WAL。之后不应再使用该实例。"""
+        async with self._lock:
+            write = self._begin_checkpoint_locked()
+            await asyncio.wrap_future(self._checkpoint_executor.submit(write))
+            self._wal.close()
+            self._wal = None
+        self._checkpoint_executor.shutdown(wait=True)
+        await super().close()
+
+    def _log_many(self, records: list[dict]) -> None:
+        """追加 WAL 记录，整批一次 flush（fsync=True 时一次 fsync）。"""
+        self._wal.write(
+            "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        )
+        self._wal.flush()
+        if self._fsync:
+            os.fsync(self._wal.fileno())
+        self._wal_records += len(records)
+
+    def _sync_rows(self, start: int, end: int) -> None:
+        """msync 向量文件（及密集副本）中 [start, end) 行所在的页。"""
+        for buf in (self._vector_buf, self._dense_buf):
+            if buf is None or end <= start:
+                continue
+            row_bytes = buf.strides[0]
+            lo = start * row_bytes // mmap.PAGESIZE * mmap.PAGESIZE
+            buf._mmap.flush(lo, end * row_bytes - lo)
+
+    def _maybe_checkpoint(self) -> None:
+        """
+        变更已应用后调用：WAL 过长时自动 checkpoint。
+
+        锁内只做快照与 WAL 轮换，序列化与 fsync 交给 checkpoint 线程，
+        不阻塞事件循环。上一次还未落盘时不再提交，WAL 继续增长。
+        """
+        if self._wal_records < self._checkpoint_every:
+            return
+        if self._checkpoint_pending is not None and not self._checkpoint_pending.done():
+            return
+        self._checkpoint_pending = self._checkpoint_executor.submit(
+            self._begin_checkpoint_locked()
+        )
+
+    def _checkpoint_locked(self) -> None:
+        """同步 checkpoint（缩容、关闭时）：排在已提交的快照之后，落盘后返回。"""
+        self._checkpoint_executor.submit(self._begin_checkpoint_locked()).result()
+
+    def _begin_checkpoint_locked(self) -> Callable[[], None]:
+        """
+        锁内快照各行对齐列并轮换 WAL：当前 wal.log 改名为 wal.log.<段号>，
+        之后的记录写入新的 wal.log。返回在锁外写 sidecar 的函数。
+        """
+        n = self._active_count
+        snapshot = {
+            "vectors": self._vector_buf,
+            "dense": self._dense_buf,
+            "capacity": self._capacity,
+            "count": n,
+            "ids": list(self._id_index),
+            "owner_col": self._owner_col[:n].copy(),
+            "owner_names": list(self._owner_names),
+            "texts": self._texts.copy(),
+            "metas": self._metas.copy(),
+            "created_at": self._created_col[:n].copy(),
+        }
+        if self._wal is not None:
+            self._wal.close()
+            os.replace(self._dir / _WAL_FILE, self._rotated_wal(self._wal_epoch))
+        self._wal_epoch += 1
+        self._wal = open(self._dir / _WAL_FILE, "w", encoding="utf-8")
+        self._wal_records = 0
+        epoch = self._wal_epoch
+        return lambda: self._write_checkpoint(snapshot, epoch)
+
+    def _write_checkpoint(self, snapshot: dict, epoch: int) -> None:
+        """checkpoint 线程：刷新 mmap、原子替换 sidecar，再删除已并入的 WAL 段。"""
+        snapshot["vectors"].flush()
+        if snapshot["dense"] is not None:
+            snapshot["dense"].flush()
+
+        n = snapshot["count"]
+        texts, metas = snapshot["texts"], snapshot["metas"]
+        used, owners = np.unique(snapshot["owner_col"], return_inverse=True)
+        sidecar = {
+            "version": _SIDECAR_VERSION,
+            "epoch": epoch,
+            "packed_dim": self._packed_dim,
+            "capacity": snapshot["capacity"],
+            "count": n,
+            "owner_table": [snapshot["owner_names"][code] for code in used],
+            "rows": {
+                "ids": snapshot["ids"],
+                "owners": owners.tolist(),
+                "texts": [texts.get(row).decode() for row in range(n)],
+                "metadata": [_decode_metadata(metas.get(row)) for row in range(n)],
+                "created_at": snapshot["created_at"].tolist(),
+            },
+        }
+
+        tmp = self._dir / (_SIDECAR_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._dir / _SIDECAR_FILE)
+        for segment, path in self._rotated_wals():
+            if segment < epoch:
+                path.unlink(missing_ok=True)
+        logger.info("Field checkpoint: %d intents", n)
+
+    def _rotated_wal(self, segment: int) -> Path:
+        return self._dir / f"{_WAL_FILE}.{segment}"
+
+    def _rotated_wals(self) -> list[tuple[int, Path]]:
+        """已轮换、尚未并入 sidecar 的 WAL 段，按段号升序。"""
+        segments = []
+        for path in self._dir.glob(_WAL_FILE + ".*"):
+            suffix = path.name[len(_WAL_FILE) + 1 :]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return sorted(segments)
+
+    # ── 冷启动 ─────────────────────────────────────────────
+
+    def _map(self, name: str, capacity: int, width: int, dtype) -> np.memmap:
+        """映射 capacity 行的文件；文件大小不符时原地扩展或截短（缩容）。"""
+        path = self._dir / name
+        nbytes = capacity * width * np.dtype(dtype).itemsize
+        with open(path, "r+b" if path.exists() else "w+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() != nbytes:
+                f.truncate(nbytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, width))
+
+    def _open(self) -> None:
+        sidecar_path = self._dir / _SIDECAR_FILE
+        sidecar = None
+        if sidecar_path.exists():
+            with open(sidecar_path, encoding="utf-8") as f:
+                sidecar = json.load(f)
+            if sidecar.get("packed_dim") != self._packed_dim:
+                raise ValueError(
+                    f"Field at {self._dir} has packed_dim={sidecar.get('packed_dim')}, "
+                    f"pipeline expects {self._packed_dim}"
+                )
+
+        capacity = max(_INITIAL_CAPACITY, sidecar["capacity"] if sidecar else 0)
+        vectors_path = self._dir / _VECTORS_FILE
+        if vectors_path.exists():
+            capacity = max(capacity, vectors_path.stat().st_size // self._packed_dim)
+        self._capacity = capacity
+        self._resize_columns(capacity)
+        self._vector_buf = self._map(_VECTORS_FILE, capacity, self._packed_dim, np.uint8)
+        if self._dense_buf is not None:
+            self._dense_buf = self._map(
+                _DENSE_FILE, capacity, self._dense_buf.shape[1], self._dense_buf.dtype
+            )
+
+        if sidecar is not None:
+            rows = sidecar["rows"]
+            owner_table = sidecar["owner_table"]
+            for iid, code, text, meta, ts in zip(
+                rows["ids"], rows["owners"], rows["texts"],
+                rows["metadata"], rows["created_at"],
+            ):
+                self._restore_row(Intent(
+                    id=iid, owner=owner_table[code], text=text,
+                    metadata=meta, created_at=ts,
+                ))
+
+        # sidecar 之后的 WAL 段（checkpoint 线程未写完 sidecar 就退出时留下）按序回放
+        epoch = sidecar.get("epoch", 0) if sidecar else 0
+        wal_paths = []
+        for segment, path in self._rotated_wals():
+            if segment < epoch:
+                path.unlink()
+            else:
+                wal_paths.append(path)
+                epoch = segment + 1
+        self._wal_epoch = epoch
+        replayed = self._replay_wal(wal_paths + [self._dir / _WAL_FILE])
+
+        # 重建派生索引
+        self._vectors = self._vector_buf[: self._active_count]
+        if self._prefix_buf is not None:
+            self._prefix_buf[: self._active_count] = self._vectors[:, : self._cascade_bytes]
+        for row, iid in enumerate(self._id_index):
+            owner = self._owner_names[self._owner_col[row]]
+            self._dedup[_dedup_key(owner, self._texts.get(row).decode())] = iid
+        if self._index is not None:
+            for row, iid in enumerate(self._id_index):
+                self._index.add(iid, self._vector_buf[row])
+
+        self._wal = open(self._dir / _WAL_FILE, "a", encoding="utf-8")
+        self._wal_records = replayed
+        logger.info(
+            "Persistent field opened at %s: %d intents (%d WAL records replayed)",
+            self._dir, self._active_count, replayed,
+        )
+
+    def _replay_wal(self, wal_paths: list[Path]) -> int:
+        """按序回放各 WAL 段的映射。返回有效记录数。末尾的残缺行被截掉。"""
+        count = 0
+        last_move: tuple[int, int] | None = None
+        last_update: dict | None = None
+        for wal_path in wal_paths:
+            if not wal_path.exists():
+                continue
+            good_offset = 0
+            with open(wal_path, "rb") as f:
+                for raw in f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        logger.warning(
+                            "Truncating torn WAL tail of %s at offset %d", wal_path.name, good_offset
+                        )
+                        break
+                    good_offset += len(raw)
+                    count += 1
+                    if record["op"] == "add":
+                        if record["row"] != self._active_count:
+                            raise ValueError(
+                                f"WAL row mismatch for {record['id']}: "
+                                f"expected {self._active_count}, got {record['row']}"
+                            )
+                        self._restore_row(Intent(
+                            id=record["id"], owner=record["owner"], text=record["text"],
+                            metadata=record["metadata"], created_at=record["created_at"],
+                        ))
+                        last_move = last_update = None
+                    elif record["op"] == "del":
+                        last_move = self._forget_row(record["id"])
+                        last_update = None
+                    elif record["op"] == "upd":
+                        self._rewrite_row(record["id"], record["text"], record["metadata"])
+                        last_move = None
+                        last_update = record
+
+            if good_offset < wal_path.stat().st_size:
+                with open(wal_path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        # 最后一条 del 的 swap 搬运可能未完成：重做一次（幂等）
+        if last_move is not None:
+            idx, last = last_move
+            self._vector_buf[idx] = self._vector_buf[last]
+            if self._dense_buf is not None:
+                self._dense_buf[idx] = self._dense_buf[last]
+        # 最后一条 upd 的原地覆盖可能未完成：按记录里的向量重写（幂等）
+        if last_update is not None and last_update["id"] in self._pos_index:
+            row = self._pos_index[last_update["id"]]
+            self._vector_buf[row] = np.frombuffer(
+                base64.b64decode(last_update["vector"]), dtype=np.uint8
+            )
+            if self._dense_buf is not None and "dense" in last_update:
+                self._dense_buf[row] = np.frombuffer(
+                    base64.b64decode(last_update["dense"]), dtype=self._dense_buf.dtype
+                )
+        return count
+
+    def _restore_row(self, intent: Intent) -> None:
+        """追加映射（向量已在 mmap 中）。"""
+        if self._active_count >= self._capacity:
+            self._grow_buffer()
+        row = self._active_count
+        code = self._owner_code(intent.owner)
+        self._owner_col[row] = code
+        self._retain_owner(code)
+        self._created_col[row] = intent.created_at
+        self._texts.append_many([intent.text.encode()])
+        meta_blob = _encode_metadata(intent.metadata)
+        self._metas.append_many([meta_blob])
+        self._id_index.append(intent.id)
+        self._pos_index[intent.id] = row
+        self._index_metadata(row, _decode_metadata(meta_blob))
+        self._schedule_expiry(intent)
+        self._active_count += 1
+
+    def _rewrite_row(self, intent_id: str, text: str, metadata: dict) -> None:
+        """改写映射中的 text / metadata（向量已在 mmap 中），行号不变。"""
+        row = self._pos_index.get(intent_id)
+        if row is None:
+            return
+        current = self._intent_at(row)
+        updated = replace(current, text=text, metadata=metadata)
+        self._texts.set(row, text.encode())
+        meta_blob = _encode_metadata(metadata)
+        self._metas.set(row, meta_blob)
+        self._unindex_metadata(row, current.metadata)
+        self._index_metadata(row, _decode_metadata(meta_blob))
+        self._expires.pop(intent_id, None)
+        self._schedule_expiry(updated)
+
+    def _forget_row(self, intent_id: str) -> tuple[int, int] | None:
+        """按 swap-remove 规则移除映射与行对齐列，不搬运向量。返回需要的 (idx, last) 拷贝。"""
+        idx = self._pos_index.pop(intent_id, None)
+        if idx is None:
+            return None
+        self._expires.pop(intent_id, None)
+        self._release_owner(int(self._owner_col[idx]))
+        self._unindex_metadata(idx, self._metadata_at(idx))
+        last = self._active_count - 1
+        move = None
+        if idx != last:
+            moved_id = self._id_index[last]
+            moved_meta = self._metadata_at(last)
+            self._unindex_metadata(last, moved_meta)
+            self._index_metadata(idx, moved_meta)
+            self._id_index[idx] = moved_id
+            self._pos_index[moved_id] = idx
+            self._owner_col[idx] = self._owner_col[last]
+            self._created_col[idx] = self._created_col[last]
+            move = (idx, last)
+        self._texts.swap_remove(idx)
+        self._metas.swap_remove(idx)
+        self._id_index.pop()
+        self._active_count -= 1
+        return move
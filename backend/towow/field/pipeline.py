@@ -6,17 +6,24 @@
 2. encoder.encode_batch(chunks) → float[N, 768]
 3. projector.batch_project(dense) → uint8[N, 1250]
 4. bundle_binary(binaries) → uint8[1250]
+
+可选 cache（EmbeddingCache）：按 规范化文本 + 编码器/投影器身份 缓存
+encode_with_dense 的结果，重复查询不再跑模型。规范化（NFC + strip）
+无论是否启用缓存都会执行，两种模式的编码结果一致。写入路径传
+cache_results=False：命中照用，但不把 deposit / 批量导入的文本挤进查询 LRU。
 """
 
 from __future__ import annotations
 
 import hashlib
 import logging
+import unicodedata
 
 import numpy as np
 
+from towow.field.cache import EmbeddingCache
 from towow.field.chunker import split_chunks
-from towow.field.protocols import Encoder, Projector
+from towow.field.protocols import Encoder, Projector, batch_similarity_many
 from towow.field.projector import bundle_binary
 
 logger = logging.getLogger(__name__)
@@ -25,35 +32,172 @@ logger = logging.getLogger(__name__)
 class EncodingPipeline:
     """组合 Encoder + Projector + Chunker 为统一编码流水线。"""
 
-    def __init__(self, encoder: Encoder, projector: Projector) -> None:
+    def __init__(
+        self,
+        encoder: Encoder,
+        projector: Projector,
+        cache: EmbeddingCache | None = None,
+    ) -> None:
         self._encoder = encoder
         self._projector = projector
+        self._cache = cache
+        # 缓存键前缀：同一缓存被多个 pipeline 共享时区分模型与投影
+        self._cache_namespace = "|".join(
+            str(part)
+            for part in (
+                type(encoder).__qualname__,
+                getattr(encoder, "model_name", ""),
+                encoder.dim,
+                type(projector).__qualname__,
+                projector.packed_dim,
+                getattr(projector, "D", ""),
+                getattr(projector, "seed", ""),
+            )
+        )
+
+    @property
+    def cache(self) -> EmbeddingCache | None:
+        return self._cache
 
-    def encode_text(self, text: str) -> np.ndarray:
+    def encode_text(self, text: str, cache_results: bool = True) -> np.ndarray:
         """
         text → packed binary vector (uint8[1250])。
 
         短文本直接编码。长文本切分后逐块编码再 bundle。
         """
+        return self.encode_with_dense(text, cache_results)[0]
+
+    def encode_with_dense(
+        self, text: str, cache_results: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        text → (packed binary vector, 归一化密集向量 float32[dim])。
+
+        密集向量用于两阶段检索的精排：单 chunk 即编码结果，
+        多 chunk 取各块均值后重新归一化（与 binary 的 bundle 对应）。
+        cache_results=False 时只读缓存，未命中的编码结果不写回。
+        """
+        text = _normalize(text)
+        if self._cache is None:
+            return self._encode_uncached(text)
+        key = EmbeddingCache.make_key(self._cache_namespace, text)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        binary, dense = self._encode_uncached(text)
+        if cache_results:
+            self._cache.put(key, binary, dense)
+        return binary, dense
+
+    def _encode_uncached(self, text: str) -> tuple[np.ndarray, np.ndarray]:
         chunks = split_chunks(text)
         if not chunks:
             raise ValueError("Cannot encode empty text")
 
         if len(chunks) == 1:
             dense = self._encoder.encode(chunks[0])
-            return self._projector.project(dense)
+            return self._projector.project(dense), dense
 
         # 多 chunk: batch encode → batch project → bundle
         dense_vecs = self._encoder.encode_batch(chunks)
         binary_vecs = self._projector.batch_project(dense_vecs)
+        return self._combine_chunks(text, binary_vecs, dense_vecs)
+
+    def _combine_chunks(
+        self, text: str, binary_vecs: np.ndarray, dense_vecs: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """多 chunk → (bundle 后的 binary, 均值重新归一化的 dense)。"""
         # bundle 的 seed 基于文本 hash，确保确定性
         seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
         D = getattr(self._projector, 'D', self._projector.packed_dim * 8)
-        return bundle_binary(list(binary_vecs), D=D, seed=seed)
+        binary = bundle_binary(binary_vecs, D=D, seed=seed)
+        dense = dense_vecs.mean(axis=0)
+        norm = np.linalg.norm(dense)
+        if norm > 0:
+            dense = dense / norm
+        return binary, dense.astype(np.float32)
+
+    def encode_texts(
+        self, texts: list[str], cache_results: bool = True
+    ) -> list[np.ndarray]:
+        """批量编码多段文本。所有文本的 chunk 合并为一次 encode_batch。"""
+        return list(self.encode_texts_with_dense(texts, cache_results)[0])
+
+    def encode_texts_with_dense(
+        self, texts: list[str], cache_results: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        多段文本 → (uint8[N, packed_dim], float32[N, dim])，与逐条 encode_with_dense 对应。
 
-    def encode_texts(self, texts: list[str]) -> list[np.ndarray]:
-        """批量编码多段文本。每段独立走 chunk+bundle 流水线。"""
-        return [self.encode_text(t) for t in texts]
+        缓存命中的文本直接取用，批内重复文本只编码一次。其余文本全部切分后
+        把 chunk 展平，按长度排序（同批长度相近，padding 少）一次
+        encode_batch + batch_project，再按文本回组：单 chunk 直接取行，
+        多 chunk 做 bundle。cache_results 同 encode_with_dense。
+        """
+        texts = [_normalize(t) for t in texts]
+        binaries = np.empty((len(texts), self.packed_dim), dtype=np.uint8)
+        denses = np.empty((len(texts), self.dense_dim), dtype=np.float32)
+
+        keys: list[str | None] = [None] * len(texts)
+        todo: list[int] = []
+        first: dict[str, int] = {}
+        duplicates: list[tuple[int, int]] = []
+        for i, text in enumerate(texts):
+            if text in first:
+                duplicates.append((i, first[text]))
+                continue
+            first[text] = i
+            if self._cache is not None:
+                keys[i] = EmbeddingCache.make_key(self._cache_namespace, text)
+                hit = self._cache.get(keys[i])
+                if hit is not None:
+                    binaries[i], denses[i] = hit
+                    continue
+            todo.append(i)
+        if todo:
+            self._encode_flat(texts, todo, keys if cache_results else None, binaries, denses)
+        for i, j in duplicates:
+            binaries[i], denses[i] = binaries[j], denses[j]
+        return binaries, denses
+
+    def _encode_flat(
+        self,
+        texts: list[str],
+        todo: list[int],
+        keys: list[str | None] | None,
+        binaries: np.ndarray,
+        denses: np.ndarray,
+    ) -> None:
+        """
+        texts[todo] 的 chunk 展平为一批编码，结果写入 binaries / denses 对应行。
+
+        keys 为 None 时不写回缓存。
+        """
+        # 展平：chunk 列表 + 每个文本在其中的 [start, end)
+        flat: list[str] = []
+        spans: list[tuple[int, int]] = []
+        for i in todo:
+            chunks = split_chunks(texts[i])
+            if not chunks:
+                raise ValueError("Cannot encode empty text")
+            spans.append((len(flat), len(flat) + len(chunks)))
+            flat.extend(chunks)
+
+        order = sorted(range(len(flat)), key=lambda c: len(flat[c]), reverse=True)
+        dense_sorted = self._encoder.encode_batch([flat[c] for c in order])
+        dense_flat = np.empty_like(dense_sorted)
+        dense_flat[order] = dense_sorted
+        binary_flat = self._projector.batch_project(dense_flat)
+
+        for i, (start, end) in zip(todo, spans):
+            if end - start == 1:
+                binaries[i], denses[i] = binary_flat[start], dense_flat[start]
+            else:
+                binaries[i], denses[i] = self._combine_chunks(
+                    texts[i], binary_flat[start:end], dense_flat[start:end]
+                )
+            if self._cache is not None and keys is not None:
+                self._cache.put(keys[i], binaries[i], denses[i])
 
     def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
         """代理到 projector.similarity。"""
@@ -65,7 +209,28 @@ class EncodingPipeline:
         """代理到 projector.batch_similarity。"""
         return self._projector.batch_similarity(query, candidates)
 
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """代理到 projector.batch_similarity_many（未实现时逐条 batch_similarity）。"""
+        return batch_similarity_many(self._projector, queries, candidates)
+
     @property
     def packed_dim(self) -> int:
         """投影后 packed uint8 向量的长度。"""
         return self._projector.packed_dim
+
+    @property
+    def code_bits(self) -> int:
+        """二进制码的有效位数 D（相似度 = 1 - hamming / D）。"""
+        return self._projector.D
+
+    @property
+    def dense_dim(self) -> int:
+        """编码器输出的密集向量维度。"""
+        return self._encoder.dim
+
+
+def _normalize(text: str) -> str:
+    """缓存键与编码共用的规范化：Unicode NFC + 去首尾空白。"""
+    return unicodedata.normalize("NFC", text).strip()
@@ -25,6 +25,16 @@ _SCENE_DIRS = [
     ("M1_matchmaking", "m_"),
 ]
 
+
+def scene_prefix(scene: str) -> str:
+    """Scene directory name ("S1_hackathon") or owner prefix ("h_" / "h") → owner prefix."""
+    for scene_dir_name, prefix in _SCENE_DIRS:
+        if scene in (scene_dir_name, prefix, prefix.rstrip("_")):
+            return prefix
+    known = ", ".join(f"{name} ({prefix})" for name, prefix in _SCENE_DIRS)
+    raise ValueError(f"Unknown scene '{scene}', expected one of: {known}")
+
+
 # Fields to extract from each agent profile
 _CORE_FIELDS = ["name", "role", "occupation", "bio"]
 _LIST_FIELDS = ["skills", "interests"]
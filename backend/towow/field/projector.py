@@ -6,16 +6,114 @@ All projectors satisfy the Projector Protocol: float[dim] → packed uint8[packe
 Available projectors:
 - SimHashProjector: Random hyperplane projection (D=10000, 1250 bytes) — Phase 1 baseline
 - MrlBqlProjector: Binary Quantization (sign→packbits, 64 bytes for 512d) — ADR-012 upgrade
+- HadamardProjector: Structured random rotation (SORF, HD3·HD2·HD1) — SimHash drop-in
+  with ~100 KB of sign vectors instead of a 30 MB plane matrix
 """
 
 from __future__ import annotations
 
+import threading
+
 import numpy as np
 
 # Phase 1 实验锁定的参数
 _DEFAULT_D = 10_000
 _DEFAULT_SEED = 42
 
+# popcount 查找表：byte → bit count（numpy < 2.0 时的回退路径）
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+
+# bundle 平局用的 RandomState：构造一次约 180µs，重新 seed 只需几微秒且序列相同。
+# 编码在线程池中执行，每线程一个
+_tiebreak_local = threading.local()
+
+
+def _tiebreak_rng(seed: int) -> np.random.RandomState:
+    rng = getattr(_tiebreak_local, "rng", None)
+    if rng is None:
+        rng = _tiebreak_local.rng = np.random.RandomState()
+    rng.seed(seed)
+    return rng
+
+
+def hamming_distance(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """
+    query (uint8[packed_dim]) vs candidates (uint8[N, packed_dim]) → int32[N] 不同 bit 数。
+
+    XOR 后按 64-bit word 计数（np.bitwise_count，numpy ≥ 2.0），
+    packed_dim 不是 8 的倍数时尾部按 byte 计数。旧 numpy 回退到 uint8 LUT。
+    行连续且 packed_dim 是 8 的倍数时 XOR 也直接在 uint64 视图上做（元素少 8 倍）。
+    """
+    if candidates.ndim == 1:
+        candidates = candidates.reshape(1, -1)
+    if _word_aligned(candidates):
+        query_words = np.ascontiguousarray(query, dtype=np.uint8).view(np.uint64)
+        words = np.bitwise_xor(candidates.view(np.uint64), query_words)
+        return _sum_word_counts(np.bitwise_count(words))
+    return _popcount_rows(np.bitwise_xor(query, candidates))
+
+
+def hamming_distance_many(queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """
+    queries (uint8[Q, packed_dim]) vs candidates (uint8[N, packed_dim]) → int32[Q, N]。
+
+    一次广播 XOR 得到 Q×N 距离：candidates 只读一遍，适合分块扫描中的多查询。
+    """
+    if candidates.ndim == 1:
+        candidates = candidates.reshape(1, -1)
+    queries = np.asarray(queries, dtype=np.uint8).reshape(-1, candidates.shape[1])
+    n_queries, n = queries.shape[0], candidates.shape[0]
+    if _word_aligned(candidates):
+        query_words = np.ascontiguousarray(queries).view(np.uint64)
+        words = np.bitwise_xor(query_words[:, None, :], candidates.view(np.uint64)[None, :, :])
+        counts = np.bitwise_count(words).reshape(n_queries * n, -1)
+        return _sum_word_counts(counts).reshape(n_queries, n)
+    xor = np.bitwise_xor(queries[:, None, :], candidates[None, :, :])
+    return _popcount_rows(xor.reshape(-1, xor.shape[2])).reshape(n_queries, n)
+
+
+# 每行不超过该 word 数、且行数较多时逐列累加计数（短行上 sum(axis=1) 的逐行
+# 开销占主导；行数很少时逐列的调用开销反而更大）
+_COLUMN_SUM_WORDS = 16
+_COLUMN_SUM_MIN_ROWS = 512
+
+
+def _word_aligned(candidates: np.ndarray) -> bool:
+    """candidates 能否按 uint64 视图读取：行宽是 8 字节的倍数且行内连续。"""
+    return (
+        _HAS_BITWISE_COUNT
+        and candidates.shape[1] % 8 == 0
+        and candidates.strides[1] == 1
+        and candidates.strides[0] % 8 == 0
+    )
+
+
+def _sum_word_counts(counts: np.ndarray) -> np.ndarray:
+    """uint8[N, W] 每个 word 的 1 bit 数 → int32[N]。"""
+    if counts.shape[1] > _COLUMN_SUM_WORDS or counts.shape[0] < _COLUMN_SUM_MIN_ROWS:
+        return counts.sum(axis=1, dtype=np.int32)
+    diff = np.zeros(counts.shape[0], dtype=np.int32)
+    for col in range(counts.shape[1]):
+        diff += counts[:, col]
+    return diff
+
+
+def _popcount_rows(xor: np.ndarray) -> np.ndarray:
+    """uint8[N, P] → int32[N] 每行 1 bit 数。"""
+    if not _HAS_BITWISE_COUNT:
+        return _POPCOUNT_LUT[xor].sum(axis=1, dtype=np.int32)
+
+    n_words = xor.shape[1] // 8
+    diff = np.zeros(xor.shape[0], dtype=np.int32)
+    if n_words:
+        words = np.ascontiguousarray(xor[:, : n_words * 8]).view(np.uint64)
+        diff += _sum_word_counts(np.bitwise_count(words))
+    if xor.shape[1] % 8:
+        diff += np.bitwise_count(xor[:, n_words * 8 :]).sum(axis=1, dtype=np.int32)
+    return diff
+
 
 class SimHashProjector:
     """随机超平面投影 + Hamming 相似度。"""
@@ -24,14 +122,11 @@ class SimHashProjector:
         self, input_dim: int = 768, D: int = _DEFAULT_D, seed: int = _DEFAULT_SEED
     ) -> None:
         self.D = D
+        self.seed = seed
         self._packed_size = (D + 7) // 8  # 1250 for D=10000
         # 确定性生成超平面矩阵（全网一致）
         rng = np.random.RandomState(seed)
         self._planes = rng.randn(D, input_dim).astype(np.float32)
-        # popcount 查找表：byte → bit count
-        self._popcount_lut = np.array(
-            [bin(i).count("1") for i in range(256)], dtype=np.int32
-        )
 
     def project(self, dense: np.ndarray) -> np.ndarray:
         """float32[dim] → packed uint8[packed_dim]。"""
@@ -52,19 +147,21 @@ class SimHashProjector:
 
     def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
         """两个 packed binary vector 的 Hamming 相似度 [0, 1]。"""
-        xor = np.bitwise_xor(a, b)
-        diff = self._popcount_lut[xor].sum()
+        diff = hamming_distance(a, b)[0]
         return 1.0 - diff / self.D
 
     def batch_similarity(
         self, query: np.ndarray, candidates: np.ndarray
     ) -> np.ndarray:
         """query (uint8[packed_dim]) vs candidates (uint8[N, packed_dim]) → float[N]。"""
-        if candidates.ndim == 1:
-            candidates = candidates.reshape(1, -1)
-        # 向量化 XOR + popcount
-        xor = np.bitwise_xor(query, candidates)  # (N, 1250)
-        diff = self._popcount_lut[xor].sum(axis=1)  # (N,)
+        diff = hamming_distance(query, candidates)  # (N,)
+        return 1.0 - diff / self.D
+
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """queries (uint8[Q, packed_dim]) vs candidates (uint8[N, packed_dim]) → float[Q, N]。"""
+        diff = hamming_distance_many(queries, candidates)
         return 1.0 - diff / self.D
 
     @property
@@ -88,10 +185,6 @@ class MrlBqlProjector:
     def __init__(self, input_dim: int = 512) -> None:
         self.D = input_dim
         self._packed_size = (input_dim + 7) // 8  # 64 for D=512
-        # popcount 查找表：byte → bit count
-        self._popcount_lut = np.array(
-            [bin(i).count("1") for i in range(256)], dtype=np.int32
-        )
 
     def project(self, dense: np.ndarray) -> np.ndarray:
         """float32[dim] → packed uint8[packed_dim]。"""
@@ -109,18 +202,130 @@ class MrlBqlProjector:
 
     def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
         """两个 packed binary vector 的 Hamming 相似度 [0, 1]。"""
-        xor = np.bitwise_xor(a, b)
-        diff = self._popcount_lut[xor].sum()
+        diff = hamming_distance(a, b)[0]
+        return 1.0 - diff / self.D
+
+    def batch_similarity(
+        self, query: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """query (uint8[packed_dim]) vs candidates (uint8[N, packed_dim]) → float[N]。"""
+        diff = hamming_distance(query, candidates)
+        return 1.0 - diff / self.D
+
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """queries (uint8[Q, packed_dim]) vs candidates (uint8[N, packed_dim]) → float[Q, N]。"""
+        diff = hamming_distance_many(queries, candidates)
+        return 1.0 - diff / self.D
+
+    @property
+    def packed_dim(self) -> int:
+        return self._packed_size
+
+
+# HadamardProjector 每次变换的行数上限（临时数组 rows × n_blocks × block float32）
+_HADAMARD_BATCH_ROWS = 256
+
+
+def _sylvester_hadamard(n: int) -> np.ndarray:
+    """n×n Sylvester Hadamard 矩阵（n 为 2 的幂），元素 ±1。"""
+    h = np.ones((1, 1), dtype=np.float32)
+    while h.shape[0] < n:
+        h = np.block([[h, h], [h, -h]])
+    return h
+
+
+class HadamardProjector:
+    """结构化随机投影（SORF）+ Hamming 相似度。
+
+    每个输出块是 sign(H·D3·H·D2·H·D1·x)：x 补零到 2 的幂长度 n，
+    Di 为随机 ±1 对角阵，H 为快速 Walsh–Hadamard 变换。三轮之后
+    各输出坐标近似独立的随机超平面，保持 SimHash 的
+    P[bit 相同] = 1 − θ/π 性质；块内方向两两正交。D 个 bit 由
+    ceil(D / n) 个独立块拼接后截断得到。
+
+    H_n 按 Kronecker 分解 H_a ⊗ H_b（a·b = n，768 维时 32 × 32）计算：
+    行块 reshape 成 a×b 后左右各乘一个小 Hadamard 矩阵，两次 GEMM 代替
+    log2(n) 轮逐元素蝶形运算。
+
+    存储只有 rounds × n_blocks × n 个符号加两个小矩阵（768 维、D=10000
+    时约 130 KB，SimHash 平面矩阵为 30 MB）。
+    """
+
+    def __init__(
+        self,
+        input_dim: int = 768,
+        D: int = _DEFAULT_D,
+        seed: int = _DEFAULT_SEED,
+        rounds: int = 3,
+    ) -> None:
+        if rounds < 1:
+            raise ValueError("rounds must be >= 1")
+        self.D = D
+        self.seed = seed
+        self._input_dim = input_dim
+        self._packed_size = (D + 7) // 8
+        log_block = max(0, (input_dim - 1).bit_length())
+        self._block = 1 << log_block  # 768 → 1024
+        self._n_blocks = -(-D // self._block)
+        self._h_left = _sylvester_hadamard(1 << (log_block // 2))
+        self._h_right = _sylvester_hadamard(1 << (log_block - log_block // 2))
+        rng = np.random.RandomState(seed)
+        self._signs = np.where(
+            rng.randint(0, 2, size=(rounds, self._n_blocks, self._block)) == 1,
+            np.float32(1.0), np.float32(-1.0),
+        )
+
+    def project(self, dense: np.ndarray) -> np.ndarray:
+        """float32[dim] → packed uint8[packed_dim]。"""
+        dense = np.asarray(dense, dtype=np.float32).reshape(1, -1)
+        return np.packbits(self._transform(dense)[0] >= 0)
+
+    def batch_project(self, dense: np.ndarray) -> np.ndarray:
+        """float32[N, dim] → uint8[N, packed_dim]。"""
+        dense = np.asarray(dense, dtype=np.float32)
+        if dense.ndim == 1:
+            return self.project(dense).reshape(1, -1)
+        out = np.empty((dense.shape[0], self._packed_size), dtype=np.uint8)
+        for start in range(0, dense.shape[0], _HADAMARD_BATCH_ROWS):
+            rows = dense[start : start + _HADAMARD_BATCH_ROWS]
+            out[start : start + rows.shape[0]] = np.packbits(
+                self._transform(rows) >= 0, axis=1
+            )
+        return out
+
+    def _transform(self, x: np.ndarray) -> np.ndarray:
+        """float32[N, dim] → float32[N, D]（未归一化，只用符号）。"""
+        n = x.shape[0]
+        a, b = self._h_left.shape[0], self._h_right.shape[0]
+        y = np.zeros((n, self._n_blocks, self._block), dtype=np.float32)
+        y[:, :, : self._input_dim] = x[:, None, :]
+        for signs in self._signs:
+            y *= signs
+            # H_n · v = H_a · V · H_b（V 为 v reshape 成的 a×b 矩阵，H 对称）
+            rows = n * self._n_blocks
+            v = (y.reshape(rows * a, b) @ self._h_right).reshape(rows, a, b)
+            y = np.matmul(self._h_left, v).reshape(n, self._n_blocks, self._block)
+        return y.reshape(n, -1)[:, : self.D]
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        """两个 packed binary vector 的 Hamming 相似度 [0, 1]。"""
+        diff = hamming_distance(a, b)[0]
         return 1.0 - diff / self.D
 
     def batch_similarity(
         self, query: np.ndarray, candidates: np.ndarray
     ) -> np.ndarray:
         """query (uint8[packed_dim]) vs candidates (uint8[N, packed_dim]) → float[N]。"""
-        if candidates.ndim == 1:
-            candidates = candidates.reshape(1, -1)
-        xor = np.bitwise_xor(query, candidates)
-        diff = self._popcount_lut[xor].sum(axis=1)
+        diff = hamming_distance(query, candidates)
+        return 1.0 - diff / self.D
+
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """queries (uint8[Q, packed_dim]) vs candidates (uint8[N, packed_dim]) → float[Q, N]。"""
+        diff = hamming_distance_many(queries, candidates)
         return 1.0 - diff / self.D
 
     @property
@@ -129,33 +334,36 @@ class MrlBqlProjector:
 
 
 def bundle_binary(
-    vectors: list[np.ndarray], D: int = _DEFAULT_D, seed: int = 0
+    vectors: list[np.ndarray] | np.ndarray, D: int = _DEFAULT_D, seed: int = 0
 ) -> np.ndarray:
     """
     多数投票 bundle: 多个 packed binary → 一个 packed binary。
 
     每个 bit 位置统计 1 的个数，过半 → 1。
     偶数输入时用 seed 随机打破平局。
+
+    vectors 可以是 list 或已堆叠的 uint8[n, packed_dim] 矩阵：整体一次
+    unpackbits(axis=1) 成 uint8 位矩阵再按列求和，不逐条展开。
     """
-    if not vectors:
+    stacked = np.asarray(vectors, dtype=np.uint8)
+    if stacked.ndim != 2 or stacked.shape[0] == 0:
         raise ValueError("Cannot bundle empty list")
-    if len(vectors) == 1:
-        return vectors[0].copy()
+    n = stacked.shape[0]
+    if n == 1:
+        return stacked[0].copy()
 
-    n = len(vectors)
-    unpacked = np.array(
-        [np.unpackbits(v)[:D] for v in vectors], dtype=np.int32
-    )
-    counts = unpacked.sum(axis=0)
-    threshold = n / 2.0
+    D = min(D, stacked.shape[1] * 8)
+    counts = np.unpackbits(stacked, axis=1, count=D).sum(axis=0, dtype=np.int32)
 
-    result_bits = np.zeros(D, dtype=np.uint8)
-    result_bits[counts > threshold] = 1
+    # 整数比较 2·count 与 n，等价于 count 与 n/2
+    doubled = counts * 2
+    result_bits = (doubled > n).astype(np.uint8)
 
     # 平局：偶数输入时 count == n/2
-    ties = counts == threshold
-    if ties.any():
-        rng = np.random.RandomState(seed)
-        result_bits[ties] = rng.randint(0, 2, size=ties.sum()).astype(np.uint8)
+    ties = doubled == n
+    n_ties = int(np.count_nonzero(ties))
+    if n_ties:
+        rng = _tiebreak_rng(seed)
+        result_bits[ties] = rng.randint(0, 2, size=n_ties).astype(np.uint8)
 
     return np.packbits(result_bits)
@@ -95,7 +95,30 @@ class Projector(Protocol):
         """query vs N candidates。返回 float[N]。"""
         ...
 
+    def batch_similarity_many(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> np.ndarray:
+        """Q queries vs N candidates。返回 float[Q, N]。默认逐条调用 batch_similarity。"""
+        return batch_similarity_many(self, queries, candidates)
+
     @property
     def packed_dim(self) -> int:
         """投影后 packed uint8 向量的长度。"""
         ...
+
+
+def batch_similarity_many(
+    projector: Projector, queries: np.ndarray, candidates: np.ndarray
+) -> np.ndarray:
+    """
+    Q queries vs N candidates → float[Q, N]。
+
+    projector 自带 batch_similarity_many 时直接使用（一次扫描）；
+    只实现了 batch_similarity 的 Projector 退化为逐条查询。
+    """
+    many = getattr(type(projector), "batch_similarity_many", None)
+    if many is not None and many is not Projector.batch_similarity_many:
+        return projector.batch_similarity_many(queries, candidates)
+    return np.array(
+        [projector.batch_similarity(q, candidates) for q in queries], dtype=np.float64
+    ).reshape(len(queries), len(candidates))
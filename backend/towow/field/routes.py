@@ -3,26 +3,39 @@ V2 Intent Field HTTP API — deposit intents, match by text, get stats.
 
 Endpoints:
   POST /field/api/deposit  — deposit text into the field
+  POST /field/api/deposit-bulk — stream NDJSON deposits (one DepositRequest per line)
   POST /field/api/match    — match text against the field (Intent level)
   POST /field/api/match-owners — match text against the field (Owner level)
   GET  /field/api/stats    — field statistics
 
 Depends on app.state.field (V2 MemoryField, handles encoding internally).
+Optional app.state.match_cache (MatchResultCache) serves repeated /match and
+/match-owners queries without encoding or scanning, as long as the field's
+generation has not changed since the result was computed.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
+from collections.abc import Awaitable, Callable
 from typing import Any
 
-from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field, ValidationError
+
+from towow.field.profile_loader import scene_prefix
+from towow.field.types import MatchFilter
 
 logger = logging.getLogger(__name__)
 
 field_router = APIRouter(prefix="/field/api", tags=["field"])
 
+# NDJSON bulk ingestion limits
+_BULK_MAX_LINE_BYTES = 1024 * 1024
+_BULK_MAX_REPORTED_ERRORS = 20
+
 
 # ── Request / Response schemas ──────────────────────────
 
@@ -37,9 +50,36 @@ class DepositResponse(BaseModel):
     message: str
 
 
+class BulkDepositResponse(BaseModel):
+    received: int = Field(..., description="Non-empty NDJSON lines read")
+    deposited: int = Field(..., description="Lines accepted into the field (incl. dedup hits)")
+    rejected: int
+    errors: list[str] = Field(default_factory=list, description="First few per-line errors")
+    total_intents: int
+
+
 class MatchRequest(BaseModel):
     text: str = Field(..., min_length=1, description="Query text to match")
     k: int = Field(default=10, ge=1, le=100)
+    rerank: int = Field(
+        default=0, ge=0, le=1000,
+        description="Rerank top-R Hamming candidates by exact cosine (0 = off)",
+    )
+    scenes: list[str] = Field(
+        default_factory=list,
+        description="Only owners from these scenes (S1_hackathon / h_ / h, ...)",
+    )
+    exclude_owners: list[str] = Field(
+        default_factory=list, description="Owners to leave out, e.g. the submitter"
+    )
+    metadata: dict[str, Any] = Field(
+        default_factory=dict, description="Metadata equality filters (scalar values)"
+    )
+    ef_search: int = Field(
+        default=0, ge=0, le=4096,
+        description="HNSW candidate list size for /match (0 = field default; "
+        "ignored without index='hnsw' and by /match-owners)",
+    )
 
 
 class MatchResultItem(BaseModel):
@@ -60,6 +100,9 @@ class MatchResponse(BaseModel):
     results: list[MatchResultItem]
     query_time_ms: float
     total_intents: int
+    diagnostics: dict[str, Any] = Field(
+        default_factory=dict, description="Per-query runtime details (match cache hit, saved ms)"
+    )
 
 
 class OwnerMatchResponse(BaseModel):
@@ -67,11 +110,17 @@ class OwnerMatchResponse(BaseModel):
     query_time_ms: float
     total_intents: int
     total_owners: int
+    diagnostics: dict[str, Any] = Field(
+        default_factory=dict, description="Per-query runtime details (match cache hit, saved ms)"
+    )
 
 
 class StatsResponse(BaseModel):
     intent_count: int
     owner_count: int
+    diagnostics: dict[str, Any] = Field(
+        default_factory=dict, description="Implementation-specific runtime stats"
+    )
 
 
 # ── Helpers ─────────────────────────────────────────────
@@ -90,6 +139,83 @@ def _get_mpg(request: Request):
     return mpg
 
 
+def _match_kwargs(req: MatchRequest) -> dict[str, Any]:
+    """Only pass rerank / filters when requested, so plain IntentField implementations keep working."""
+    kwargs: dict[str, Any] = {"rerank": req.rerank} if req.rerank else {}
+    try:
+        filters = MatchFilter(
+            owner_prefixes=tuple(scene_prefix(s) for s in req.scenes),
+            exclude_owners=tuple(req.exclude_owners),
+            metadata=req.metadata,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if filters:
+        kwargs["filters"] = filters
+    return kwargs
+
+
+async def _cached_match(
+    request: Request,
+    field,
+    kind: str,
+    req: MatchRequest,
+    kwargs: dict[str, Any],
+    run: Callable[[], Awaitable[list]],
+) -> tuple[list, dict[str, Any]]:
+    """
+    Run a match through app.state.match_cache when the field exposes a generation.
+
+    Returns (results, diagnostics). The generation is read before matching, so a
+    write that lands mid-query leaves an entry that is already stale.
+    """
+    cache = getattr(request.app.state, "match_cache", None)
+    generation = getattr(field, "generation", None)
+    if cache is None or generation is None:
+        return await run(), {}
+    key = cache.make_key(kind, req.text, req.k, sorted(kwargs.items()))
+    hit = cache.get(key, generation)
+    if hit is not None:
+        results, saved_ms = hit
+    else:
+        t0 = time.time()
+        results = await run()
+        cache.put(key, generation, results, (time.time() - t0) * 1000)
+        saved_ms = 0.0
+    return results, {
+        "match_cache": {
+            "hit": hit is not None,
+            "saved_ms": round(saved_ms, 2),
+            "hit_rate": cache.hit_rate,
+        }
+    }
+
+
+def _owner_items(results) -> list[OwnerMatchItem]:
+    """OwnerMatch list → response items."""
+    return [
+        OwnerMatchItem(
+            owner=r.owner, score=r.score,
+            top_intents=[
+                MatchResultItem(
+                    intent_id=i.intent_id, score=i.score,
+                    owner=i.owner, text=i.text, metadata=i.metadata,
+                )
+                for i in r.intents
+            ],
+        )
+        for r in results
+    ]
+
+
+async def _match_owners_many(field, texts: list[str], k: int) -> list:
+    """Batched match_owners. Not part of IntentField, so fall back to one call per text."""
+    many = getattr(field, "match_owners_many", None)
+    if many is not None:
+        return await many(texts, k)
+    return list(await asyncio.gather(*(field.match_owners(t, k) for t in texts)))
+
+
 _PERSPECTIVE_LABELS = {
     "resonance": "共振",
     "complement": "互补",
@@ -110,12 +236,96 @@ async def deposit_intent(req: DepositRequest, request: Request):
     )
 
 
+@field_router.post("/deposit-bulk", response_model=BulkDepositResponse)
+async def deposit_bulk(
+    request: Request,
+    batch_size: int = Query(default=256, ge=1, le=4096),
+):
+    """Stream NDJSON deposits. Each line is a DepositRequest JSON object.
+
+    The body is consumed incrementally and flushed to field.deposit_many every
+    batch_size lines. The next chunk is not read until the batch is ingested,
+    so memory stays bounded and slow encoding backpressures the client.
+    """
+    field = _get_field(request)
+    received = 0
+    deposited = 0
+    errors: list[str] = []
+    batch: list[tuple[str, str, dict]] = []
+    batch_lines: list[int] = []
+
+    def report(where: str, msg: str) -> None:
+        if len(errors) < _BULK_MAX_REPORTED_ERRORS:
+            errors.append(f"{where}: {msg}")
+
+    async def flush() -> None:
+        nonlocal deposited
+        if not batch:
+            return
+        try:
+            await field.deposit_many(batch)
+        except ValueError as e:
+            # deposit_many validates the whole batch before writing, so a
+            # rejected batch leaves nothing behind.
+            report(f"lines {batch_lines[0]}-{batch_lines[-1]}", str(e))
+        else:
+            deposited += len(batch)
+        batch.clear()
+        batch_lines.clear()
+
+    def parse(line: bytes, line_no: int) -> None:
+        nonlocal received
+        if not line.strip():
+            return
+        received += 1
+        try:
+            item = DepositRequest.model_validate_json(line)
+        except ValidationError as e:
+            report(f"line {line_no}", e.errors()[0]["msg"])
+            return
+        if not item.text.strip() or not item.owner.strip():
+            report(f"line {line_no}", "text and owner must not be blank")
+            return
+        batch.append((item.text, item.owner, item.metadata))
+        batch_lines.append(line_no)
+
+    pending = b""
+    line_no = 0
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > _BULK_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"NDJSON line {line_no + 1} too long")
+        for line in lines:
+            line_no += 1
+            parse(line, line_no)
+            if len(batch) >= batch_size:
+                await flush()
+    parse(pending, line_no + 1)
+    await flush()
+
+    logger.info("Bulk deposit: %d lines, %d deposited", received, deposited)
+    return BulkDepositResponse(
+        received=received,
+        deposited=deposited,
+        rejected=received - deposited,
+        errors=errors,
+        total_intents=await field.count(),
+    )
+
+
 @field_router.post("/match", response_model=MatchResponse)
 async def match_intents(req: MatchRequest, request: Request):
     """Match text against the field, return Intent-level results."""
     field = _get_field(request)
+    kwargs = _match_kwargs(req)
+    if req.ef_search:
+        kwargs["ef_search"] = req.ef_search
     t0 = time.time()
-    results = await field.match(req.text, req.k)
+    results, diagnostics = await _cached_match(
+        request, field, "match", req, kwargs,
+        lambda: field.match(req.text, req.k, **kwargs),
+    )
     query_time_ms = (time.time() - t0) * 1000
     total = await field.count()
 
@@ -129,6 +339,7 @@ async def match_intents(req: MatchRequest, request: Request):
         ],
         query_time_ms=round(query_time_ms, 2),
         total_intents=total,
+        diagnostics=diagnostics,
     )
 
 
@@ -136,29 +347,22 @@ async def match_intents(req: MatchRequest, request: Request):
 async def match_owners(req: MatchRequest, request: Request):
     """Match text against the field, return Owner-level aggregated results."""
     field = _get_field(request)
+    kwargs = _match_kwargs(req)
     t0 = time.time()
-    results = await field.match_owners(req.text, req.k)
+    results, diagnostics = await _cached_match(
+        request, field, "match_owners", req, kwargs,
+        lambda: field.match_owners(req.text, req.k, **kwargs),
+    )
     query_time_ms = (time.time() - t0) * 1000
     total_intents = await field.count()
     total_owners = await field.count_owners()
 
     return OwnerMatchResponse(
-        results=[
-            OwnerMatchItem(
-                owner=r.owner, score=r.score,
-                top_intents=[
-                    MatchResultItem(
-                        intent_id=i.intent_id, score=i.score,
-                        owner=i.owner, text=i.text, metadata=i.metadata,
-                    )
-                    for i in r.intents
-                ],
-            )
-            for r in results
-        ],
+        results=_owner_items(results),
         query_time_ms=round(query_time_ms, 2),
         total_intents=total_intents,
         total_owners=total_owners,
+        diagnostics=diagnostics,
     )
 
 
@@ -166,9 +370,14 @@ async def match_owners(req: MatchRequest, request: Request):
 async def field_stats(request: Request):
     """Return field statistics."""
     field = _get_field(request)
+    diagnostics = field.stats() if hasattr(field, "stats") else {}
+    cache = getattr(request.app.state, "match_cache", None)
+    if cache is not None:
+        diagnostics["match_cache"] = cache.stats()
     return StatsResponse(
         intent_count=await field.count(),
         owner_count=await field.count_owners(),
+        diagnostics=diagnostics,
     )
 
 
@@ -187,6 +396,9 @@ class PerspectiveSection(BaseModel):
 class PerspectiveMatchResponse(BaseModel):
     original_query: str
     perspectives: list[PerspectiveSection]
+    original_results: list[OwnerMatchItem] = Field(
+        default_factory=list, description="Owner matches for the original query"
+    )
     generation_time_ms: float
     match_time_ms: float
     total_intents: int
@@ -202,7 +414,7 @@ class LoadProfilesResponse(BaseModel):
 
 @field_router.post("/match-perspectives", response_model=PerspectiveMatchResponse)
 async def match_perspectives(req: PerspectiveMatchRequest, request: Request):
-    """Multi-perspective match: LLM generates 3 query perspectives, each runs match_owners."""
+    """Multi-perspective match: LLM generates 3 query perspectives, matched with the original in one scan."""
     field = _get_field(request)
     mpg = _get_mpg(request)
 
@@ -222,31 +434,22 @@ async def match_perspectives(req: PerspectiveMatchRequest, request: Request):
         perspectives.interference[:60],
     )
 
-    # 2. Run match_owners for each perspective
+    # 2. One batched match for all perspectives plus the original query
     t1 = time.time()
-    sections: list[PerspectiveSection] = []
-    for name in ("resonance", "complement", "interference"):
-        query_text = getattr(perspectives, name)
-        owner_results = await field.match_owners(query_text, req.k)
-        sections.append(PerspectiveSection(
+    original_results, *perspective_results = await _match_owners_many(
+        field, perspectives.all_queries(), req.k
+    )
+    sections = [
+        PerspectiveSection(
             perspective=name,
             label=_PERSPECTIVE_LABELS[name],
-            query_used=query_text,
-            results=[
-                OwnerMatchItem(
-                    owner=r.owner,
-                    score=r.score,
-                    top_intents=[
-                        MatchResultItem(
-                            intent_id=i.intent_id, score=i.score,
-                            owner=i.owner, text=i.text, metadata=i.metadata,
-                        )
-                        for i in r.intents
-                    ],
-                )
-                for r in owner_results
-            ],
-        ))
+            query_used=getattr(perspectives, name),
+            results=_owner_items(results),
+        )
+        for name, results in zip(
+            ("resonance", "complement", "interference"), perspective_results
+        )
+    ]
     match_time_ms = (time.time() - t1) * 1000
 
     total_intents = await field.count()
@@ -255,6 +458,7 @@ async def match_perspectives(req: PerspectiveMatchRequest, request: Request):
     return PerspectiveMatchResponse(
         original_query=req.text,
         perspectives=sections,
+        original_results=_owner_items(original_results),
         generation_time_ms=round(generation_time_ms, 1),
         match_time_ms=round(match_time_ms, 1),
         total_intents=total_intents,
@@ -279,13 +483,9 @@ async def load_profiles(request: Request):
         )
 
     profiles = load_all_profiles()
-    loaded = 0
-    for owner, text in profiles.items():
-        try:
-            await field.deposit(text, owner)
-            loaded += 1
-        except ValueError:
-            continue
+    items = [(text, owner, None) for owner, text in profiles.items() if text.strip()]
+    await field.deposit_many(items)
+    loaded = len(items)
 
     logger.info("Loaded %d profiles into field", loaded)
     return LoadProfilesResponse(
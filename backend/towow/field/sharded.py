@@ -0,0 +1,721 @@
+"""
+ShardedField — 按 owner 分片到多个工作进程的 IntentField。
+
+单个 MemoryField 的扫描受限于一个核和一个进程的内存。ShardedField 把
+Intent 按 owner 哈希分到 N 个分片进程，每个分片进程持有一个只存向量、
+不加载模型的 MemoryField（_Shard）：
+
+- 编码在父进程完成（模型只加载一份），分片只接收编码好的 binary / dense
+  向量，用 1 - hamming / D 打分。
+- deposit / remove_owner 只发往 owner 所在分片；remove(intent_id) 广播；
+  upsert(intent_id) 先广播查出所在分片，编码后只发往该分片。
+- match / match_owners 并行扇出到全部分片，各分片返回本地 top-k（已按分数
+  降序），父进程 heapq.merge 归并取前 k。
+  同一 owner 的全部 Intent 都在同一分片，owner 聚合（max / mean / softmax、
+  max_intents）在分片内即已精确，全局 top-k owner ⊆ 各分片 top-k 之并，
+  归并结果与单个 MemoryField 完全一致（仅同分时的次序可能不同）。
+
+进程间用 multiprocessing Pipe 一问一答；父进程每个分片一把 asyncio 锁、
+阻塞的收发放在 I/O 线程池里，事件循环不被阻塞，分片之间真正并行。
+
+ttl / ttl_by_type / compact_below 下发到各分片，过期堆与缩容在分片内进行；
+分片进程没有事件循环，由父进程的维护任务（带 TTL 的写入或删除 / 改写后
+启动）每 maintenance_interval 秒广播一轮淘汰 + 缩容，各分片都无待办时退出。
+cascade_bits / cascade_multiplier 同样下发，级联粗排与精排都在分片内完成。
+index（"mih" / "hnsw"）与 ef_search 也下发，每个分片各建一份只含本分片
+Intent 的索引；HNSW 墓碑过多时由同一轮维护广播，在分片内同步重建（重建
+期间该分片的请求排队等待）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from towow.field.field import (
+    _DENSE_DTYPES,
+    _EXPIRE_BATCH,
+    _INDEX_KINDS,
+    _OWNER_AGGREGATES,
+    MemoryField,
+    _dedup_key,
+)
+from towow.field.pipeline import EncodingPipeline
+from towow.field.projector import hamming_distance, hamming_distance_many
+from towow.field.types import FieldResult, Intent, MatchFilter, OwnerMatch
+
+if TYPE_CHECKING:
+    from towow.infra.encode_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+def _shard_of(owner: str, n_shards: int) -> int:
+    """owner → 分片号。用 sha1 而非 hash()：跨进程、跨重启稳定。"""
+    return int.from_bytes(hashlib.sha1(owner.encode()).digest()[:4], "little") % n_shards
+
+
+class _CodePipeline:
+    """分片进程内的 pipeline：只打分不编码（向量由父进程编码后下发）。"""
+
+    def __init__(self, packed_dim: int, code_bits: int, dense_dim: int) -> None:
+        self._packed_dim = packed_dim
+        self._code_bits = code_bits
+        self._dense_dim = dense_dim
+
+    @property
+    def packed_dim(self) -> int:
+        return self._packed_dim
+
+    @property
+    def dense_dim(self) -> int:
+        return self._dense_dim
+
+    def batch_similarity(self, query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        return 1.0 - hamming_distance(query, candidates) / self._code_bits
+
+    def batch_similarity_many(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        return 1.0 - hamming_distance_many(queries, candidates) / self._code_bits
+
+
+class _Shard(MemoryField):
+    """分片进程内的 MemoryField：同步、按向量操作，由 _shard_main 单线程驱动。"""
+
+    def lookup(self, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        """(owner, text) → 已存在的 intent_id。"""
+        found: dict[tuple[str, str], str] = {}
+        for pair in pairs:
+            iid = self._dedup.get(_dedup_key(*pair))
+            if iid is not None:
+                found[pair] = iid
+        return found
+
+    def add(
+        self, intents: list[Intent], binaries: np.ndarray, denses: np.ndarray | None
+    ) -> list[str]:
+        """追加已编码的 Intent；已存在的 (owner, text) 返回原 id。"""
+        keys = [_dedup_key(i.owner, i.text) for i in intents]
+        fresh = [n for n, key in enumerate(keys) if key not in self._dedup]
+        if fresh:
+            self._append_many_locked(
+                [intents[n] for n in fresh],
+                binaries[fresh],
+                denses[fresh] if denses is not None else None,
+            )
+            self._dedup.update((keys[n], intents[n].id) for n in fresh)
+        return [self._dedup[key] for key in keys]
+
+    def owner_of(self, intent_id: str) -> str | None:
+        row = self._pos_index.get(intent_id)
+        return self._owner_names[self._owner_col[row]] if row is not None else None
+
+    def upsert_row(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None,
+        metadata: dict | None,
+        binary: np.ndarray,
+        dense: np.ndarray | None,
+    ) -> None:
+        """新建或原地改写已编码的 Intent（规则同 MemoryField.upsert）。"""
+        self._upsert_locked(intent_id, text, owner, metadata, binary, dense)
+
+    def topk(
+        self,
+        queries: np.ndarray,
+        k: int,
+        rerank: int = 0,
+        query_denses: np.ndarray | None = None,
+        filters: MatchFilter | None = None,
+        ef_search: int = 0,
+    ) -> list[list[FieldResult]]:
+        """每条查询的本地 top-k，按分数降序。有索引且不过滤时逐条走索引。"""
+        if self._active_count == 0:
+            return [[] for _ in queries]
+        subset = self._filter_rows(filters)
+        if rerank > 0 and query_denses is not None and self._dense_buf is not None:
+            results = []
+            for query, dense in zip(queries, query_denses):
+                rows, _ = self._candidate_topk(query, max(rerank, k), subset, ef_search)
+                results.append(self._build_results(*self._rerank_dense(dense, rows, k)))
+            return results
+        if self._index is not None and subset is None:
+            return [
+                self._build_results(*self._candidate_topk(query, k, None, ef_search))
+                for query in queries
+            ]
+        return [
+            self._build_results(rows, scores)
+            for rows, scores in self._candidate_topk_many(queries, k, subset)
+        ]
+
+    def owners(
+        self,
+        queries: np.ndarray,
+        k: int,
+        max_intents: int,
+        aggregate: str,
+        rerank: int = 0,
+        query_denses: np.ndarray | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[list[OwnerMatch]]:
+        """每条查询的本地 top-k owner（owner 只存在于本分片，聚合即精确）。"""
+        if self._active_count == 0:
+            return [[] for _ in queries]
+        subset = self._filter_rows(filters)
+        if rerank > 0 and query_denses is not None and self._dense_buf is not None:
+            results = []
+            for query, dense in zip(queries, query_denses):
+                rows, _ = self._candidate_topk(query, max(rerank, k * max_intents), subset)
+                rows, scores = self._rerank_dense(dense, rows, rows.size)
+                results.append(self._aggregate_owners(rows, scores, k, max_intents, aggregate))
+            return results
+        rows = subset
+        scores = self._scan_scores_many(queries, rows)
+        if rows is None:
+            rows = np.arange(scores.shape[1], dtype=np.int64)
+        return [
+            self._aggregate_owners(rows, row_scores, k, max_intents, aggregate)
+            for row_scores in scores
+        ]
+
+    def remove_ids(self, intent_ids: list[str]) -> int:
+        before = self._active_count
+        for iid in intent_ids:
+            self._remove_locked(iid)
+        return before - self._active_count
+
+    def drop_owner(self, owner: str) -> int:
+        return self.remove_ids(self._owner_ids(owner))
+
+    def sizes(self) -> tuple[int, int]:
+        return self._active_count, self._live_owners
+
+    def expire_due(self, now: float) -> int:
+        """淘汰本分片到期的 Intent。返回淘汰数量。"""
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            removed += self._expire_locked(now, _EXPIRE_BATCH)
+        return removed
+
+    def shrink(self) -> bool:
+        return self._compact_locked()
+
+    def reindex(self) -> bool:
+        """HNSW 墓碑过多时同步重建（分片进程单线程，没有并发读者，不需要变更日志）。"""
+        if not self._stale_index():
+            return False
+        self._index = self._index.rebuilt(list(self._id_index), self._vectors)
+        self._index_rebuilds += 1
+        return True
+
+    def pending(self) -> bool:
+        """本分片是否还有待淘汰的 Intent、待缩容的缓冲区或待重建的索引。"""
+        return bool(self._expires or self._sparse() or self._stale_index())
+
+
+def _shard_main(
+    conn: Connection,
+    packed_dim: int,
+    code_bits: int,
+    dense_dim: int,
+    field_kwargs: dict[str, Any],
+) -> None:
+    """分片进程主循环：收 (方法名, 参数)，回 ("ok", 结果) 或 ("error", 异常)。"""
+    shard = _Shard(_CodePipeline(packed_dim, code_bits, dense_dim), **field_kwargs)
+    while True:
+        try:
+            op, args = conn.recv()
+        except EOFError:
+            break
+        if op == "close":
+            conn.send(("ok", None))
+            break
+        try:
+            conn.send(("ok", getattr(shard, op)(*args)))
+        except Exception as exc:
+            conn.send(("error", exc))
+    conn.close()
+
+
+class ShardedField:
+    """多进程分片场。满足 IntentField Protocol，结果与 MemoryField 一致。"""
+
+    def __init__(
+        self,
+        pipeline: EncodingPipeline,
+        n_shards: int | None = None,
+        dense_dtype: str | None = None,
+        owner_aggregate: str = "max",
+        scan_tile_bytes: int | None = None,
+        scan_threads: int = 0,
+        encode_executor: Executor | None = None,
+        encode_batcher: MicroBatcher | None = None,
+        mp_context: str = "spawn",
+        ttl: float | None = None,
+        ttl_by_type: dict[str, float] | None = None,
+        compact_below: float = 0.25,
+        maintenance_interval: float = 1.0,
+        cascade_bits: int = 0,
+        cascade_multiplier: int = 8,
+        index: str = "brute",
+        ef_search: int = 64,
+    ) -> None:
+        n_shards = n_shards or os.cpu_count() or 1
+        if n_shards < 1:
+            raise ValueError("n_shards must be positive")
+        if dense_dtype is not None and dense_dtype not in _DENSE_DTYPES:
+            raise ValueError(
+                f"Unknown dense_dtype '{dense_dtype}', expected one of {_DENSE_DTYPES}"
+            )
+        if owner_aggregate not in _OWNER_AGGREGATES:
+            raise ValueError(
+                f"Unknown owner_aggregate '{owner_aggregate}', "
+                f"expected one of {_OWNER_AGGREGATES}"
+            )
+        # 分片进程里的构造错误只会表现为断开的 Pipe，索引与级联参数在这里先校验
+        if index not in _INDEX_KINDS:
+            raise ValueError(
+                f"Unknown index '{index}', expected one of {_INDEX_KINDS}"
+            )
+        if ef_search < 1:
+            raise ValueError("ef_search must be >= 1")
+        if cascade_bits % 8 or not 0 <= cascade_bits < pipeline.packed_dim * 8:
+            raise ValueError(
+                "cascade_bits must be a multiple of 8 shorter than the code "
+                f"({pipeline.packed_dim * 8} bits)"
+            )
+        if cascade_multiplier < 1:
+            raise ValueError("cascade_multiplier must be >= 1")
+        self._pipeline = pipeline
+        self._n_shards = n_shards
+        self._dense_dtype = dense_dtype
+        self._owner_aggregate = owner_aggregate
+        self._owns_executor = encode_executor is None
+        self._encode_executor: Executor = encode_executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="field-encode"
+        )
+        self._encode_batcher = encode_batcher
+        # 每个分片一个 I/O 线程做阻塞的 Pipe 收发，扇出时各分片并行
+        self._io = ThreadPoolExecutor(max_workers=n_shards, thread_name_prefix="field-shard")
+        self._shard_locks = [asyncio.Lock() for _ in range(n_shards)]
+        # 写入代数：所有写入都经过父进程，在这里计数（见 generation）
+        self._writes = 0
+        self._maintenance_interval = maintenance_interval
+        self._maintenance: asyncio.Task | None = None
+        self._expiring = bool(ttl or ttl_by_type)
+
+        field_kwargs: dict[str, Any] = {
+            "dense_dtype": dense_dtype,
+            "owner_aggregate": owner_aggregate,
+            "ttl": ttl,
+            "ttl_by_type": ttl_by_type,
+            "compact_below": compact_below,
+            "maintenance_interval": 0.0,
+            "cascade_bits": cascade_bits,
+            "cascade_multiplier": cascade_multiplier,
+            "index": index,
+            "ef_search": ef_search,
+        }
+        if scan_tile_bytes is not None:
+            field_kwargs["scan_tile_bytes"] = scan_tile_bytes
+        if scan_threads > 1:
+            # 分片内再按行区间并行扫描（分片进程同步执行，不需要读线程）
+            field_kwargs["scan_threads"] = scan_threads
+        code_bits = getattr(pipeline, "code_bits", pipeline.packed_dim * 8)
+        dense_dim = pipeline.dense_dim if dense_dtype is not None else 0
+        ctx = mp.get_context(mp_context)
+        self._conns: list[Connection] = []
+        self._procs: list[mp.process.BaseProcess] = []
+        for shard in range(n_shards):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(
+                target=_shard_main,
+                args=(child_conn, pipeline.packed_dim, code_bits, dense_dim, field_kwargs),
+                name=f"field-shard-{shard}",
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+        logger.info("ShardedField started %d shard processes (%s)", n_shards, mp_context)
+
+    # ── 分片通信 ───────────────────────────────────────────
+
+    def _roundtrip(self, shard: int, op: str, args: tuple) -> Any:
+        conn = self._conns[shard]
+        conn.send((op, args))
+        status, value = conn.recv()
+        if status == "error":
+            raise value
+        return value
+
+    async def _call(self, shard: int, op: str, *args: Any) -> Any:
+        """向单个分片发一次请求。同一分片的请求按锁串行（Pipe 一问一答）。"""
+        loop = asyncio.get_running_loop()
+        async with self._shard_locks[shard]:
+            return await loop.run_in_executor(self._io, self._roundtrip, shard, op, args)
+
+    async def _broadcast(self, op: str, *args: Any) -> list[Any]:
+        """并行发往全部分片，返回按分片号排列的结果。"""
+        return await asyncio.gather(
+            *(self._call(shard, op, *args) for shard in range(self._n_shards))
+        )
+
+    def _shard_of(self, owner: str) -> int:
+        return _shard_of(owner, self._n_shards)
+
+    # ── 编码（父进程） ─────────────────────────────────────
+
+    async def _run_encode(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._encode_executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def _encode_queries(
+        self, texts: list[str], with_dense: bool
+    ) -> tuple[np.ndarray | None, np.ndarray | None, list[int]]:
+        """非空查询 → (uint8[Q, packed_dim], 可选 dense[Q, dim], 在 texts 中的下标)。"""
+        valid = [i for i, t in enumerate(texts) if t and t.strip()]
+        if not valid:
+            return None, None, valid
+        stripped = [texts[i].strip() for i in valid]
+        if with_dense:
+            binaries, denses = await self._run_encode(
+                self._pipeline.encode_texts_with_dense, stripped
+            )
+            return np.asarray(binaries), np.asarray(denses), valid
+        if len(stripped) == 1 and self._encode_batcher is not None:
+            return (await self._encode_batcher.submit(stripped[0]))[None, :], None, valid
+        vecs = await self._run_encode(self._pipeline.encode_texts, stripped)
+        return np.stack(vecs), None, valid
+
+    async def _encode_new(
+        self, texts: list[str]
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        待写入文本 → (uint8[N, packed_dim], 可选 dense[N, dim])。单条走 micro-batcher。
+
+        结果不写回查询缓存（deposit / 批量导入的文本不挤占查询 LRU）。
+        """
+        if self._dense_dtype is not None:
+            return await self._run_encode(
+                self._pipeline.encode_texts_with_dense, texts, cache_results=False
+            )
+        if len(texts) == 1 and self._encode_batcher is not None:
+            return (await self._encode_batcher.submit(texts[0]))[None, :], None
+        vecs = await self._run_encode(self._pipeline.encode_texts, texts, cache_results=False)
+        return np.stack(vecs), None
+
+    # ── 写路径 ─────────────────────────────────────────────
+
+    async def deposit(
+        self, text: str, owner: str, metadata: dict | None = None
+    ) -> str:
+        """Intent 进入场（owner 所在分片）。幂等：同一 (owner, text) 不重复存储。"""
+        return (await self.deposit_many([(text, owner, metadata)]))[0]
+
+    async def deposit_many(
+        self, items: list[tuple[str, str, dict | None]]
+    ) -> list[str]:
+        """批量 deposit：已存在的先按分片查出，新文本一次编码，再按分片并行写入。"""
+        for text, owner, _ in items:
+            if not text or not text.strip():
+                raise ValueError("Cannot deposit empty text")
+            if not owner or not owner.strip():
+                raise ValueError("Cannot deposit without owner")
+
+        pairs = [(owner, text.strip()) for text, owner, _ in items]
+        by_shard: dict[int, list[tuple[str, str]]] = {}
+        for pair in dict.fromkeys(pairs):
+            by_shard.setdefault(self._shard_of(pair[0]), []).append(pair)
+        shards = list(by_shard)
+        ids: dict[tuple[str, str], str] = {}
+        for found in await asyncio.gather(
+            *(self._call(s, "lookup", by_shard[s]) for s in shards)
+        ):
+            ids.update(found)
+
+        pending: dict[tuple[str, str], Intent] = {}
+        for pair, (_, _, metadata) in zip(pairs, items):
+            if pair in ids or pair in pending:
+                continue
+            pending[pair] = Intent(
+                id=str(uuid.uuid4()), owner=pair[0], text=pair[1], metadata=metadata or {}
+            )
+        new_intents = list(pending.values())
+        if new_intents:
+            binaries, denses = await self._encode_new([i.text for i in new_intents])
+            rows_by_shard: dict[int, list[int]] = {}
+            for n, intent in enumerate(new_intents):
+                rows_by_shard.setdefault(self._shard_of(intent.owner), []).append(n)
+            targets = list(rows_by_shard)
+            written = await asyncio.gather(*(
+                self._call(
+                    s,
+                    "add",
+                    [new_intents[n] for n in rows_by_shard[s]],
+                    binaries[rows_by_shard[s]],
+                    denses[rows_by_shard[s]] if denses is not None else None,
+                )
+                for s in targets
+            ))
+            for s, shard_ids in zip(targets, written):
+                for n, iid in zip(rows_by_shard[s], shard_ids):
+                    ids[(new_intents[n].owner, new_intents[n].text)] = iid
+            self._writes += 1
+
+        if self._expiring:
+            self._ensure_maintenance()
+        logger.debug("Deposited %d items across %d shards", len(items), len(shards))
+        return [ids[pair] for pair in pairs]
+
+    async def upsert(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """
+        按 intent_id 原地改写 Intent（规则同 MemoryField.upsert）。
+
+        intent_id 不携带分片号：先广播查出所在分片（不在场内时用 owner 的分片），
+        父进程编码后只发往该分片。
+        """
+        if not text or not text.strip():
+            raise ValueError("Cannot deposit empty text")
+        if owner is not None and not owner.strip():
+            raise ValueError("Cannot deposit without owner")
+        text = text.strip()
+        current = next(
+            (o for o in await self._broadcast("owner_of", intent_id) if o is not None), None
+        )
+        if current is None and owner is None:
+            raise KeyError(f"Unknown intent_id '{intent_id}'")
+        binaries, denses = await self._encode_new([text])
+        await self._call(
+            self._shard_of(current or owner),
+            "upsert_row",
+            intent_id,
+            text,
+            owner,
+            metadata,
+            binaries[0],
+            denses[0] if denses is not None else None,
+        )
+        self._writes += 1
+        self._ensure_maintenance()
+        return intent_id
+
+    async def remove(self, intent_id: str) -> None:
+        """移除单个 Intent。intent_id 不携带分片号，广播到全部分片。"""
+        if sum(await self._broadcast("remove_ids", [intent_id])):
+            self._writes += 1
+            self._ensure_maintenance()
+
+    async def remove_owner(self, owner: str) -> int:
+        """移除 owner 的所有 Intent。返回移除数量。"""
+        removed = await self._call(self._shard_of(owner), "drop_owner", owner)
+        if removed:
+            self._writes += 1
+            self._ensure_maintenance()
+        return removed
+
+    async def expire(self, now: float | None = None) -> int:
+        """各分片淘汰到期（expires_at <= now，默认当前时间）的 Intent。返回淘汰总数。"""
+        now = time.time() if now is None else now
+        removed = sum(await self._broadcast("expire_due", now))
+        if removed:
+            self._writes += 1
+        return removed
+
+    async def compact(self) -> bool:
+        """各分片按 compact_below 缩容。返回是否有分片缩容。"""
+        return any(await self._broadcast("shrink"))
+
+    async def rebuild_index(self) -> bool:
+        """各分片的 HNSW 墓碑过多时重建。返回是否有分片重建。"""
+        return any(await self._broadcast("reindex"))
+
+    def _ensure_maintenance(self) -> None:
+        """惰性启动后台维护任务。只在带 TTL 的写入或删除 / 改写之后调用，须在事件循环内。"""
+        if self._maintenance_interval <= 0:
+            return
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        """每 maintenance_interval 秒广播一轮淘汰 + 缩容 + 重建；各分片都无事可做时退出。"""
+        pending = True
+        while pending:
+            await asyncio.sleep(self._maintenance_interval)
+            try:
+                await self.expire()
+                await self.compact()
+                await self.rebuild_index()
+                pending = any(await self._broadcast("pending"))
+            except Exception:
+                logger.exception("Sharded field maintenance round failed")
+
+    # ── 读路径 ─────────────────────────────────────────────
+
+    async def match(
+        self,
+        text: str,
+        k: int = 10,
+        rerank: int = 0,
+        filters: MatchFilter | None = None,
+        ef_search: int = 0,
+    ) -> list[FieldResult]:
+        """扇出到全部分片，归并各分片 top-k。filters / ef_search 随查询下发。"""
+        return (await self._match_many([text], k, rerank, filters, ef_search))[0]
+
+    async def match_many(
+        self, texts: list[str], k: int = 10, filters: MatchFilter | None = None
+    ) -> list[list[FieldResult]]:
+        """多条查询一次编码、每个分片一次扫描。返回与 texts 对齐（空文本 → []）。"""
+        return await self._match_many(texts, k, 0, filters)
+
+    async def _match_many(
+        self,
+        texts: list[str],
+        k: int,
+        rerank: int,
+        filters: MatchFilter | None,
+        ef_search: int = 0,
+    ) -> list[list[FieldResult]]:
+        results: list[list[FieldResult]] = [[] for _ in texts]
+        with_dense = rerank > 0 and self._dense_dtype is not None
+        queries, denses, valid = await self._encode_queries(texts, with_dense)
+        if queries is None or k <= 0:
+            return results
+        per_shard = await self._broadcast(
+            "topk", queries, k, rerank, denses, filters, ef_search
+        )
+        for q, shard_lists in zip(valid, zip(*per_shard)):
+            results[q] = self._merge(shard_lists, k)
+        return results
+
+    async def match_owners(
+        self,
+        text: str,
+        k: int = 10,
+        max_intents: int = 3,
+        rerank: int = 0,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[OwnerMatch]:
+        """扇出到全部分片，归并各分片 top-k owner（owner 不跨分片，结果精确）。"""
+        return (
+            await self._match_owners_many([text], k, max_intents, aggregate, rerank, filters)
+        )[0]
+
+    async def match_owners_many(
+        self,
+        texts: list[str],
+        k: int = 10,
+        max_intents: int = 3,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[list[OwnerMatch]]:
+        """多条查询的 match_owners。返回与 texts 对齐（空文本 → []）。"""
+        return await self._match_owners_many(texts, k, max_intents, aggregate, 0, filters)
+
+    async def _match_owners_many(
+        self,
+        texts: list[str],
+        k: int,
+        max_intents: int,
+        aggregate: str | None,
+        rerank: int,
+        filters: MatchFilter | None,
+    ) -> list[list[OwnerMatch]]:
+        aggregate = aggregate or self._owner_aggregate
+        if aggregate not in _OWNER_AGGREGATES:
+            raise ValueError(
+                f"Unknown aggregate '{aggregate}', expected one of {_OWNER_AGGREGATES}"
+            )
+        results: list[list[OwnerMatch]] = [[] for _ in texts]
+        if k <= 0:
+            return results
+        with_dense = rerank > 0 and self._dense_dtype is not None
+        queries, denses, valid = await self._encode_queries(texts, with_dense)
+        if queries is None:
+            return results
+        per_shard = await self._broadcast(
+            "owners", queries, k, max(1, max_intents), aggregate, rerank, denses, filters
+        )
+        for q, shard_lists in zip(valid, zip(*per_shard)):
+            results[q] = self._merge(shard_lists, k)
+        return results
+
+    @staticmethod
+    def _merge(shard_lists: tuple[list, ...], k: int) -> list:
+        """各分片已按分数降序的 top-k → 全局 top-k（同分按分片号）。"""
+        merged = heapq.merge(*shard_lists, key=lambda r: -r.score)
+        return list(itertools.islice(merged, k))
+
+    @property
+    def generation(self) -> int:
+        """写入代数：每次改变了分片内容的写入（含一轮有淘汰的过期）后加一。"""
+        return self._writes
+
+    async def count(self) -> int:
+        return sum(rows for rows, _ in await self._broadcast("sizes"))
+
+    async def count_owners(self) -> int:
+        return sum(owners for _, owners in await self._broadcast("sizes"))
+
+    # ── 生命周期 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        """运行时诊断（/field/api/stats 展示）。"""
+        stats: dict[str, Any] = {"shards": self._n_shards}
+        if self._encode_batcher is not None:
+            stats["encode_batching"] = self._encode_batcher.stats()
+        cache = getattr(self._pipeline, "cache", None)
+        if cache is not None:
+            stats["query_cache"] = cache.stats()
+        return stats
+
+    async def close(self) -> None:
+        """停止维护任务，通知分片进程退出并回收。"""
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            try:
+                await self._maintenance
+            except asyncio.CancelledError:
+                pass
+            self._maintenance = None
+        for shard in range(self._n_shards):
+            try:
+                await self._call(shard, "close")
+            except (EOFError, BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._io.shutdown(wait=False)
+        if self._owns_executor:
+            self._encode_executor.shutdown(wait=False)
@@ -0,0 +1,776 @@
+"""
+SharedMemoryField — 多进程共享的 MemoryField（multiprocessing.shared_memory）。
+
+uvicorn --workers N 时每个 worker 各有一份 app.state.field，彼此不一致，
+向量也被复制 N 份。本实现把向量矩阵、密集副本、id / owner / 去重列和
+元数据都放进一段命名共享内存，所有 worker attach 同一段：
+match QPS 随核数扩展，向量只存一份。
+
+段布局（定长，创建时按 capacity 一次分配，按 64 字节对齐）：
+- header: int64[16]（magic、布局参数、count、seq、owner 数、arena 用量）
+- vectors: uint8[capacity, packed_dim]
+- dense: 可选密集副本 [capacity, dense_dim]（float16 / int8）
+- owner_col: int32[capacity]，owner 编码列（编码表在 owner 表中）
+- keys: uint64[capacity]，sha256(owner|text) 前 8 字节，去重用
+- ids: S36[capacity]，intent_id（更长的 id 在 upsert 时拒绝）
+- rec_off / rec_len: 行 → arena 中 JSON 记录（text / metadata / created_at）
+- owner_off / owner_len / owner_live: owner 表（名称在 arena 中）与存活行数
+- arena: uint8[arena_bytes]，追加式字节区；空间不足时原地压缩
+
+并发约定：
+- 单写者：写操作先取进程内 asyncio 锁，再取锁文件上的 fcntl.flock，
+  任一时刻全机只有一个进程在改段。
+- 追加不打断读者：行数据和 owner 表先写，最后才发布 header.count；
+  读者先读 count，只看 [0, count) 的完整行。
+- 破坏性变更（swap 删除、arena 压缩、upsert 原地改写）用 seqlock：写者把 seq 加到奇数、
+  修改、再加到偶数。读者在 _read 中记下 seq，扫描并构建结果后复核，
+  seq 变化（或扫描中因撕裂状态抛错）就重试。读者不加锁。
+- 依赖 x86-64 等强内存序平台上对齐 int64 的读写原子且按序可见。
+
+去重与删除在写锁内对共享列做向量化比较（O(N) 次 numpy 比较），
+不维护进程内的 id → 行索引，因此任一 worker 都能直接写。
+不支持 index="mih" / "hnsw"（进程内索引无法跟随其他 worker 的写入）和 ttl，也不做持久化。
+过滤匹配只支持 owner 谓词（前缀 / 排除，按共享的 owner 编码列求行集合）；
+元数据倒排同样是进程内结构，元数据条件会被拒绝。
+
+段在所有进程退出后仍然存在，需显式 unlink()（或重启机器）才释放。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, TypeVar
+
+import numpy as np
+
+from towow.field.columns import _COMPACT_ROWS
+from towow.field.field import MemoryField
+from towow.field.pipeline import EncodingPipeline
+from towow.field.types import FieldResult, Intent, MatchFilter, OwnerMatch
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+_MAGIC = 0x444C4657574F5754  # b"TOWOWFLD"
+_LAYOUT_VERSION = 1
+_ALIGN = 64
+_ID_BYTES = 36  # str(uuid4())
+
+_DEFAULT_CAPACITY = 100_000
+_DEFAULT_ARENA_BYTES = 128 * 1024 * 1024
+
+# header 槽位
+(
+    _H_MAGIC, _H_VERSION, _H_PACKED_DIM, _H_CAPACITY, _H_DENSE_DIM, _H_DENSE_KIND,
+    _H_OWNER_CAPACITY, _H_ARENA_BYTES, _H_COUNT, _H_SEQ, _H_OWNERS, _H_ARENA_USED,
+    _H_LIVE_OWNERS,
+) = range(13)
+_HEADER_SLOTS = 16
+
+_DENSE_KINDS = {None: 0, "float16": 1, "int8": 2}
+
+# 等待写者完成 swap / 压缩的轮询间隔与上限（写者持锁期间崩溃时不无限自旋）
+_LOCK_POLL_S = 0.0005
+_READ_WAIT_S = 5.0
+
+
+def _row_hash(owner: str, text: str) -> int:
+    """(owner, text) → uint64 去重键（与 _dedup_key 同源，取 sha256 前 8 字节）。"""
+    return int.from_bytes(hashlib.sha256(f"{owner}|{text}".encode()).digest()[:8], "little")
+
+
+def _layout(
+    capacity: int,
+    packed_dim: int,
+    dense_dim: int,
+    dense_dtype: str | None,
+    owner_capacity: int,
+    arena_bytes: int,
+) -> tuple[dict[str, tuple[int, tuple[int, ...], np.dtype]], int]:
+    """列名 → (偏移, 形状, dtype)，以及段总字节数。"""
+    columns: list[tuple[str, tuple[int, ...], Any]] = [
+        ("header", (_HEADER_SLOTS,), np.int64),
+        ("vectors", (capacity, packed_dim), np.uint8),
+        ("owner_col", (capacity,), np.int32),
+        ("keys", (capacity,), np.uint64),
+        ("ids", (capacity,), f"S{_ID_BYTES}"),
+        ("rec_off", (capacity,), np.int64),
+        ("rec_len", (capacity,), np.int32),
+        ("owner_off", (owner_capacity,), np.int64),
+        ("owner_len", (owner_capacity,), np.int32),
+        ("owner_live", (owner_capacity,), np.int32),
+        ("arena", (arena_bytes,), np.uint8),
+    ]
+    if dense_dtype is not None:
+        columns.insert(2, ("dense", (capacity, dense_dim), dense_dtype))
+    layout = {}
+    offset = 0
+    for name, shape, dtype in columns:
+        dtype = np.dtype(dtype)
+        layout[name] = (offset, shape, dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        offset += -(-size // _ALIGN) * _ALIGN
+    return layout, offset
+
+
+def _open_segment(name: str, size: int) -> tuple[SharedMemory, bool]:
+    """创建或 attach 命名段 → (段, 是否新建)。段的生命周期不交给 resource_tracker。"""
+    try:
+        shm, created = SharedMemory(name=name, create=True, size=size), True
+    except FileExistsError:
+        shm, created = SharedMemory(name=name), False
+    # resource_tracker 会在本进程退出时 unlink 它登记过的段（attach 也登记），
+    # 其他 worker 仍在使用；由 unlink() 显式释放
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, created
+
+
+class _ProcessLock:
+    """进程内 asyncio.Lock + 锁文件 fcntl.flock：全机单写者。"""
+
+    def __init__(self, fd: int) -> None:
+        self._fd = fd
+        self._local = asyncio.Lock()
+
+    async def __aenter__(self) -> None:
+        await self._local.acquire()
+        try:
+            while True:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return
+                except BlockingIOError:
+                    # 其他进程在写：让出事件循环，不阻塞本 worker 的读请求
+                    await asyncio.sleep(_LOCK_POLL_S)
+        except BaseException:
+            self._local.release()
+            raise
+
+    async def __aexit__(self, *exc: object) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._local.release()
+
+
+class SharedMemoryField(MemoryField):
+    """多进程共享场。满足 IntentField Protocol，行为与 MemoryField 一致。"""
+
+    def __init__(
+        self,
+        pipeline: EncodingPipeline,
+        name: str,
+        capacity: int = _DEFAULT_CAPACITY,
+        arena_bytes: int = _DEFAULT_ARENA_BYTES,
+        owner_capacity: int | None = None,
+        lock_path: str | Path | None = None,
+        **kwargs,
+    ) -> None:
+        if kwargs.get("index", "brute") != "brute":
+            raise ValueError("SharedMemoryField only supports index='brute'")
+        if kwargs.get("ttl") is not None or kwargs.get("ttl_by_type"):
+            raise ValueError("SharedMemoryField does not support ttl")
+        if kwargs.get("cascade_bits"):
+            raise ValueError("SharedMemoryField does not support cascade_bits")
+        if capacity < 1 or arena_bytes < 1:
+            raise ValueError("capacity and arena_bytes must be positive")
+        super().__init__(pipeline, **kwargs)
+        # 段按 capacity 定长分配，不缩容；也没有进程内的过期堆
+        self._maintenance_interval = 0.0
+        self._name = name
+
+        lock_path = Path(lock_path or Path(tempfile.gettempdir()) / f"{name}.lock")
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = _ProcessLock(self._lock_fd)
+
+        dense_dim = pipeline.dense_dim if self._dense_dtype is not None else 0
+        owner_capacity = owner_capacity or capacity
+        layout, size = _layout(
+            capacity, self._packed_dim, dense_dim, self._dense_dtype,
+            owner_capacity, arena_bytes,
+        )
+        # 创建 + 初始化 header 在写锁内完成，并发启动的 worker 只会看到完整的段
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            self._shm, self._created = _open_segment(name, size)
+            header = np.ndarray((_HEADER_SLOTS,), np.int64, self._shm.buf)
+            if self._created:
+                header[:] = 0
+                header[_H_MAGIC] = _MAGIC
+                header[_H_VERSION] = _LAYOUT_VERSION
+                header[_H_PACKED_DIM] = self._packed_dim
+                header[_H_CAPACITY] = capacity
+                header[_H_DENSE_DIM] = dense_dim
+                header[_H_DENSE_KIND] = _DENSE_KINDS[self._dense_dtype]
+                header[_H_OWNER_CAPACITY] = owner_capacity
+                header[_H_ARENA_BYTES] = arena_bytes
+            existing = header.copy()
+            del header
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        if not self._created:
+            # 已存在的段：布局参数以段为准，只校验编码兼容
+            try:
+                self._check_header(existing, dense_dim)
+            except ValueError:
+                self._shm.close()
+                os.close(self._lock_fd)
+                raise
+            capacity = int(existing[_H_CAPACITY])
+            owner_capacity = int(existing[_H_OWNER_CAPACITY])
+            layout, _ = _layout(
+                capacity, self._packed_dim, dense_dim, self._dense_dtype,
+                owner_capacity, int(existing[_H_ARENA_BYTES]),
+            )
+
+        self._bind(layout)
+        self._capacity = capacity
+        self._owner_capacity = owner_capacity
+        self._sync_view()
+        logger.info(
+            "%s shared field segment '%s' (capacity=%d, rows=%d)",
+            "Created" if self._created else "Attached to", name, capacity, self._active_count,
+        )
+
+    def _check_header(self, header: np.ndarray, dense_dim: int) -> None:
+        if int(header[_H_MAGIC]) != _MAGIC or int(header[_H_VERSION]) != _LAYOUT_VERSION:
+            raise ValueError(f"Shared memory segment '{self._name}' is not a field segment")
+        expected = (self._packed_dim, dense_dim, _DENSE_KINDS[self._dense_dtype])
+        found = (
+            int(header[_H_PACKED_DIM]), int(header[_H_DENSE_DIM]), int(header[_H_DENSE_KIND]),
+        )
+        if found != expected:
+            raise ValueError(
+                f"Shared field '{self._name}' layout (packed_dim, dense_dim, dense_kind)="
+                f"{found} does not match this pipeline {expected}"
+            )
+
+    def _bind(self, layout: dict[str, tuple[int, tuple[int, ...], np.dtype]]) -> None:
+        """把共享段切成各列的 numpy 视图，替换 MemoryField 的进程内缓冲。"""
+        views = {
+            name: np.ndarray(shape, dtype, self._shm.buf, offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+        self._header = views["header"]
+        self._vector_buf = views["vectors"]
+        self._dense_buf = views.get("dense")
+        self._owner_col = views["owner_col"]
+        self._keys = views["keys"]
+        self._ids = views["ids"]
+        self._rec_off = views["rec_off"]
+        self._rec_len = views["rec_len"]
+        self._owner_off = views["owner_off"]
+        self._owner_len = views["owner_len"]
+        self._owner_live = views["owner_live"]
+        self._arena = views["arena"]
+
+    # ── 读路径 ─────────────────────────────────────────────
+
+    def _sync_view(self) -> None:
+        """从 header 刷新行数视图，并把新出现的 owner 追加到本地编码表。"""
+        count = int(self._header[_H_COUNT])
+        owners = int(self._header[_H_OWNERS])
+        for code in range(len(self._owner_names), owners):
+            name = self._arena_bytes(self._owner_off[code], self._owner_len[code]).decode()
+            self._owner_codes[name] = code
+            self._owner_names.append(name)
+        self._active_count = count
+        self._vectors = self._vector_buf[:count]
+
+    async def _read(self, fn: Callable[[], _T]) -> _T:
+        """
+        seqlock 读：seq 为奇数（写者在 swap / 压缩）时让出事件循环等待，
+        结束后 seq 变化则重试。
+
+        _sync_view 在事件循环上执行（多个读线程并发刷新会互相覆盖本地视图）；
+        scan_threads > 0 时 fn 经 run_in_executor 在读线程中执行，否则同步执行。
+        同一 seq 下只有追加，其他读者刷新视图只会让行数变多，不影响本次结果。
+        """
+        header = self._header
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + _READ_WAIT_S
+        while True:
+            seq = int(header[_H_SEQ])
+            if seq & 1:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Shared field '{self._name}' writer stalled mid-update")
+                await asyncio.sleep(0)
+                continue
+            self._sync_view()
+            try:
+                if self._read_executor is None:
+                    result = fn()
+                else:
+                    result = await loop.run_in_executor(self._read_executor, fn)
+            except Exception:
+                if int(header[_H_SEQ]) == seq:
+                    raise
+                result = None  # 撕裂状态导致的异常，重试
+            if int(header[_H_SEQ]) == seq:
+                return result
+            self._read_retries += 1
+
+    async def match(
+        self,
+        text: str,
+        k: int = 10,
+        rerank: int = 0,
+        filters: MatchFilter | None = None,
+        ef_search: int = 0,
+    ) -> list[FieldResult]:
+        self._sync_view()
+        return await super().match(text, k, rerank, filters, ef_search)
+
+    async def match_many(
+        self, texts: list[str], k: int = 10, filters: MatchFilter | None = None
+    ) -> list[list[FieldResult]]:
+        self._sync_view()
+        return await super().match_many(texts, k, filters)
+
+    async def match_owners(
+        self,
+        text: str,
+        k: int = 10,
+        max_intents: int = 3,
+        rerank: int = 0,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[OwnerMatch]:
+        self._sync_view()
+        return await super().match_owners(text, k, max_intents, rerank, aggregate, filters)
+
+    async def match_owners_many(
+        self,
+        texts: list[str],
+        k: int = 10,
+        max_intents: int = 3,
+        aggregate: str | None = None,
+        filters: MatchFilter | None = None,
+    ) -> list[list[OwnerMatch]]:
+        self._sync_view()
+        return await super().match_owners_many(texts, k, max_intents, aggregate, filters)
+
+    def _metadata_rows(self, metadata: tuple[tuple[str, Any], ...]) -> np.ndarray:
+        raise ValueError("SharedMemoryField does not support metadata filters")
+
+    def _arena_bytes(self, offset: int, length: int) -> bytes:
+        return self._arena[int(offset) : int(offset) + int(length)].tobytes()
+
+    def _record(self, row: int) -> dict[str, Any]:
+        return json.loads(self._arena_bytes(self._rec_off[row], self._rec_len[row]))
+
+    def _build_results(
+        self, indices: np.ndarray, scores: np.ndarray
+    ) -> list[FieldResult]:
+        """行号 + 分数 → FieldResult 列表（元数据从 arena 解码）。"""
+        results: list[FieldResult] = []
+        for idx, score in zip(indices, scores):
+            record = self._record(idx)
+            results.append(
+                FieldResult(
+                    intent_id=self._ids[idx].decode(),
+                    score=float(score),
+                    owner=self._owner_names[self._owner_col[idx]],
+                    text=record["text"],
+                    metadata=record["metadata"],
+                )
+            )
+        return results
+
+    def _find_ids(self, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        """(owner, text) → 已在场内的 intent_id。按 uint64 键向量化比较，命中行再核对原文。"""
+        if not pairs or self._active_count == 0:
+            return {}
+        hashes = np.array([_row_hash(owner, text) for owner, text in pairs], dtype=np.uint64)
+        wanted = set(pairs)
+        found: dict[tuple[str, str], str] = {}
+        for row in np.flatnonzero(np.isin(self._keys[: self._active_count], hashes)):
+            pair = (self._owner_names[self._owner_col[row]], self._record(row)["text"])
+            if pair in wanted:
+                found[pair] = self._ids[row].decode()
+        return found
+
+    @property
+    def generation(self) -> int:
+        """
+        写入代数（跨进程）：段头 seq 在高位、行数在低位。
+
+        破坏性变更使 seq 增大（一次可删多行，行数可能同时减少），同一 seq 下
+        只有追加，行数严格增大；行数不超过段容量，拼接后任何变更都会改变取值。
+        """
+        header = self._header
+        return int(header[_H_SEQ]) << 32 | int(header[_H_COUNT])
+
+    async def count(self) -> int:
+        return int(self._header[_H_COUNT])
+
+    async def count_owners(self) -> int:
+        return int(self._header[_H_LIVE_OWNERS])
+
+    async def compact(self) -> bool:
+        """段按 capacity 定长分配，不缩容（换成进程内缓冲会与其他 worker 脱钩）。"""
+        return False
+
+    def _compact_locked(self) -> bool:
+        return False
+
+    # ── 写路径 ─────────────────────────────────────────────
+
+    async def deposit(
+        self, text: str, owner: str, metadata: dict | None = None
+    ) -> str:
+        """Intent 进入场。幂等：同一 (owner, text) 不重复存储（跨进程）。"""
+        if not text or not text.strip():
+            raise ValueError("Cannot deposit empty text")
+        if not owner or not owner.strip():
+            raise ValueError("Cannot deposit without owner")
+        pair = (owner, text.strip())
+        existing = await self._read(lambda: self._find_ids([pair]))
+        if pair in existing:
+            return existing[pair]
+
+        intent = Intent(
+            id=str(uuid.uuid4()), owner=owner, text=pair[1], metadata=metadata or {}
+        )
+        dense_vec = None
+        if self._dense_buf is not None:
+            binary_vec, dense_vec = await self._run_encode(
+                self._pipeline.encode_with_dense, intent.text, cache_results=False
+            )
+            dense_vec = dense_vec.reshape(1, -1)
+        else:
+            binary_vec = await self._encode_text(intent.text, cache_results=False)
+        ids = await self._commit([pair], [intent], binary_vec.reshape(1, -1), dense_vec)
+        return ids[0]
+
+    async def deposit_many(
+        self, items: list[tuple[str, str, dict | None]]
+    ) -> list[str]:
+        """批量 deposit。场内已有（任一进程写入）和批内重复的 (owner, text) 都不再编码。"""
+        for text, owner, _ in items:
+            if not text or not text.strip():
+                raise ValueError("Cannot deposit empty text")
+            if not owner or not owner.strip():
+                raise ValueError("Cannot deposit without owner")
+
+        pairs = [(owner, text.strip()) for text, owner, _ in items]
+        existing = await self._read(lambda: self._find_ids(pairs))
+        pending: dict[tuple[str, str], Intent] = {}
+        for pair, (_, _, metadata) in zip(pairs, items):
+            if pair in existing or pair in pending:
+                continue
+            pending[pair] = Intent(
+                id=str(uuid.uuid4()), owner=pair[0], text=pair[1], metadata=metadata or {}
+            )
+
+        new_intents = list(pending.values())
+        binaries, denses = await self._run_encode(
+            self._encode_many, [i.text for i in new_intents]
+        )
+        ids = await self._commit(pairs, new_intents, binaries, denses)
+        logger.debug("Deposited %d items into shared field '%s'", len(items), self._name)
+        return ids
+
+    async def _commit(
+        self,
+        pairs: list[tuple[str, str]],
+        new_intents: list[Intent],
+        binaries: np.ndarray,
+        denses: np.ndarray | None,
+    ) -> list[str]:
+        """写锁内复核去重（编码期间其他进程可能已写入）并追加，返回与 pairs 对齐的 id。"""
+        async with self._lock:
+            self._sync_locked()
+            ids = self._find_ids(pairs)
+            fresh = [
+                n for n, i in enumerate(new_intents) if (i.owner, i.text) not in ids
+            ]
+            if fresh:
+                self._append_many_locked(
+                    [new_intents[n] for n in fresh],
+                    binaries[fresh],
+                    denses[fresh] if denses is not None else None,
+                )
+                ids.update(
+                    {(new_intents[n].owner, new_intents[n].text): new_intents[n].id for n in fresh}
+                )
+        return [ids[pair] for pair in pairs]
+
+    def _append_many_locked(
+        self,
+        intents: list[Intent],
+        binary_vecs: np.ndarray,
+        dense_vecs: np.ndarray | None = None,
+    ) -> None:
+        """写锁内追加：先写 owner 表与行数据，最后发布 count，读者无需重试。"""
+        header = self._header
+        start = self._active_count
+        end = start + len(intents)
+        if end > self._capacity:
+            raise RuntimeError(
+                f"Shared field '{self._name}' is full ({self._capacity} rows)"
+            )
+
+        new_owners = list(
+            dict.fromkeys(i.owner for i in intents if i.owner not in self._owner_codes)
+        )
+        owners = int(header[_H_OWNERS])
+        if owners + len(new_owners) > self._owner_capacity:
+            raise RuntimeError(
+                f"Shared field '{self._name}' owner table is full ({self._owner_capacity})"
+            )
+        owner_blobs = [name.encode() for name in new_owners]
+        records = [
+            json.dumps(
+                {"text": i.text, "metadata": i.metadata, "created_at": i.created_at},
+                ensure_ascii=False,
+            ).encode()
+            for i in intents
+        ]
+        self._reserve_arena_locked(sum(map(len, owner_blobs)) + sum(map(len, records)))
+
+        # owner 表先于引用它的行发布
+        used = int(header[_H_ARENA_USED])
+        for code, blob in enumerate(owner_blobs, owners):
+            used = self._arena_write(used, blob, self._owner_off, self._owner_len, code)
+        header[_H_ARENA_USED] = used
+        header[_H_OWNERS] = owners + len(new_owners)
+        self._sync_view()
+
+        codes = np.array([self._owner_codes[i.owner] for i in intents], dtype=np.int32)
+        self._vector_buf[start:end] = binary_vecs
+        if self._dense_buf is not None and dense_vecs is not None:
+            self._dense_buf[start:end] = self._quantize_dense(dense_vecs)
+        self._owner_col[start:end] = codes
+        self._keys[start:end] = [_row_hash(i.owner, i.text) for i in intents]
+        self._ids[start:end] = [i.id.encode() for i in intents]
+        for row, blob in enumerate(records, start):
+            used = self._arena_write(used, blob, self._rec_off, self._rec_len, row)
+        header[_H_ARENA_USED] = used
+
+        newly_live = np.unique(codes[self._owner_live[codes] == 0]).size
+        np.add.at(self._owner_live, codes, 1)
+        header[_H_LIVE_OWNERS] += newly_live
+        header[_H_COUNT] = end
+        self._active_count = end
+        self._vectors = self._vector_buf[:end]
+
+    def _arena_write(
+        self, used: int, blob: bytes, offsets: np.ndarray, lengths: np.ndarray, slot: int
+    ) -> int:
+        self._arena[used : used + len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+        offsets[slot] = used
+        lengths[slot] = len(blob)
+        return used + len(blob)
+
+    def _reserve_arena_locked(self, nbytes: int) -> None:
+        """保证 arena 尾部有 nbytes 空间：不够时先压缩掉已删除行的记录。"""
+        arena_bytes = self._arena.shape[0]
+        if int(self._header[_H_ARENA_USED]) + nbytes <= arena_bytes:
+            return
+        self._compact_arena_locked()
+        if int(self._header[_H_ARENA_USED]) + nbytes > arena_bytes:
+            raise RuntimeError(
+                f"Shared field '{self._name}' metadata arena is full ({arena_bytes} bytes)"
+            )
+
+    def _compact_arena_locked(self) -> None:
+        """把 owner 名称与存活行的记录紧凑地搬到 arena 头部（按行块 gather，临时内存有界）。"""
+        owners = int(self._header[_H_OWNERS])
+        count = self._active_count
+        offsets = np.concatenate([self._owner_off[:owners], self._rec_off[:count]])
+        lengths = np.concatenate(
+            [self._owner_len[:owners], self._rec_len[:count]]
+        ).astype(np.int64)
+        new_offsets = np.cumsum(lengths) - lengths
+        total = int(lengths.sum())
+        packed = np.empty(total, dtype=np.uint8)
+        for lo in range(0, len(lengths), _COMPACT_ROWS):
+            hi = min(len(lengths), lo + _COMPACT_ROWS)
+            size = lengths[lo:hi]
+            n_bytes = int(size.sum())
+            if n_bytes == 0:
+                continue
+            base = int(new_offsets[lo])
+            shift = np.repeat(offsets[lo:hi] - (new_offsets[lo:hi] - base), size)
+            packed[base : base + n_bytes] = self._arena[shift + np.arange(n_bytes)]
+        with self._destructive():
+            self._arena[:total] = packed
+            self._owner_off[:owners] = new_offsets[:owners]
+            self._rec_off[:count] = new_offsets[owners:]
+            self._header[_H_ARENA_USED] = total
+        logger.info("Compacted shared field '%s' arena to %d bytes", self._name, total)
+
+    def _sync_locked(self) -> None:
+        """写锁内刷新视图。seq 停在奇数说明上一个写者在 swap / 压缩中途退出：
+        至多一行不一致（与 PersistentField 的崩溃窗口同级），记录后恢复读者。"""
+        if int(self._header[_H_SEQ]) & 1:
+            logger.error("Shared field '%s': previous writer died mid-update", self._name)
+            self._header[_H_SEQ] += 1
+        self._sync_view()
+
+    @contextmanager
+    def _destructive(self) -> Iterator[None]:
+        """seqlock 写区间：期间读者等待，结束后正在读的读者重试。"""
+        self._header[_H_SEQ] += 1
+        try:
+            yield
+        finally:
+            self._header[_H_SEQ] += 1
+
+    def _remove_locked(self, intent_id: str) -> None:
+        """写锁内按 id 列定位并移除单个 Intent。"""
+        self._sync_locked()
+        rows = np.flatnonzero(self._ids[: self._active_count] == intent_id.encode())
+        self._remove_rows_locked(rows)
+
+    async def upsert(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None = None,
+        metadata: dict | None = None,
+    ) -> str:
+        """同 MemoryField.upsert。id 列定长，超过 _ID_BYTES 的 intent_id 会被截断错配，直接拒绝。"""
+        if len(intent_id.encode()) > _ID_BYTES:
+            raise ValueError(
+                f"intent_id '{intent_id}' exceeds {_ID_BYTES} bytes, "
+                "the shared id column cannot hold it"
+            )
+        return await super().upsert(intent_id, text, owner, metadata)
+
+    def _upsert_locked(
+        self,
+        intent_id: str,
+        text: str,
+        owner: str | None,
+        metadata: dict | None,
+        binary_vec: np.ndarray,
+        dense_vec: np.ndarray | None,
+    ) -> None:
+        """写锁内按 id 列定位：不存在时追加，存在时在 seqlock 区间内原地改写该行。"""
+        self._sync_locked()
+        rows = np.flatnonzero(self._ids[: self._active_count] == intent_id.encode())
+        if rows.size == 0:
+            if owner is None:
+                raise KeyError(f"Unknown intent_id '{intent_id}'")
+            if self._find_ids([(owner, text)]):
+                raise ValueError(f"Owner '{owner}' already has an intent with this text")
+            self._append_many_locked(
+                [Intent(id=intent_id, owner=owner, text=text, metadata=metadata or {})],
+                binary_vec.reshape(1, -1),
+                dense_vec.reshape(1, -1) if dense_vec is not None else None,
+            )
+            return
+
+        row = int(rows[0])
+        current_owner = self._owner_names[self._owner_col[row]]
+        if owner is not None and owner != current_owner:
+            raise ValueError(
+                f"Intent {intent_id} belongs to '{current_owner}', cannot move it to '{owner}'"
+            )
+        holder = self._find_ids([(current_owner, text)]).get((current_owner, text))
+        if holder is not None and holder != intent_id:
+            raise ValueError(f"Owner '{current_owner}' already has intent {holder} with this text")
+        record = self._record(row)
+        blob = json.dumps(
+            {
+                "text": text,
+                "metadata": record["metadata"] if metadata is None else metadata,
+                "created_at": record["created_at"],
+            },
+            ensure_ascii=False,
+        ).encode()
+        # 可能先压缩 arena（行号不变，只改 rec_off）
+        self._reserve_arena_locked(len(blob))
+        with self._destructive():
+            self._vector_buf[row] = binary_vec
+            if self._dense_buf is not None and dense_vec is not None:
+                self._dense_buf[row] = self._quantize_dense(dense_vec.reshape(1, -1))[0]
+            self._keys[row] = _row_hash(current_owner, text)
+            self._header[_H_ARENA_USED] = self._arena_write(
+                int(self._header[_H_ARENA_USED]), blob, self._rec_off, self._rec_len, row
+            )
+
+    async def remove_owner(self, owner: str) -> int:
+        """移除 owner 的所有 Intent。返回移除数量。"""
+        async with self._lock:
+            self._sync_locked()
+            code = self._owner_codes.get(owner)
+            if code is None:
+                return 0
+            rows = np.flatnonzero(self._owner_col[: self._active_count] == code)
+            self._remove_rows_locked(rows)
+            return int(rows.size)
+
+    def _remove_rows_locked(self, rows: np.ndarray) -> None:
+        """按行号降序 swap 删除：每次搬入的末行都不是待删行。"""
+        if rows.size == 0:
+            return
+        columns = [self._vector_buf, self._owner_col, self._keys, self._ids,
+                   self._rec_off, self._rec_len]
+        if self._dense_buf is not None:
+            columns.append(self._dense_buf)
+        count = self._active_count
+        with self._destructive():
+            for row in np.sort(rows)[::-1]:
+                code = self._owner_col[row]
+                self._owner_live[code] -= 1
+                if self._owner_live[code] == 0:
+                    self._header[_H_LIVE_OWNERS] -= 1
+                last = count - 1
+                if row != last:
+                    for column in columns:
+                        column[row] = column[last]
+                count -= 1
+            self._header[_H_COUNT] = count
+        self._active_count = count
+        self._vectors = self._vector_buf[:count]
+
+    # ── 生命周期 ───────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        stats = super().stats()
+        header = self._header
+        stats["shared_memory"] = {
+            "name": self._name,
+            "capacity": self._capacity,
+            "rows": int(header[_H_COUNT]),
+            "owners": int(header[_H_LIVE_OWNERS]),
+            "arena_bytes": self._arena.shape[0],
+            "arena_used": int(header[_H_ARENA_USED]),
+            "segment_bytes": self._shm.size,
+            "generation": int(header[_H_SEQ]),
+            "read_retries": self._read_retries,
+        }
+        return stats
+
+    async def close(self) -> None:
+        """释放本进程的映射与锁文件描述符。段本身保留给其他 worker。"""
+        for attr in ("_header", "_vector_buf", "_owner_col", "_keys", "_ids", "_rec_off",
+                     "_rec_len", "_owner_off", "_owner_len", "_owner_live", "_arena"):
+            setattr(self, attr, None)
+        self._dense_buf = None
+        self._vectors = np.empty((0, self._packed_dim), dtype=np.uint8)
+        self._shm.close()
+        os.close(self._lock_fd)
+        await super().close()
+
+    def unlink(self) -> None:
+        """销毁命名段（所有进程关闭映射后内存才真正释放）。"""
+        # SharedMemory.unlink 会再向 resource_tracker 注销一次，先补回登记
+        resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
@@ -4,12 +4,14 @@ V2 Intent Field 数据类型。
 Intent 是场中唯一的粒子（Genome §2）。
 FieldResult 是 Intent 级匹配结果。
 OwnerMatch 是 Owner 级聚合结果。
+MatchFilter 是 match / match_owners 的行过滤谓词。
 """
 
 from __future__ import annotations
 
 import time
 from dataclasses import dataclass, field
+from typing import Any
 
 
 @dataclass(frozen=True)
@@ -41,3 +43,41 @@ class OwnerMatch:
     owner: str
     score: float
     intents: tuple[FieldResult, ...] = ()
+
+
+# 元数据等值过滤只支持可哈希的标量值（二级索引的键）
+_FILTER_SCALARS = (str, int, float, bool, type(None))
+
+
+@dataclass(frozen=True)
+class MatchFilter:
+    """
+    match / match_owners 的行过滤谓词，各条件之间为 AND。
+
+    - owner_prefixes: owner 以其中任一前缀开头（场景前缀 "h_" / "s_" / "r_" / "m_"）
+    - exclude_owners: 排除这些 owner（如提交者自己）
+    - metadata: 元数据等值条件，{key: value} 全部满足；value 须为标量
+
+    构造时规范化为排序后的元组，实例可哈希、可 pickle（分片进程间传递）。
+    """
+
+    owner_prefixes: tuple[str, ...] = ()
+    exclude_owners: tuple[str, ...] = ()
+    metadata: tuple[tuple[str, Any], ...] = ()
+
+    def __post_init__(self) -> None:
+        items = (
+            self.metadata.items() if isinstance(self.metadata, dict) else self.metadata
+        )
+        metadata = tuple(sorted(((str(k), v) for k, v in items), key=lambda kv: kv[0]))
+        for key, value in metadata:
+            if not isinstance(value, _FILTER_SCALARS):
+                raise ValueError(
+                    f"Metadata filter '{key}' must be a scalar, got {type(value).__name__}"
+                )
+        object.__setattr__(self, "owner_prefixes", tuple(sorted(set(self.owner_prefixes))))
+        object.__setattr__(self, "exclude_owners", tuple(sorted(set(self.exclude_owners))))
+        object.__setattr__(self, "metadata", metadata)
+
+    def __bool__(self) -> bool:
+        return bool(self.owner_prefixes or self.exclude_owners or self.metadata)
@@ -51,3 +51,34 @@ class TowowConfig(BaseSettings):
     # Resonance
     default_k_star: int = 5
     embedding_dim: int = 128
+
+    # Encoder micro-batching (shared by V1 resonance and V2 field); opt-in, e.g. 32
+    encode_batch_max_size: int = 1  # 1 = off; > 1 coalesces concurrent encodes
+    encode_batch_wait_ms: float = 5.0
+
+    # V2 Intent Field
+    field_data_dir: str = ""  # Non-empty → PersistentField (mmap + WAL) at this path
+    # Non-empty → SharedMemoryField segment shared by all uvicorn workers (takes precedence
+    # over field_data_dir; Docker needs --shm-size ≥ capacity × packed_dim + arena)
+    field_shared_memory: str = ""
+    field_shared_capacity: int = 100_000
+    field_shared_arena_mb: int = 128
+    field_shards: int = 0  # > 1 → ShardedField: owner-partitioned shard processes (in-memory)
+    field_projector: str = "simhash"  # simhash | hadamard (structured, codes not interchangeable)
+    field_query_cache_entries: int = 0  # opt-in query-embedding LRU (e.g. 4096); 0 = off
+    field_query_cache_mb: int = 64
+    field_match_cache_entries: int = 0  # opt-in generation-versioned match cache (e.g. 1024)
+    field_scan_threads: int = 0  # 0 = scan on the event loop; N = off-loop scan over N row ranges
+    # Coarse-to-fine match: scan a contiguous code prefix of this many bits, verify
+    # k × multiplier candidates on the full code (0 = exact full-code scan)
+    field_cascade_bits: int = 0
+    field_cascade_multiplier: int = 8
+    # Candidate index: brute (exact blocked scan) | mih (exact, short codes) | hnsw
+    # (approximate graph; ef_search is the default candidate list, /match can override)
+    field_index: str = "brute"
+    field_ef_search: int = 64
+    # Intent expiry: TTL in seconds from created_at. metadata["ttl"] overrides per intent,
+    # field_ttl_by_type maps metadata["type"] → TTL (JSON env, e.g. {"demand": 604800})
+    field_ttl_seconds: float = 0  # 0 = intents never expire by default
+    field_ttl_by_type: dict[str, float] = {}
+    field_compact_below: float = 0.25  # shrink the vector buffer below this occupancy
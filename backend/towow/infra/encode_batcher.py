@@ -0,0 +1,221 @@
+"""
+Dynamic micro-batching for text encoders.
+
+Concurrent single-text encode calls each run their own model forward pass,
+which wastes most of the model's batch throughput. MicroBatcher collects
+concurrent requests for up to max_wait_ms (or until max_batch_size) and
+runs one batch call in an executor, resolving each caller's future.
+
+While a batch is running, new requests keep queueing, so the next batch
+grows with load (adaptive batching) instead of piling up small batches.
+
+Usable by both stacks:
+- V2: MemoryField(encode_batcher=MicroBatcher(pipeline.encode_texts))
+- V1: BatchingEncoder wraps a MicroBatcher as a core.protocols.Encoder,
+  so NegotiationEngine._run_encoding picks it up unchanged.
+
+For a worker process instead of a thread, pass a ProcessPoolExecutor and a
+picklable batch_fn such as SentenceTransformerBatch (loads the model once
+inside the worker).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from towow.core.errors import EncodingError
+from towow.core.protocols import Vector
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_BATCH_SIZE = 32
+_DEFAULT_MAX_WAIT_MS = 5.0
+# Latency samples kept for p50/p99
+_LATENCY_WINDOW = 2048
+
+
+class MicroBatcher:
+    """Coalesce concurrent submit(text) calls into batch_fn(list[text]) calls."""
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[str]], Sequence[Any]],
+        max_batch_size: int = _DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = _DEFAULT_MAX_WAIT_MS,
+        executor: Executor | None = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._owns_executor = executor is None
+        self._executor: Executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="micro-batch"
+        )
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+        # Stats
+        self._requests = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._latencies_ms: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+    async def submit(self, text: str) -> Any:
+        """Encode one text via the next batch.
+
+        Raises whatever batch_fn raised, or ValueError if it returned a
+        different number of results than texts.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def run_batch(self, texts: list[str]) -> Sequence[Any]:
+        """Run an already-formed batch directly (bulk callers skip the queue)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._batch_fn, texts)
+
+    def stats(self) -> dict[str, Any]:
+        """Request/batch counters and end-to-end latency percentiles (ms)."""
+        lat = np.fromiter(self._latencies_ms, dtype=np.float64)
+        return {
+            "requests": self._requests,
+            "batches": self._batches,
+            "mean_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "max_batch_size": self._largest_batch,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "latency_p50_ms": round(float(np.percentile(lat, 50)), 2) if lat.size else 0.0,
+            "latency_p99_ms": round(float(np.percentile(lat, 99)), 2) if lat.size else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Stop the worker task; queued callers get CancelledError."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._execute(batch)
+
+    async def _execute(self, batch: list[tuple[str, asyncio.Future, float]]) -> None:
+        texts = [text for text, _, _ in batch]
+        try:
+            results = await self.run_batch(texts)
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"batch_fn returned {len(results)} results for {len(batch)} texts"
+                )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        now = time.perf_counter()
+        self._requests += len(batch)
+        self._batches += 1
+        self._largest_batch = max(self._largest_batch, len(batch))
+        for (_, future, t0), result in zip(batch, results):
+            self._latencies_ms.append((now - t0) * 1000)
+            if not future.done():
+                future.set_result(result)
+
+
+class BatchingEncoder:
+    """V1 Encoder (core.protocols.Encoder) backed by a MicroBatcher.
+
+    batch_fn must return one normalized float vector per text.
+    """
+
+    def __init__(self, batcher: MicroBatcher) -> None:
+        self._batcher = batcher
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        return self._batcher
+
+    async def encode(self, text: str) -> Vector:
+        if not text or not text.strip():
+            raise EncodingError("Cannot encode empty text")
+        try:
+            vec = await self._batcher.submit(text)
+        except Exception as e:
+            raise EncodingError(f"Encoding failed: {e}") from e
+        return np.asarray(vec, dtype=np.float32)
+
+    async def batch_encode(self, texts: list[str]) -> list[Vector]:
+        if not texts:
+            return []
+        for i, t in enumerate(texts):
+            if not t or not t.strip():
+                raise EncodingError(f"Cannot encode empty text at index {i}")
+        try:
+            vecs = await self._batcher.run_batch(texts)
+        except Exception as e:
+            raise EncodingError(f"Batch encoding failed: {e}") from e
+        return [np.asarray(v, dtype=np.float32) for v in vecs]
+
+
+# Per-process model cache for SentenceTransformerBatch
+_WORKER_MODELS: dict[str, Any] = {}
+
+
+class SentenceTransformerBatch:
+    """Picklable batch_fn for ProcessPoolExecutor workers.
+
+    The model is loaded lazily on first call inside each worker process
+    and cached there, so only the model name crosses the process boundary.
+    """
+
+    def __init__(self, model_name: str, normalize: bool = True) -> None:
+        self.model_name = model_name
+        self.normalize = normalize
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        model = _WORKER_MODELS.get(self.model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name)
+            _WORKER_MODELS[self.model_name] = model
+        vecs = model.encode(texts, normalize_embeddings=self.normalize)
+        return np.asarray(vecs, dtype=np.float32)
@@ -0,0 +1,81 @@
+"""
+bundle_binary 微基准：逐条 unpackbits（旧实现）vs 堆叠矩阵一次 unpackbits（现实现）
+
+对 SimHash (D=10000, 1250B) 与 MRL+BQL (D=512, 64B) 两种码长，
+在不同 chunk 数下测单次 bundle 耗时，并校验两者输出逐位一致。
+不加载模型，随机码即可。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_bundle_binary.py
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.projector import bundle_binary
+
+CHUNK_COUNTS = [2, 3, 4, 8, 16, 32, 64]
+CODES = [("SimHash", 10_000), ("MRL+BQL", 512)]
+SEED = 42
+
+
+def legacy_bundle(vectors: list[np.ndarray], D: int, seed: int) -> np.ndarray:
+    """改写前的实现：每条向量单独 unpackbits 成 Python list，再转 int32。"""
+    n = len(vectors)
+    unpacked = np.array([np.unpackbits(v)[:D] for v in vectors], dtype=np.int32)
+    counts = unpacked.sum(axis=0)
+    threshold = n / 2.0
+    result_bits = np.zeros(D, dtype=np.uint8)
+    result_bits[counts > threshold] = 1
+    ties = counts == threshold
+    if ties.any():
+        rng = np.random.RandomState(seed)
+        result_bits[ties] = rng.randint(0, 2, size=ties.sum()).astype(np.uint8)
+    return np.packbits(result_bits)
+
+
+def time_per_call(fn, repeat: int) -> float:
+    """最优一轮的单次耗时（微秒）。"""
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / repeat)
+    return best * 1e6
+
+
+def main() -> None:
+    rng = np.random.RandomState(SEED)
+    print(f"{'code':<8} {'chunks':>6} {'legacy µs':>10} {'vectorised µs':>14} {'speed-up':>9}")
+    print("-" * 52)
+    for name, D in CODES:
+        packed = (D + 7) // 8
+        for n in CHUNK_COUNTS:
+            stacked = rng.randint(0, 256, size=(n, packed), dtype=np.uint8)
+            as_list = list(stacked)
+            assert np.array_equal(
+                legacy_bundle(as_list, D, SEED), bundle_binary(stacked, D=D, seed=SEED)
+            ), f"output mismatch: {name} n={n}"
+            repeat = max(20, 2000 // n)
+            legacy = time_per_call(lambda: legacy_bundle(as_list, D, SEED), repeat)
+            vectorised = time_per_call(lambda: bundle_binary(stacked, D=D, seed=SEED), repeat)
+            print(
+                f"{name:<8} {n:>6} {legacy:>10.1f} {vectorised:>14.1f} "
+                f"{legacy / vectorised:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+MemoryField 内存基准：每条 Intent 的常驻内存（RSS 增量 / 条）
+
+对 64 字节 binary 码（D=512）的随机码，按 N 条 Intent 建场：
+  - 文本约 50 字符，owner 数 = N / 10，半数 Intent 带两个标量元数据
+  - 测 deposit_many 前后的 RSS 增量，除以 N 得到每条 Intent 的字节数，
+    并拆出向量矩阵（容量 × 64B）与其余（元数据、id、索引）两部分
+  - 建场后抽查 match / remove_owner / 去重命中，确认场仍可用
+
+不加载模型：StubPipeline 按批生成随机码，编码开销近似为零。
+每个规模在独立子进程中运行，RSS 互不干扰。10M 需要数 GB 内存与
+数分钟，默认只跑 1M。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_field_memory.py
+  PYTHONPATH=. python ../tests/field_poc/bench_field_memory.py 1000000 10000000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gc
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.field import MemoryField
+from towow.field.projector import hamming_distance, hamming_distance_many
+
+D = 512
+PACKED = D // 8
+BATCH = 50_000
+DEFAULT_SIZES = [1_000_000]
+SEED = 42
+
+
+class StubPipeline:
+    """按批生成随机码；打分与 SimHashProjector 相同（1 - hamming / D）。"""
+
+    packed_dim = PACKED
+    code_bits = D
+
+    def __init__(self) -> None:
+        self._rng = np.random.RandomState(SEED)
+
+    def encode_text(self, text: str) -> np.ndarray:
+        return self._rng.randint(0, 256, size=PACKED, dtype=np.uint8)
+
+    def encode_texts(self, texts: list[str]) -> list[np.ndarray]:
+        return list(self._rng.randint(0, 256, size=(len(texts), PACKED), dtype=np.uint8))
+
+    def batch_similarity(self, query, candidates):
+        return 1.0 - hamming_distance(query, candidates) / D
+
+    def batch_similarity_many(self, queries, candidates):
+        return 1.0 - hamming_distance_many(queries, candidates) / D
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+def items(start: int, end: int, n_owners: int) -> list[tuple[str, str, dict | None]]:
+    return [
+        (
+            f"looking for a collaborator on project {i} in area {i % 997}",
+            f"owner_{i % n_owners}",
+            {"scene": f"h_{i % 7}", "tier": i % 3} if i % 2 else None,
+        )
+        for i in range(start, end)
+    ]
+
+
+async def measure(n: int) -> dict:
+    field = MemoryField(StubPipeline(), maintenance_interval=0)
+    n_owners = max(1, n // 10)
+    gc.collect()
+    before = rss_bytes()
+    t0 = time.perf_counter()
+    for start in range(0, n, BATCH):
+        await field.deposit_many(items(start, min(n, start + BATCH), n_owners))
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    total = rss_bytes() - before
+    vectors = field._capacity * PACKED
+
+    # 场仍可用：匹配、去重命中、按 owner 删除
+    assert len(await field.match("anything", k=10)) == 10
+    first = items(0, 1, n_owners)[0]
+    assert await field.deposit(*first) == field._id_index[0]
+    removed = await field.remove_owner(first[1])
+    assert removed == len(range(0, n, n_owners))
+    return {
+        "n": n,
+        "rss_mb": total / 2**20,
+        "bytes_per_intent": total / n,
+        "vector_bytes_per_intent": vectors / n,
+        "other_bytes_per_intent": (total - vectors) / n,
+        "deposit_rows_per_s": n / elapsed,
+    }
+
+
+def run(n: int, queue) -> None:
+    queue.put(asyncio.run(measure(n)))
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    header = (
+        f"{'intents':>10} {'RSS MB':>9} {'B/intent':>9} {'vector B':>9} "
+        f"{'other B':>8} {'deposit rows/s':>15}"
+    )
+    print(f"D={D} ({PACKED} B/code), batch={BATCH}\n")
+    print(header)
+    print("-" * len(header))
+    ctx = mp.get_context("fork")
+    for n in sizes:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run, args=(n, queue))
+        proc.start()
+        r = queue.get()
+        proc.join()
+        print(
+            f"{r['n']:>10} {r['rss_mb']:>9.1f} {r['bytes_per_intent']:>9.0f} "
+            f"{r['vector_bytes_per_intent']:>9.0f} {r['other_bytes_per_intent']:>8.0f} "
+            f"{r['deposit_rows_per_s']:>15.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+"""
+检索后端基准套件：召回 vs 延迟，可重复、可逐次对比
+
+按 规模 × 数据源 × 投影器 × 后端 的组合建场，每个组合测：
+  - project_rows_per_s：投影器 batch_project 吞吐（dense → binary 码）
+  - deposit_rows_per_s：deposit_many 吞吐（码已预生成，只测场的写入 + 索引维护）
+  - match p50 / p99 / mean（单条 match，k 条结果）
+  - rss_mb / rss_bytes_per_row：建场前后的 RSS 增量
+  - recall_at_k：对 Hamming 暴力扫描真值的召回（按距离计，见下）
+  - dense_recall_at_k：对 dense cosine 真值的召回（投影 + 检索的整体损失）
+
+数据源（不加载模型，CPU 即可）：
+  - synthetic：有聚类结构的高斯向量，簇信号集中在前面的维度（MRL 式）
+  - profiles：447 个 Agent Profile 文本经字符 n-gram 特征哈希成 dense 向量，
+    每行 = 某个 Profile 的向量 + 扰动；查询是 test_queries.py 的真实查询文本
+投影器：simhash / hadamard（--code-bits，默认 10000）、mrl_bql（512 bit）
+后端：
+  - brute：精确分块扫描
+  - cascade：码前缀粗排 + 完整码精排，扫描 cascade_multiplier 的几个取值
+  - mih：Multi-Index Hashing（仅 ≤ 64 字节码）
+  - hnsw：HNSW 图，扫描 ef_search 的几个取值
+
+Hamming 距离大量同分，recall_at_k 按距离而非按 id 计：返回结果中距离不超过
+真值第 k 小距离的条数 / k（精确后端恒为 1）。两个真值都在生成数据时对每批
+数据流式累积，不保留 dense 矩阵。
+
+每个后端在独立的 fork 子进程中建场，RSS 互不干扰（码矩阵由父进程生成，
+写时复制继承，不计入增量）。超出预算的组合记为 skipped 并写明原因：
+码矩阵超过 --max-code-gb、mih 超过 --max-mih-rows、hnsw 超过 --max-hnsw-rows
+（纯 Python 建图约数 ms/行）。
+
+结果写入 tests/field_poc/results/BENCH-field_suite_<时间>.json（含 git 提交、
+numpy 版本、CPU 数与全部参数）。--baseline 给出上一次的结果文件时，按组合键
+打印 p99 / recall / 吞吐的变化，用于逐次发现退化。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_field_suite.py
+  PYTHONPATH=. python ../tests/field_poc/bench_field_suite.py --sizes 10000 100000 1000000 10000000
+  PYTHONPATH=. python ../tests/field_poc/bench_field_suite.py --projectors mrl_bql --backends brute hnsw \\
+      --baseline ../tests/field_poc/results/BENCH-field_suite_20261016-120000.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.field import MemoryField
+from towow.field.profile_loader import load_all_profiles
+from towow.field.projector import (
+    HadamardProjector,
+    MrlBqlProjector,
+    SimHashProjector,
+    hamming_distance,
+    hamming_distance_many,
+)
+
+try:
+    from tests.field_poc.test_queries import TEST_QUERIES
+except ModuleNotFoundError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from test_queries import TEST_QUERIES
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+DIM = 512  # dense 维度（mrl_bql 的码长）
+DEFAULT_SIZES = [10_000, 100_000]
+SOURCES = ("synthetic", "profiles")
+PROJECTORS = ("simhash", "hadamard", "mrl_bql")
+BACKENDS = ("brute", "cascade", "mih", "hnsw")
+CASCADE_MULTIPLIERS = [4, 8, 32]
+EF_SEARCHES = [16, 64, 256]
+MIH_MAX_CODE_BYTES = 64
+BATCH = 50_000
+N_CLUSTERS = 2_000
+SEED = 7
+PARAM_LABELS = {"cascade_multiplier": "x", "ef_search": "ef"}
+
+
+# ── 数据 ───────────────────────────────────────────────────
+
+
+@dataclass
+class FieldData:
+    """一个 (数据源, 投影器, 规模) 组合的码与真值。"""
+
+    source: str
+    projector: str
+    codes: np.ndarray  # uint8[N, packed]
+    query_codes: np.ndarray  # uint8[Q, packed]
+    hamming_kth: np.ndarray  # int[Q]：真值第 k 小的 Hamming 距离
+    dense_topk: np.ndarray  # int64[Q, k]：dense cosine 真值的行号
+    code_bits: int
+    project_rows_per_s: float
+    row_texts: list[str]  # profiles 源每行文本的后缀（按行号取模）
+
+
+def make_projector(name: str, code_bits: int):
+    if name == "simhash":
+        return SimHashProjector(input_dim=DIM, D=code_bits, seed=42)
+    if name == "hadamard":
+        return HadamardProjector(input_dim=DIM, D=code_bits, seed=42)
+    return MrlBqlProjector(input_dim=DIM)
+
+
+def hashed_embedding(text: str) -> np.ndarray:
+    """字符 2/3-gram 特征哈希 → L2 归一化的 float32[DIM]（不依赖模型的确定性编码）。"""
+    vec = np.zeros(DIM, dtype=np.float32)
+    for n in (2, 3):
+        for i in range(len(text) - n + 1):
+            h = int.from_bytes(hashlib.blake2b(text[i : i + n].encode(), digest_size=4).digest(), "little")
+            vec[h % DIM] += 1.0 if h & (1 << 31) else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class DenseSource:
+    """按批生成 dense 行与查询（同一 seed 下可重复）。"""
+
+    def __init__(self, source: str, n_rows: int, n_queries: int) -> None:
+        self._rng = np.random.RandomState(SEED)
+        self.row_texts: list[str] = []
+        if source == "synthetic":
+            weights = (2.0 * (1.0 - np.arange(DIM) / DIM) + 0.25).astype(np.float32)
+            self._bases = self._rng.standard_normal((N_CLUSTERS, DIM)).astype(np.float32) * weights
+            self._noise = 1.0
+            sources = np.sort(self._rng.choice(n_rows, size=n_queries, replace=False))
+            self._query_rows = sources
+            self._queries = None
+        else:
+            profiles = [text for text in load_all_profiles().values() if text.strip()]
+            self.row_texts = [text[:60] for text in profiles]
+            self._bases = np.stack([hashed_embedding(text) for text in profiles]) * 4.0
+            self._noise = 0.15
+            texts = [q["query"] for q in TEST_QUERIES]
+            base = np.stack([hashed_embedding(t) for t in texts]) * 4.0
+            picks = np.arange(n_queries) % len(texts)
+            self._queries = base[picks] + 0.05 * self._rng.standard_normal(
+                (n_queries, DIM)
+            ).astype(np.float32)
+            self._query_rows = None
+
+    def batch(self, start: int, end: int) -> np.ndarray:
+        if self._queries is None:
+            centres = self._bases[self._rng.randint(len(self._bases), size=end - start)]
+        else:
+            centres = self._bases[np.arange(start, end) % len(self._bases)]
+        return centres + self._noise * self._rng.standard_normal(
+            (end - start, DIM)
+        ).astype(np.float32)
+
+    def queries_from(self, start: int, end: int, dense: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """本批中被选为查询来源的 (查询下标, 加噪后的查询向量)。profiles 源不从行中取查询。"""
+        if self._query_rows is None:
+            return np.empty(0, dtype=np.int64), np.empty((0, DIM), dtype=np.float32)
+        picked = np.flatnonzero((self._query_rows >= start) & (self._query_rows < end))
+        noisy = dense[self._query_rows[picked] - start]
+        return picked, noisy + 0.7 * self._rng.standard_normal(noisy.shape).astype(np.float32)
+
+    @property
+    def fixed_queries(self) -> np.ndarray | None:
+        return self._queries
+
+
+def _merge_smallest(best: np.ndarray, new: np.ndarray, k: int) -> np.ndarray:
+    """每行保留 best 与 new 拼接后最小的 k 个值（无序）。"""
+    both = np.concatenate([best, new], axis=1)
+    return np.partition(both, k - 1, axis=1)[:, :k]
+
+
+def generate(source: str, projector_name: str, n_rows: int, args) -> FieldData:
+    """生成码并流式累积两个真值。"""
+    k, n_queries = args.k, args.queries
+    projector = make_projector(projector_name, args.code_bits)
+    data = DenseSource(source, n_rows, n_queries)
+    codes = np.empty((n_rows, projector.packed_dim), dtype=np.uint8)
+
+    # 先确定查询（dense truth 需要完整的查询向量）：synthetic 的查询取自行，
+    # 因此先过一遍生成器拿到查询，再用同一 seed 重新生成行
+    query_dense = data.fixed_queries
+    if query_dense is None:
+        query_dense = np.empty((n_queries, DIM), dtype=np.float32)
+        for start in range(0, n_rows, BATCH):
+            end = min(n_rows, start + BATCH)
+            picked, noisy = data.queries_from(start, end, data.batch(start, end))
+            query_dense[picked] = noisy
+        data = DenseSource(source, n_rows, n_queries)
+    query_unit = query_dense / np.linalg.norm(query_dense, axis=1, keepdims=True)
+    query_codes = projector.batch_project(query_dense)
+
+    hamming_best = np.full((n_queries, k), np.iinfo(np.int32).max, dtype=np.int32)
+    dense_best = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    dense_ids = np.zeros((n_queries, k), dtype=np.int64)
+    project_s = 0.0
+    for start in range(0, n_rows, BATCH):
+        end = min(n_rows, start + BATCH)
+        dense = data.batch(start, end)
+        if data.fixed_queries is None:
+            data.queries_from(start, end, dense)  # 与第一遍保持同样的随机数消耗
+        t0 = time.perf_counter()
+        codes[start:end] = projector.batch_project(dense)
+        project_s += time.perf_counter() - t0
+
+        # Hamming 真值：每条查询在本批的最小 k 个距离
+        dists = np.stack([hamming_distance(q, codes[start:end]) for q in query_codes])
+        hamming_best = _merge_smallest(hamming_best, dists, k)
+        # dense 真值：cosine top-k 行号
+        unit = dense / np.linalg.norm(dense, axis=1, keepdims=True)
+        scores = query_unit @ unit.T
+        cand_scores = np.concatenate([dense_best, scores], axis=1)
+        cand_ids = np.concatenate(
+            [dense_ids, np.broadcast_to(np.arange(start, end), scores.shape)], axis=1
+        )
+        top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+        dense_best = np.take_along_axis(cand_scores, top, axis=1)
+        dense_ids = np.take_along_axis(cand_ids, top, axis=1)
+
+    return FieldData(
+        source=source,
+        projector=projector_name,
+        codes=codes,
+        query_codes=query_codes,
+        hamming_kth=hamming_best.max(axis=1),
+        dense_topk=dense_ids,
+        code_bits=getattr(projector, "D", projector.packed_dim * 8),
+        project_rows_per_s=n_rows / project_s,
+        row_texts=data.row_texts,
+    )
+
+
+# ── 建场与测量（子进程） ───────────────────────────────────
+
+
+class CodePipeline:
+    """文本 "row {i} ..." / "query {j}" → 预生成的码；打分为 1 - hamming / code_bits。"""
+
+    def __init__(self, data: FieldData) -> None:
+        self._data = data
+        self.packed_dim = data.codes.shape[1]
+        self.code_bits = data.code_bits
+
+    def _code(self, text: str) -> np.ndarray:
+        kind, number = text.split(maxsplit=2)[:2]
+        return (self._data.query_codes if kind == "query" else self._data.codes)[int(number)]
+
+    def encode_text(self, text: str) -> np.ndarray:
+        return self._code(text)
+
+    def encode_texts(self, texts: list[str]) -> list[np.ndarray]:
+        return [self._code(t) for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        return 1.0 - hamming_distance(query, candidates) / self.code_bits
+
+    def batch_similarity_many(self, queries, candidates):
+        return 1.0 - hamming_distance_many(queries, candidates) / self.code_bits
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def backend_kwargs(backend: str, data: FieldData) -> dict:
+    if backend == "cascade":
+        prefix = max(8, data.code_bits // 4 // 8 * 8)
+        return {"cascade_bits": prefix}
+    if backend in ("mih", "hnsw"):
+        return {"index": backend}
+    return {}
+
+
+def sweep(backend: str) -> list[dict]:
+    """同一次建场上扫描的查询参数（召回 vs 延迟曲线上的点）。"""
+    if backend == "cascade":
+        return [{"cascade_multiplier": m} for m in CASCADE_MULTIPLIERS]
+    if backend == "hnsw":
+        return [{"ef_search": ef} for ef in EF_SEARCHES]
+    return [{}]
+
+
+async def measure(data: FieldData, backend: str, args) -> list[dict]:
+    n_rows = data.codes.shape[0]
+    n_owners = max(1, n_rows // 10)
+    gc.collect()
+    before = rss_bytes()
+    field = MemoryField(
+        CodePipeline(data),
+        maintenance_interval=0,
+        scan_threads=args.scan_threads,
+        **backend_kwargs(backend, data),
+    )
+    suffixes = data.row_texts
+    t0 = time.perf_counter()
+    for start in range(0, n_rows, BATCH):
+        end = min(n_rows, start + BATCH)
+        await field.deposit_many([
+            (f"row {i} {suffixes[i % len(suffixes)]}" if suffixes else f"row {i}", f"owner_{i % n_owners}", None)
+            for i in range(start, end)
+        ])
+    deposit_s = time.perf_counter() - t0
+    gc.collect()
+    rss = rss_bytes() - before
+
+    records = []
+    for params in sweep(backend):
+        match_kwargs = {}
+        if "cascade_multiplier" in params:
+            field._cascade_multiplier = params["cascade_multiplier"]
+        if "ef_search" in params:
+            match_kwargs["ef_search"] = params["ef_search"]
+        await field.match("query 0", k=args.k, **match_kwargs)  # 预热
+        latency, recall, dense_recall = [], [], []
+        for q in range(args.queries):
+            t = time.perf_counter()
+            results = await field.match(f"query {q}", k=args.k, **match_kwargs)
+            latency.append((time.perf_counter() - t) * 1000)
+            rows = np.array([int(r.text.split(maxsplit=2)[1]) for r in results], dtype=np.int64)
+            dists = hamming_distance(data.query_codes[q], data.codes[rows])
+            recall.append(int((dists <= data.hamming_kth[q]).sum()) / args.k)
+            dense_recall.append(len(set(rows.tolist()) & set(data.dense_topk[q].tolist())) / args.k)
+        latency = np.array(latency)
+        records.append({
+            "params": params,
+            "deposit_rows_per_s": n_rows / deposit_s,
+            "match_p50_ms": float(np.percentile(latency, 50)),
+            "match_p99_ms": float(np.percentile(latency, 99)),
+            "match_mean_ms": float(latency.mean()),
+            "rss_mb": rss / 2**20,
+            "rss_bytes_per_row": rss / n_rows,
+            "recall_at_k": float(np.mean(recall)),
+            "dense_recall_at_k": float(np.mean(dense_recall)),
+        })
+    await field.close()
+    return records
+
+
+def run_child(data: FieldData, backend: str, args, queue) -> None:
+    try:
+        queue.put(("ok", asyncio.run(measure(data, backend, args))))
+    except Exception as exc:  # 子进程里的异常带回父进程记录
+        queue.put(("error", repr(exc)))
+
+
+def skip_reason(backend: str, n_rows: int, packed: int, args) -> str | None:
+    if backend == "mih" and packed > MIH_MAX_CODE_BYTES:
+        return f"mih needs codes <= {MIH_MAX_CODE_BYTES} B (got {packed} B)"
+    if backend == "mih" and n_rows > args.max_mih_rows:
+        return f"rows > --max-mih-rows {args.max_mih_rows}"
+    if backend == "hnsw" and n_rows > args.max_hnsw_rows:
+        return f"rows > --max-hnsw-rows {args.max_hnsw_rows}"
+    return None
+
+
+# ── 驱动 ───────────────────────────────────────────────────
+
+
+def config_key(r: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(r.get("params", {}).items()))
+    return f"{r['rows']}/{r['source']}/{r['projector']}/{r['backend']}/{params}"
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def print_row(r: dict) -> None:
+    label = f"{r['rows']:>9} {r['source']:<9} {r['projector']:<8} {r['backend']:<7}"
+    params = ",".join(f"{PARAM_LABELS[k]}={v}" for k, v in r.get("params", {}).items())
+    if r["status"] != "ok":
+        print(f"{label} {params:<12} {r['status']}: {r['reason']}")
+        return
+    print(
+        f"{label} {params:<12} {r['deposit_rows_per_s']:>10.0f} {r['match_p50_ms']:>8.2f} "
+        f"{r['match_p99_ms']:>8.2f} {r['rss_bytes_per_row']:>8.0f} "
+        f"{r['recall_at_k']:>7.3f} {r['dense_recall_at_k']:>7.3f}"
+    )
+
+
+def compare(records: list[dict], baseline_path: Path) -> None:
+    """按组合键对比上一次的结果：p99、召回与 deposit 吞吐的变化。"""
+    baseline = {
+        config_key(r): r
+        for r in json.loads(baseline_path.read_text())["results"]
+        if r["status"] == "ok"
+    }
+    print(f"\nvs baseline {baseline_path.name}")
+    header = f"{'config':<58} {'p99 Δ%':>8} {'recall Δ':>9} {'deposit Δ%':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in records:
+        old = baseline.get(config_key(r))
+        if r["status"] != "ok" or old is None:
+            continue
+        print(
+            f"{config_key(r):<58} "
+            f"{100 * (r['match_p99_ms'] / old['match_p99_ms'] - 1):>+8.1f} "
+            f"{r['recall_at_k'] - old['recall_at_k']:>+9.3f} "
+            f"{100 * (r['deposit_rows_per_s'] / old['deposit_rows_per_s'] - 1):>+11.1f}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--sources", nargs="+", choices=SOURCES, default=list(SOURCES))
+    parser.add_argument("--projectors", nargs="+", choices=PROJECTORS, default=list(PROJECTORS))
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--code-bits", type=int, default=10_000, help="simhash / hadamard 码长")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--scan-threads", type=int, default=0)
+    parser.add_argument("--max-code-gb", type=float, default=4.0)
+    parser.add_argument("--max-mih-rows", type=int, default=1_000_000)
+    parser.add_argument("--max-hnsw-rows", type=int, default=10_000)
+    parser.add_argument("--baseline", type=Path, help="上一次的结果 JSON，打印逐项变化")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径（默认 results/ 下按时间命名）")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    started = datetime.now()
+    print(
+        f"sizes={args.sizes}, queries={args.queries}, k={args.k}, "
+        f"scan_threads={args.scan_threads}, cpu_count={os.cpu_count()}\n"
+    )
+    header = (
+        f"{'rows':>9} {'source':<9} {'proj':<8} {'backend':<7} {'params':<12} "
+        f"{'deposit/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'B/row':>8} {'recall':>7} {'dense':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    ctx = mp.get_context("fork")
+    records: list[dict] = []
+    for n_rows in args.sizes:
+        for source in args.sources:
+            for projector in args.projectors:
+                packed = MrlBqlProjector(DIM).packed_dim if projector == "mrl_bql" else (args.code_bits + 7) // 8
+                base = {"rows": n_rows, "source": source, "projector": projector, "code_bytes": packed}
+                if n_rows * packed > args.max_code_gb * 2**30:
+                    for backend in args.backends:
+                        r = {**base, "backend": backend, "status": "skipped",
+                             "reason": f"codes exceed --max-code-gb {args.max_code_gb}"}
+                        records.append(r)
+                        print_row(r)
+                    continue
+                data = generate(source, projector, n_rows, args)
+                base["project_rows_per_s"] = data.project_rows_per_s
+                for backend in args.backends:
+                    reason = skip_reason(backend, n_rows, packed, args)
+                    if reason is None:
+                        queue = ctx.Queue()
+                        proc = ctx.Process(target=run_child, args=(data, backend, args, queue))
+                        proc.start()
+                        status, value = queue.get()
+                        proc.join()
+                    if reason is not None or status != "ok":
+                        r = {**base, "backend": backend, "status": "skipped" if reason else "error",
+                             "reason": reason or value}
+                        records.append(r)
+                        print_row(r)
+                        continue
+                    for measured in value:
+                        r = {**base, "backend": backend, "status": "ok", **measured}
+                        records.append(r)
+                        print_row(r)
+                del data
+                gc.collect()
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = args.output or RESULTS_DIR / f"BENCH-field_suite_{started:%Y%m%d-%H%M%S}.json"
+    meta = {
+        "started": started.isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "dense_dim": DIM,
+        "n_clusters": N_CLUSTERS,
+        "seed": SEED,
+    }
+    output.write_text(json.dumps({"meta": meta, "results": records}, ensure_ascii=False, indent=2))
+    print(f"\nResults saved to {output}")
+    if args.baseline is not None:
+        compare(records, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+MRL 级联检索基准：前缀粗排 + 完整码精排 vs 完整码精确扫描
+
+对 D=512（64B）的 MrlBqlProjector 码（sign(x) → packbits），按 cascade_bits
+的码前缀建连续副本，比较不同 cascade_multiplier 下的：
+  - recall@k：级联 top-k 与完整码精确 top-k 的重合比例
+  - 单条 match 延迟 p50 / p99（扫描在事件循环上同步执行，scan_threads=0）
+
+不加载模型，合成向量有聚类结构（每个文档 = 簇中心 + 簇内扰动，查询 = 某个
+文档 + 噪声），两种维度分布：
+  - mrl：簇信号集中在前面的维度（Matryoshka 训练的效果，前缀即低维表示）
+  - flat：各维同等重要，前缀只是随机的一部分超平面（SimHash 码的前缀即如此）
+真实 BgeM3Encoder 的前缀信息量介于两者之间，以实测为准。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_mrl_cascade.py
+  PYTHONPATH=. python ../tests/field_poc/bench_mrl_cascade.py 1000000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.field import MemoryField
+from towow.field.projector import MrlBqlProjector, hamming_distance, hamming_distance_many
+
+D = 512
+PACKED = D // 8
+DEFAULT_ROWS = 200_000
+N_CLUSTERS = 2_000
+N_QUERIES = 200
+K = 10
+CASCADE_BITS = 128
+MULTIPLIERS = [1, 2, 4, 8, 16, 32]
+BATCH = 50_000
+SEED = 7
+
+
+class StubPipeline:
+    """文本 → 预生成的码；打分与 MrlBqlProjector 相同（1 - hamming / D）。"""
+
+    packed_dim = PACKED
+    code_bits = D
+
+    def __init__(self, codes: dict[str, np.ndarray]) -> None:
+        self._codes = codes
+
+    def encode_text(self, text: str) -> np.ndarray:
+        return self._codes[text]
+
+    def encode_texts(self, texts: list[str]) -> list[np.ndarray]:
+        return [self._codes[t] for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        return 1.0 - hamming_distance(query, candidates) / D
+
+    def batch_similarity_many(self, queries, candidates):
+        return 1.0 - hamming_distance_many(queries, candidates) / D
+
+
+def dimension_weights(kind: str) -> np.ndarray:
+    """各维的簇信号强度：mrl 从 2.25 线性降到 0.25，flat 取同样的平均值。"""
+    mrl = 2.0 * (1.0 - np.arange(D) / D) + 0.25
+    return mrl if kind == "mrl" else np.full(D, mrl.mean())
+
+
+def corpus(n_rows: int, kind: str) -> tuple[np.ndarray, np.ndarray]:
+    """(文档码 uint8[N, 64], 查询码 uint8[Q, 64])。"""
+    rng = np.random.RandomState(SEED)
+    projector = MrlBqlProjector(input_dim=D)
+    weights = dimension_weights(kind).astype(np.float32)
+    centroids = rng.standard_normal((N_CLUSTERS, D)).astype(np.float32) * weights
+    sources = np.sort(rng.choice(n_rows, size=N_QUERIES, replace=False))
+    codes = np.empty((n_rows, PACKED), dtype=np.uint8)
+    queries = np.empty((N_QUERIES, PACKED), dtype=np.uint8)
+    for start in range(0, n_rows, BATCH):
+        end = min(n_rows, start + BATCH)
+        dense = centroids[rng.randint(N_CLUSTERS, size=end - start)]
+        dense += rng.standard_normal(dense.shape).astype(np.float32)
+        codes[start:end] = projector.batch_project(dense)
+        picked = (sources >= start) & (sources < end)
+        noisy = dense[sources[picked] - start]
+        noisy += 0.7 * rng.standard_normal(noisy.shape).astype(np.float32)
+        queries[picked] = projector.batch_project(noisy)
+    return codes, queries
+
+
+async def build(codes: np.ndarray, queries: np.ndarray, **kwargs) -> MemoryField:
+    texts = [f"intent {i}" for i in range(codes.shape[0])]
+    query_texts = [f"query {i}" for i in range(queries.shape[0])]
+    pipeline = StubPipeline(dict(zip(texts + query_texts, [*codes, *queries])))
+    field = MemoryField(pipeline, maintenance_interval=0, **kwargs)
+    for start in range(0, len(texts), BATCH):
+        await field.deposit_many(
+            [(t, f"owner_{i % 10_000}", None) for i, t in enumerate(texts[start : start + BATCH], start)]
+        )
+    return field
+
+
+async def run_queries(field: MemoryField) -> tuple[list[set[str]], np.ndarray]:
+    """每条查询的 top-k 文本集合与延迟（ms）。"""
+    await field.match("query 0", k=K)  # 预热
+    found, latency = [], []
+    for q in range(N_QUERIES):
+        t0 = time.perf_counter()
+        results = await field.match(f"query {q}", k=K)
+        latency.append((time.perf_counter() - t0) * 1000)
+        found.append({r.text for r in results})  # id 每次建场重新生成，按文本比对
+    return found, np.array(latency)
+
+
+async def report(n_rows: int, kind: str) -> None:
+    codes, queries = corpus(n_rows, kind)
+    exact = await build(codes, queries)
+    truth, base = await run_queries(exact)
+    await exact.close()
+    del exact
+
+    print(f"\n[{kind}] rows={n_rows}, clusters={N_CLUSTERS}, queries={N_QUERIES}, k={K}")
+    header = (
+        f"{'search':<22} {'scan B/row':>10} {'recall@k':>9} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'speedup':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    p50_base = np.percentile(base, 50)
+    print(
+        f"{'exact 512-bit':<22} {PACKED:>10} {1.0:>9.4f} {p50_base:>8.2f} "
+        f"{np.percentile(base, 99):>8.2f} {1.0:>8.2f}"
+    )
+    field = await build(codes, queries, cascade_bits=CASCADE_BITS)
+    for multiplier in MULTIPLIERS:
+        field._cascade_multiplier = multiplier
+        found, latency = await run_queries(field)
+        recall = np.mean([len(f & t) / K for f, t in zip(found, truth)])
+        p50 = np.percentile(latency, 50)
+        print(
+            f"{f'cascade {CASCADE_BITS}b x{multiplier}':<22} {CASCADE_BITS // 8:>10} "
+            f"{recall:>9.4f} {p50:>8.2f} {np.percentile(latency, 99):>8.2f} "
+            f"{p50_base / p50:>8.2f}"
+        )
+    await field.close()
+
+
+async def main() -> None:
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    for kind in ("mrl", "flat"):
+        await report(n_rows, kind)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+ShardedField 吞吐基准：单进程 MemoryField vs N 个分片进程的 scatter-gather
+
+对同一批 SimHash 码长（D=10000, 1250B）的随机码：
+  - deposit_many 吞吐（行/秒，含向量经 Pipe 下发到分片）
+  - 并发 match / match_owners 的 QPS（CONCURRENCY 条查询同时在途）
+  - 结果校验：各分片归并后的 top-k 分数与单进程 MemoryField 逐条一致
+
+不加载模型：StubPipeline 按文本返回预生成的随机码，编码开销近似为零，
+测到的是扫描 + 进程间通信本身。分片用 fork 启动（spawn 会在每个分片里
+重新 import sentence_transformers）。QPS 随分片数的扩展受机器核数限制，
+输出里打印 cpu_count 供对照。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_sharded_field.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.field import MemoryField
+from towow.field.projector import hamming_distance, hamming_distance_many
+from towow.field.sharded import ShardedField
+
+D = 10_000
+PACKED = (D + 7) // 8
+N_ROWS = 100_000
+N_OWNERS = 5_000
+N_QUERIES = 64
+CONCURRENCY = 8
+K = 10
+SHARD_COUNTS = [1, 2, 4]
+SEED = 42
+
+
+class StubPipeline:
+    """文本 → 预生成随机码；打分与 SimHashProjector 相同（1 - hamming / D）。"""
+
+    def __init__(self, codes: dict[str, np.ndarray]) -> None:
+        self._codes = codes
+
+    packed_dim = PACKED
+    code_bits = D
+
+    def encode_text(self, text: str) -> np.ndarray:
+        return self._codes[text]
+
+    def encode_texts(self, texts: list[str]) -> list[np.ndarray]:
+        return [self._codes[t] for t in texts]
+
+    def batch_similarity(self, query, candidates):
+        return 1.0 - hamming_distance(query, candidates) / D
+
+    def batch_similarity_many(self, queries, candidates):
+        return 1.0 - hamming_distance_many(queries, candidates) / D
+
+
+def corpus() -> tuple[list[tuple[str, str, None]], list[str], StubPipeline]:
+    rng = np.random.RandomState(SEED)
+    texts = [f"intent {i}" for i in range(N_ROWS)]
+    queries = [f"query {i}" for i in range(N_QUERIES)]
+    codes = rng.randint(0, 256, size=(N_ROWS + N_QUERIES, PACKED), dtype=np.uint8)
+    pipeline = StubPipeline(dict(zip(texts + queries, codes)))
+    items = [(t, f"owner_{i % N_OWNERS}", None) for i, t in enumerate(texts)]
+    return items, queries, pipeline
+
+
+async def deposit_rate(field, items) -> float:
+    t0 = time.perf_counter()
+    for start in range(0, len(items), 10_000):
+        await field.deposit_many(items[start : start + 10_000])
+    return len(items) / (time.perf_counter() - t0)
+
+
+async def qps(call, queries: list[str]) -> float:
+    """CONCURRENCY 条查询同时在途时的 QPS。"""
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(q: str) -> None:
+        async with sem:
+            await call(q)
+
+    await call(queries[0])
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return len(queries) / (time.perf_counter() - t0)
+
+
+async def main() -> None:
+    items, queries, pipeline = corpus()
+    print(
+        f"rows={N_ROWS}, owners={N_OWNERS}, D={D}, queries={N_QUERIES}, "
+        f"concurrency={CONCURRENCY}, cpu_count={os.cpu_count()}\n"
+    )
+    header = (
+        f"{'field':<12} {'deposit rows/s':>15} {'match QPS':>10} "
+        f"{'owners QPS':>11} {'exact':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    reference = MemoryField(pipeline)
+    rate = await deposit_rate(reference, items)
+    expected = [[r.score for r in await reference.match(q, k=K)] for q in queries[:8]]
+    print(
+        f"{'memory':<12} {rate:>15.0f} {await qps(lambda q: reference.match(q, k=K), queries):>10.1f} "
+        f"{await qps(lambda q: reference.match_owners(q, k=K), queries):>11.1f} {'-':>6}"
+    )
+    await reference.close()
+    del reference
+
+    for n in SHARD_COUNTS:
+        field = ShardedField(pipeline, n_shards=n, mp_context="fork")
+        try:
+            rate = await deposit_rate(field, items)
+            got = [[r.score for r in await field.match(q, k=K)] for q in queries[:8]]
+            match_qps = await qps(lambda q: field.match(q, k=K), queries)
+            owners_qps = await qps(lambda q: field.match_owners(q, k=K), queries)
+            print(
+                f"{f'sharded x{n}':<12} {rate:>15.0f} {match_qps:>10.1f} "
+                f"{owners_qps:>11.1f} {str(got == expected):>6}"
+            )
+        finally:
+            await field.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
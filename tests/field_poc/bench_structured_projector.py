@@ -0,0 +1,138 @@
+"""
+HadamardProjector（结构化 SORF）vs SimHashProjector（稠密随机超平面）基准
+
+指标:
+  - 构造耗时与常驻内存（子进程内测 RSS 增量，互不干扰）
+  - 投影吞吐：单条 project 延迟、batch_project 行/秒
+  - 召回：合成聚类数据上，Hamming top-k 对精确 cosine top-k 的 recall@k，
+    以及 Hamming top-R 候选对 cosine top-k 的覆盖率（两阶段检索场景）
+
+不加载模型，768 维随机聚类向量模拟编码器输出。
+
+运行:
+  cd backend
+  PYTHONPATH=. python ../tests/field_poc/bench_structured_projector.py
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+BACKEND_DIR = PROJECT_ROOT / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from towow.field.projector import HadamardProjector, SimHashProjector
+
+INPUT_DIM = 768
+D = 10_000
+SEED = 42
+
+N_DOCS = 20_000
+N_CLUSTERS = 200
+N_QUERIES = 200
+K = 10
+RERANK = 100
+
+PROJECTORS = {
+    "simhash": SimHashProjector,
+    "hadamard": HadamardProjector,
+}
+
+
+def _rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _construct_in_child(name: str, queue: mp.Queue) -> None:
+    before = _rss_kb()
+    t0 = time.perf_counter()
+    proj = PROJECTORS[name](input_dim=INPUT_DIM, D=D, seed=SEED)
+    elapsed = time.perf_counter() - t0
+    queue.put((elapsed, _rss_kb() - before))
+    del proj
+
+
+def construction(name: str) -> tuple[float, int]:
+    """(构造秒数, RSS 增量 KB)，在新进程中测量。"""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_construct_in_child, args=(name, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def throughput(proj, data: np.ndarray) -> tuple[float, float]:
+    """(单条 project 微秒, batch_project 行/秒)。"""
+    single = data[0]
+    proj.project(single)
+    t0 = time.perf_counter()
+    for _ in range(200):
+        proj.project(single)
+    single_us = (time.perf_counter() - t0) / 200 * 1e6
+
+    batch = data[:2048]
+    proj.batch_project(batch[:64])
+    t0 = time.perf_counter()
+    proj.batch_project(batch)
+    rows_per_s = batch.shape[0] / (time.perf_counter() - t0)
+    return single_us, rows_per_s
+
+
+def synthetic_corpus() -> tuple[np.ndarray, np.ndarray]:
+    """单位向量：聚类中心 + 噪声，查询取自同一分布。"""
+    rng = np.random.RandomState(SEED)
+    centers = rng.randn(N_CLUSTERS, INPUT_DIM)
+    docs = centers[rng.randint(0, N_CLUSTERS, N_DOCS)] + 0.8 * rng.randn(N_DOCS, INPUT_DIM)
+    queries = centers[rng.randint(0, N_CLUSTERS, N_QUERIES)] + 0.8 * rng.randn(N_QUERIES, INPUT_DIM)
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def recall(proj, docs: np.ndarray, queries: np.ndarray) -> tuple[float, float]:
+    """(recall@K, top-RERANK 候选对 cosine top-K 的覆盖率)。"""
+    truth = np.argsort(-(queries @ docs.T), axis=1)[:, :K]
+    doc_codes = proj.batch_project(docs)
+    query_codes = proj.batch_project(queries)
+    sims = np.stack([proj.batch_similarity(q, doc_codes) for q in query_codes])
+    ranked = np.argsort(-sims, axis=1, kind="stable")
+    at_k = np.mean([len(set(t) & set(r[:K])) / K for t, r in zip(truth, ranked)])
+    at_r = np.mean([len(set(t) & set(r[:RERANK])) / K for t, r in zip(truth, ranked)])
+    return float(at_k), float(at_r)
+
+
+def main() -> None:
+    docs, queries = synthetic_corpus()
+    print(f"D={D}, input_dim={INPUT_DIM}, docs={N_DOCS}, queries={N_QUERIES}\n")
+    header = (
+        f"{'projector':<10} {'init ms':>8} {'RSS MB':>7} {'project µs':>11} "
+        f"{'batch rows/s':>13} {f'recall@{K}':>10} {f'top{RERANK}⊇top{K}':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, cls in PROJECTORS.items():
+        init_s, rss_kb = construction(name)
+        proj = cls(input_dim=INPUT_DIM, D=D, seed=SEED)
+        single_us, rows_per_s = throughput(proj, docs)
+        at_k, at_r = recall(proj, docs, queries)
+        print(
+            f"{name:<10} {init_s * 1000:>8.1f} {rss_kb / 1024:>7.1f} {single_us:>11.1f} "
+            f"{rows_per_s:>13.0f} {at_k:>10.3f} {at_r:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()